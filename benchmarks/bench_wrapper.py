@@ -0,0 +1,374 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+bench_wrapper.py – Benchmarks de carga do SmartAIWrapper
+
+Mede, contra bancos semeados com 10k/100k/1M linhas de auditoria:
+- ``cache_hit_memory``   – latência de um hit no LRU em memória;
+- ``cache_hit_sqlite``   – latência de um hit no SQLite (LRU desligado);
+- ``cache_miss_overhead``– custo do wrapper numa chamada nova, descontado
+                           o tempo gasto dentro do provider;
+- ``audit_throughput``   – linhas de auditoria/s (chamadas novas + flush);
+- ``concurrency``        – 1/8/64 chamadores simultâneos, metade hits e
+                           metade chamadas novas, com o provider sintético
+                           (latência, erros e 429 configuráveis).
+
+O resultado vai para ``benchmarks/results/bench_<data>.json``; compare
+versões com ``benchmarks/compare.py``. Os bancos semeados ficam em
+``benchmarks/.data/`` e são reaproveitados (``--reseed`` recria).
+
+Uso:
+    python benchmarks/bench_wrapper.py [--quick]
+    python benchmarks/bench_wrapper.py --sizes 10000,100000,1000000 --concurrency 1,8,64
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import hashlib
+import logging
+import argparse
+import platform
+import sqlite3
+import statistics
+import subprocess
+import tempfile
+import threading
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(BASE_DIR, "src", "utils"))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from smart_ai_wrapper import SmartAIWrapper, init_audit_schema
+from db_connection import SQLiteConnectionManager
+from synthetic_provider import SyntheticProvider
+
+BENCH_DIR = Path(__file__).resolve().parent
+DATA_DIR = BENCH_DIR / ".data"
+RESULTS_DIR = BENCH_DIR / "results"
+
+MODEL = "gemini-1.5-flash"
+SEED_CHUNK = 50_000
+
+SQL_SEED = """
+    INSERT INTO ai_audit_logs (
+        book_id, job_id, model_name, request_hash, prompt_raw, response_raw,
+        input_tokens, output_tokens, estimated_cost_usd, cost_usd,
+        latency_ms, status_code, payload_json, created_at, updated_at
+    ) VALUES (?, NULL, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, NULL, ?, ?)
+"""
+
+logger = logging.getLogger("Bench")
+
+
+# ----------------------------------------------------------------------
+# Dados
+# ----------------------------------------------------------------------
+def seeded_prompt(i: int) -> str:
+    return f"bench prompt {i}: traduza o verso {i} do Srimad Bhagavatam"
+
+
+def seed_database(path: Path, rows: int) -> float:
+    """Cria um banco com ``rows`` linhas de auditoria (95% SUCCESS). Retorna os segundos gastos."""
+    start = time.perf_counter()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    db = SQLiteConnectionManager(path, init_script=init_audit_schema)
+    rng = random.Random(rows)
+    now = datetime.utcnow()
+    response = "resposta semeada " * 20
+
+    def generate(first: int, last: int):
+        for i in range(first, last):
+            prompt = seeded_prompt(i)
+            created = (now - timedelta(minutes=rng.randrange(90 * 24 * 60))).strftime("%Y-%m-%d %H:%M:%S")
+            status = "SUCCESS" if rng.random() < 0.95 else "ERROR"
+            yield (
+                i % 50, MODEL, hashlib.sha256(prompt.encode("utf-8")).hexdigest(), prompt,
+                response if status == "SUCCESS" else "erro", 20, 100, 0.0006, 0.00005,
+                rng.uniform(200, 4000), status, created, created,
+            )
+
+    try:
+        for first in range(0, rows, SEED_CHUNK):
+            with db.transaction() as conn:
+                conn.executemany(SQL_SEED, generate(first, min(rows, first + SEED_CHUNK)))
+        db.connection().execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    finally:
+        db.close()
+    return time.perf_counter() - start
+
+
+def seeded_copy(rows: int, workdir: Path, reseed: bool = False) -> Path:
+    """Cópia de trabalho do banco semeado (o original fica intacto entre execuções)."""
+    source = DATA_DIR / f"seed_{rows}.db"
+    if reseed and source.exists():
+        source.unlink()
+    if not source.exists():
+        logger.info(f"🌱 Semeando {rows} linhas em {source} ...")
+        logger.info(f"   pronto em {seed_database(source, rows):.1f}s")
+    target = workdir / f"bench_{rows}.db"
+    for suffix in ("", "-wal", "-shm"):
+        Path(f"{target}{suffix}").unlink(missing_ok=True)
+    shutil.copyfile(source, target)
+    return target
+
+
+def successful_seeds(rows: int, count: int, rng: random.Random) -> List[str]:
+    """Prompts semeados sorteados (o SQLite decide se são SUCCESS; ~95%)."""
+    return [seeded_prompt(rng.randrange(rows)) for _ in range(count)]
+
+
+# ----------------------------------------------------------------------
+# Medição
+# ----------------------------------------------------------------------
+def summarize(samples_s: Sequence[float]) -> Dict[str, Optional[float]]:
+    """Percentis exatos em microssegundos."""
+    if not samples_s:
+        return {"count": 0, "mean": None, "p50": None, "p95": None, "p99": None, "max": None}
+    ordered = sorted(samples_s)
+
+    def pct(q: float) -> float:
+        return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1e6, 1)
+
+    return {
+        "count": len(ordered),
+        "mean": round(statistics.fmean(ordered) * 1e6, 1),
+        "p50": pct(0.50),
+        "p95": pct(0.95),
+        "p99": pct(0.99),
+        "max": round(ordered[-1] * 1e6, 1),
+    }
+
+
+def timed_calls(call: Callable[[str], Any], prompts: Sequence[str]) -> List[float]:
+    samples = []
+    for prompt in prompts:
+        start = time.perf_counter()
+        call(prompt)
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def make_wrapper(db_path: Path, **kwargs: Any) -> SmartAIWrapper:
+    return SmartAIWrapper(db_path=db_path, pricing_path=BENCH_DIR / "pricing.json", **kwargs)
+
+
+# ----------------------------------------------------------------------
+# Cenários
+# ----------------------------------------------------------------------
+def bench_cache_hit_memory(db_path: Path, rows: int, calls: int) -> Dict[str, Any]:
+    rng = random.Random(1)
+    prompts = successful_seeds(rows, min(calls, 500), rng)
+    provider = SyntheticProvider()
+    with make_wrapper(db_path) as wrapper:
+        for prompt in prompts:                                  # aquece o LRU
+            wrapper.call_ai(prompt, MODEL, provider_func=provider)
+        workload = [rng.choice(prompts) for _ in range(calls)]
+        samples = timed_calls(lambda p: wrapper.call_ai(p, MODEL, provider_func=provider), workload)
+    return {"latency_us": summarize(samples)}
+
+
+def bench_cache_hit_sqlite(db_path: Path, rows: int, calls: int) -> Dict[str, Any]:
+    rng = random.Random(2)
+    provider = SyntheticProvider()
+    with make_wrapper(db_path, memory_cache_bytes=0) as wrapper:
+        wrapper.sqlite_hits = wrapper.sqlite_misses = 0
+        workload = successful_seeds(rows, calls, rng)
+        samples = timed_calls(lambda p: wrapper.call_ai(p, MODEL, provider_func=provider), workload)
+        hits = wrapper.sqlite_hits
+    return {"latency_us": summarize(samples), "sqlite_hits": hits, "provider_calls": provider.calls}
+
+
+def bench_cache_miss_overhead(db_path: Path, rows: int, calls: int) -> Dict[str, Any]:
+    provider = SyntheticProvider(latency_ms=0)
+    tag = time.time_ns()
+    with make_wrapper(db_path) as wrapper:
+        workload = [f"miss {tag} {i}" for i in range(calls)]
+        samples = timed_calls(lambda p: wrapper.call_ai(p, MODEL, provider_func=provider), workload)
+    provider_mean = provider.busy_seconds / max(1, provider.calls)
+    overhead = [max(0.0, s - provider_mean) for s in samples]
+    return {
+        "latency_us": summarize(overhead),
+        "provider_mean_us": round(provider_mean * 1e6, 1),
+    }
+
+
+def bench_audit_throughput(db_path: Path, rows: int, calls: int) -> Dict[str, Any]:
+    provider = SyntheticProvider(latency_ms=0)
+    tag = time.time_ns()
+    with make_wrapper(db_path) as wrapper:
+        start = time.perf_counter()
+        for i in range(calls):
+            wrapper.call_ai(f"audit {tag} {i}", MODEL, provider_func=provider)
+        wrapper.flush_audit()
+        elapsed = time.perf_counter() - start
+    return {"wall_s": round(elapsed, 4), "rows_per_s": round(calls / elapsed, 1)}
+
+
+def bench_concurrency(db_path: Path, rows: int, calls: int, callers: int,
+                      provider: SyntheticProvider) -> Dict[str, Any]:
+    """``callers`` threads dividem ``calls`` chamadas (50% hits de seeds, 50% novas)."""
+    tag = time.time_ns()
+    per_caller = max(1, calls // callers)
+    samples: List[float] = []
+    failures = 0
+    lock = threading.Lock()
+
+    with make_wrapper(db_path) as wrapper:
+        def caller(index: int) -> None:
+            nonlocal failures
+            rng = random.Random(index)
+            local, failed = [], 0
+            for i in range(per_caller):
+                prompt = (seeded_prompt(rng.randrange(rows)) if i % 2
+                          else f"conc {tag} {index} {i}")
+                start = time.perf_counter()
+                if wrapper.call_ai(prompt, MODEL, provider_func=provider) is None:
+                    failed += 1
+                local.append(time.perf_counter() - start)
+            with lock:
+                samples.extend(local)
+                failures += failed
+
+        threads = [threading.Thread(target=caller, args=(n,)) for n in range(callers)]
+        start = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        wrapper.flush_audit()
+        elapsed = time.perf_counter() - start
+        ratios = {
+            s["labels"]["tier"]: round(s["value"], 4)
+            for s in wrapper.metrics.to_dict().get("hari_cache_hit_ratio", {}).get("series", [])
+        }
+
+    return {
+        "callers": callers,
+        "wall_s": round(elapsed, 4),
+        "throughput_per_s": round(len(samples) / elapsed, 1),
+        "latency_us": summarize(samples),
+        "failed_calls": failures,
+        "provider": {
+            "calls": provider.calls,
+            "errors": provider.errors,
+            "rate_limited": provider.rate_limited,
+        },
+        "cache_hit_ratio": ratios,
+    }
+
+
+# ----------------------------------------------------------------------
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BASE_DIR,
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(sizes: Sequence[int], concurrency: Sequence[int], calls: int,
+        provider_opts: Dict[str, Any], reseed: bool = False) -> Dict[str, Any]:
+    os.environ.setdefault("HARI_ENV", "production")     # gatekeeper nunca pergunta no terminal
+    results: List[Dict[str, Any]] = []
+    scenarios = [
+        ("cache_hit_memory", bench_cache_hit_memory),
+        ("cache_hit_sqlite", bench_cache_hit_sqlite),
+        ("cache_miss_overhead", bench_cache_miss_overhead),
+        ("audit_throughput", bench_audit_throughput),
+    ]
+    with tempfile.TemporaryDirectory(prefix="hari_bench_") as tmp:
+        for rows in sizes:
+            db_path = seeded_copy(rows, Path(tmp), reseed)
+            for name, fn in scenarios:
+                logger.info(f"⏱️  {name} – {rows} linhas")
+                results.append({"rows": rows, "scenario": name, "calls": calls, **fn(db_path, rows, calls)})
+            for callers in concurrency:
+                logger.info(f"⏱️  concurrency – {rows} linhas, {callers} chamadores")
+                provider = SyntheticProvider(**provider_opts)
+                results.append({
+                    "rows": rows, "scenario": "concurrency", "calls": calls,
+                    **bench_concurrency(db_path, rows, calls, callers, provider),
+                })
+    return {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "git_commit": git_commit(),
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "sizes": list(sizes),
+            "concurrency": list(concurrency),
+            "calls": calls,
+            "provider": provider_opts,
+        },
+        "results": results,
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Benchmarks de carga do SmartAIWrapper")
+    parser.add_argument("--sizes", default="10000,100000,1000000",
+                        help="Linhas de auditoria semeadas (vírgulas)")
+    parser.add_argument("--concurrency", default="1,8,64", help="Chamadores simultâneos (vírgulas)")
+    parser.add_argument("--calls", type=int, default=2000, help="Chamadas por cenário")
+    parser.add_argument("--latency-ms", type=float, default=20.0, help="Latência do provider sintético")
+    parser.add_argument("--jitter-ms", type=float, default=10.0)
+    parser.add_argument("--error-rate", type=float, default=0.01)
+    parser.add_argument("--rate-limit", type=float, default=None,
+                        help="Req/s acima das quais o provider responde 429")
+    parser.add_argument("--quick", action="store_true", help="10k linhas, 1/8 chamadores, 300 chamadas")
+    parser.add_argument("--reseed", action="store_true", help="Recria os bancos semeados")
+    parser.add_argument("--out", default=None, help="Arquivo JSON de saída")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING, format="%(message)s")
+    logger.setLevel(logging.INFO)
+    # Erros/429 do provider sintético são esperados; não medir tempo de terminal
+    logging.getLogger("SmartAIWrapper").setLevel(logging.CRITICAL)
+
+    sizes = [int(s) for s in args.sizes.split(",") if s]
+    concurrency = [int(c) for c in args.concurrency.split(",") if c]
+    calls = args.calls
+    if args.quick:
+        sizes, concurrency, calls = [10_000], [1, 8], 300
+
+    report = run(
+        sizes, concurrency, calls,
+        provider_opts={
+            "latency_ms": args.latency_ms,
+            "jitter_ms": args.jitter_ms,
+            "error_rate": args.error_rate,
+            "rate_limit_rps": args.rate_limit,
+        },
+        reseed=args.reseed,
+    )
+
+    out = Path(args.out) if args.out else RESULTS_DIR / f"bench_{datetime.now():%Y%m%d-%H%M%S}.json"
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+
+    for r in report["results"]:
+        label = r["scenario"] + (f"[{r['callers']}]" if "callers" in r else "")
+        lat = r.get("latency_us") or {}
+        extra = r.get("rows_per_s") or r.get("throughput_per_s")
+        print(
+            f"{r['rows']:>8}  {label:<22} "
+            + (f"p50={lat['p50']}µs p95={lat['p95']}µs p99={lat['p99']}µs " if lat else "")
+            + (f"→ {extra}/s" if extra else "")
+        )
+    print(f"📄 Resultados em {out}")
+
+
+if __name__ == "__main__":
+    main()
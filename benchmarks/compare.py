@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+compare.py – Compara dois resultados de ``bench_wrapper.py``
+
+Casa os cenários por (linhas, cenário, chamadores) e mostra a variação de
+p50/p95/p99 e de vazão. Regressões acima de ``--threshold`` (%) são
+marcadas; ``--fail`` faz o script sair com código 1 se houver alguma.
+
+Uso:
+    python benchmarks/compare.py results/antes.json results/depois.json [--threshold 10] [--fail]
+"""
+
+import sys
+import json
+import argparse
+from typing import Any, Dict, List, Optional, Tuple
+
+# Métrica → True se "maior é melhor"
+METRICS = {
+    "latency_us.p50": False,
+    "latency_us.p95": False,
+    "latency_us.p99": False,
+    "rows_per_s": True,
+    "throughput_per_s": True,
+}
+
+
+def _key(result: Dict[str, Any]) -> Tuple[int, str, int]:
+    return result["rows"], result["scenario"], result.get("callers", 0)
+
+
+def _get(result: Dict[str, Any], path: str) -> Optional[float]:
+    value: Any = result
+    for part in path.split("."):
+        if not isinstance(value, dict):
+            return None
+        value = value.get(part)
+    return value if isinstance(value, (int, float)) else None
+
+
+def compare(before: Dict[str, Any], after: Dict[str, Any], threshold: float) -> Tuple[List[str], int]:
+    """Linhas do relatório e número de regressões."""
+    old = {_key(r): r for r in before["results"]}
+    lines, regressions = [], 0
+    for result in after["results"]:
+        base = old.get(_key(result))
+        if base is None:
+            continue
+        rows, scenario, callers = _key(result)
+        label = f"{rows:>8} {scenario}" + (f"[{callers}]" if callers else "")
+        for metric, higher_is_better in METRICS.items():
+            a, b = _get(base, metric), _get(result, metric)
+            if not a or b is None:
+                continue
+            change = 100.0 * (b - a) / a
+            worse = change < -threshold if higher_is_better else change > threshold
+            regressions += worse
+            lines.append(
+                f"{label:<34} {metric:<18} {a:>12.1f} → {b:>12.1f}  {change:+6.1f}%"
+                + ("  ⚠️ REGRESSÃO" if worse else "")
+            )
+    return lines, regressions
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Compara dois resultados de benchmark")
+    parser.add_argument("before")
+    parser.add_argument("after")
+    parser.add_argument("--threshold", type=float, default=10.0, help="Variação (%%) tolerada")
+    parser.add_argument("--fail", action="store_true", help="Sai com código 1 se houver regressão")
+    args = parser.parse_args(argv)
+
+    with open(args.before, encoding="utf-8") as f:
+        before = json.load(f)
+    with open(args.after, encoding="utf-8") as f:
+        after = json.load(f)
+
+    print(f"antes:  {before['meta'].get('git_commit')}  {before['meta'].get('timestamp')}")
+    print(f"depois: {after['meta'].get('git_commit')}  {after['meta'].get('timestamp')}")
+    lines, regressions = compare(before, after, args.threshold)
+    print("\n".join(lines))
+    print(f"{regressions} regressões acima de {args.threshold:.0f}%")
+    if args.fail and regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+synthetic_provider.py – Provider sintético para benchmarks do SmartAIWrapper
+
+Serve direto como ``provider_func``: latência configurável (com jitter),
+taxa de erro e limite de taxa no estilo 429 (``ProviderError`` com
+``status=429`` e ``Retry-After``), tudo determinístico por semente.
+Registra quanto tempo passou "dentro do provider", para que o benchmark
+desconte esse tempo e meça só o overhead do wrapper.
+"""
+
+import os
+import sys
+import time
+import random
+import threading
+from collections import deque
+from typing import Deque, Iterator, Optional, Union
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(BASE_DIR, "src", "utils"))
+
+from provider_registry import ProviderError
+
+
+class SyntheticProvider:
+    """
+    Parameters
+    ----------
+    latency_ms : float
+        Latência base de cada chamada.
+    jitter_ms : float
+        Variação uniforme somada à latência (``0..jitter_ms``).
+    error_rate : float
+        Fração de chamadas que falham com HTTP 500.
+    rate_limit_rps : float | None
+        Acima desta taxa (janela deslizante de 1s) responde 429.
+    retry_after : float | None
+        ``Retry-After`` (s) informado junto com o 429.
+    response_chars : int
+        Tamanho da resposta gerada.
+    streaming : bool
+        Devolve a resposta em chunks (gerador) em vez de ``str``.
+    """
+
+    __name__ = "synthetic"          # nome estável para limitadores e métricas
+
+    def __init__(self,
+                 latency_ms: float = 0.0,
+                 jitter_ms: float = 0.0,
+                 error_rate: float = 0.0,
+                 rate_limit_rps: Optional[float] = None,
+                 retry_after: Optional[float] = 0.05,
+                 response_chars: int = 400,
+                 streaming: bool = False,
+                 seed: int = 42) -> None:
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.rate_limit_rps = rate_limit_rps
+        self.retry_after = retry_after
+        self.response = ("lorem ipsum dolor sit amet " * (response_chars // 27 + 1))[:response_chars]
+        self.streaming = streaming
+
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._window: Deque[float] = deque()
+
+        self.calls = 0
+        self.errors = 0
+        self.rate_limited = 0
+        self.busy_seconds = 0.0         # tempo total gasto "dentro" do provider
+
+    # ------------------------------------------------------------------
+    def _admit(self, now: float) -> bool:
+        if self.rate_limit_rps is None:
+            return True
+        while self._window and now - self._window[0] > 1.0:
+            self._window.popleft()
+        if len(self._window) >= self.rate_limit_rps:
+            return False
+        self._window.append(now)
+        return True
+
+    def __call__(self, prompt: str, model: str) -> Union[str, Iterator[str]]:
+        start = time.perf_counter()
+        with self._lock:
+            self.calls += 1
+            admitted = self._admit(time.monotonic())
+            failed = self._random.random() < self.error_rate
+            delay = (self.latency_ms + self._random.uniform(0, self.jitter_ms)) / 1000
+            if not admitted:
+                self.rate_limited += 1
+            elif failed:
+                self.errors += 1
+        try:
+            if not admitted:
+                raise ProviderError("429 synthetic rate limit", status=429, retry_after=self.retry_after)
+            if delay > 0:
+                time.sleep(delay)
+            if failed:
+                raise ProviderError("500 synthetic failure", status=500)
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self.busy_seconds += elapsed
+        if self.streaming:
+            return iter([self.response[i:i + 64] for i in range(0, len(self.response), 64)])
+        return self.response
+
+    # ------------------------------------------------------------------
+    def reset_counters(self) -> None:
+        with self._lock:
+            self.calls = self.errors = self.rate_limited = 0
+            self.busy_seconds = 0.0
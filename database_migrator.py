@@ -1,63 +1,355 @@
-
 """
 A partir de agora, seu fluxo de manutenção do banco será:
 
     database_setup.py: Garante que as tabelas básicas existam (sempre seguro rodar).
+    Banco novo já nasce na versão atual do schema (PRAGMA user_version).
+
+    database_migrator.py: Leva bancos existentes da versão gravada em user_version
+    até a versão atual, com passos numerados (MIGRATIONS).
 
-    database_migrator.py: Garante que colunas novas de atualizações recentes sejam inseridas em tabelas antigas.
+Como funciona:
+- Todos os passos pendentes rodam numa única transação (BEGIN IMMEDIATE … COMMIT):
+  ou o banco chega na versão final, ou fica exatamente como estava.
+- Mudanças que o ALTER TABLE não faz (constraints novas) reconstroem a tabela:
+  tabela nova, cópia em blocos por rowid com progresso, troca de nomes e
+  índices/triggers recriados.
+- ``--plan`` mostra os passos pendentes e quantas linhas cada reconstrução vai
+  copiar, sem alterar nada.
+
+    python database_migrator.py --plan
+    python database_migrator.py
 
 💡 Dica de Ouro: O Campo version
 
 Note que na sua tabela library_content (v6.5) já existe um campo version. Use-o! Se você rodar o scraper novamente e o texto do WisdomLib vier levemente diferente (uma correção gramatical, por exemplo), você pode inserir o novo texto com version = 2 em vez de apagar o anterior.
 """
 
+import os
+import sys
+import time
 import sqlite3
 import logging
+import argparse
+from typing import Callable, Dict, List, Optional, Sequence
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "src", "utils"))
+
+from db_connection import DEFAULT_PRAGMAS, apply_pragmas
+from database_setup import (
+    DB_PATH, SCHEMA_VERSION, UNIQUE_INDEXES,
+    check_schema, has_unique_index, init_audit_schema, init_library_schema, schema_version,
+)
 
-# Configuração de logs
-logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
 logger = logging.getLogger("Migrator")
 
-DB_PATH = "database/harikatha.db"
+# Linhas copiadas por bloco numa reconstrução (um INSERT … SELECT por bloco)
+CHUNK_ROWS = 50_000
+
+# progress(tabela, linhas_copiadas, total_estimado)
+ProgressFunc = Callable[[str, int, int], None]
+
+
+# ----------------------------------------------------------------------
+class Migration:
+    """
+    Um passo do schema.
+
+    Parameters
+    ----------
+    version : int
+        Valor de ``user_version`` depois do passo.
+    description : str
+        Texto curto mostrado no ``--plan`` e no log.
+    apply : callable
+        ``apply(conn, chunk_rows, progress)``; roda dentro da transação da
+        migração (não pode dar COMMIT nem usar ``executescript``).
+    plan : callable | None
+        ``plan(conn) -> [ação, ...]``, só leitura: o que o passo faria
+        neste banco (lista vazia = nada a fazer).
+    """
+
+    def __init__(self,
+                 version: int,
+                 description: str,
+                 apply: Callable[[sqlite3.Connection, int, Optional[ProgressFunc]], None],
+                 plan: Optional[Callable[[sqlite3.Connection], List[str]]] = None) -> None:
+        self.version = version
+        self.description = description
+        self.apply = apply
+        self.plan = plan
+
+    def __repr__(self) -> str:
+        return f"Migration({self.version}, {self.description!r})"
+
+
+# ----------------------------------------------------------------------
+# Reconstrução de tabela
+# ----------------------------------------------------------------------
+def _columns(conn: sqlite3.Connection, table: str) -> List[str]:
+    return [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]
+
+
+def _max_rowid(conn: sqlite3.Connection, table: str) -> int:
+    """Estimativa barata do tamanho (MAX(rowid) usa a árvore, sem varrer)."""
+    return conn.execute(f"SELECT COALESCE(MAX(rowid), 0) FROM {table}").fetchone()[0]
+
 
-def add_column_if_not_exists(table_name, column_name, column_type):
-    """Adiciona uma coluna a uma tabela se ela ainda não existir."""
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-    
+def _log_progress(table: str, done: int, total: int) -> None:
+    pct = 100 * done / total if total else 100
+    logger.info(f"📦 {table}: {done:,}/{total:,} linhas ({pct:.0f}%)")
+
+
+def rebuild_table(conn: sqlite3.Connection,
+                  table: str,
+                  create_sql: str,
+                  conflict: str = "ABORT",
+                  chunk_rows: int = CHUNK_ROWS,
+                  progress: Optional[ProgressFunc] = None,
+                  skip_indexes: Sequence[str] = ()) -> int:
+    """
+    Recria ``table`` com a definição ``create_sql`` (``{table}`` no lugar do
+    nome) mantendo os dados, no procedimento recomendado pelo SQLite: tabela
+    nova, cópia, DROP da antiga, RENAME, índices e triggers recriados.
+
+    A cópia anda por faixas de rowid de ``chunk_rows`` linhas (cada bloco é
+    uma busca na árvore, sem OFFSET) e reporta progresso. ``conflict`` é a
+    resolução do INSERT (``REPLACE`` = a linha mais nova vence numa chave
+    única nova). Índices em ``skip_indexes`` não são recriados (a tabela
+    nova já traz a constraint). Deve rodar dentro de uma transação.
+
+    Retorna o número de linhas copiadas.
+    """
+    temp = f"{table}__rebuild"
+    dependents = conn.execute(
+        "SELECT type, name, sql FROM sqlite_master "
+        "WHERE tbl_name = ? AND type IN ('index', 'trigger') AND sql IS NOT NULL "
+        "ORDER BY type = 'trigger'",                         # índices antes dos triggers
+        (table,),
+    ).fetchall()
+
+    conn.execute(f"DROP TABLE IF EXISTS {temp}")
+    conn.execute(create_sql.format(table=temp))
+    new_columns = set(_columns(conn, temp))
+    columns = ", ".join(c for c in _columns(conn, table) if c in new_columns)
+
+    total = _max_rowid(conn, table)
+    start, copied = 0, 0
+    started = time.perf_counter()
+    while True:
+        end = conn.execute(
+            f"SELECT MAX(rowid) FROM (SELECT rowid FROM {table} WHERE rowid > ? ORDER BY rowid LIMIT ?)",
+            (start, chunk_rows),
+        ).fetchone()[0]
+        if end is None:
+            break
+        copied += conn.execute(
+            f"INSERT OR {conflict} INTO {temp} ({columns}) "
+            f"SELECT {columns} FROM {table} WHERE rowid > ? AND rowid <= ? ORDER BY rowid",
+            (start, end),
+        ).rowcount
+        start = end
+        (progress or _log_progress)(table, min(end, total), total)
+
+    conn.execute(f"DROP TABLE {table}")
+    # Modo legado: o RENAME não tenta reescrever triggers de outras tabelas que
+    # citam ``table`` (no intervalo entre o DROP e o RENAME ela não existe)
+    legacy = conn.execute("PRAGMA legacy_alter_table").fetchone()[0]
+    conn.execute("PRAGMA legacy_alter_table = ON")
     try:
-        # Verifica as colunas atuais da tabela
-        cur.execute(f"PRAGMA table_info({table_name});")
-        columns = [column[1] for column in cur.fetchall()]
-        
-        if column_name not in columns:
-            logger.info(f"🆕 Adicionando coluna '{column_name}' na tabela '{table_name}'...")
-            cur.execute(f"ALTER TABLE {table_name} ADD COLUMN {column_name} {column_type};")
-            conn.commit()
-            logger.info("✅ Coluna adicionada com sucesso!")
-        else:
-            # logger.info(f"✔ A coluna '{column_name}' já existe em '{table_name}'.")
-            pass
-            
-    except Exception as e:
-        logger.error(f"❌ Erro ao migrar tabela {table_name}: {e}")
+        conn.execute(f"ALTER TABLE {temp} RENAME TO {table}")
+    finally:
+        conn.execute(f"PRAGMA legacy_alter_table = {legacy}")
+    for kind, name, sql in dependents:
+        if name not in skip_indexes:
+            conn.execute(sql)
+
+    logger.info(f"🔁 {table} reconstruída: {copied:,} linhas copiadas em {time.perf_counter() - started:.1f}s")
+    return copied
+
+
+# ----------------------------------------------------------------------
+# Passos
+# ----------------------------------------------------------------------
+def _has_table(conn: sqlite3.Connection, table: str) -> bool:
+    return conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)
+    ).fetchone() is not None
+
+
+def _baseline(conn: sqlite3.Connection, chunk_rows: int, progress: Optional[ProgressFunc]) -> None:
+    init_library_schema(conn)
+    init_audit_schema(conn)
+
+
+def _plan_baseline(conn: sqlite3.Connection) -> List[str]:
+    report = check_schema(conn)
+    actions = [f"criar tabela {name}" for name in report["missing_tables"]]
+    actions += [f"criar índice {name}" for name in report["missing_indexes"]]
+    return actions
+
+
+TRANSLATION_KEY = ("index_id", "language_code", "translator")
+
+TRANSLATIONS_V2_SQL = """
+CREATE TABLE {table} (
+    id             INTEGER PRIMARY KEY,
+    index_id       INTEGER NOT NULL REFERENCES library_index(id),
+    language_code  TEXT    NOT NULL,
+    translator     TEXT,
+    text_body      TEXT,
+    word_for_word  TEXT,
+    source_ref     TEXT,
+    commentary     TEXT,
+    UNIQUE (index_id, language_code, translator)
+)
+"""
+
+
+def _translations_need_rebuild(conn: sqlite3.Connection) -> bool:
+    return (_has_table(conn, "library_translations")
+            and not has_unique_index(conn, "library_translations", TRANSLATION_KEY))
+
+
+def _translation_key_v2(conn: sqlite3.Connection, chunk_rows: int, progress: Optional[ProgressFunc]) -> None:
+    if not _translations_need_rebuild(conn):
+        return
+    ux_names = [name for name, table, _ in UNIQUE_INDEXES if table == "library_translations"]
+    rebuild_table(conn, "library_translations", TRANSLATIONS_V2_SQL, conflict="REPLACE",
+                  chunk_rows=chunk_rows, progress=progress, skip_indexes=ux_names)
+
+
+def _plan_translation_key_v2(conn: sqlite3.Connection) -> List[str]:
+    if not _translations_need_rebuild(conn):
+        return []
+    duplicates = conn.execute("""
+        SELECT COALESCE(SUM(n - 1), 0) FROM (
+            SELECT COUNT(*) AS n FROM library_translations
+            GROUP BY index_id, language_code, translator HAVING n > 1
+        )
+    """).fetchone()[0]
+    if not duplicates:
+        return []                       # o índice único do passo 1 já resolve
+    return [f"reconstruir library_translations (~{_max_rowid(conn, 'library_translations'):,} linhas; "
+            f"{duplicates:,} duplicatas descartadas, a mais nova de cada chave fica)"]
+
+
+MIGRATIONS: List[Migration] = [
+    Migration(1, "Schema base: tabelas, colunas e índices do database_setup", _baseline, _plan_baseline),
+    Migration(2, "UNIQUE (index_id, language_code, translator) em library_translations",
+              _translation_key_v2, _plan_translation_key_v2),
+]
+
+
+# ----------------------------------------------------------------------
+# Motor
+# ----------------------------------------------------------------------
+def pending_migrations(conn: sqlite3.Connection,
+                       migrations: Sequence[Migration] = MIGRATIONS) -> List[Migration]:
+    current = schema_version(conn)
+    return sorted((m for m in migrations if m.version > current), key=lambda m: m.version)
+
+
+def plan(conn: sqlite3.Connection, migrations: Sequence[Migration] = MIGRATIONS) -> List[Dict[str, object]]:
+    """O que ``migrate`` faria, sem alterar o banco: um dict por passo pendente."""
+    return [
+        {"version": m.version, "description": m.description,
+         "actions": m.plan(conn) if m.plan else []}
+        for m in pending_migrations(conn, migrations)
+    ]
+
+
+def migrate(conn: sqlite3.Connection,
+            migrations: Sequence[Migration] = MIGRATIONS,
+            chunk_rows: int = CHUNK_ROWS,
+            progress: Optional[ProgressFunc] = None) -> int:
+    """
+    Aplica os passos pendentes numa única transação e retorna a versão final.
+
+    ``BEGIN IMMEDIATE`` pega o lock de escrita antes do primeiro passo (nada
+    de falhar no meio por concorrência); qualquer erro desfaz tudo, inclusive
+    ``user_version``. Chaves estrangeiras ficam desligadas durante as
+    reconstruções, como pede o procedimento do SQLite.
+    """
+    current = schema_version(conn)
+    latest = max((m.version for m in migrations), default=current)
+    if current > latest:
+        raise RuntimeError(f"Banco na versão {current}, migrações só até {latest}.")
+    pending = pending_migrations(conn, migrations)
+    if not pending:
+        logger.info(f"✔ Banco já está na versão {current}.")
+        return current
+
+    if conn.in_transaction:
+        conn.commit()
+    isolation = conn.isolation_level
+    foreign_keys = conn.execute("PRAGMA foreign_keys").fetchone()[0]
+    conn.isolation_level = None                    # transação controlada aqui
+    conn.execute("PRAGMA foreign_keys = OFF")      # não tem efeito dentro de transação
+    started = time.perf_counter()
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        for migration in pending:
+            logger.info(f"🆕 [{migration.version}] {migration.description}")
+            migration.apply(conn, chunk_rows, progress)
+            conn.execute(f"PRAGMA user_version = {migration.version}")
+        if foreign_keys:
+            violations = conn.execute("PRAGMA foreign_key_check").fetchall()
+            if violations:
+                raise sqlite3.IntegrityError(f"{len(violations)} violações de chave estrangeira")
+        conn.execute("COMMIT")
+    except BaseException:
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
+        logger.error(f"❌ Migração desfeita; banco continua na versão {current}.")
+        raise
+    finally:
+        conn.execute(f"PRAGMA foreign_keys = {foreign_keys}")
+        conn.isolation_level = isolation
+
+    conn.execute("PRAGMA optimize")
+    version = schema_version(conn)
+    logger.info(f"🏁 Versão {current} → {version} em {time.perf_counter() - started:.1f}s.")
+    return version
+
+
+def run_migrations(db_path: str = str(DB_PATH), chunk_rows: int = CHUNK_ROWS) -> int:
+    conn = sqlite3.connect(db_path)
+    try:
+        # Cache de páginas e temporários em memória ajudam a cópia; não é
+        # preciso o mmap do perfil completo numa execução curta
+        apply_pragmas(conn, DEFAULT_PRAGMAS + (("cache_size", -256 * 1024),))
+        return migrate(conn, chunk_rows=chunk_rows)
     finally:
         conn.close()
 
-def run_migrations():
-    logger.info("🚀 Iniciando verificação de integridade do Schema...")
-    
-    # EXEMPLOS DE MUDANÇAS FUTURAS:
-    # Se você decidir que quer guardar o autor do livro:
-    add_column_if_not_exists("library_books", "author", "TEXT")
-    
-    # Se você quiser guardar um resumo da aula gerado por IA:
-    add_column_if_not_exists("lectures", "ia_summary", "TEXT")
-    
-    # Se quiser guardar a versão do modelo usado na transcrição:
-    add_column_if_not_exists("pipeline_jobs", "model_version", "TEXT")
-
-    logger.info("🏁 Migrações concluídas.")
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Migrações versionadas do banco HariKathaAI.")
+    parser.add_argument("--db", default=str(DB_PATH), help="Caminho do banco SQLite.")
+    parser.add_argument("--plan", action="store_true", help="Só mostra os passos pendentes.")
+    parser.add_argument("--chunk", type=int, default=CHUNK_ROWS, help="Linhas por bloco nas reconstruções.")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+
+    if not os.path.exists(args.db):
+        print(f"❌ Banco não encontrado: {args.db} (crie com src/utils/database_setup.py)")
+        sys.exit(1)
+
+    if args.plan:
+        conn = sqlite3.connect(f"file:{args.db}?mode=ro", uri=True)
+        steps = plan(conn)
+        print(f"🗄️ {args.db}: versão {schema_version(conn)}, código na {SCHEMA_VERSION}")
+        conn.close()
+        if not steps:
+            print("✔ Nada a fazer.")
+        for step in steps:
+            print(f"  [{step['version']}] {step['description']}")
+            for action in step["actions"] or ["(nada a fazer neste banco)"]:
+                print(f"      - {action}")
+        return
+
+    run_migrations(args.db, chunk_rows=args.chunk)
+
 
 if __name__ == "__main__":
-    run_migrations()
\ No newline at end of file
+    main()
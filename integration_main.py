@@ -8,7 +8,18 @@ from src.intelligence.librarian_storage import save_scraped_verse
 logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
 logger = logging.getLogger("IntegrationMain")
 
+class CaptureError(RuntimeError):
+    """Falha na captura de um verso (Node, JSON ou gravação)."""
+
+
 def capture_and_save(book_acronym, verse_ref):
+    """
+    Captura um verso com o scraper Node e grava no acervo.
+
+    Levanta ``CaptureError`` se o scraper falhar, não entregar JSON válido
+    ou a gravação der erro, para que o controlador de ritmo (e o circuit
+    breaker) enxerguem a falha.
+    """
     book_map = {
         "BRS": "Bhakti-rasamrta-sindhu",
         "SB": "Srimad-Bhagavatam",
@@ -27,34 +38,42 @@ def capture_and_save(book_acronym, verse_ref):
     )
 
     # 2. Lógica de Sucesso: O returncode deve ser 0
-    if result.returncode == 0:
-        # Mostramos os logs do Node apenas como informação, não como erro
-        if result.stderr:
-            print(f"--- Logs do Scraper ---\n{result.stderr}\n-----------------------")
-
-        try:
-            # 3. Busca o JSON na saída (stdout)
-            raw_output = result.stdout.strip()
-            start_index = raw_output.find('{')
-            end_index = raw_output.rfind('}') + 1
-
-            if start_index != -1 and end_index > start_index:
-                verse_data = json.loads(raw_output[start_index:end_index])
-                
-                # 4. Tenta salvar no banco
-                save_scraped_verse(verse_data, book_acronym=book_acronym)
-                logger.info(f"✅ Verso {verse_ref} processado com sucesso!")
-            else:
-                logger.error("❌ O Scraper rodou, mas não entregou um JSON válido no stdout.")
-                
-        except Exception as e:
-            logger.error(f"❌ Erro ao processar o JSON: {e}")
-            logger.debug(f"Saída bruta: {result.stdout}")
-    else:
+    if result.returncode != 0:
         # Aqui sim é um erro real de execução do Node
         logger.error(f"❌ Erro Fatal no Node.js (Exit Code {result.returncode}):")
         logger.error(result.stderr)
+        raise CaptureError(f"Scraper saiu com código {result.returncode} em {verse_ref}")
+
+    # Mostramos os logs do Node apenas como informação, não como erro
+    if result.stderr:
+        print(f"--- Logs do Scraper ---\n{result.stderr}\n-----------------------")
+
+    # 3. Busca o JSON na saída (stdout)
+    raw_output = result.stdout.strip()
+    start_index = raw_output.find('{')
+    end_index = raw_output.rfind('}') + 1
+    if start_index == -1 or end_index <= start_index:
+        logger.error("❌ O Scraper rodou, mas não entregou um JSON válido no stdout.")
+        raise CaptureError(f"Scraper não entregou JSON para {verse_ref}")
+
+    try:
+        verse_data = json.loads(raw_output[start_index:end_index])
+    except json.JSONDecodeError as e:
+        logger.error(f"❌ Erro ao processar o JSON: {e}")
+        logger.debug(f"Saída bruta: {result.stdout}")
+        raise CaptureError(f"JSON inválido para {verse_ref}: {e}") from e
+
+    # 4. Tenta salvar no banco
+    try:
+        save_scraped_verse(verse_data, book_acronym=book_acronym)
+    except Exception as e:
+        logger.error(f"❌ Erro ao salvar o verso {verse_ref}: {e}")
+        raise CaptureError(f"Falha ao gravar {verse_ref}: {e}") from e
+    logger.info(f"✅ Verso {verse_ref} processado com sucesso!")
 
 if __name__ == "__main__":
     # Teste com o verso 1.1.1
-    capture_and_save("BRS", "1.1.1")
\ No newline at end of file
+    try:
+        capture_and_save("BRS", "1.1.1")
+    except CaptureError as e:
+        logger.error(f"❌ {e}")
@@ -1,4 +1,3 @@
-import sqlite3
 import os
 import sys
 
@@ -7,43 +6,36 @@ current_dir = os.path.dirname(os.path.abspath(__file__))
 project_root = os.path.abspath(os.path.join(current_dir, '..', '..'))
 sys.path.append(project_root)
 
+from src.intelligence.verse_repository import VerseRepository
+
 DB_PATH = os.path.join(project_root, "database", "harikatha.db")
 
+_repository = None
+
+def get_repository():
+    """Repositório compartilhado (uma conexão, LRU dos versos já publicados)."""
+    global _repository
+    if _repository is None:
+        _repository = VerseRepository(DB_PATH, cache_size=256)
+    return _repository
+
 def format_verse_card(book_acronym, verse_ref):
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-    
     canonical_id = f"{book_acronym}_{verse_ref}"
-    
-    # 1. Busca Sânscrito e Transliteração (Tabela Raiz)
-    sql_root = """
-        SELECT r.primary_script, r.transliteration
-        FROM library_root_text r
-        JOIN library_index i ON r.index_id = i.id
-        WHERE i.canonical_id = ?
-    """
-    root = cur.execute(sql_root, (canonical_id,)).fetchone()
-    
-    if not root:
+
+    # Raiz + traduções do verso numa consulta só
+    verse = get_repository().get(canonical_id)
+
+    if not verse or (verse.primary_script is None and verse.transliteration is None):
         print(f"❌ Verso {canonical_id} não encontrado no banco.")
         return
 
-    # 2. Busca a Tradução Gaudiya (Tabela Traduções)
-    sql_trans = """
-        SELECT t.text_body
-        FROM library_translations t
-        JOIN library_index i ON t.index_id = i.id
-        WHERE i.canonical_id = ? 
-          AND t.translator = 'AI_Gaudiya_PT'
-    """
-    translation = cur.execute(sql_trans, (canonical_id,)).fetchone()
-    
-    conn.close()
+    # Tradução Gaudiya
+    translation = verse.translation(translator='AI_Gaudiya_PT')
 
     # --- MONTAGEM DO CARD ---
-    sanskrit = root[0]
-    translit = root[1]
-    pt_text = translation[0] if translation else "[Tradução pendente... rode o scholar.py]"
+    sanskrit = verse.primary_script
+    translit = verse.transliteration
+    pt_text = translation.text_body if translation else "[Tradução pendente... rode o scholar.py]"
 
     print("\n" + "="*50)
     print(f"🌺 {book_acronym} {verse_ref} 🌺")
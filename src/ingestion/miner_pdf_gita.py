@@ -11,7 +11,6 @@ py src/scripts/miner_pdf_gita.py
 
 import pdfplumber
 import re
-import sqlite3
 import os
 import sys
 
@@ -20,43 +19,40 @@ current_dir = os.path.dirname(os.path.abspath(__file__))
 project_root = os.path.abspath(os.path.join(current_dir, '..', '..'))
 sys.path.append(project_root)
 
-from src.intelligence.librarian_storage import _ensure_book_id, _ensure_index_id, _upsert_translation, _upsert_commentary
+from src.intelligence.librarian_storage import VerseBatchWriter
+from src.utils.database_setup import connect
 
 DB_PATH = os.path.join(project_root, "database", "harikatha.db")
 PDF_PATH = "bhagavad-gita-4ed-eng.pdf" # O arquivo que você enviou
 
-def save_verse_data(verse_data):
-    """Salva os dados extraídos no Banco de Dados"""
+def save_verse_data(writer, verse_data):
+    """Entrega o verso extraído ao writer (gravação em lote, um commit por lote)"""
     if not verse_data['ref']: return
 
     print(f"💾 Salvando BG {verse_data['ref']}...")
-    conn = sqlite3.connect(DB_PATH)
-    try:
-        # 1. Garante IDs
-        book_id = _ensure_book_id(conn, "BG") # Bhagavad-gita
-        canonical_id = f"BG_{verse_data['ref']}"
-        index_id = _ensure_index_id(conn, book_id, canonical_id, verse_data['ref'])
-
-        # 2. Salva Tradução (Inglês)
-        if verse_data['translation']:
-            full_translation = "\n".join(verse_data['translation'])
-            _upsert_translation(conn, index_id, 'en', 'BV Narayana Maharaja', full_translation)
-
-        # 3. Salva Comentário (Inglês)
-        if verse_data['commentary']:
-            full_commentary = "\n".join(verse_data['commentary'])
-            # Tenta detectar se é Visvanatha ou Narayana Maharaja pelo título, 
-            # ou salva como genérico da edição
-            _upsert_commentary(conn, index_id, 'en', 'Sarartha-varsini (Gita)', full_commentary)
-
-        conn.commit()
-    except Exception as e:
-        print(f"❌ Erro ao salvar {verse_data['ref']}: {e}")
-    finally:
-        conn.close()
+    record = {"ref": verse_data['ref'], "canonical_id": f"BG_{verse_data['ref']}"}
+
+    # 1. Tradução (Inglês)
+    if verse_data['translation']:
+        full_translation = "\n".join(verse_data['translation'])
+        record["translations"] = [{"lang": "en", "translator": "BV Narayana Maharaja", "body": full_translation}]
+
+    # 2. Comentário (Inglês)
+    if verse_data['commentary']:
+        full_commentary = "\n".join(verse_data['commentary'])
+        # Tenta detectar se é Visvanatha ou Narayana Maharaja pelo título, 
+        # ou salva como genérico da edição
+        record["commentaries"] = [{"lang": "en", "commentator": "Sarartha-varsini (Gita)", "text": full_commentary}]
+
+    writer.add(record)
 
 def mine_gita_pdf():
     print(f"🔨 Iniciando mineração de: {PDF_PATH}")
+    with VerseBatchWriter("BG", db_path=DB_PATH) as writer:
+        _mine_pages(writer)
+    print(f"🏁 {writer.written} versos gravados em {writer.batches} lotes ({writer.failed} com erro).")
+
+def _mine_pages(writer):
     
     current_verse = {"ref": None, "translation": [], "commentary": []}
     state = "SEARCHING" # SEARCHING, TRANSLATION, COMMENTARY
@@ -83,7 +79,7 @@ def mine_gita_pdf():
                 if match:
                     # Se já tínhamos um verso capturado, salva ele agora
                     if current_verse['ref']:
-                        save_verse_data(current_verse)
+                        save_verse_data(writer, current_verse)
                     
                     # Reseta para o novo verso
                     new_ref = match.group(2)
@@ -112,11 +108,11 @@ def mine_gita_pdf():
 
         # Salva o último verso
         if current_verse['ref']:
-            save_verse_data(current_verse)
+            save_verse_data(writer, current_verse)
 
 if __name__ == "__main__":
     # Garante que o livro BG existe no banco antes de começar
-    conn = sqlite3.connect(DB_PATH)
+    conn = connect(DB_PATH)                 # schema + PRAGMAs de desempenho
     conn.execute("INSERT OR IGNORE INTO library_books (acronym, book_title) VALUES ('BG', 'Śrīmad Bhagavad-gītā')")
     conn.commit()
     conn.close()
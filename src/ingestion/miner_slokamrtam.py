@@ -13,7 +13,6 @@ Correções Finais:
 import os
 import re
 import sys
-import sqlite3
 import logging
 import pdfplumber
 from typing import List, Tuple
@@ -23,13 +22,8 @@ CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
 PROJECT_ROOT = os.path.abspath(os.path.join(CURRENT_DIR, "..", ".."))
 sys.path.append(PROJECT_ROOT)
 
-from src.intelligence.librarian_storage import (
-    _ensure_book_id,
-    _ensure_index_id,
-    _upsert_root_text,
-    _upsert_translation,
-    _upsert_commentary
-)
+from src.intelligence.librarian_storage import VerseBatchWriter
+from src.utils.database_setup import connect
 
 DB_PATH  = os.path.join(PROJECT_ROOT, "database", "harikatha.db")
 PDF_PATH = "Sri Slokamrtam Cinmaya v1.0.qxp - Sri_Slokamritam.pdf"
@@ -335,33 +329,26 @@ def extract_columns(page) -> List[str]:
 
 # --- 5. Persistência ---
 
-def save_to_db(conn: sqlite3.Connection, ref: str, lines: List[str], chapter: str):
+def save_to_db(writer: VerseBatchWriter, ref: str, lines: List[str], chapter: str):
+    """Monta o registro do verso e entrega ao writer (commit por lote)."""
     if not ref or not lines: return
     try:
         data = process_verse_block(lines)
-        book_id = _ensure_book_id(conn, "SLK")
-        canonical_id = f"SLK_{ref}"
-        index_id = _ensure_index_id(conn, book_id, canonical_id, ref)
-        
-        if data["root"]:
-            _upsert_root_text(conn, index_id, None, data["root"])
-            
+        record = {"ref": ref, "canonical_id": f"SLK_{ref}", "transliteration": data["root"] or None}
+
         if data["body"] or data["ref"] or data["commentary"] or data["w2w"]:
-            _upsert_translation(
-                conn, index_id, "en", "Slokamrtam Book",
-                text_body=data["body"],
-                word_for_word=data["w2w"], 
-                source_ref=data["ref"],
-                commentary=data["commentary"]
-            )
+            record["translations"] = [{
+                "lang": "en", "translator": "Slokamrtam Book",
+                "body": data["body"],
+                "w2w": data["w2w"],
+                "ref": data["ref"],
+                "commentary": data["commentary"],
+            }]
 
         if chapter and len(chapter) > 3 and ":" not in chapter:
-            conn.execute("INSERT OR IGNORE INTO theological_concepts (term, category) VALUES (?, 'Tattva')", (chapter.lower(),))
-            res = conn.execute("SELECT id FROM theological_concepts WHERE term = ?", (chapter.lower(),)).fetchone()
-            if res:
-                conn.execute("INSERT OR REPLACE INTO content_tags (concept_id, library_index_id, relevance_score) VALUES (?, ?, 2.0)", (res[0], index_id))
+            record["tags"] = [{"term": chapter.lower(), "category": "Tattva", "score": 2.0}]
 
-        status = "Root✅" if data["root"] else "Root❌"
+        writer.add(record)
 
     except Exception as e:
         logger.error(f"❌ Erro {ref}: {e}")
@@ -370,9 +357,10 @@ def save_to_db(conn: sqlite3.Connection, ref: str, lines: List[str], chapter: st
 
 def mine_slokamrtam():
     logger.info(f"🔨 Mineração V23.0 (Final Polish): {PDF_PATH}")
-    conn = sqlite3.connect(DB_PATH)
+    conn = connect(DB_PATH)                 # schema + PRAGMAs de desempenho
     conn.execute("INSERT OR IGNORE INTO library_books (acronym, book_title) VALUES ('SLK', 'Śrī Ślokāmṛtam')")
     conn.commit()
+    writer = VerseBatchWriter("SLK", conn=conn)
     
     verse_num_regex = re.compile(r"^\s*(\d+\.\d+)\s*$")
     chapter_regex = re.compile(r"^(Chapter|SAMBANDHA|ABHIDHEYA|PRAYOJANA)\s*(\d*)\s*[-–]?\s*(.*)", re.IGNORECASE)
@@ -394,7 +382,7 @@ def mine_slokamrtam():
                     new_chap = part3 if part3 else clean
                     if len(new_chap) > 3 and ":" not in new_chap:
                         if curr_ref:
-                            save_to_db(conn, curr_ref, curr_lines, curr_chapter)
+                            save_to_db(writer, curr_ref, curr_lines, curr_chapter)
                             curr_ref, curr_lines = None, []
                         curr_chapter = new_chap
                         logger.info(f"📂 Tópico: {curr_chapter}")
@@ -403,7 +391,7 @@ def mine_slokamrtam():
                 verse_match = verse_num_regex.match(clean)
                 if verse_match:
                     if curr_ref:
-                        save_to_db(conn, curr_ref, curr_lines, curr_chapter)
+                        save_to_db(writer, curr_ref, curr_lines, curr_chapter)
                     
                     curr_ref = verse_match.group(1)
                     curr_lines = []
@@ -413,11 +401,11 @@ def mine_slokamrtam():
                     curr_lines.append(raw)
 
             if curr_ref:
-                save_to_db(conn, curr_ref, curr_lines, curr_chapter)
+                save_to_db(writer, curr_ref, curr_lines, curr_chapter)
             
-    conn.commit()
+    writer.close()
     conn.close()
-    logger.info("🏁 Processo Concluído.")
+    logger.info(f"🏁 Processo Concluído: {writer.written} gravações em {writer.batches} lotes.")
 
 if __name__ == "__main__":
     if os.path.exists(PDF_PATH):
@@ -2,12 +2,24 @@
 # -*- coding: utf-8 -*-
 
 """
-librarian_storage.py (V8.0 - Suporte a Word-for-Word)
+librarian_storage.py (V9.0 - Gravação em lote)
+
+- Funções ``_upsert_*``: gravação verso a verso (scripts antigos).
+- ``VerseBatchWriter``: registros de verso (raiz, traduções, w2w, refs,
+  comentários, tags) gravados em lote – ids do library_index resolvidos em
+  bloco, ``executemany`` por tabela e um commit por lote.
+- ``save_scraped_verse``: grava o JSON do scraper (WisdomLib).
+- ``IdentityCache``: ids de livros, entradas do índice e conceitos em
+  memória, por conexão (sem SELECT repetido nos loops de ingestão).
 """
 
 import os
 import sqlite3
 import logging
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
 
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 DB_PATH = os.path.join(BASE_DIR, "database", "harikatha.db")
@@ -23,19 +35,17 @@ def _get_connection() -> sqlite3.Connection:
     return sqlite3.connect(DB_PATH)
 
 def _ensure_book_id(conn: sqlite3.Connection, acronym: str) -> int:
-    cur = conn.execute("SELECT id FROM library_books WHERE acronym = ?", (acronym,))
-    row = cur.fetchone()
-    if not row: raise ValueError(f"Livro '{acronym}' não encontrado!")
-    return row[0]
+    return identity_cache(conn).book_id(acronym)
 
-def _ensure_index_id(conn: sqlite3.Connection, book_id: int, canonical_id: str, verse_ref: str) -> int:
+def _ref_numbers(verse_ref: str) -> Tuple[int, int, int]:
     parts = verse_ref.split(".")
     n1 = int(parts[0]) if len(parts) > 0 and parts[0].isdigit() else 0
     n2 = int(parts[1]) if len(parts) > 1 and parts[1].isdigit() else 0
     n3 = int(parts[2]) if len(parts) > 2 and parts[2].isdigit() else 0
+    return n1, n2, n3
 
-    conn.execute("INSERT OR IGNORE INTO library_index (book_id, canonical_id, num_1, num_2, num_3) VALUES (?, ?, ?, ?, ?)", (book_id, canonical_id, n1, n2, n3))
-    return conn.execute("SELECT id FROM library_index WHERE canonical_id = ?", (canonical_id,)).fetchone()[0]
+def _ensure_index_id(conn: sqlite3.Connection, book_id: int, canonical_id: str, verse_ref: str) -> int:
+    return identity_cache(conn).index_ids(book_id, [(canonical_id, verse_ref)])[canonical_id]
 
 def _upsert_root_text(conn: sqlite3.Connection, index_id: int, sanskrit: str, translit: str) -> None:
     if not sanskrit and not translit: return
@@ -70,4 +80,413 @@ def _upsert_translation(
 
 def _upsert_commentary(conn: sqlite3.Connection, index_id: int, lang: str, commentator: str, text: str) -> None:
     if not text or len(text.strip()) < 5: return
-    conn.execute("INSERT OR REPLACE INTO library_commentaries (index_id, language_code, commentator, text_body) VALUES (?, ?, ?, ?)", (index_id, lang, commentator, text.strip()))
\ No newline at end of file
+    conn.execute("INSERT OR REPLACE INTO library_commentaries (index_id, language_code, commentator, text_body) VALUES (?, ?, ?, ?)", (index_id, lang, commentator, text.strip()))
+
+# ----------------------------------------------------------------------
+# Gravação em lote
+# ----------------------------------------------------------------------
+SQL_INDEX_INSERT = "INSERT OR IGNORE INTO library_index (book_id, canonical_id, num_1, num_2, num_3) VALUES (?, ?, ?, ?, ?)"
+SQL_ROOT_UPSERT = "INSERT OR REPLACE INTO library_root_text (index_id, primary_script, transliteration) VALUES (?, ?, ?)"
+SQL_TRANSLATION_UPSERT = """
+    INSERT OR REPLACE INTO library_translations
+    (index_id, language_code, translator, text_body, word_for_word, source_ref, commentary)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+"""
+SQL_COMMENTARY_UPSERT = "INSERT OR REPLACE INTO library_commentaries (index_id, language_code, commentator, text_body) VALUES (?, ?, ?, ?)"
+SQL_CONCEPT_INSERT = "INSERT OR IGNORE INTO theological_concepts (term, category) VALUES (?, ?)"
+SQL_TAG_UPSERT = "INSERT OR REPLACE INTO content_tags (concept_id, library_index_id, relevance_score) VALUES (?, ?, ?)"
+
+# Variáveis por SELECT ... IN (...) (SQLite antigo aceita até 999)
+_IN_CHUNK = 500
+
+
+# ----------------------------------------------------------------------
+# Cache de identidade (acrônimo / canonical_id / termo → id)
+# ----------------------------------------------------------------------
+class IdentityCache:
+    """
+    Ids de ``library_books.acronym``, ``library_index.canonical_id`` e
+    ``theological_concepts.term`` de uma conexão.
+
+    Livros e conceitos são carregados com uma consulta cada na criação; o
+    índice é carregado por livro, com uma consulta, no primeiro uso. Inserts
+    feitos por aqui entram no cache na hora. Escritas de fora (outro
+    processo/conexão) são detectadas por ``PRAGMA data_version`` em
+    ``refresh_if_changed()``; quem apaga/reescreve essas tabelas pela mesma
+    conexão (ou desfaz uma transação) chama ``invalidate()``.
+    """
+
+    def __init__(self, conn: sqlite3.Connection) -> None:
+        self.conn = conn
+        self.books: Dict[str, int] = {}
+        self.index: Dict[str, int] = {}
+        self.concepts: Dict[str, int] = {}
+        self._warm_books: set = set()
+        self._data_version = self._current_version()
+        self.hits = 0
+        self.misses = 0
+        self._warm()
+
+    # ------------------------------------------------------------------
+    def _current_version(self) -> int:
+        return self.conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def _warm(self) -> None:
+        self.books = dict(self.conn.execute("SELECT acronym, id FROM library_books"))
+        try:
+            self.concepts = dict(self.conn.execute("SELECT term, id FROM theological_concepts"))
+        except sqlite3.OperationalError:            # banco sem tabela de conceitos
+            self.concepts = {}
+
+    def _warm_index(self, book_id: int) -> None:
+        if book_id not in self._warm_books:
+            self.index.update(self.conn.execute(
+                "SELECT canonical_id, id FROM library_index WHERE book_id = ?", (book_id,)
+            ))
+            self._warm_books.add(book_id)
+
+    # ------------------------------------------------------------------
+    def invalidate(self, table: Optional[str] = None) -> None:
+        """Esquece ``books`` | ``index`` | ``concepts`` (ou tudo); recarrega sob demanda."""
+        if table in (None, "index"):
+            self.index.clear()
+            self._warm_books.clear()
+        if table in (None, "books", "concepts"):
+            self._warm()
+
+    def refresh_if_changed(self) -> bool:
+        """Invalida tudo se outra conexão gravou no banco desde a última checagem."""
+        version = self._current_version()
+        if version == self._data_version:
+            return False
+        self._data_version = version
+        self.invalidate()
+        return True
+
+    # ------------------------------------------------------------------
+    def book_id(self, acronym: str) -> int:
+        book_id = self.books.get(acronym)
+        if book_id is None:
+            row = self.conn.execute("SELECT id FROM library_books WHERE acronym = ?", (acronym,)).fetchone()
+            if not row: raise ValueError(f"Livro '{acronym}' não encontrado!")
+            book_id = self.books[acronym] = row[0]
+        return book_id
+
+    def index_ids(self, book_id: int, entries: Sequence[Tuple[str, str]]) -> Dict[str, int]:
+        """
+        ``{canonical_id: id}`` para ``[(canonical_id, ref)]``; só os ausentes
+        do cache são inseridos (``INSERT OR IGNORE``) e consultados, em bloco.
+        """
+        self._warm_index(book_id)
+        missing = {cid: ref for cid, ref in entries if cid not in self.index}
+        self.hits += len(entries) - len(missing)
+        if missing:
+            self.misses += len(missing)
+            self.conn.executemany(SQL_INDEX_INSERT, [
+                (book_id, cid, *_ref_numbers(ref)) for cid, ref in missing.items()
+            ])
+            self.index.update(_lookup_ids(
+                self.conn, "SELECT id, canonical_id FROM library_index WHERE canonical_id IN ({marks})",
+                list(missing),
+            ))
+        return {cid: self.index[cid] for cid, _ in entries}
+
+    def concept_ids(self, terms: Sequence[Tuple[str, str]]) -> Dict[str, int]:
+        """``{termo: id}`` para ``[(termo, categoria)]``, criando os que faltam."""
+        missing = {term: category for term, category in terms if term not in self.concepts}
+        if missing:
+            self.conn.executemany(SQL_CONCEPT_INSERT, list(missing.items()))
+            self.concepts.update(_lookup_ids(
+                self.conn, "SELECT id, term FROM theological_concepts WHERE term IN ({marks})",
+                list(missing),
+            ))
+        return {term: self.concepts[term] for term, _ in terms}
+
+
+# sqlite3.Connection não aceita weakref nem atributos: registro por id(conn),
+# conferindo a identidade (id pode ser reaproveitado depois de um close).
+_IDENTITY_CACHES: "OrderedDict[int, IdentityCache]" = OrderedDict()
+_IDENTITY_LOCK = threading.Lock()
+_IDENTITY_MAX = 8
+
+
+def _is_open(conn: sqlite3.Connection) -> bool:
+    try:
+        conn.total_changes
+        return True
+    except sqlite3.ProgrammingError:
+        return False
+
+
+def identity_cache(conn: sqlite3.Connection) -> IdentityCache:
+    """Cache de identidade da conexão (criado e pré-carregado no primeiro uso)."""
+    key = id(conn)
+    with _IDENTITY_LOCK:
+        cache = _IDENTITY_CACHES.get(key)
+        if cache is not None and cache.conn is conn:
+            _IDENTITY_CACHES.move_to_end(key)
+            return cache
+    cache = IdentityCache(conn)
+    with _IDENTITY_LOCK:
+        _IDENTITY_CACHES[key] = cache
+        for other_key, other in list(_IDENTITY_CACHES.items()):
+            if len(_IDENTITY_CACHES) <= _IDENTITY_MAX:
+                break
+            if other_key != key and not _is_open(other.conn):
+                del _IDENTITY_CACHES[other_key]
+        while len(_IDENTITY_CACHES) > _IDENTITY_MAX:
+            _IDENTITY_CACHES.popitem(last=False)
+    return cache
+
+
+def invalidate_identity_cache(conn: sqlite3.Connection, table: Optional[str] = None) -> None:
+    """Para quem apaga/reescreve livros, índice ou conceitos por fora dos helpers."""
+    with _IDENTITY_LOCK:
+        cache = _IDENTITY_CACHES.get(id(conn))
+    if cache is not None and cache.conn is conn:
+        cache.invalidate(table)
+
+
+def release_identity_cache(conn: sqlite3.Connection) -> None:
+    """Solta o cache (e a referência à conexão) antes de fechá-la."""
+    with _IDENTITY_LOCK:
+        cache = _IDENTITY_CACHES.get(id(conn))
+        if cache is not None and cache.conn is conn:
+            del _IDENTITY_CACHES[id(conn)]
+
+
+def _clean(text: Optional[str]) -> Optional[str]:
+    text = text.strip() if text else ""
+    return text or None
+
+
+def _lookup_ids(conn: sqlite3.Connection, sql: str, keys: Sequence[str]) -> Dict[str, int]:
+    """``{chave: id}`` em blocos de ``_IN_CHUNK`` (``sql`` tem um ``{marks}``)."""
+    ids: Dict[str, int] = {}
+    for start in range(0, len(keys), _IN_CHUNK):
+        chunk = keys[start:start + _IN_CHUNK]
+        marks = ",".join("?" * len(chunk))
+        ids.update((key, row_id) for row_id, key in conn.execute(sql.format(marks=marks), chunk))
+    return ids
+
+
+# Campos obrigatórios de cada item das listas de um registro
+_REQUIRED_ITEM_KEYS = {
+    "translations": ("lang", "translator"),
+    "commentaries": ("lang", "commentator"),
+    "tags": ("term",),
+}
+
+
+def _check_record(record: Dict[str, Any]) -> None:
+    """Valida um registro do ``VerseBatchWriter`` antes de ele entrar no lote."""
+    if not record.get("ref"):
+        raise ValueError("Registro de verso sem 'ref'")
+    for field, keys in _REQUIRED_ITEM_KEYS.items():
+        for item in record.get(field) or ():
+            missing = [k for k in keys if not item.get(k)]
+            if missing:
+                raise ValueError(f"{record['ref']}: item de '{field}' sem {', '.join(missing)}")
+
+
+class VerseBatchWriter:
+    """
+    Grava versos de um livro em lotes (uma transação por lote).
+
+    Cada registro é um dict::
+
+        {
+            "ref": "1.2.3",                       # obrigatório
+            "canonical_id": "SLK_1.2.3",          # padrão = f"{acrônimo}_{ref}"
+            "sanskrit": "...", "transliteration": "...",
+            "translations": [{"lang": "en", "translator": "...", "body": "...",
+                              "w2w": "...", "ref": "...", "commentary": "..."}],
+            "commentaries": [{"lang": "en", "commentator": "...", "text": "..."}],
+            "tags": [{"term": "...", "category": "Tattva", "score": 2.0}],
+        }
+
+    As regras de limpeza são as mesmas das funções ``_upsert_*`` (textos
+    aparados; partes vazias e comentários com menos de 5 caracteres são
+    ignorados). Se um lote falhar, ele é regravado verso a verso para
+    isolar o registro problemático (que é registrado no log e descartado).
+
+    Parameters
+    ----------
+    book_acronym : str
+        Acrônimo em ``library_books`` (o livro precisa existir).
+    db_path : str
+        Banco (padrão = ``database/harikatha.db``). Ignorado se ``conn`` vier.
+    batch_size : int
+        Versos por transação.
+    conn : sqlite3.Connection | None
+        Conexão existente (quem passa é quem fecha).
+    """
+
+    def __init__(self,
+                 book_acronym: str,
+                 db_path: str = DB_PATH,
+                 batch_size: int = 200,
+                 conn: Optional[sqlite3.Connection] = None) -> None:
+        self.acronym = book_acronym
+        self.batch_size = max(1, int(batch_size))
+        self._owns_conn = conn is None
+        self.conn = conn or sqlite3.connect(db_path)
+        if self._owns_conn:
+            self.conn.execute("PRAGMA busy_timeout = 5000")
+        self.ids = identity_cache(self.conn)
+        self.book_id = self.ids.book_id(book_acronym)
+        self._pending: List[Dict[str, Any]] = []
+        self.written = 0
+        self.batches = 0
+        self.failed = 0
+
+    # ------------------------------------------------------------------
+    def add(self, record: Dict[str, Any]) -> None:
+        """
+        Enfileira um verso; grava quando o lote enche.
+
+        Levanta ``ValueError`` para registros sem os campos obrigatórios
+        (o verso não entra no lote, que segue intacto).
+        """
+        _check_record(record)
+        self._pending.append(record)
+        if len(self._pending) >= self.batch_size:
+            self.flush()
+
+    def add_many(self, records: Iterable[Dict[str, Any]]) -> None:
+        for record in records:
+            self.add(record)
+
+    # ------------------------------------------------------------------
+    def flush(self) -> int:
+        """Grava os versos pendentes. Retorna quantos foram gravados."""
+        records, self._pending = self._pending, []
+        if not records:
+            return 0
+        self.ids.refresh_if_changed()
+        try:
+            with self._transaction():
+                self._write(records)
+            written = len(records)
+        except Exception as exc:
+            logger.warning(f"⚠️ Lote de {len(records)} versos falhou ({exc!r}); gravando um a um.")
+            written = 0
+            for record in records:
+                try:
+                    with self._transaction():
+                        self._write([record])
+                    written += 1
+                except Exception as single_exc:
+                    self.failed += 1
+                    logger.error(f"❌ Erro {record.get('ref')}: {single_exc!r}")
+        self.written += written
+        self.batches += 1
+        return written
+
+    # ------------------------------------------------------------------
+    @contextmanager
+    def _transaction(self):
+        """``with self.conn`` que esquece os ids em cache se a transação for desfeita."""
+        try:
+            with self.conn:
+                yield
+        except BaseException:
+            self.ids.invalidate()               # ids inseridos no lote desfeito
+            raise
+
+    def _write(self, records: List[Dict[str, Any]]) -> None:
+        conn = self.conn
+        canonical = [r.get("canonical_id") or f"{self.acronym}_{r['ref']}" for r in records]
+
+        # 1. library_index: ids do cache; só os novos são inseridos/consultados
+        ids = self.ids.index_ids(self.book_id, [(cid, r["ref"]) for cid, r in zip(canonical, records)])
+
+        roots, translations, commentaries, tags = [], [], [], []
+        for cid, r in zip(canonical, records):
+            index_id = ids[cid]
+            sanskrit, translit = r.get("sanskrit"), r.get("transliteration")
+            if sanskrit or translit:
+                roots.append((index_id, sanskrit, translit))
+            for t in r.get("translations") or ():
+                body = _clean(t.get("body")) or ""
+                w2w, ref, comm = _clean(t.get("w2w")), _clean(t.get("ref")), _clean(t.get("commentary"))
+                if body or w2w or ref or comm:
+                    translations.append((index_id, t["lang"], t["translator"], body, w2w, ref, comm))
+            for c in r.get("commentaries") or ():
+                text = _clean(c.get("text"))
+                if text and len(text) >= 5:
+                    commentaries.append((index_id, c["lang"], c["commentator"], text))
+            for tag in r.get("tags") or ():
+                tags.append((tag["term"], tag.get("category", "Tattva"), index_id, tag.get("score", 1.0)))
+
+        # 2. Uma executemany por tabela
+        if roots:
+            conn.executemany(SQL_ROOT_UPSERT, roots)
+        if translations:
+            conn.executemany(SQL_TRANSLATION_UPSERT, translations)
+        if commentaries:
+            conn.executemany(SQL_COMMENTARY_UPSERT, commentaries)
+        if tags:
+            concept_ids = self.ids.concept_ids([(term, cat) for term, cat, _, _ in tags])
+            conn.executemany(SQL_TAG_UPSERT, [
+                (concept_ids[term], index_id, score) for term, _, index_id, score in tags
+            ])
+
+    # ------------------------------------------------------------------
+    def close(self) -> None:
+        """Grava o que falta e fecha a conexão (se foi aberta aqui)."""
+        try:
+            self.flush()
+        finally:
+            if self._owns_conn:
+                release_identity_cache(self.conn)
+                self.conn.close()
+
+    def __enter__(self) -> "VerseBatchWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+
+# ----------------------------------------------------------------------
+def scraped_verse_record(verse_data: Dict[str, Any], translator: str = "WisdomLib") -> Dict[str, Any]:
+    """
+    Converte o JSON do scraper (``tests/test_wisdom_fetcher.js``) num
+    registro do ``VerseBatchWriter``. Cada tradução extra da lista vira
+    ``translator_2``, ``translator_3``... (mesma chave única por idioma).
+    """
+    if verse_data.get("error"):
+        raise ValueError(f"Scraper retornou erro: {verse_data['error']}")
+    translations = [
+        {
+            "lang": "en",
+            "translator": translator if i == 0 else f"{translator}_{i + 1}",
+            "body": text,
+            "ref": verse_data.get("source"),
+        }
+        for i, text in enumerate(verse_data.get("english_translations") or [])
+    ]
+    return {
+        "ref": str(verse_data["reference"]),
+        "sanskrit": _clean(verse_data.get("sanskrit")),
+        "transliteration": _clean(verse_data.get("transliteration")),
+        "translations": translations,
+    }
+
+
+def save_scraped_verse(verse_data: Dict[str, Any],
+                       book_acronym: str,
+                       writer: Optional[VerseBatchWriter] = None) -> None:
+    """
+    Grava um verso capturado pelo scraper. Com ``writer`` o verso entra no
+    lote dele (várias capturas, um commit por lote); sem, grava na hora.
+    """
+    record = scraped_verse_record(verse_data)
+    if writer is not None:
+        writer.add(record)
+        return
+    with VerseBatchWriter(book_acronym, batch_size=1) as single:
+        single.add(record)
+    if single.failed:
+        raise sqlite3.DatabaseError(f"Falha ao gravar {book_acronym} {record['ref']}")
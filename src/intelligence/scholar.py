@@ -1,49 +1,84 @@
 import sqlite3
 import os
-import google.generativeai as genai
+import sys
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
 from dotenv import load_dotenv
 
-# Carrega a API KEY
+# Carrega a API KEY (o SDK é configurado uma vez, pelo adapter, no primeiro uso)
 load_dotenv()
-genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
 
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 DB_PATH = os.path.join(BASE_DIR, "database", "harikatha.db")
 
-def get_verses_for_gaudiya_translation():
-    """
-    Busca versos que têm Sânscrito e Referência em Inglês (WisdomLib),
-    mas ainda não têm a tradução Gaudiya em Português.
+sys.path.append(os.path.join(BASE_DIR, "src", "utils"))
+from smart_ai_wrapper import SmartAIWrapper
+from prompt_registry import get_prompt
+from provider_registry import get_provider
+from prompt_packing import pack_by_budget, split_packed
+from token_counter import default_counter
+from translation_queue import TranslationQueue, TranslationWriter
+
+SCHOLAR_MODEL = "gemini-2.0-flash"
+TRANSLATOR = "AI_Gaudiya_PT"        # Nosso tradutor especializado
+_queue = None
+
+# --- O PROMPT GAUDIYA (config/prompts.yaml) ---
+# Instruímos a IA a priorizar a teologia (Siddhanta) sobre a tradução literal.
+# A chave de cache vem do id/versão + dados do verso: reformatar o texto
+# no YAML não invalida o cache. Mudou o sentido? Suba a versão.
+GAUDIYA_TRANSLATION = get_prompt("scholar.gaudiya_pt")
+
+# --- MODO EMPACOTADO ---
+# Mesmas diretrizes, pagas uma vez para N versos; resposta em array JSON.
+GAUDIYA_TRANSLATION_PACKED = get_prompt("scholar.gaudiya_pt_packed")
+
+VERSE_BLOCK = (
+    "### id={canonical_id}\n"
+    "- Sânscrito: {sanskrit}\n"
+    "- Transliteração: {translit}\n"
+    '- Referência Acadêmica (Inglês): "{english_ref}"'
+)
+
+# Orçamentos por requisição empacotada (saída do Flash 2.0 vai até 8192 tokens)
+PACK_MAX_INPUT_TOKENS = 8000
+PACK_MAX_OUTPUT_TOKENS = 6000
+PACK_MAX_VERSES = 25
+
+
+# Provider real do Gemini (injetado no SmartAIWrapper), reaproveitado entre versos
+gemini_provider = get_provider("gemini")
+gemini_json_provider = get_provider("gemini", json_mode=True)   # modo empacotado
+
+def get_queue():
+    """Fila persistente de versos sem tradução Gaudiya (aberta uma vez por processo)."""
+    global _queue
+    if _queue is None:
+        _queue = TranslationQueue(DB_PATH, language_code="pt", translator=TRANSLATOR, source_language="en")
+    return _queue
+
+def get_verses_for_gaudiya_translation(limit=5):
     """
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-    
-    # Seleciona o verso se ele tem raiz, tem inglês (para apoio), 
-    # mas NÃO tem tradução feita pelo 'AI_Gaudiya_PT'
-    sql = """
-    SELECT 
-        i.id, 
-        i.canonical_id, 
-        r.primary_script as sanskrit, 
-        r.transliteration,
-        t_en.text_body as english_ref
-    FROM library_index i
-    JOIN library_root_text r ON r.index_id = i.id
-    JOIN library_translations t_en ON t_en.index_id = i.id 
-         AND t_en.language_code = 'en'
-    WHERE NOT EXISTS (
-        SELECT 1 FROM library_translations t_pt 
-        WHERE t_pt.index_id = i.id 
-        AND t_pt.language_code = 'pt' 
-        AND t_pt.translator = 'AI_Gaudiya_PT' -- Nosso tradutor especializado
-    )
-    GROUP BY i.id
-    LIMIT 5
+    Versos que têm Sânscrito e Referência em Inglês (WisdomLib), mas ainda
+    não têm a tradução Gaudiya em Português – lidos da ``translation_queue``
+    (índice dos pendentes), sem varrer o acervo.
+
+    Os versos são reservados (lease) para este processo – ``limit=None``
+    reserva a fila inteira (planejamento do job) – e o que sobrar volta à
+    fila em ``return_leases()``.
     """
-    
-    rows = cur.execute(sql).fetchall()
-    conn.close()
-    return rows
+    queue = get_queue()
+    if limit is None:
+        return queue.lease_all()
+    return queue.lease(limit)
+
+def return_leases():
+    """Devolve à fila os versos reservados e não concluídos por este processo."""
+    if _queue is not None:
+        returned = _queue.release_owned()
+        if returned:
+            print(f"↩️ {returned} versos devolvidos à fila")
 
 def save_translation(index_id, text):
     conn = sqlite3.connect(DB_PATH)
@@ -52,64 +87,301 @@ def save_translation(index_id, text):
             INSERT OR REPLACE INTO library_translations
             (index_id, language_code, translator, text_body)
             VALUES (?, ?, ?, ?)
-        """, (index_id, 'pt', 'AI_Gaudiya_PT', text.strip()))
-        conn.commit()
-        print(f"   ✅ Salvo como 'AI_Gaudiya_PT'")
+        """, (index_id, 'pt', TRANSLATOR, text.strip()))
+        conn.commit()        # trigger da fila marca o verso como DONE
+        print(f"   ✅ Salvo como '{TRANSLATOR}'")
     except Exception as e:
         print(f"   ❌ Erro ao salvar: {e}")
     finally:
         conn.close()
 
-def consult_scholar(verse_data):
-    index_id, canonical_id, sanskrit, translit, english_ref = verse_data
-    
-    print(f"\n📿 Meditando sobre {canonical_id}...")
-    
-    # --- O PROMPT GAUDIYA ---
-    # Instruímos a IA a priorizar a teologia (Siddhanta) sobre a tradução literal.
-    prompt = f"""
-    Atue como um Pandita e tradutor devoto da tradição Gaudiya Vaishnava (seguidor de Rupa Goswami e Srila Prabhupada).
-    
-    TAREFA:
-    Traduza o verso abaixo do Sânscrito para o Português do Brasil.
-    
-    DADOS:
-    - Sânscrito: {sanskrit}
-    - Transliteração: {translit}
-    - Referência Acadêmica (Inglês): "{english_ref}" (Use APENAS para tirar dúvidas gramaticais. Ignore se for seco ou impessoal).
-    
-    DIRETRIZES DE TRADUÇÃO (Siddhanta):
-    1. O Foco é BHAKTI (Devoção). Não use termos impessoais ou monistas.
-    2. Se o verso falar de Krishna/Radha, use a linguagem doce e respeitosa dos Acaryas.
-    3. Mantenha termos técnicos essenciais em Sânscrito (como 'Rasa', 'Preman', 'Bhava') se não houver equivalente perfeito, ou coloque a tradução entre parênteses.
-    4. Estilo: Elevado, mas compreensível para um devoto brasileiro atual.
+def build_prompt(verse_data):
+    """Prompt estruturado do verso (chave de cache = dados do verso + versão)."""
+    _, _, sanskrit, translit, english_ref = verse_data
+    return GAUDIYA_TRANSLATION.bind(sanskrit=sanskrit, translit=translit, english_ref=english_ref)
+
+def clean_translation(translation):
+    translation = translation.strip()
+    # Remove aspas extras se a IA colocar
+    if translation.startswith('"') and translation.endswith('"'):
+        translation = translation[1:-1]
+    return translation
+
+def store_result(verse_data, translation):
+    index_id, canonical_id = verse_data[0], verse_data[1]
+    if not translation:
+        print(f"   ❌ O Pandita silenciou em {canonical_id} (bloqueio de custo ou erro – ver ai_audit_logs)")
+        get_queue().release([index_id])      # volta para a fila
+        return
+
+    translation = clean_translation(translation)
+    print(f"   📜 Resultado: {translation[:100]}...")
+    save_translation(index_id, translation)
+
+def consult_scholar(verse_data, wrapper):
+    print(f"\n📿 Meditando sobre {verse_data[1]}...")
     
-    SAÍDA:
-    Apenas o texto da tradução em Português.
+    # Cache, gatekeeper de custo e auditoria ficam por conta do wrapper
+    translation = wrapper.call_ai(build_prompt(verse_data), model=SCHOLAR_MODEL, provider_func=gemini_provider)
+    store_result(verse_data, translation)
+
+def plan_pending(wrapper, concurrency=None):
+    """Planeja a fila inteira de versos pendentes (tokens, cache, custo, tempo)."""
+    verses = get_verses_for_gaudiya_translation(limit=None)
+    plan = wrapper.plan_job([build_prompt(v) for v in verses], model=SCHOLAR_MODEL, concurrency=concurrency)
+    return verses, plan
+
+def run_planned(wrapper, verses, plan):
+    """Executa um plano aprovado e salva as traduções."""
+    responses = wrapper.run_plan(plan, provider_func=gemini_provider)
+    for verse_data, translation in zip(verses, responses):
+        store_result(verse_data, translation)
+
+# --- MODO EMPACOTADO: N versos por requisição ---
+def verse_block(verse_data):
+    _, canonical_id, sanskrit, translit, english_ref = verse_data
+    return VERSE_BLOCK.format(canonical_id=canonical_id, sanskrit=sanskrit,
+                              translit=translit, english_ref=english_ref)
+
+def build_packed_prompt(pack):
+    """Um prompt para o pacote inteiro (chave de cache = versos do pacote + versão)."""
+    return GAUDIYA_TRANSLATION_PACKED.bind(verses="\n\n".join(verse_block(v) for v in pack))
+
+def make_packs(verses, max_input_tokens=PACK_MAX_INPUT_TOKENS,
+               max_output_tokens=PACK_MAX_OUTPUT_TOKENS, max_verses=PACK_MAX_VERSES):
+    """
+    Agrupa os versos pelos orçamentos de tokens. A saída de cada verso é
+    estimada pela referência em inglês (português ≈ 1,4× mais tokens)
+    mais o envelope JSON.
+    """
+    header = default_counter.count(GAUDIYA_TRANSLATION_PACKED.render(verses=""), SCHOLAR_MODEL)
+
+    def cost(verse_data):
+        block_tokens = default_counter.count(verse_block(verse_data), SCHOLAR_MODEL)
+        ref_tokens = default_counter.count(verse_data[4] or "", SCHOLAR_MODEL)
+        return block_tokens + 2, int(ref_tokens * 1.4) + 24
+
+    return pack_by_budget(verses, cost, header, max_input_tokens, max_output_tokens, max_verses)
+
+def prepare_packs(wrapper, verses, **budgets):
+    """Separa versos já em cache (por verso) e empacota o resto."""
+    flags = wrapper.cached_flags([build_prompt(v) for v in verses], SCHOLAR_MODEL)
+    cached = [v for v, hit in zip(verses, flags) if hit]
+    todo = [v for v, hit in zip(verses, flags) if not hit]
+    return cached, make_packs(todo, **budgets)
+
+def store_packed(wrapper, pack, prompt, response):
     """
+    Separa a resposta do pacote por verso, grava cada verso no cache do
+    wrapper (uma chamada avulsa depois é cache hit) e salva a tradução.
+    Retorna os versos que faltaram na resposta.
+    """
+    translations = split_packed([v[1] for v in pack], response)
+    missing = []
+    for verse_data in pack:
+        translation = translations.get(verse_data[1])
+        if not translation:
+            missing.append(verse_data)
+            continue
+        wrapper.prime_cache(build_prompt(verse_data), SCHOLAR_MODEL, translation,
+                            source_hash=prompt.cache_key)
+        store_result(verse_data, translation)
+    return missing
+
+def run_packed(wrapper, cached, packs, plan=None, workers=None):
+    """Executa os pacotes (plano aprovado ou lote direto); faltantes vão um a um."""
+    for verse_data in cached:
+        consult_scholar(verse_data, wrapper)            # cache hit, custo $0
+
+    if plan is not None:
+        prompts = plan.prompts
+        responses = wrapper.run_plan(plan, provider_func=gemini_json_provider)
+    else:
+        prompts = [build_packed_prompt(p) for p in packs]
+        responses = wrapper.call_ai_many(prompts, model=SCHOLAR_MODEL,
+                                         provider_func=gemini_json_provider, max_workers=workers)
+
+    missing = []
+    for pack, prompt, response in zip(packs, prompts, responses):
+        print(f"\n📦 Pacote com {len(pack)} versos ({pack[0][1]} … {pack[-1][1]})")
+        missing.extend(store_packed(wrapper, pack, prompt, response))
+
+    if missing:
+        print(f"\n🔁 {len(missing)} versos faltaram nas respostas empacotadas – traduzindo um a um.")
+        for verse_data in missing:
+            consult_scholar(verse_data, wrapper)
+
+def plan_packed(wrapper, concurrency=None):
+    """Como ``plan_pending``, mas planejando os pacotes."""
+    verses = get_verses_for_gaudiya_translation(limit=None)
+    cached, packs = prepare_packs(wrapper, verses)
+    plan = wrapper.plan_job([build_packed_prompt(p) for p in packs], model=SCHOLAR_MODEL,
+                            concurrency=concurrency)
+    return cached, packs, plan
+
+def translate_packed(wrapper, verses, workers=None):
+    cached, packs = prepare_packs(wrapper, verses)
+    print(f"📦 {len(verses)} versos → {len(cached)} em cache + {len(packs)} requisições empacotadas")
+    run_packed(wrapper, cached, packs, workers=workers)
+
+# --- MODO PARALELO: N workers + escritor único em lote ---
+class Progress:
+    """Progresso no terminal (no máximo um print a cada ``every`` segundos)."""
+
+    def __init__(self, total, every=5.0):
+        self.total = total
+        self.every = every
+        self.done = 0
+        self.failed = 0
+        self.start = time.monotonic()
+        self._last = 0.0
+
+    def update(self, ok, force=False):
+        if ok:
+            self.done += 1
+        else:
+            self.failed += 1
+        now = time.monotonic()
+        if force or now - self._last >= self.every:
+            self._last = now
+            print(self.line())
+
+    def line(self):
+        elapsed = max(time.monotonic() - self.start, 1e-6)
+        rate = self.done / elapsed
+        left = max(self.total - self.done - self.failed, 0)
+        eta = f"{left / rate / 60:.1f}min" if rate else "?"
+        pct = 100.0 * (self.done + self.failed) / self.total if self.total else 100.0
+        return (f"📈 {self.done + self.failed}/{self.total} ({pct:.1f}%) | "
+                f"{rate:.2f} versos/s | ETA {eta} | ❌ {self.failed}")
+
+def translate_one(wrapper, verse_data):
+    """Tarefa do worker: só a chamada (o gatekeeper já rodou na thread principal)."""
+    return wrapper.call_ai(build_prompt(verse_data), model=SCHOLAR_MODEL,
+                           provider_func=gemini_provider, gatekeeper=False)
+
+def run_parallel(wrapper, workers=4, limit=None):
+    """
+    Traduz a fila com ``workers`` chamadas simultâneas e um escritor único
+    que grava em lote. Ctrl-C para de reservar versos, espera as chamadas
+    em andamento, grava o que chegou e devolve o resto à fila – rodar de
+    novo continua de onde parou (respostas já pagas saem do cache).
+    """
+    queue = get_queue()
+    total = queue.stats().get("PENDING", 0)
+    if limit:
+        total = min(total, limit)
+    if not total:
+        print("📭 Todos os versos já possuem tradução Gaudiya.")
+        return
+
+    print(f"🚀 {total} versos | {workers} workers | escritor único em lote (Ctrl-C interrompe com segurança)")
+    progress = Progress(total)
+    writer = TranslationWriter(DB_PATH, "pt", TRANSLATOR)
+    pool = ThreadPoolExecutor(max_workers=workers)
+    in_flight = {}
+    leased = 0
+
+    def collect(futures):
+        for fut in futures:
+            verse_data = in_flight.pop(fut)
+            try:
+                translation = fut.result()
+            except Exception as e:
+                print(f"   ❌ {verse_data[1]}: {e}")
+                translation = None
+            if translation:
+                writer.put(verse_data[0], clean_translation(translation))
+            else:
+                queue.release([verse_data[0]])
+            progress.update(bool(translation))
 
     try:
-        model = genai.GenerativeModel('gemini-2.0-flash')
-        response = model.generate_content(prompt)
-        translation = response.text.strip()
-        
-        # Remove aspas extras se a IA colocar
-        if translation.startswith('"') and translation.endswith('"'):
-            translation = translation[1:-1]
-            
-        print(f"   📜 Resultado: {translation[:100]}...")
-        save_translation(index_id, translation)
-        
-    except Exception as e:
-        print(f"   ❌ O Pandita silenciou (Erro): {e}")
+        while True:
+            # Mantém 2× workers na fila do pool: ninguém espera por trabalho
+            room = 2 * workers - len(in_flight)
+            batch = queue.lease(min(room, total - leased)) if room > 0 and leased < total else []
+            for verse_data in batch:
+                leased += 1
+                # Gatekeeper em série aqui: a confirmação (input) nunca sai das threads
+                if not wrapper.gate_call(build_prompt(verse_data), model=SCHOLAR_MODEL):
+                    queue.release([verse_data[0]])
+                    progress.update(False)
+                    continue
+                in_flight[pool.submit(translate_one, wrapper, verse_data)] = verse_data
+            if not in_flight:
+                if batch:
+                    continue                # lote todo barrado no gatekeeper: reserva o próximo
+                break
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            collect(done)
+    except KeyboardInterrupt:
+        print("\n⏸️  Interrompido – aguardando as chamadas em andamento e salvando...")
+        for fut in list(in_flight):
+            if fut.cancel():
+                in_flight.pop(fut)
+        collect(list(in_flight))
+    finally:
+        pool.shutdown(wait=True)
+        writer.close()                      # grava o último lote (itens → DONE)
+        returned = queue.release_owned()    # o que não terminou volta à fila
+        wrapper.flush_audit()
+        print(progress.line())
+        print(f"💾 {writer.written} traduções gravadas em {writer.batches} commits"
+              + (f" | ↩️ {returned} devolvidas à fila" if returned else ""))
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Scholar Gaudiya – traduções AI_Gaudiya_PT")
+    parser.add_argument("--plan", action="store_true",
+                        help="Planeja a fila inteira, pede aprovação uma vez e executa em lote")
+    parser.add_argument("--yes", action="store_true", help="Aprova o plano sem perguntar")
+    parser.add_argument("--workers", type=int, default=None, help="Concorrência do lote")
+    parser.add_argument("--packed", action="store_true",
+                        help="Vários versos por requisição (instruções pagas uma vez por pacote)")
+    parser.add_argument("--limit", type=int, default=None,
+                        help="Versos por rodada (padrão 5; com --parallel, a fila inteira; 0 = todos)")
+    parser.add_argument("--parallel", action="store_true",
+                        help="Fila inteira (ou --limit) com --workers threads e gravação em lote")
+    args = parser.parse_args()
+
     print("🙏 Scholar Gaudiya iniciado...")
-    verses = get_verses_for_gaudiya_translation()
-    
-    if not verses:
-        print("📭 Todos os versos já possuem tradução Gaudiya.")
-    else:
-        print(f"📚 Encontrados {len(verses)} versos para traduzir.")
-        for v in verses:
-            consult_scholar(v)
\ No newline at end of file
+    with SmartAIWrapper(db_path=DB_PATH) as wrapper:
+        try:
+            if args.plan:
+                if args.packed:
+                    cached, packs, plan = plan_packed(wrapper, args.workers)
+                    has_work = bool(cached or packs)
+                else:
+                    verses, plan = plan_pending(wrapper, args.workers)
+                    has_work = bool(verses)
+                if not has_work:
+                    print("📭 Todos os versos já possuem tradução Gaudiya.")
+                    sys.exit(0)
+                print(plan.summary())
+                if args.yes or input("Aprovar o plano? (y/n): ").lower() in {"y", "yes", "s", "sim"}:
+                    if args.packed:
+                        run_packed(wrapper, cached, packs, plan.approve())
+                    else:
+                        run_planned(wrapper, verses, plan.approve())
+                else:
+                    print("❌ Plano recusado.")
+                sys.exit(0)
+
+            if args.parallel:
+                run_parallel(wrapper, workers=args.workers or wrapper.max_concurrency,
+                             limit=args.limit or None)
+                sys.exit(0)
+
+            limit = 5 if args.limit is None else (args.limit or None)
+            verses = get_verses_for_gaudiya_translation(limit=limit)
+            if not verses:
+                print("📭 Todos os versos já possuem tradução Gaudiya.")
+            elif args.packed:
+                print(f"📚 Encontrados {len(verses)} versos para traduzir (modo empacotado).")
+                translate_packed(wrapper, verses, args.workers)
+            else:
+                print(f"📚 Encontrados {len(verses)} versos para traduzir.")
+                for v in verses:
+                    consult_scholar(v, wrapper)
+        finally:
+            return_leases()                 # plano recusado, Ctrl-C, versos sem resposta
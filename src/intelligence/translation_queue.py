@@ -0,0 +1,493 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+translation_queue.py – Fila de trabalho persistente das traduções por IA
+
+Antes, cada lote do Scholar varria o acervo inteiro (join triplo +
+``NOT EXISTS`` + ``GROUP BY``) para achar 5 versos sem tradução. Agora:
+
+- ``translation_queue`` guarda um item por (verso, idioma alvo, tradutor).
+- Triggers enfileiram o verso quando ele passa a ter texto raiz e a
+  tradução de apoio (ex.: inglês), e marcam o item ``DONE`` quando a
+  tradução alvo é gravada. Um backfill (paginado por id) cobre o acervo
+  que já existia quando o alvo foi registrado.
+- Workers pegam itens com lease atômico (``UPDATE … RETURNING``); a
+  escolha usa um índice parcial só dos ``PENDING`` que cobre a consulta,
+  então custa O(lote) mesmo com 100k+ versos.
+"""
+
+import os
+import sys
+import time
+import uuid
+import queue
+import socket
+import sqlite3
+import logging
+import threading
+from typing import Iterator, List, Optional, Sequence, Tuple
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+DB_PATH = os.path.join(BASE_DIR, "database", "harikatha.db")
+
+sys.path.append(os.path.join(BASE_DIR, "src", "utils"))
+from db_connection import SQLiteConnectionManager
+
+logger = logging.getLogger("TranslationQueue")
+
+VerseRow = Tuple[int, str, Optional[str], Optional[str], Optional[str]]
+
+QUEUE_SCHEMA_SQL = """
+CREATE TABLE IF NOT EXISTS translation_targets (
+    language_code   TEXT NOT NULL,
+    translator      TEXT NOT NULL,
+    source_language TEXT NOT NULL,
+    PRIMARY KEY (language_code, translator)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS translation_queue (
+    id            INTEGER PRIMARY KEY,
+    index_id      INTEGER NOT NULL,
+    language_code TEXT NOT NULL,
+    translator    TEXT NOT NULL,
+    state         TEXT NOT NULL DEFAULT 'PENDING'
+                  CHECK (state IN ('PENDING','LEASED','DONE','FAILED')),
+    attempts      INTEGER NOT NULL DEFAULT 0,
+    lease_owner   TEXT,
+    lease_expires REAL,
+    enqueued_at   TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE (index_id, language_code, translator)
+);
+
+-- Escolha do próximo lote: só PENDING, já na ordem do id, cobrindo index_id
+CREATE INDEX IF NOT EXISTS idx_tq_pending
+    ON translation_queue (language_code, translator, state, id, index_id)
+    WHERE state = 'PENDING';
+
+-- Leases vencidos (worker que morreu)
+CREATE INDEX IF NOT EXISTS idx_tq_leases
+    ON translation_queue (lease_expires)
+    WHERE state = 'LEASED';
+"""
+
+# Triggers dependem das tabelas do acervo (criadas fora deste módulo)
+QUEUE_TRIGGERS_SQL = """
+CREATE INDEX IF NOT EXISTS idx_translations_index_lang
+    ON library_translations (index_id, language_code, translator);
+
+-- Chegou a tradução de apoio: enfileira se já há texto raiz
+CREATE TRIGGER IF NOT EXISTS trg_tq_enqueue_on_translation
+AFTER INSERT ON library_translations
+BEGIN
+    INSERT OR IGNORE INTO translation_queue (index_id, language_code, translator)
+    SELECT NEW.index_id, t.language_code, t.translator
+    FROM translation_targets t
+    WHERE t.source_language = NEW.language_code
+      AND EXISTS (SELECT 1 FROM library_root_text r WHERE r.index_id = NEW.index_id)
+      AND NOT EXISTS (SELECT 1 FROM library_translations d
+                      WHERE d.index_id = NEW.index_id
+                        AND d.language_code = t.language_code
+                        AND d.translator = t.translator);
+END;
+
+-- Chegou o texto raiz: enfileira se já há tradução de apoio
+CREATE TRIGGER IF NOT EXISTS trg_tq_enqueue_on_root
+AFTER INSERT ON library_root_text
+BEGIN
+    INSERT OR IGNORE INTO translation_queue (index_id, language_code, translator)
+    SELECT NEW.index_id, t.language_code, t.translator
+    FROM translation_targets t
+    WHERE EXISTS (SELECT 1 FROM library_translations s
+                  WHERE s.index_id = NEW.index_id AND s.language_code = t.source_language)
+      AND NOT EXISTS (SELECT 1 FROM library_translations d
+                      WHERE d.index_id = NEW.index_id
+                        AND d.language_code = t.language_code
+                        AND d.translator = t.translator);
+END;
+
+-- Tradução alvo gravada: item concluído
+CREATE TRIGGER IF NOT EXISTS trg_tq_done
+AFTER INSERT ON library_translations
+BEGIN
+    UPDATE translation_queue
+       SET state = 'DONE', lease_owner = NULL, lease_expires = NULL
+     WHERE index_id = NEW.index_id
+       AND language_code = NEW.language_code
+       AND translator = NEW.translator
+       AND state != 'DONE';
+END;
+"""
+
+SQL_BACKFILL = """
+INSERT OR IGNORE INTO translation_queue (index_id, language_code, translator)
+SELECT i.id, ?, ?
+FROM library_index i
+WHERE i.id > ? AND i.id <= ?
+  AND EXISTS (SELECT 1 FROM library_root_text r WHERE r.index_id = i.id)
+  AND EXISTS (SELECT 1 FROM library_translations s
+              WHERE s.index_id = i.id AND s.language_code = ?)
+  AND NOT EXISTS (SELECT 1 FROM library_translations d
+                  WHERE d.index_id = i.id AND d.language_code = ? AND d.translator = ?)
+"""
+
+SQL_LEASE = """
+UPDATE translation_queue
+   SET state = 'LEASED', lease_owner = ?, lease_expires = ?, attempts = attempts + 1
+ WHERE id IN (
+       SELECT id FROM translation_queue
+        WHERE language_code = ? AND translator = ? AND state = 'PENDING' AND id > ?
+        ORDER BY id
+        LIMIT ?)
+RETURNING id, index_id
+"""
+
+SQL_PENDING_PAGE = """
+SELECT id, index_id FROM translation_queue
+ WHERE language_code = ? AND translator = ? AND state = 'PENDING' AND id > ?
+ ORDER BY id
+ LIMIT ?
+"""
+
+SQL_EXPIRE_LEASES = """
+UPDATE translation_queue
+   SET state = CASE WHEN attempts >= ? THEN 'FAILED' ELSE 'PENDING' END,
+       lease_owner = NULL, lease_expires = NULL
+ WHERE state = 'LEASED' AND lease_expires < ?
+"""
+
+# Hidrata só os ids do lote (busca por chave primária)
+SQL_HYDRATE = """
+SELECT i.id, i.canonical_id, r.primary_script, r.transliteration,
+       (SELECT s.text_body FROM library_translations s
+         WHERE s.index_id = i.id AND s.language_code = ? LIMIT 1)
+FROM library_index i
+JOIN library_root_text r ON r.index_id = i.id
+WHERE i.id IN ({marks})
+"""
+
+SQL_SAVE_TRANSLATION = """
+INSERT OR REPLACE INTO library_translations (index_id, language_code, translator, text_body)
+VALUES (?, ?, ?, ?)
+"""
+
+BACKFILL_CHUNK = 5000
+
+
+# ----------------------------------------------------------------------
+def init_queue_schema(conn: sqlite3.Connection) -> None:
+    """Cria a fila e, se o acervo já existir, os triggers de manutenção."""
+    conn.executescript(QUEUE_SCHEMA_SQL)
+    tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    if {"library_index", "library_root_text", "library_translations"} <= tables:
+        conn.executescript(QUEUE_TRIGGERS_SQL)
+
+
+# ----------------------------------------------------------------------
+class TranslationQueue:
+    """
+    Fila de versos a traduzir para um (idioma, tradutor).
+
+    Parameters
+    ----------
+    db_path : str | Path
+        Banco do acervo (padrão = ``database/harikatha.db``).
+    language_code, translator : str
+        Tradução alvo (ex.: ``"pt"``, ``"AI_Gaudiya_PT"``).
+    source_language : str
+        Tradução de apoio exigida para o verso entrar na fila.
+    lease_seconds : float
+        Validade do lease; itens de um worker que morreu voltam para a fila.
+    max_attempts : int
+        Leases vencidos ou devolvidos por ``release`` a partir daqui viram
+        ``FAILED`` (não voltam sozinhos).
+    """
+
+    # ------------------------------------------------------------------
+    def __init__(self,
+                 db_path=DB_PATH,
+                 language_code: str = "pt",
+                 translator: str = "AI_Gaudiya_PT",
+                 source_language: str = "en",
+                 lease_seconds: float = 600.0,
+                 max_attempts: int = 3) -> None:
+        self.language_code = language_code
+        self.translator = translator
+        self.source_language = source_language
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._db = SQLiteConnectionManager(db_path, init_script=init_queue_schema)
+        self._register_target()
+
+    # ------------------------------------------------------------------
+    def _register_target(self) -> None:
+        """Registra o alvo; na primeira vez, enfileira o acervo existente."""
+        with self._db.transaction() as conn:
+            cur = conn.execute(
+                "INSERT OR IGNORE INTO translation_targets (language_code, translator, source_language) "
+                "VALUES (?, ?, ?)",
+                (self.language_code, self.translator, self.source_language),
+            )
+            is_new = cur.rowcount == 1
+        if is_new:
+            added = self.backfill()
+            logger.info(f"📥 [QUEUE] {self.language_code}/{self.translator}: {added} versos enfileirados")
+
+    # ------------------------------------------------------------------
+    def backfill(self, chunk_size: int = BACKFILL_CHUNK) -> int:
+        """
+        Enfileira versos já existentes, em fatias de ``library_index.id``
+        (uma transação curta por fatia). Idempotente.
+        """
+        conn = self._db.connection()
+        try:
+            max_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM library_index").fetchone()[0]
+        except sqlite3.OperationalError:
+            return 0                                    # acervo ainda não criado
+        added, last = 0, 0
+        while last < max_id:
+            upper = last + chunk_size
+            with conn:
+                added += conn.execute(SQL_BACKFILL, (
+                    self.language_code, self.translator, last, upper,
+                    self.source_language, self.language_code, self.translator,
+                )).rowcount
+            last = upper
+        return added
+
+    # ------------------------------------------------------------------
+    def _hydrate(self, index_ids: Sequence[int]) -> List[VerseRow]:
+        """Dados dos versos (mesmo formato da busca antiga), na ordem de ``index_ids``."""
+        if not index_ids:
+            return []
+        rows = self._db.connection().execute(
+            SQL_HYDRATE.format(marks=",".join("?" * len(index_ids))),
+            (self.source_language, *index_ids),
+        ).fetchall()
+        by_id = {row[0]: row for row in rows}
+        return [by_id[i] for i in index_ids if i in by_id]
+
+    # ------------------------------------------------------------------
+    def lease(self, limit: int = 5, after_id: int = 0) -> List[VerseRow]:
+        """
+        Reserva até ``limit`` versos pendentes para este worker (atômico:
+        dois workers nunca recebem o mesmo item). Leases vencidos voltam
+        para a fila antes da escolha.
+        """
+        now = time.time()
+        with self._db.transaction() as conn:
+            conn.execute(SQL_EXPIRE_LEASES, (self.max_attempts, now))
+            leased = conn.execute(SQL_LEASE, (
+                self.owner, now + self.lease_seconds,
+                self.language_code, self.translator, after_id, limit,
+            )).fetchall()
+        leased.sort()
+        return self._hydrate([index_id for _, index_id in leased])
+
+    def lease_all(self, page_size: int = 1000) -> List[VerseRow]:
+        """Reserva a fila inteira para este worker, em páginas de ``page_size``."""
+        verses: List[VerseRow] = []
+        while True:
+            page = self.lease(page_size)
+            if not page:
+                return verses
+            verses.extend(page)
+
+    # ------------------------------------------------------------------
+    def iter_pending(self, page_size: int = 1000) -> Iterator[List[VerseRow]]:
+        """Páginas de versos pendentes sem reservar (paginação por id)."""
+        conn = self._db.connection()
+        last = 0
+        while True:
+            page = conn.execute(SQL_PENDING_PAGE, (
+                self.language_code, self.translator, last, page_size,
+            )).fetchall()
+            if not page:
+                return
+            last = page[-1][0]
+            yield self._hydrate([index_id for _, index_id in page])
+
+    def pending(self) -> List[VerseRow]:
+        """Todos os versos pendentes (para planejamento do job)."""
+        return [row for page in self.iter_pending() for row in page]
+
+    # ------------------------------------------------------------------
+    def release(self, index_ids: Sequence[int], failed: bool = False) -> None:
+        """
+        Devolve itens reservados.
+
+        ``failed=True`` tira da fila até nova ordem; itens que já gastaram
+        ``max_attempts`` leases também viram ``FAILED`` em vez de voltar
+        (um verso que sempre falha não prende a fila para sempre). Só os
+        leases deste worker são devolvidos: o de outro processo segue dele.
+        """
+        if not index_ids:
+            return
+        with self._db.transaction() as conn:
+            conn.executemany(
+                "UPDATE translation_queue "
+                "SET state = CASE WHEN ? OR attempts >= ? THEN 'FAILED' ELSE 'PENDING' END, "
+                "lease_owner = NULL, lease_expires = NULL "
+                "WHERE index_id = ? AND language_code = ? AND translator = ? "
+                "AND state = 'LEASED' AND lease_owner = ?",
+                [(failed, self.max_attempts, i, self.language_code, self.translator, self.owner)
+                 for i in index_ids],
+            )
+
+    def release_owned(self) -> int:
+        """
+        Devolve à fila tudo que este worker ainda tem reservado (saída limpa).
+
+        Esses itens não foram processados, então o lease não conta como
+        tentativa.
+        """
+        with self._db.transaction() as conn:
+            return conn.execute(
+                "UPDATE translation_queue SET state = 'PENDING', lease_owner = NULL, lease_expires = NULL, "
+                "attempts = MAX(attempts - 1, 0) "
+                "WHERE lease_owner = ? AND state = 'LEASED'",
+                (self.owner,),
+            ).rowcount
+
+    # ------------------------------------------------------------------
+    def retry_failed(self) -> int:
+        """Recoloca na fila os itens ``FAILED``."""
+        with self._db.transaction() as conn:
+            return conn.execute(
+                "UPDATE translation_queue SET state = 'PENDING', attempts = 0 "
+                "WHERE language_code = ? AND translator = ? AND state = 'FAILED'",
+                (self.language_code, self.translator),
+            ).rowcount
+
+    # ------------------------------------------------------------------
+    def stats(self) -> dict:
+        rows = self._db.connection().execute(
+            "SELECT state, COUNT(*) FROM translation_queue "
+            "WHERE language_code = ? AND translator = ? GROUP BY state",
+            (self.language_code, self.translator),
+        ).fetchall()
+        return dict(rows)
+
+    # ------------------------------------------------------------------
+    def close(self) -> None:
+        self._db.close()
+
+    def __enter__(self) -> "TranslationQueue":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+
+# ----------------------------------------------------------------------
+class TranslationWriter:
+    """
+    Escritor único das traduções: vários workers chamam ``put`` e uma
+    thread grava em lote (``executemany`` numa transação). Cada linha
+    gravada conclui o item da fila pelo trigger ``trg_tq_done``.
+
+    Parameters
+    ----------
+    batch_size : int
+        Traduções por commit.
+    flush_interval : float
+        Segundos máximos que uma tradução espera pelo commit.
+    """
+
+    _STOP = object()
+
+    # ------------------------------------------------------------------
+    def __init__(self,
+                 db_path=DB_PATH,
+                 language_code: str = "pt",
+                 translator: str = "AI_Gaudiya_PT",
+                 batch_size: int = 50,
+                 flush_interval: float = 2.0) -> None:
+        self.language_code = language_code
+        self.translator = translator
+        self.batch_size = max(1, int(batch_size))
+        self.flush_interval = flush_interval
+        self.written = 0
+        self.batches = 0
+        self.failed = 0
+        self._db = SQLiteConnectionManager(db_path, init_script=init_queue_schema)
+        self._inbox: "queue.Queue" = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="TranslationWriter", daemon=True)
+        self._thread.start()
+
+    # ------------------------------------------------------------------
+    def put(self, index_id: int, text: str) -> None:
+        """Entrega uma tradução ao escritor (não bloqueia)."""
+        self._inbox.put((index_id, text))
+
+    # ------------------------------------------------------------------
+    def _commit(self, rows: List[Tuple[int, str]]) -> None:
+        try:
+            with self._db.transaction() as conn:
+                conn.executemany(SQL_SAVE_TRANSLATION, [
+                    (index_id, self.language_code, self.translator, text) for index_id, text in rows
+                ])
+        except sqlite3.Error as exc:
+            # Os itens continuam reservados e voltam à fila quando o lease vencer
+            self.failed += len(rows)
+            logger.error(f"❌ [WRITER] Falha ao gravar {len(rows)} traduções: {exc}")
+            return
+        self.written += len(rows)
+        self.batches += 1
+
+    # ------------------------------------------------------------------
+    def _run(self) -> None:
+        rows: List[Tuple[int, str]] = []
+        deadline = None
+        while True:
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                item = self._inbox.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+            if item is self._STOP:
+                break
+            if item is not None:
+                rows.append(item)
+                if deadline is None:
+                    deadline = time.monotonic() + self.flush_interval
+            if rows and (len(rows) >= self.batch_size or time.monotonic() >= deadline):
+                self._commit(rows)
+                rows, deadline = [], None
+        if rows:
+            self._commit(rows)
+
+    # ------------------------------------------------------------------
+    def close(self) -> None:
+        """Grava o que sobrou e encerra a thread."""
+        if self._thread.is_alive():
+            self._inbox.put(self._STOP)
+            self._thread.join()
+        self._db.close()
+
+    def __enter__(self) -> "TranslationWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Fila de traduções por IA")
+    parser.add_argument("--lang", default="pt")
+    parser.add_argument("--translator", default="AI_Gaudiya_PT")
+    parser.add_argument("--source", default="en")
+    parser.add_argument("--backfill", action="store_true", help="Reenfileira o acervo existente")
+    parser.add_argument("--retry-failed", action="store_true", help="Recoloca itens FAILED na fila")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(message)s")
+    with TranslationQueue(DB_PATH, args.lang, args.translator, args.source) as q:
+        if args.backfill:
+            print(f"📥 {q.backfill()} versos enfileirados.")
+        if args.retry_failed:
+            print(f"🔁 {q.retry_failed()} itens de volta à fila.")
+        print(f"📊 {q.stats()}")
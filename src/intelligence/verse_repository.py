@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+verse_repository.py – Leitura do acervo: versos completos em uma consulta
+
+Antes, cada leitor (publisher, auditorias, scripts de qualidade) montava
+seus próprios joins entre ``library_index``, ``library_root_text``,
+``library_translations``, ``library_commentaries`` e ``content_tags``,
+muitas vezes um verso por vez e numa conexão nova. Agora:
+
+- ``VerseRepository.get`` / ``get_many`` / ``chapter`` devolvem versos
+  hidratados (raiz, todas as traduções com w2w, comentários, tags) com
+  UMA consulta por chamada, não importa quantos versos: traduções,
+  comentários e tags vêm agregados em JSON por verso (subconsultas pelos
+  índices de ``index_id``), e a lista de ids vai num único parâmetro
+  (``json_each``), sem limite de variáveis do SQLite.
+- Objetos leves com ``__slots__`` (``Verse``, ``Translation``,
+  ``Commentary``, ``Tag``).
+- LRU opcional por ``canonical_id``, invalidado quando outra conexão grava
+  no banco (``PRAGMA data_version``).
+"""
+
+import os
+import sys
+import json
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Sequence
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+DB_PATH = os.path.join(BASE_DIR, "database", "harikatha.db")
+
+sys.path.append(os.path.join(BASE_DIR, "src", "utils"))
+from db_connection import SQLiteConnectionManager
+
+
+# ----------------------------------------------------------------------
+class Translation:
+    __slots__ = ("language_code", "translator", "text_body", "word_for_word", "source_ref", "commentary")
+
+    def __init__(self, language_code, translator, text_body, word_for_word, source_ref, commentary) -> None:
+        self.language_code = language_code
+        self.translator = translator
+        self.text_body = text_body
+        self.word_for_word = word_for_word
+        self.source_ref = source_ref
+        self.commentary = commentary
+
+    def __repr__(self) -> str:
+        return f"Translation({self.language_code!r}, {self.translator!r})"
+
+
+class Commentary:
+    __slots__ = ("language_code", "commentator", "text_body")
+
+    def __init__(self, language_code, commentator, text_body) -> None:
+        self.language_code = language_code
+        self.commentator = commentator
+        self.text_body = text_body
+
+    def __repr__(self) -> str:
+        return f"Commentary({self.language_code!r}, {self.commentator!r})"
+
+
+class Tag:
+    __slots__ = ("term", "category", "score")
+
+    def __init__(self, term, category, score) -> None:
+        self.term = term
+        self.category = category
+        self.score = score
+
+    def __repr__(self) -> str:
+        return f"Tag({self.term!r}, {self.score!r})"
+
+
+class Verse:
+    """Verso hidratado; ``translations``/``commentaries`` na ordem de gravação, tags por relevância."""
+
+    __slots__ = ("index_id", "canonical_id", "book_id", "num_1", "num_2", "num_3",
+                 "primary_script", "transliteration", "translations", "commentaries", "tags")
+
+    def __init__(self, index_id, canonical_id, book_id, num_1, num_2, num_3,
+                 primary_script, transliteration,
+                 translations: List[Translation], commentaries: List[Commentary], tags: List[Tag]) -> None:
+        self.index_id = index_id
+        self.canonical_id = canonical_id
+        self.book_id = book_id
+        self.num_1 = num_1
+        self.num_2 = num_2
+        self.num_3 = num_3
+        self.primary_script = primary_script
+        self.transliteration = transliteration
+        self.translations = translations
+        self.commentaries = commentaries
+        self.tags = tags
+
+    @property
+    def ref(self) -> str:
+        """Referência sem o acrônimo (``SLK_8.39`` → ``8.39``)."""
+        return self.canonical_id.split("_", 1)[-1]
+
+    def translation(self, language_code: Optional[str] = None,
+                    translator: Optional[str] = None) -> Optional[Translation]:
+        """Primeira tradução que bate com os filtros informados."""
+        for t in self.translations:
+            if (language_code is None or t.language_code == language_code) and \
+               (translator is None or t.translator == translator):
+                return t
+        return None
+
+    def __repr__(self) -> str:
+        return f"Verse({self.canonical_id!r}, {len(self.translations)} traduções)"
+
+
+# ----------------------------------------------------------------------
+# Uma linha por verso; filhos agregados em JSON (cada subconsulta usa o
+# índice que começa por index_id). ``{where}`` escolhe os versos.
+SQL_VERSES = """
+SELECT i.id, i.canonical_id, i.book_id, i.num_1, i.num_2, i.num_3,
+       r.primary_script, r.transliteration,
+       (SELECT json_group_array(json_array(language_code, translator, text_body,
+                                           word_for_word, source_ref, commentary))
+          FROM (SELECT * FROM library_translations WHERE index_id = i.id ORDER BY id)),
+       (SELECT json_group_array(json_array(language_code, commentator, text_body))
+          FROM (SELECT * FROM library_commentaries WHERE index_id = i.id ORDER BY id)),
+       (SELECT json_group_array(json_array(c.term, c.category, ct.relevance_score))
+          FROM content_tags ct JOIN theological_concepts c ON c.id = ct.concept_id
+         WHERE ct.library_index_id = i.id)
+FROM library_index i
+LEFT JOIN library_root_text r ON r.index_id = i.id
+WHERE {where}
+"""
+
+SQL_BY_CANONICAL = SQL_VERSES.format(where="i.canonical_id IN (SELECT value FROM json_each(?))")
+
+SQL_BY_CHAPTER = SQL_VERSES.format(where="""
+    i.book_id = (SELECT id FROM library_books WHERE acronym = ?)
+    AND (? IS NULL OR i.num_1 = ?)
+    AND (? IS NULL OR i.num_2 >= ?)
+    AND (? IS NULL OR i.num_2 <= ?)
+ORDER BY i.num_1, i.num_2, i.num_3, i.id
+""")
+
+
+def _verse(row: Sequence) -> Verse:
+    tags = [Tag(*t) for t in json.loads(row[10])]
+    tags.sort(key=lambda t: -(t.score or 0))
+    return Verse(
+        *row[:8],
+        translations=[Translation(*t) for t in json.loads(row[8])],
+        commentaries=[Commentary(*c) for c in json.loads(row[9])],
+        tags=tags,
+    )
+
+
+# ----------------------------------------------------------------------
+class VerseRepository:
+    """
+    Caminho único de leitura de versos.
+
+    Parameters
+    ----------
+    db_path : str | Path
+        Banco do acervo (padrão = ``database/harikatha.db``).
+    cache_size : int
+        Versos mantidos no LRU (0 = sem cache).
+    conn : sqlite3.Connection | None
+        Conexão já aberta (usada como está, não é fechada aqui).
+    """
+
+    # ------------------------------------------------------------------
+    def __init__(self, db_path=DB_PATH, cache_size: int = 0,
+                 conn: Optional[sqlite3.Connection] = None) -> None:
+        self._conn = conn
+        self._db = None if conn is not None else SQLiteConnectionManager(db_path)
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[str, Verse]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._versions = threading.local()
+        self.hits = 0
+        self.misses = 0
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = self._conn or self._db.connection()
+        if self.cache_size:
+            # data_version muda quando OUTRA conexão grava: o cache fica velho
+            version = conn.execute("PRAGMA data_version").fetchone()[0]
+            if getattr(self._versions, "value", version) != version:
+                self.clear_cache()
+            self._versions.value = version
+        return conn
+
+    # ------------------------------------------------------------------
+    def get(self, canonical_id: str) -> Optional[Verse]:
+        """Um verso (``None`` se não existir)."""
+        return self.get_many([canonical_id]).get(canonical_id)
+
+    def get_many(self, canonical_ids: Iterable[str]) -> Dict[str, Verse]:
+        """
+        ``{canonical_id: Verse}`` na ordem pedida (ids inexistentes ficam de
+        fora). Uma consulta só para todos os que não estão no cache.
+        """
+        ids = list(dict.fromkeys(canonical_ids))
+        conn = self._connection()
+        found: Dict[str, Verse] = {}
+        missing = ids
+        if self.cache_size:
+            with self._lock:
+                for cid in ids:
+                    verse = self._cache.get(cid)
+                    if verse is not None:
+                        self._cache.move_to_end(cid)
+                        found[cid] = verse
+            self.hits += len(found)
+            missing = [cid for cid in ids if cid not in found]
+        if missing:
+            self.misses += len(missing)
+            loaded = [_verse(row) for row in conn.execute(SQL_BY_CANONICAL, (json.dumps(missing),))]
+            found.update((v.canonical_id, v) for v in loaded)
+            self._remember(loaded)
+        return {cid: found[cid] for cid in ids if cid in found}
+
+    def chapter(self, book_acronym: str, chapter: Optional[int] = None,
+                start: Optional[int] = None, end: Optional[int] = None) -> List[Verse]:
+        """
+        Versos de um livro (ou de um capítulo ``num_1``, opcionalmente de
+        ``start`` a ``end`` em ``num_2``) em ordem de referência, numa consulta.
+        """
+        conn = self._connection()
+        rows = conn.execute(SQL_BY_CHAPTER, (book_acronym, chapter, chapter, start, start, end, end))
+        verses = [_verse(row) for row in rows]
+        self._remember(verses)
+        return verses
+
+    # ------------------------------------------------------------------
+    def _remember(self, verses: List[Verse]) -> None:
+        if not self.cache_size:
+            return
+        with self._lock:
+            for verse in verses:
+                self._cache[verse.canonical_id] = verse
+                self._cache.move_to_end(verse.canonical_id)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def clear_cache(self) -> None:
+        with self._lock:
+            self._cache.clear()
+
+    def close(self) -> None:
+        self.clear_cache()
+        if self._db is not None:
+            self._db.close()
+
+    def __enter__(self) -> "VerseRepository":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
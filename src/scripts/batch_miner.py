@@ -1,4 +1,3 @@
-import time
 import sys
 import os
 
@@ -9,6 +8,7 @@ project_root = os.path.abspath(os.path.join(current_dir, '..', '..'))
 sys.path.append(project_root)
 
 from integration_main import capture_and_save
+from src.utils.rate_controller import AdaptiveRateController, CircuitOpenError
 
 # --- Configuração da Mineração ---
 LIVRO = "BRS" # Bhakti-rasamrta-sindhu
@@ -29,17 +29,21 @@ print("="*60)
 sucessos = 0
 erros = 0
 
+# Ritmo gentil com o servidor (≤ 1 req/s), que recua sozinho em 429/erros
+# e para de insistir se o site cair (circuit breaker).
+controle = AdaptiveRateController(initial_rate=0.5, max_rate=1.0, name=f"scraper:{LIVRO}")
+
 for ref in versos_alvo:
     print(f"\n[⏳] Processando {LIVRO} {ref}...")
     try:
         # Chama nosso pipeline validado
-        capture_and_save(LIVRO, ref)
+        controle.call(capture_and_save, LIVRO, ref)
         sucessos += 1
-        
-        # Pausa estratégica para não sermos bloqueados (Seja gentil com o servidor)
-        print("   ...Respirando por 5 segundos...")
-        time.sleep(5) 
-        
+
+    except CircuitOpenError as e:
+        print(f"   [🛑] {e}. Encerrando o turno.")
+        erros += 1
+        break
     except Exception as e:
         print(f"   [❌] Falha: {e}")
         erros += 1
@@ -48,4 +52,5 @@ print("\n" + "="*60)
 print(f"🏁 FIM DO TURNO.")
 print(f"✅ Sucessos: {sucessos}")
 print(f"❌ Erros: {erros}")
+print(f"📊 Ritmo: {controle.stats()}")
 print("="*60)
\ No newline at end of file
@@ -18,6 +18,7 @@ Fluxo:
 import sys
 import sqlite3
 import logging
+import argparse
 import json
 import time
 from pathlib import Path
@@ -27,6 +28,7 @@ BASE_DIR = Path(__file__).resolve().parent.parent.parent
 sys.path.append(str(BASE_DIR / "src" / "utils"))
 
 from smart_ai_wrapper import SmartAIWrapper  # Assumindo que você salvou a v6.7 lá
+from prompt_registry import get_prompt
 
 # Configurações
 DB_PATH = BASE_DIR / "database" / "harikatha.db"
@@ -47,13 +49,33 @@ UJJVALA_RAW_TEXT = [
     }
 ]
 
+# Prompt estruturado: a chave de cache depende só do verso, do contexto e da versão
+VERSE_PROMPT = get_prompt("ingest.verse")      # config/prompts.yaml
+
 class BookIngestor:
-    def __init__(self):
+    def __init__(self, items=None):
         self.conn = sqlite3.connect(DB_PATH)
         self.wrapper = SmartAIWrapper(db_path=DB_PATH)
+        self.items = items if items is not None else UJJVALA_RAW_TEXT
         self.book_id = None
         self.job_id = None
 
+    @staticmethod
+    def load_items(path):
+        """Lê a entrada JSON: lista de {"ref", "sanskrit", "prompt_context"}."""
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+
+    def build_prompts(self):
+        return [
+            VERSE_PROMPT.bind(sanskrit=item['sanskrit'], context=item['prompt_context'])
+            for item in self.items
+        ]
+
+    def plan(self, max_workers=4):
+        """Dry-run do job inteiro: tokens, cache, custo e tempo estimados."""
+        return self.wrapper.plan_job(self.build_prompts(), model="gemini-1.5-flash", concurrency=max_workers)
+
     def setup_book(self):
         """Garante que o livro existe no catálogo."""
         logger.info("📚 Configurando livro: Ujjvala-nīlamaṇi")
@@ -85,60 +107,78 @@ class BookIngestor:
     def mock_provider(self, prompt: str, model: str) -> str:
         """
         Simula a resposta da IA para testes sem custo real.
-        Em produção, substitua por: return genai.GenerativeModel(model).generate_content(prompt).text
+        Em produção, injete o adapter do registro: provider_registry.get_provider("gemini")
         """
         time.sleep(0.5) # Simula latência
         return f"[IA TRANSLATION] Análise do verso '{prompt[:30]}...' realizada com sucesso.\nSignificado: A doçura de Krishna é suprema."
 
-    def process_content(self):
-        """Loop principal de ingestão."""
+    def _ensure_index(self, cursor, ref):
+        """Cria (ou recupera) a entrada do verso em library_index."""
+        # Extrai números do ref (ex: UN 1.1 -> num_1=1, num_2=1)
+        # Simplificação para o exemplo:
+        parts = ref.split()[-1].split('.')
+        n1 = int(parts[0])
+        n2 = int(parts[1])
+
+        try:
+            cursor.execute("""
+                INSERT INTO library_index (book_id, canonical_id, num_1, num_2, page_number)
+                VALUES (?, ?, ?, ?, ?)
+            """, (self.book_id, ref, n1, n2, 0))
+            return cursor.lastrowid
+        except sqlite3.IntegrityError:
+            # Se já existe, recupera o ID
+            cursor.execute("SELECT id FROM library_index WHERE canonical_id = ?", (ref,))
+            return cursor.fetchone()[0]
+
+    def process_content(self, max_workers=4, plan=None):
+        """
+        Loop principal de ingestão.
+
+        Os versos vão em lote para o wrapper (``call_ai_many``): as chamadas
+        à IA rodam em paralelo e os resultados voltam na ordem do texto.
+        Com um ``plan`` aprovado (``self.plan()``), roda sem confirmação
+        por chamada.
+        """
         cursor = self.conn.cursor()
-        
-        for item in UJJVALA_RAW_TEXT:
-            ref = item['ref']
-            raw_text = item['sanskrit']
-            
-            logger.info(f"🔄 Processando {ref}...")
-
-            # 1. Cria o índice (GPS do verso)
-            # Extrai números do ref (ex: UN 1.1 -> num_1=1, num_2=1)
-            # Simplificação para o exemplo:
-            parts = ref.split()[-1].split('.')
-            n1 = int(parts[0])
-            n2 = int(parts[1])
-
-            try:
-                cursor.execute("""
-                    INSERT INTO library_index (book_id, canonical_id, num_1, num_2, page_number)
-                    VALUES (?, ?, ?, ?, ?)
-                """, (self.book_id, ref, n1, n2, 0))
-                index_id = cursor.lastrowid
-            except sqlite3.IntegrityError:
-                # Se já existe, recupera o ID
-                cursor.execute("SELECT id FROM library_index WHERE canonical_id = ?", (ref,))
-                index_id = cursor.fetchone()[0]
-
-            # 2. Chama a IA via Wrapper (Com Auditoria)
-            full_prompt = f"Texto: {raw_text}\nContexto: {item['prompt_context']}"
-            
-            ai_response = self.wrapper.call_ai(
-                prompt=full_prompt,
+
+        # 1. Cria os índices (GPS dos versos)
+        index_ids = []
+        for item in self.items:
+            logger.info(f"🔄 Preparando {item['ref']}...")
+            index_ids.append(self._ensure_index(cursor, item['ref']))
+        self.conn.commit()
+
+        # 2. Chama a IA via Wrapper (Com Auditoria), em lote
+        if plan is not None:
+            responses = self.wrapper.run_plan(
+                plan,
+                book_id=self.book_id,
+                job_id=self.job_id,
+                provider_func=self.mock_provider,
+            )
+        else:
+            responses = self.wrapper.call_ai_many(
+                self.build_prompts(),
                 model="gemini-1.5-flash",
                 book_id=self.book_id,
                 job_id=self.job_id,
-                provider_func=self.mock_provider # <--- INJEÇÃO DA FUNÇÃO REAL AQUI
+                provider_func=self.mock_provider, # <--- INJEÇÃO DA FUNÇÃO REAL AQUI
+                max_workers=max_workers,
             )
 
+        # 3. Salva o conteúdo gerado (uma transação para o lote)
+        for item, index_id, ai_response in zip(self.items, index_ids, responses):
+            ref = item['ref']
             if ai_response:
-                # 3. Salva o conteúdo gerado
                 cursor.execute("""
                     INSERT INTO library_content (index_id, content_type, language_code, text_body, version)
                     VALUES (?, 'TRANSLATION', 'pt', ?, 1)
                 """, (index_id, ai_response))
-                self.conn.commit()
                 logger.info(f"💾 {ref} salvo com sucesso.")
             else:
                 logger.warning(f"⚠️ {ref} pulado (Bloqueio de custo ou Erro).")
+        self.conn.commit()
 
     def finish_job(self):
         """Marca o job como concluído."""
@@ -148,14 +188,32 @@ class BookIngestor:
         """, (self.job_id,))
         self.conn.commit()
         self.conn.close()
+        self.wrapper.close()
         logger.info("🏁 Ingestão concluída.")
 
 if __name__ == "__main__":
-    ingestor = BookIngestor()
+    parser = argparse.ArgumentParser(description="Ingestão de livro via SmartAIWrapper")
+    parser.add_argument("--input", help="JSON com os versos (padrão: texto de exemplo)")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--plan", action="store_true",
+                        help="Mostra o plano (custo/tempo) e pede aprovação uma única vez")
+    parser.add_argument("--yes", action="store_true", help="Aprova o plano sem perguntar")
+    args = parser.parse_args()
+
+    ingestor = BookIngestor(BookIngestor.load_items(args.input) if args.input else None)
+    plan = None
+    if args.plan:
+        plan = ingestor.plan(args.workers)
+        print(plan.summary())
+        if not (args.yes or input("Aprovar o plano? (y/n): ").lower() in {"y", "yes", "s", "sim"}):
+            logger.info("❌ Plano recusado.")
+            ingestor.wrapper.close()
+            sys.exit(0)
+        plan.approve()
     try:
         ingestor.setup_book()
         ingestor.start_job()
-        ingestor.process_content()
+        ingestor.process_content(args.workers, plan)
         ingestor.finish_job()
     except Exception as e:
         logger.error(f"❌ Falha fatal: {e}")
@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+audit_report.py – Relatório de custo/latência a partir dos totais diários
+
+Lê apenas ``ai_audit_rollup_daily`` (ver ``audit_rollup.py``), então
+responde em milissegundos mesmo com milhões de linhas em ``ai_audit_logs``
+– e continua valendo para períodos já expurgados.
+
+Uso:
+    python src/utils/audit_report.py [--days 30] [--by model,status] [--json]
+    python src/utils/audit_report.py --rebuild      # recalcula a partir do log
+"""
+
+import sys
+import json
+import argparse
+import sqlite3
+from pathlib import Path
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Sequence
+
+try:                                    # importado como pacote (src.utils.audit_report)
+    from .db_connection import SQLiteConnectionManager
+    from .audit_rollup import (
+        ROLLUP_TABLE, BUCKET_COLUMNS, LATENCY_BUCKETS_MS, init_rollup_schema, rebuild_rollups,
+    )
+except ImportError:                     # importado via sys.path / executado direto
+    from db_connection import SQLiteConnectionManager
+    from audit_rollup import (
+        ROLLUP_TABLE, BUCKET_COLUMNS, LATENCY_BUCKETS_MS, init_rollup_schema, rebuild_rollups,
+    )
+
+BASE_DIR = Path(__file__).resolve().parent.parent.parent
+DB_PATH = BASE_DIR / "database" / "harikatha.db"
+
+DEFAULT_DAYS = 30
+
+# Nome na linha de comando → coluna da tabela de totais
+DIMENSIONS = {
+    "day": "day",
+    "model": "model_name",
+    "status": "status_code",
+    "book": "book_id",
+    "job": "job_id",
+}
+
+_SUMS = (
+    "calls", "input_tokens", "output_tokens", "estimated_cost_usd", "cost_usd",
+    "cache_hits", "latency_sum_ms", "latency_count", "ttft_sum_ms", "ttft_count",
+)
+
+
+# ----------------------------------------------------------------------
+def _since(days: Optional[int], now: Optional[datetime] = None) -> str:
+    if days is None:
+        return "0000-00-00"
+    now = now or datetime.now(timezone.utc)
+    return (now - timedelta(days=days - 1)).strftime("%Y-%m-%d")
+
+
+def latency_quantile(buckets: Sequence[int], q: float) -> Optional[int]:
+    """
+    Limite superior (ms) do balde onde cai o quantil ``q``; ``None`` se
+    cair no último balde (acima de ``LATENCY_BUCKETS_MS[-1]``) ou sem dados.
+    """
+    total = sum(buckets)
+    if not total:
+        return None
+    seen = 0
+    for upper, count in zip(LATENCY_BUCKETS_MS, buckets):
+        seen += count
+        if seen >= q * total:
+            return upper
+    return None
+
+
+# ----------------------------------------------------------------------
+def build_report(conn: sqlite3.Connection,
+                 by: Sequence[str] = ("model",),
+                 days: Optional[int] = DEFAULT_DAYS,
+                 now: Optional[datetime] = None) -> List[Dict[str, Any]]:
+    """
+    Totais agrupados pelas dimensões ``by`` (``day``, ``model``, ``status``,
+    ``book``, ``job``) nos últimos ``days`` dias (``None`` = tudo).
+
+    Cada linha traz as somas, latência/TTFT médias, p50/p95 aproximados
+    pelos baldes, a razão de cache hits e a diferença custo real − estimado.
+    """
+    unknown = [d for d in by if d not in DIMENSIONS]
+    if unknown:
+        raise ValueError(f"Dimensão desconhecida: {', '.join(unknown)} (use {', '.join(DIMENSIONS)})")
+    keys = [DIMENSIONS[d] for d in by]
+    columns = keys + [f"SUM({c}) AS {c}" for c in _SUMS + BUCKET_COLUMNS]
+    sql = f"SELECT {', '.join(columns)} FROM {ROLLUP_TABLE} WHERE day >= ?"
+    if keys:
+        sql += f" GROUP BY {', '.join(keys)} ORDER BY {', '.join(keys)}"
+
+    conn.row_factory = sqlite3.Row
+    rows = conn.execute(sql, (_since(days, now),)).fetchall()
+    conn.row_factory = None
+
+    report = []
+    for row in rows:
+        if row["calls"] is None:                # tabela vazia sem GROUP BY
+            continue
+        buckets = [row[c] for c in BUCKET_COLUMNS]
+        calls, hits = row["calls"], row["cache_hits"]
+        report.append({
+            **{d: row[DIMENSIONS[d]] for d in by},
+            "calls": calls,
+            "cache_hits": hits,
+            "cache_hit_ratio": round(hits / (hits + calls), 4) if hits + calls else 0.0,
+            "input_tokens": row["input_tokens"],
+            "output_tokens": row["output_tokens"],
+            "estimated_cost_usd": round(row["estimated_cost_usd"], 6),
+            "cost_usd": round(row["cost_usd"], 6),
+            "cost_delta_usd": round(row["cost_usd"] - row["estimated_cost_usd"], 6),
+            "avg_latency_ms": round(row["latency_sum_ms"] / row["latency_count"], 1) if row["latency_count"] else None,
+            "p50_latency_ms": latency_quantile(buckets, 0.50),
+            "p95_latency_ms": latency_quantile(buckets, 0.95),
+            "avg_ttft_ms": round(row["ttft_sum_ms"] / row["ttft_count"], 1) if row["ttft_count"] else None,
+            "latency_buckets": dict(zip(BUCKET_COLUMNS, buckets)),
+        })
+    return report
+
+
+# ----------------------------------------------------------------------
+def format_report(report: List[Dict[str, Any]], by: Sequence[str]) -> str:
+    """Tabela de texto simples (uma linha por grupo)."""
+    def ms(value: Optional[float], bucketed: bool = False) -> str:
+        if value is None:
+            return f">{LATENCY_BUCKETS_MS[-1]}" if bucketed else "-"
+        return f"{value:.0f}"
+
+    header = [d.upper() for d in by] + [
+        "CALLS", "HITS", "HIT%", "TOK_IN", "TOK_OUT", "EST_$", "REAL_$", "AVG_MS", "P50≤", "P95≤",
+    ]
+    lines = [header]
+    for r in report:
+        lines.append([str(r[d]) for d in by] + [
+            str(r["calls"]), str(r["cache_hits"]), f"{100 * r['cache_hit_ratio']:.1f}",
+            str(r["input_tokens"]), str(r["output_tokens"]),
+            f"{r['estimated_cost_usd']:.4f}", f"{r['cost_usd']:.4f}",
+            ms(r["avg_latency_ms"]),
+            ms(r["p50_latency_ms"], r["calls"] > 0), ms(r["p95_latency_ms"], r["calls"] > 0),
+        ])
+    widths = [max(len(line[i]) for line in lines) for i in range(len(header))]
+    return "\n".join("  ".join(cell.ljust(w) for cell, w in zip(line, widths)) for line in lines)
+
+
+# ----------------------------------------------------------------------
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Relatório de custo/latência da auditoria de IA")
+    parser.add_argument("--db", default=str(DB_PATH))
+    parser.add_argument("--days", type=int, default=DEFAULT_DAYS,
+                        help="Últimos N dias (padrão 30; 0 = todo o histórico)")
+    parser.add_argument("--by", default="model",
+                        help=f"Dimensões separadas por vírgula: {', '.join(DIMENSIONS)} (padrão model)")
+    parser.add_argument("--json", action="store_true", help="Saída em JSON")
+    parser.add_argument("--rebuild", action="store_true",
+                        help="Recalcula os totais a partir de ai_audit_logs (perde o que já foi expurgado)")
+    args = parser.parse_args(argv)
+
+    by = [d.strip() for d in args.by.split(",") if d.strip()]
+    db = SQLiteConnectionManager(args.db, init_script=init_rollup_schema)
+    try:
+        if args.rebuild:
+            with db.transaction() as conn:
+                print(f"🔄 Totais recalculados: {rebuild_rollups(conn)} linhas.")
+        try:
+            report = build_report(db.connection(), by, args.days or None)
+        except ValueError as exc:
+            parser.error(str(exc))
+    finally:
+        db.close()
+
+    if args.json:
+        json.dump(report, sys.stdout, ensure_ascii=False, indent=2)
+        print()
+    else:
+        print(format_report(report, by))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+audit_rollup.py – Totais diários da auditoria mantidos de forma incremental
+
+``ai_audit_rollup_daily`` guarda, por dia × modelo × status × livro × job:
+chamadas, tokens, custo estimado vs real, cache hits, soma/contagem de
+latência e TTFT e um histograma fixo de latência. Triggers em
+``ai_audit_logs`` somam cada linha nova (e cada upsert que é de fato uma
+nova chamada); os cache hits – que não geram linha de auditoria – chegam
+pelo wrapper, em lote, assim como as falhas que o upsert descarta (chave
+que já tem SUCCESS). O dia de uma chamada é o da última gravação
+(``updated_at``), não o da primeira tentativa daquela chave. Relatórios
+(``audit_report.py``) leem só esta tabela, sem varrer o log. O expurgo
+não apaga os totais.
+"""
+
+import sqlite3
+from typing import Any, Dict, List, Optional, Tuple
+
+try:                                    # importado como pacote (src.utils.audit_rollup)
+    from .db_connection import execute_script
+except ImportError:                     # importado via sys.path / executado direto
+    from db_connection import execute_script
+
+# Limites superiores (ms) dos baldes de latência; o último balde é "acima de"
+LATENCY_BUCKETS_MS: Tuple[int, ...] = (250, 500, 1000, 2000, 5000, 10000)
+BUCKET_COLUMNS: Tuple[str, ...] = tuple(f"lat_le_{b}" for b in LATENCY_BUCKETS_MS) + (
+    f"lat_gt_{LATENCY_BUCKETS_MS[-1]}",
+)
+
+ROLLUP_TABLE = "ai_audit_rollup_daily"
+ROLLUP_KEY = ("day", "model_name", "status_code", "book_id", "job_id")
+ROLLUP_SUMS = (
+    "calls", "input_tokens", "output_tokens", "estimated_cost_usd", "cost_usd",
+    "cache_hits", "latency_sum_ms", "latency_count", "ttft_sum_ms", "ttft_count",
+) + BUCKET_COLUMNS
+
+ROLLUP_SCHEMA_SQL = f"""
+CREATE TABLE IF NOT EXISTS {ROLLUP_TABLE} (
+    day                 TEXT    NOT NULL,           -- YYYY-MM-DD (UTC)
+    model_name          TEXT    NOT NULL,
+    status_code         TEXT    NOT NULL,
+    book_id             INTEGER NOT NULL DEFAULT 0, -- 0 = sem livro
+    job_id              INTEGER NOT NULL DEFAULT 0, -- 0 = sem job
+    calls               INTEGER NOT NULL DEFAULT 0,
+    input_tokens        INTEGER NOT NULL DEFAULT 0,
+    output_tokens       INTEGER NOT NULL DEFAULT 0,
+    estimated_cost_usd  REAL    NOT NULL DEFAULT 0,
+    cost_usd            REAL    NOT NULL DEFAULT 0,
+    cache_hits          INTEGER NOT NULL DEFAULT 0,
+    latency_sum_ms      REAL    NOT NULL DEFAULT 0,
+    latency_count       INTEGER NOT NULL DEFAULT 0,
+    ttft_sum_ms         REAL    NOT NULL DEFAULT 0,
+    ttft_count          INTEGER NOT NULL DEFAULT 0,
+    {", ".join(f"{c} INTEGER NOT NULL DEFAULT 0" for c in BUCKET_COLUMNS)},
+    PRIMARY KEY (day, model_name, status_code, book_id, job_id)
+) WITHOUT ROWID;
+"""
+
+
+def _contribution(row: str) -> Dict[str, str]:
+    """Expressões SQL da contribuição de uma linha de ``ai_audit_logs`` (``NEW`` ou alias)."""
+    buckets = {}
+    lower = None
+    for upper, column in zip(LATENCY_BUCKETS_MS, BUCKET_COLUMNS):
+        low = f"{row}.latency_ms > {lower} AND " if lower is not None else ""
+        buckets[column] = f"({low}{row}.latency_ms <= {upper})"
+        lower = upper
+    buckets[BUCKET_COLUMNS[-1]] = f"({row}.latency_ms > {lower})"
+    return {
+        "day": f"date(COALESCE({row}.updated_at, {row}.created_at))",
+        "model_name": f"{row}.model_name",
+        "status_code": f"{row}.status_code",
+        "book_id": f"COALESCE({row}.book_id, 0)",
+        "job_id": f"COALESCE({row}.job_id, 0)",
+        "calls": "1",
+        "input_tokens": f"COALESCE({row}.input_tokens, 0)",
+        "output_tokens": f"COALESCE({row}.output_tokens, 0)",
+        "estimated_cost_usd": f"COALESCE({row}.estimated_cost_usd, 0)",
+        "cost_usd": f"COALESCE({row}.cost_usd, 0)",
+        "cache_hits": "0",
+        "latency_sum_ms": f"COALESCE({row}.latency_ms, 0)",
+        "latency_count": f"({row}.latency_ms IS NOT NULL)",
+        "ttft_sum_ms": f"COALESCE({row}.ttft_ms, 0)",
+        "ttft_count": f"({row}.ttft_ms IS NOT NULL)",
+        **{c: f"COALESCE({expr}, 0)" for c, expr in buckets.items()},
+    }
+
+
+_COLUMNS = ROLLUP_KEY + ROLLUP_SUMS
+_UPSERT_TAIL = (
+    f" ON CONFLICT({', '.join(ROLLUP_KEY)}) DO UPDATE SET "
+    + ", ".join(f"{c} = {c} + excluded.{c}" for c in ROLLUP_SUMS)
+)
+
+
+def _trigger_insert(row: str) -> str:
+    values = _contribution(row)
+    return (
+        f"INSERT INTO {ROLLUP_TABLE} ({', '.join(_COLUMNS)}) "
+        f"VALUES ({', '.join(values[c] for c in _COLUMNS)})" + _UPSERT_TAIL
+    )
+
+
+# Linhas derivadas (prime_cache: custo zero, sem chamada) não contam
+_IS_CALL = "json_extract(NEW.payload_json, '$.derived_from') IS NULL"
+
+ROLLUP_TRIGGERS_SQL = f"""
+CREATE TRIGGER IF NOT EXISTS trg_audit_rollup_insert
+AFTER INSERT ON ai_audit_logs
+WHEN {_IS_CALL}
+BEGIN
+    {_trigger_insert("NEW")};
+END;
+
+-- Upsert de uma chave já registrada = nova chamada; a regravação idêntica
+-- do spool (mesmo payload, com o mesmo call_id) é ignorada
+CREATE TRIGGER IF NOT EXISTS trg_audit_rollup_update
+AFTER UPDATE OF payload_json ON ai_audit_logs
+WHEN {_IS_CALL} AND NEW.payload_json IS NOT OLD.payload_json
+BEGIN
+    {_trigger_insert("NEW")};
+END;
+"""
+
+def _rebuild_sql() -> str:
+    values = _contribution("l")
+    select = [values[c] if c in ROLLUP_KEY else f"SUM({values[c]})" for c in _COLUMNS]
+    return (
+        f"INSERT INTO {ROLLUP_TABLE} ({', '.join(_COLUMNS)}) "
+        f"SELECT {', '.join(select)} FROM ai_audit_logs l "
+        f"WHERE {_IS_CALL.replace('NEW.', 'l.')} "
+        f"GROUP BY {', '.join(values[c] for c in ROLLUP_KEY)}"
+    )
+
+
+SQL_REBUILD = _rebuild_sql()
+
+# Falha que o upsert da auditoria não grava (a chave já tem SUCCESS): a
+# contribuição é calculada dos parâmetros da linha, com a data de hoje
+_SKIPPED_ROW = (
+    "SELECT datetime('now') AS created_at, datetime('now') AS updated_at, "
+    + ", ".join(f":{c} AS {c}" for c in (
+        "model_name", "status_code", "book_id", "job_id", "input_tokens", "output_tokens",
+        "estimated_cost_usd", "cost_usd", "latency_ms", "ttft_ms", "payload_json",
+    ))
+)
+
+
+def _skipped_sql() -> str:
+    values = _contribution("r")
+    return (
+        f"WITH r AS ({_SKIPPED_ROW}) "
+        f"INSERT INTO {ROLLUP_TABLE} ({', '.join(_COLUMNS)}) "
+        f"SELECT {', '.join(values[c] for c in _COLUMNS)} FROM r "
+        f"WHERE {_IS_CALL.replace('NEW.', 'r.')}" + _UPSERT_TAIL
+    )
+
+
+SQL_SKIPPED_CALL = _skipped_sql()
+
+SQL_CACHE_HITS = (
+    f"INSERT INTO {ROLLUP_TABLE} (day, model_name, status_code, book_id, job_id, cache_hits) "
+    f"VALUES (date('now'), ?, 'SUCCESS', ?, ?, ?) "
+    f"ON CONFLICT({', '.join(ROLLUP_KEY)}) DO UPDATE SET cache_hits = cache_hits + excluded.cache_hits"
+)
+
+HitKey = Tuple[str, int, int]
+
+
+# ----------------------------------------------------------------------
+def _has_table(conn: sqlite3.Connection, name: str) -> bool:
+    return conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (name,)
+    ).fetchone() is not None
+
+
+def init_rollup_schema(conn: sqlite3.Connection) -> None:
+    """
+    Cria a tabela de totais e os triggers. Se a tabela ainda não existia,
+    soma o histórico já presente em ``ai_audit_logs`` (uma vez).
+    """
+    existed = _has_table(conn, ROLLUP_TABLE)
+    if not _has_table(conn, "ai_audit_logs"):     # só leitura de relatório
+        execute_script(conn, ROLLUP_SCHEMA_SQL)
+        return
+    # Triggers de uma versão anterior (outra fórmula) são recriados
+    body = _trigger_insert("NEW")
+    stale = [name for name, sql in conn.execute(
+        "SELECT name, sql FROM sqlite_master WHERE type = 'trigger' AND name LIKE 'trg_audit_rollup_%'"
+    ) if body not in sql]
+    for name in stale:
+        conn.execute(f"DROP TRIGGER {name}")
+    execute_script(conn, ROLLUP_SCHEMA_SQL + ROLLUP_TRIGGERS_SQL)
+    if not existed:
+        conn.execute(SQL_REBUILD)
+
+
+def rebuild_rollups(conn: sqlite3.Connection) -> int:
+    """
+    Recalcula os totais a partir de ``ai_audit_logs`` (linhas já expurgadas
+    e cache hits passados se perdem). Retorna as linhas de totais geradas.
+    """
+    conn.execute(f"DELETE FROM {ROLLUP_TABLE}")
+    conn.execute(SQL_REBUILD)
+    return conn.execute(f"SELECT COUNT(*) FROM {ROLLUP_TABLE}").fetchone()[0]
+
+
+def record_cache_hits(conn: sqlite3.Connection, hits: Dict[HitKey, int]) -> None:
+    """Soma cache hits acumulados ``{(modelo, book_id, job_id): n}`` no dia de hoje."""
+    conn.executemany(SQL_CACHE_HITS, [(m, b, j, n) for (m, b, j), n in hits.items() if n])
+
+
+def record_skipped_calls(conn: sqlite3.Connection, rows: List[Dict[str, Any]]) -> int:
+    """
+    Soma nos totais as falhas que o upsert de ``ai_audit_logs`` vai ignorar
+    (status diferente de SUCCESS numa chave que já tem SUCCESS – ex.:
+    ``force=True`` que falhou). Sem isso essas chamadas pagas somem dos
+    relatórios. Deve rodar na transação do flush, antes do INSERT, com as
+    linhas na ordem em que serão gravadas. Retorna quantas foram somadas.
+    """
+    if all(row.get("status_code") == "SUCCESS" for row in rows):
+        return 0
+    succeeded = set()
+    for row in rows:
+        key = (row["request_hash"], row["model_name"])
+        if row.get("status_code") != "SUCCESS" and key not in succeeded and conn.execute(
+            "SELECT 1 FROM ai_audit_logs WHERE request_hash = ? AND model_name = ? "
+            "AND status_code = 'SUCCESS'", key,
+        ).fetchone():
+            succeeded.add(key)
+    skipped = []
+    for row in rows:                    # mesma ordem do executemany do upsert
+        key = (row["request_hash"], row["model_name"])
+        if row.get("status_code") == "SUCCESS":
+            succeeded.add(key)
+        elif key in succeeded:
+            skipped.append(row)
+    if skipped:
+        conn.executemany(SQL_SKIPPED_CALL, skipped)
+    return len(skipped)
+
+
+def hit_key(model: str, book_id: Optional[int], job_id: Optional[int]) -> HitKey:
+    """Chave de ``record_cache_hits`` (ids ausentes viram 0, como na tabela)."""
+    return model, book_id or 0, job_id or 0
@@ -0,0 +1,349 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+audit_sink.py – Gravação write-behind da auditoria de IA
+
+Tira o INSERT + COMMIT do caminho crítico de cada chamada:
+- As linhas ficam num buffer em memória e são gravadas em lote
+  (``executemany`` numa única transação).
+- O flush dispara por tamanho (``batch_size``), por tempo
+  (``flush_interval``), no ``close()`` e no ``atexit``.
+- Cada linha também é anexada a um spool local (JSONL, um segmento por
+  flush). Se o processo morrer antes do commit, o próximo processo
+  reaplica os segmentos órfãos — o INSERT é idempotente (upsert).
+  Um segmento só é órfão quando o processo dono (pid no nome) morreu.
+- Um lote que falha ``max_failures`` vezes seguidas é regravado linha a
+  linha; as linhas que ainda falham vão para quarentena (arquivo
+  ``.quarantine`` no spool) em vez de travar os próximos flushes.
+"""
+
+import os
+import json
+import time
+import uuid
+import atexit
+import logging
+import sqlite3
+import threading
+from itertools import count
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger("AuditSink")
+
+SPOOL_SUFFIX = ".spool"
+QUARANTINE_SUFFIX = ".quarantine"
+
+# Sinks vivos neste processo (tag = "<pid>-<uuid>"); segmentos deles não são órfãos
+_LIVE_TAGS: set = set()
+
+
+def _pid_alive(pid: int) -> Optional[bool]:
+    """Se o processo existe (``None`` = não dá para saber nesta plataforma)."""
+    if os.name == "nt":
+        return None             # os.kill(pid, 0) no Windows envia CTRL+C
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        return True             # existe, mas é de outro usuário
+    return True
+
+
+def _owner_alive(path: Path) -> Optional[bool]:
+    """Se o sink que escreveu o segmento ``audit-<pid>-<uuid>-<seq>`` ainda vive."""
+    parts = path.name[len("audit-"):].split("-")
+    if len(parts) < 3 or not parts[0].isdigit():
+        return None
+    pid = int(parts[0])
+    if pid == os.getpid():
+        return f"{parts[0]}-{parts[1]}" in _LIVE_TAGS
+    return _pid_alive(pid)
+
+
+# ----------------------------------------------------------------------
+class AuditSink:
+    """
+    Buffer de auditoria com flush em lote e spool à prova de crash.
+
+    Parameters
+    ----------
+    db : SQLiteConnectionManager
+        Conexões usadas no flush.
+    insert_sql : str
+        Comando (com parâmetros nomeados) executado via ``executemany``.
+    batch_size : int
+        Linhas acumuladas que disparam um flush. ``<= 1`` grava na hora,
+        sem thread de fundo (comportamento síncrono clássico).
+    flush_interval : float
+        Segundos máximos que uma linha espera no buffer.
+    spool_dir : Path | None
+        Pasta dos segmentos de spool (``None`` desativa o spool).
+    stale_after : float
+        Idade mínima (s) para um segmento ser considerado órfão quando não
+        dá para saber se o processo dono ainda vive (ex.: Windows).
+    max_failures : int
+        Flushes seguidos com erro antes de o lote ir para quarentena.
+    prepare : callable | None
+        ``f(conn, linhas) -> linhas`` aplicada dentro da transação do flush,
+        antes do ``executemany`` (ex.: mover textos para o blob store).
+    """
+
+    # ------------------------------------------------------------------
+    def __init__(self,
+                 db,
+                 insert_sql: str,
+                 batch_size: int = 50,
+                 flush_interval: float = 2.0,
+                 spool_dir: Optional[Path] = None,
+                 stale_after: float = 300.0,
+                 max_failures: int = 3,
+                 prepare: Optional[Callable[[Any, List[Dict[str, Any]]], List[Dict[str, Any]]]] = None) -> None:
+        self.db = db
+        self.insert_sql = insert_sql
+        self.prepare = prepare
+        self.batch_size = max(1, int(batch_size))
+        self.flush_interval = flush_interval
+        self.spool_dir = Path(spool_dir) if spool_dir else None
+        self.stale_after = stale_after
+        self.max_failures = max(1, int(max_failures))
+
+        self._buffer: List[Dict[str, Any]] = []
+        self._pending_success: Dict[Tuple[str, str], str] = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._closed = False
+
+        self._seq = count(1)
+        self._tag = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._failures = 0                      # flushes seguidos com erro
+        self._segments: List[Path] = []         # segmentos já rotacionados, sem commit
+        self._spool_path: Optional[Path] = None
+        self._spool_file = None
+
+        self.rows_written = 0
+        self.rows_quarantined = 0
+        self.flushes = 0
+
+        if self.spool_dir is not None:
+            _LIVE_TAGS.add(self._tag)
+            self.spool_dir.mkdir(parents=True, exist_ok=True)
+            self.recover()
+            self._open_segment()
+
+        if self.batch_size > 1:
+            self._thread = threading.Thread(target=self._run, name="AuditSinkFlusher", daemon=True)
+            self._thread.start()
+        atexit.register(self.close)
+
+    # ------------------------------------------------------------------
+    # Spool
+    # ------------------------------------------------------------------
+    def _open_segment(self) -> None:
+        name = f"audit-{self._tag}-{next(self._seq):06d}{SPOOL_SUFFIX}"
+        self._spool_path = self.spool_dir / name
+        self._spool_file = open(self._spool_path, "a", encoding="utf-8")
+
+    def _rotate_segment(self) -> List[Path]:
+        """Fecha o segmento atual e abre outro. Retorna os segmentos a confirmar."""
+        if self._spool_file is None:
+            return []
+        self._spool_file.close()
+        segments = self._segments + [self._spool_path]
+        self._segments = []
+        self._open_segment()
+        return segments
+
+    @staticmethod
+    def _read_segment(path: Path) -> List[Dict[str, Any]]:
+        rows = []
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    rows.append(json.loads(line))
+                except json.JSONDecodeError:
+                    # Última linha truncada por um crash no meio do write
+                    logger.warning(f"⚠️ Linha corrompida ignorada no spool {path.name}")
+        return rows
+
+    # ------------------------------------------------------------------
+    def recover(self) -> int:
+        """
+        Reaplica segmentos de spool órfãos (de processos que morreram).
+
+        Segmentos de sinks vivos (inclusive o segmento atual, ainda vazio, de
+        um processo ocioso) nunca são tocados. Retorna quantas linhas foram
+        regravadas.
+        """
+        if self.spool_dir is None:
+            return 0
+        now = time.time()
+        recovered = 0
+        for path in sorted(self.spool_dir.glob(f"audit-*{SPOOL_SUFFIX}")):
+            if path == self._spool_path or path in self._segments:
+                continue
+            try:
+                alive = _owner_alive(path)
+                if alive:
+                    continue
+                stat = path.stat()
+                if alive is None and now - stat.st_mtime < self.stale_after:
+                    continue            # dono desconhecido: só pela idade
+                if stat.st_size == 0:
+                    path.unlink()
+                    continue
+                rows = self._read_segment(path)
+                if rows:
+                    self._execute(rows)
+                path.unlink()
+                recovered += len(rows)
+            except (OSError, sqlite3.Error) as exc:
+                logger.error(f"❌ Falha ao reaplicar spool {path.name}: {exc}")
+        if recovered:
+            logger.info(f"♻️ [AUDIT] {recovered} linhas recuperadas do spool.")
+        return recovered
+
+    # ------------------------------------------------------------------
+    # API
+    # ------------------------------------------------------------------
+    def write(self, row: Dict[str, Any]) -> None:
+        """Enfileira uma linha de auditoria (grava na hora se ``batch_size <= 1``)."""
+        if self.batch_size <= 1 or self._closed:
+            self._insert([row])
+            return
+
+        with self._lock:
+            if self._spool_file is not None:
+                self._spool_file.write(json.dumps(row, ensure_ascii=False) + "\n")
+                self._spool_file.flush()
+            self._buffer.append(row)
+            if row.get("status_code") == "SUCCESS" and row.get("response_raw"):
+                self._pending_success[(row["request_hash"], row["model_name"])] = row["response_raw"]
+            full = len(self._buffer) >= self.batch_size
+        if full:
+            self._wake.set()
+
+    # ------------------------------------------------------------------
+    def pending_response(self, request_hash: str, model: str) -> Optional[str]:
+        """Resposta SUCCESS ainda no buffer (ainda não está no SQLite)."""
+        with self._lock:
+            return self._pending_success.get((request_hash, model))
+
+    # ------------------------------------------------------------------
+    def _execute(self, rows: List[Dict[str, Any]]) -> None:
+        with self.db.transaction() as conn:
+            if self.prepare is not None:
+                rows = self.prepare(conn, rows)
+            conn.executemany(self.insert_sql, rows)
+
+    def _insert(self, rows: List[Dict[str, Any]]) -> None:
+        self._execute(rows)
+        self.rows_written += len(rows)
+        self.flushes += 1
+
+    # ------------------------------------------------------------------
+    def flush(self) -> int:
+        """Grava o buffer numa única transação. Retorna as linhas gravadas."""
+        with self._flush_lock:
+            with self._lock:
+                rows, self._buffer = self._buffer, []
+                segments = self._rotate_segment() if rows else []
+            if not rows:
+                return 0
+
+            try:
+                self._insert(rows)
+                self._failures = 0
+                written = len(rows)
+            except Exception as exc:
+                self._failures += 1
+                logger.error(f"❌ Falha ao gravar lote de auditoria ({len(rows)} linhas, "
+                             f"tentativa {self._failures}/{self.max_failures}): {exc}")
+                if self._failures < self.max_failures:
+                    with self._lock:
+                        self._buffer = rows + self._buffer
+                        self._segments = segments + self._segments
+                    return 0
+                self._failures = 0
+                written = self._insert_one_by_one(rows)
+
+            with self._lock:
+                for row in rows:
+                    key = (row["request_hash"], row["model_name"])
+                    if key in self._pending_success and self._pending_success[key] == row.get("response_raw"):
+                        del self._pending_success[key]
+            for path in segments:
+                try:
+                    path.unlink()
+                except OSError:
+                    pass
+            return written
+
+    # ------------------------------------------------------------------
+    def _insert_one_by_one(self, rows: List[Dict[str, Any]]) -> int:
+        """Último recurso para um lote que não grava: linha a linha, o resto em quarentena."""
+        bad = []
+        for row in rows:
+            try:
+                self._insert([row])
+            except Exception:
+                bad.append(row)
+        if bad:
+            self._quarantine(bad)
+        return len(rows) - len(bad)
+
+    def _quarantine(self, rows: List[Dict[str, Any]]) -> None:
+        self.rows_quarantined += len(rows)
+        if self.spool_dir is None:
+            logger.error(f"❌ [AUDIT] {len(rows)} linhas de auditoria descartadas após "
+                         f"{self.max_failures} falhas seguidas.")
+            return
+        path = self.spool_dir / f"audit-{self._tag}{QUARANTINE_SUFFIX}"
+        with open(path, "a", encoding="utf-8") as f:
+            for row in rows:
+                f.write(json.dumps(row, ensure_ascii=False) + "\n")
+        logger.error(f"❌ [AUDIT] {len(rows)} linhas em quarentena em {path.name} "
+                     f"após {self.max_failures} falhas seguidas.")
+
+    # ------------------------------------------------------------------
+    def _run(self) -> None:
+        """Thread de fundo: flush por tempo ou quando o buffer enche."""
+        while not self._stop.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            if self._buffer:
+                self.flush()
+
+    # ------------------------------------------------------------------
+    def close(self) -> None:
+        """Para a thread de fundo, grava o que sobrou e fecha o spool."""
+        if self._closed:
+            return
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout=5)
+        self.flush()
+        self._closed = True
+        _LIVE_TAGS.discard(self._tag)
+        with self._lock:
+            if self._spool_file is not None:
+                self._spool_file.close()
+                self._spool_file = None
+                if self._spool_path and not self._segments:
+                    try:
+                        self._spool_path.unlink()
+                    except OSError:
+                        pass
+        try:
+            atexit.unregister(self.close)
+        except Exception:
+            pass
@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+blob_store.py – Armazenamento deduplicado e comprimido de prompts/respostas
+
+Cada texto vira um blob endereçado pelo seu SHA‑256 na tabela ``ai_blobs``,
+comprimido com zstd (se ``zstandard`` estiver instalado) ou zlib. As linhas
+de ``ai_audit_logs`` guardam só as referências (``prompt_ref`` /
+``response_ref``): o mesmo prompt-padrão do scholar é gravado uma vez só.
+
+Uso como script (migra linhas antigas, em blocos):
+    python src/utils/blob_store.py --migrate [--db caminho] [--chunk 500] [--vacuum]
+"""
+
+import sys
+import json
+import zlib
+import hashlib
+import logging
+import argparse
+import sqlite3
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+try:
+    import zstandard
+except ImportError:                     # dependência opcional
+    zstandard = None
+
+try:                                    # importado como pacote (src.utils.blob_store)
+    from .db_connection import ensure_columns, execute_script
+except ImportError:                     # importado via sys.path / executado direto
+    from db_connection import ensure_columns, execute_script
+
+logger = logging.getLogger("BlobStore")
+
+BLOB_SCHEMA_SQL = """
+CREATE TABLE IF NOT EXISTS ai_blobs (
+    blob_hash   TEXT    PRIMARY KEY,
+    codec       TEXT    NOT NULL CHECK (codec IN ('raw','zlib','zstd')),
+    raw_size    INTEGER NOT NULL,
+    data        BLOB    NOT NULL,
+    created_at  DATETIME DEFAULT CURRENT_TIMESTAMP
+) WITHOUT ROWID;
+"""
+
+# Colunas de referência acrescentadas em ai_audit_logs
+AUDIT_REF_COLUMNS = {"prompt_ref": "TEXT", "response_ref": "TEXT"}
+
+AUDIT_REF_INDEXES_SQL = """
+CREATE INDEX IF NOT EXISTS idx_audit_prompt_ref   ON ai_audit_logs(prompt_ref);
+CREATE INDEX IF NOT EXISTS idx_audit_response_ref ON ai_audit_logs(response_ref);
+"""
+
+SQL_BLOB_INSERT = """
+    INSERT OR IGNORE INTO ai_blobs (blob_hash, codec, raw_size, data)
+    VALUES (?, ?, ?, ?)
+"""
+
+# Textos menores que isso não compensam o cabeçalho do compressor
+MIN_COMPRESS_BYTES = 64
+
+ZLIB_LEVEL = 6
+ZSTD_LEVEL = 6
+
+
+# ----------------------------------------------------------------------
+def blob_hash(text: str) -> str:
+    """SHA‑256 do texto (UTF‑8) – chave do blob."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+# ----------------------------------------------------------------------
+def compress(text: str) -> Tuple[str, bytes]:
+    """Comprime o texto. Retorna ``(codec, dados)``."""
+    raw = text.encode("utf-8")
+    if len(raw) < MIN_COMPRESS_BYTES:
+        return "raw", raw
+    if zstandard is not None:
+        return "zstd", zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(raw)
+    return "zlib", zlib.compress(raw, ZLIB_LEVEL)
+
+
+# ----------------------------------------------------------------------
+def decompress(codec: str, data: bytes) -> str:
+    """Operação inversa de ``compress``."""
+    if codec == "raw":
+        return bytes(data).decode("utf-8")
+    if codec == "zlib":
+        return zlib.decompress(data).decode("utf-8")
+    if codec == "zstd":
+        if zstandard is None:
+            raise RuntimeError("Blob comprimido com zstd, mas o pacote 'zstandard' não está instalado.")
+        return zstandard.ZstdDecompressor().decompress(data).decode("utf-8")
+    raise ValueError(f"Codec desconhecido: {codec}")
+
+
+# ----------------------------------------------------------------------
+def init_blob_schema(conn: sqlite3.Connection) -> None:
+    """Cria ``ai_blobs`` e as colunas/índices de referência em ai_audit_logs."""
+    execute_script(conn, BLOB_SCHEMA_SQL)
+    ensure_columns(conn, "ai_audit_logs", AUDIT_REF_COLUMNS)
+    execute_script(conn, AUDIT_REF_INDEXES_SQL)
+
+
+# ----------------------------------------------------------------------
+def put_blobs(conn: sqlite3.Connection, texts: Iterable[str]) -> List[str]:
+    """
+    Grava os textos (sem duplicar) e retorna as referências, na mesma ordem.
+
+    Não faz commit: roda dentro da transação de quem chama.
+    """
+    refs: List[str] = []
+    new: Dict[str, Tuple[str, str, int, bytes]] = {}
+    for text in texts:
+        ref = blob_hash(text)
+        refs.append(ref)
+        if ref not in new:
+            codec, data = compress(text)
+            new[ref] = (ref, codec, len(text.encode("utf-8")), data)
+    if new:
+        conn.executemany(SQL_BLOB_INSERT, list(new.values()))
+    return refs
+
+
+# ----------------------------------------------------------------------
+def get_blob(conn: sqlite3.Connection, ref: str) -> Optional[str]:
+    """Lê e descomprime um blob pela referência."""
+    row = conn.execute(
+        "SELECT codec, data FROM ai_blobs WHERE blob_hash = ?", (ref,)
+    ).fetchone()
+    return decompress(row[0], row[1]) if row else None
+
+
+# ----------------------------------------------------------------------
+def _slim_payload(payload_json: Optional[str], prompt: str, prompt_ref: str) -> Optional[str]:
+    """Troca a cópia do prompt dentro do payload pela referência."""
+    if not payload_json:
+        return payload_json
+    try:
+        payload = json.loads(payload_json)
+    except (TypeError, ValueError):
+        return payload_json
+    if isinstance(payload, dict) and payload.get("prompt") == prompt:
+        payload.pop("prompt")
+        payload["prompt_ref"] = prompt_ref
+        return json.dumps(payload, ensure_ascii=False)
+    return payload_json
+
+
+# ----------------------------------------------------------------------
+def externalize_rows(conn: sqlite3.Connection, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Converte linhas de auditoria para o formato com referências.
+
+    Prompts e respostas vão para ``ai_blobs``; a linha devolvida (cópia)
+    fica com ``prompt_raw = ''``, ``response_raw = NULL`` e os refs.
+    Usado pelo ``AuditSink`` dentro da transação do flush.
+    """
+    texts: List[str] = []
+    for row in rows:
+        texts.append(row["prompt_raw"] or "")
+        texts.append(row["response_raw"] or "")
+    refs = put_blobs(conn, texts)
+
+    slim = []
+    for i, row in enumerate(rows):
+        prompt_ref, response_ref = refs[2 * i], refs[2 * i + 1]
+        new = dict(row)
+        new["payload_json"] = _slim_payload(row.get("payload_json"), row["prompt_raw"], prompt_ref)
+        new["prompt_ref"] = prompt_ref
+        new["response_ref"] = response_ref if row["response_raw"] else None
+        new["prompt_raw"] = ""
+        new["response_raw"] = None
+        slim.append(new)
+    return slim
+
+
+# ----------------------------------------------------------------------
+def migrate_audit_rows(conn: sqlite3.Connection, chunk_size: int = 500) -> int:
+    """
+    Migra linhas antigas (texto inline) para o blob store.
+
+    Percorre ``ai_audit_logs`` por ``audit_id`` (keyset) em blocos de
+    ``chunk_size``, com um commit por bloco – pode ser interrompido e
+    retomado a qualquer momento. Retorna o total de linhas migradas.
+    """
+    init_blob_schema(conn)
+    conn.commit()
+
+    last_id, migrated = 0, 0
+    while True:
+        rows = conn.execute(
+            """
+            SELECT audit_id, prompt_raw, response_raw, payload_json
+            FROM ai_audit_logs
+            WHERE audit_id > ? AND prompt_ref IS NULL
+            ORDER BY audit_id
+            LIMIT ?
+            """,
+            (last_id, chunk_size),
+        ).fetchall()
+        if not rows:
+            break
+
+        with conn:
+            dicts = [
+                {"audit_id": r[0], "prompt_raw": r[1] or "", "response_raw": r[2], "payload_json": r[3]}
+                for r in rows
+            ]
+            slim = externalize_rows(conn, dicts)
+            conn.executemany(
+                """
+                UPDATE ai_audit_logs
+                SET prompt_raw = :prompt_raw, response_raw = :response_raw,
+                    payload_json = :payload_json,
+                    prompt_ref = :prompt_ref, response_ref = :response_ref
+                WHERE audit_id = :audit_id
+                """,
+                slim,
+            )
+        last_id = rows[-1][0]
+        migrated += len(rows)
+        logger.info(f"📦 [BLOBS] {migrated} linhas migradas (até audit_id={last_id})")
+    return migrated
+
+
+# ----------------------------------------------------------------------
+def main(argv: Optional[List[str]] = None) -> None:
+    base_dir = Path(__file__).resolve().parent.parent.parent
+    parser = argparse.ArgumentParser(description="Blob store da auditoria de IA")
+    parser.add_argument("--db", default=str(base_dir / "database" / "harikatha.db"))
+    parser.add_argument("--migrate", action="store_true", help="Migra linhas antigas para ai_blobs")
+    parser.add_argument("--chunk", type=int, default=500)
+    parser.add_argument("--vacuum", action="store_true", help="VACUUM ao final (devolve espaço ao disco)")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+    if not args.migrate:
+        parser.print_help()
+        return
+
+    conn = sqlite3.connect(args.db)
+    try:
+        total = migrate_audit_rows(conn, args.chunk)
+        logger.info(f"✅ Migração concluída: {total} linhas.")
+        if args.vacuum:
+            logger.info("🧹 Executando VACUUM...")
+            conn.execute("VACUUM")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,143 +2,379 @@
 # -*- coding: utf-8 -*-
 
 """
-final_cleanup.py
-Script final para resolver os últimos 4 problemas pendentes.
-Correções aplicadas:
-1. Ajuste de nomes de colunas para bater com Schema V8.0 (language -> language_code).
-2. Remoção de colunas inexistentes no índice (chapter_title).
+database_setup.py – Schema oficial do banco HariKathaAI (sempre seguro rodar)
+
+Recursos principais:
+- Cria todas as tabelas usadas pelos scripts: acervo (livros, índice, texto
+  raiz, traduções, comentários, conceitos/tags, conteúdo legado, jobs) e
+  auditoria de IA (logs, leases, blobs, totais diários).
+- Índices dos caminhos quentes: ``canonical_id`` único, chave composta das
+  traduções (verso, idioma, tradutor) e auditoria por hash/status/data.
+  Em bancos antigos com duplicatas o índice único vira índice comum (com
+  aviso) em vez de falhar.
+- Perfil de PRAGMAs de desempenho (WAL, synchronous=NORMAL, mmap, cache,
+  temp_store em memória).
+- Versão do schema em ``PRAGMA user_version``: banco novo já nasce na
+  versão atual; banco existente mais antigo é atualizado pelo
+  ``database_migrator.py`` (passos versionados, numa transação só).
+
+Uso:
+    python src/utils/database_setup.py            # cria/atualiza database/harikatha.db
+    python src/utils/database_setup.py --check    # só relata versão, tabelas e índices
 """
 
+import sys
 import sqlite3
-import os
-
-BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-DB_PATH = os.path.join(BASE_DIR, "database", "harikatha.db")
-
-def get_conn():
-    return sqlite3.connect(DB_PATH)
-
-def ensure_slk_8_39_exists(cursor, book_id):
-    """Insere o registro do verso 8.39 na tabela de índice e depois insere o conteúdo."""
-    canonical_id = "SLK_8.39"
-    
-    # 1. Verifica se existe no índice
-    cursor.execute("SELECT id FROM library_index WHERE canonical_id = ?", (canonical_id,))
-    res = cursor.fetchone()
-    
-    if not res:
-        print(f"➕ Criando entrada no índice para {canonical_id}...")
-        # Schema V8.0: library_index não tem 'chapter_title' nem 'source_ref'
-        cursor.execute("""
-            INSERT INTO library_index (book_id, canonical_id)
-            VALUES (?, ?)
-        """, (book_id, canonical_id))
-        index_id = cursor.lastrowid
-    else:
-        index_id = res[0]
-        
-    # 2. Insere/Atualiza Raiz
-    root_text = """kīrtana-prabhāve, smaraṇa haibe,
-se kāle bhajana-nirjana sambhava"""
-    
-    cursor.execute("INSERT OR REPLACE INTO library_root_text (index_id, transliteration) VALUES (?, ?)", 
-                   (index_id, root_text))
-
-    # 3. Insere/Atualiza Tradução
-    w2w = "kīrtana-prabhāve — by the power of the chanting; smaraṇa — remembering the Lord’s pastimes; haibe — will be; se kāle — at that time; bhajana-nirjana — solitary bhajana; sambhava — possible."
-    body = "The transcendental power of congregational chanting automatically awakens remembrance of the Lord and His divine pastimes in relation to one’s own eternal spiritual form. Only at that time does it become possible to go off to a solitary place and engage in the confidential worship of Their Lordships (aṣṭa-kālīya-līlā-smaraṇa)."
-    source_ref = "Mahājana-racita Gīta, Duṣṭa Mana! – Śrīla Bhaktisiddhānta Sarasvatī Prabhupāda"
-    
-    # Verifica se já tem tradução
-    cursor.execute("SELECT id FROM library_translations WHERE index_id = ?", (index_id,))
-    trans_res = cursor.fetchone()
-    
-    if trans_res:
-        cursor.execute("""
-            UPDATE library_translations SET text_body=?, word_for_word=?, source_ref=? WHERE id=?
-        """, (body, w2w, source_ref, trans_res[0]))
-    else:
-        # CORREÇÃO AQUI: language -> language_code
-        cursor.execute("""
-            INSERT INTO library_translations (index_id, language_code, text_body, word_for_word, source_ref)
-            VALUES (?, 'en', ?, ?, ?)
-        """, (index_id, body, w2w, source_ref))
-        
-    print("✅ SLK_8.39 restaurado com sucesso.")
-
-def fix_slk_0_1(cursor):
-    """Substitui o texto explodido do 0.1 por texto limpo."""
-    print("🔧 Consertando SLK_0.1 (Explodido)...")
-    
-    w2w = "vande — offer my respectful obeisances; aham — I; śrī-guroḥ — of Śrī Gurudeva; śrī-yuta-pada-kamalam — unto the opulent lotus feet; śrī-gurun — unto the spiritual masters; vaiṣṇavān — unto the Vaiṣṇavas; ca — and; śrī-rūpam — unto Śrīla Rūpa Gosvāmī; sāgrajātam — with his elder brother (Śrīla Sanātana Gosvāmī); saha-gaṇa-raghunāthan-vitam — with Raghunātha Dāsa Gosvāmī and associates; tam — unto him; sa-jīvam — with Jīva Gosvāmī; sādvaitam — with Advaita Ācārya; sāvadhūtam — with Nityānanda Prabhu; parijana-sahitam — and with Śrīvāsa Ṭhākura and all the other devotees; kṛṣṇa-caitanya-devam — unto Lord Śrī Kṛṣṇa Caitanya Mahāprabhu; śrī-rādhā-kṛṣṇa-pādān — unto the lotus feet of Śrī Rādhā and Kṛṣṇa; saha-gaṇa-lalitā-śrī-viśākhān-vitāṁś — with Lalitā, Viśākhā and the other sakhīs; ca — also."
-    
-    body = "I offer praṇāma to the lotus feet of Śrī Gurudeva (both dīkṣā and śikṣā-guru), guru-varga (our entire disciplic succession), the Vaiṣṇavas, Śrīla Rūpa Gosvāmī, his elder brother Śrīla Sanātana Gosvāmī, Śrīla Raghunātha Dāsa Gosvāmī, Śrīla Jīva Gosvāmī and their associates. I offer praṇāma to Śrī Advaita Ācārya, Śrī Nityānanda Prabhu, Śrīvāsa Ṭhākura and all the devotees, and to Śrī Kṛṣṇa Caitanya Mahāprabhu. I offer praṇāma to the lotus feet of Śrī Rādhā and Kṛṣṇa, and to Śrī Lalitā-devī, Śrī Viśākhā-devī and all the other sakhīs."
-
-    cursor.execute("SELECT id FROM library_index WHERE canonical_id = 'SLK_0.1'")
-    res = cursor.fetchone()
-    if res:
-        index_id = res[0]
-        cursor.execute("""
-            UPDATE library_translations 
-            SET word_for_word = ?, text_body = ? 
-            WHERE index_id = ?
-        """, (w2w, body, index_id))
-        print("✅ SLK_0.1 limpo.")
-
-def fix_slk_13_47(cursor):
-    """Insere o texto raiz do 13.47."""
-    print("🔧 Preenchendo SLK_13.47...")
-    root_text = """kṛṣṇa-nāma-dhare kata bala?
-viṣaya-vāsanānale, mora citta sadā jvale,
-ravi-tapta maru-bhūmi-tala"""
-    
-    cursor.execute("SELECT id FROM library_index WHERE canonical_id = 'SLK_13.47'")
-    res = cursor.fetchone()
-    if res:
-        # Tenta update primeiro
-        cursor.execute("UPDATE library_root_text SET transliteration = ? WHERE index_id = ?", (root_text, res[0]))
-        if cursor.rowcount == 0:
-             cursor.execute("INSERT INTO library_root_text (index_id, transliteration) VALUES (?, ?)", (res[0], root_text))
-        print("✅ SLK_13.47 preenchido.")
-
-def fix_slk_13_87(cursor):
-    """Remove título vazado no 13.87."""
-    print("🔧 Limpando SLK_13.87...")
-    cursor.execute("""
-        SELECT t.id, t.text_body 
-        FROM library_translations t
-        JOIN library_index i ON t.index_id = i.id
-        WHERE i.canonical_id = 'SLK_13.87'
-    """)
-    res = cursor.fetchone()
-    if res:
-        trans_id, body = res
-        if "Rādhā-Kṛṣṇa tattva" in body:
-            clean_body = body.split("therefore kāma-bīja")[0].strip() + " therefore kāma-bīja indicates Rādhā-Kṛṣṇa tattva."
-            clean_body = clean_body.replace("\nindicates", " indicates").strip()
-            
-            cursor.execute("UPDATE library_translations SET text_body = ? WHERE id = ?", (clean_body, trans_id))
-            print("✅ SLK_13.87 ajustado.")
-
-def run_cleanup():
-    conn = get_conn()
-    cursor = conn.cursor()
-    
-    cursor.execute("SELECT id FROM library_books WHERE acronym = 'SLK'")
-    book_res = cursor.fetchone()
-    if not book_res:
-        print("Livro SLK não encontrado.")
-        return
-    book_id = book_res[0]
+import logging
+import argparse
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+
+try:                                    # importado como pacote (src.utils.database_setup)
+    from .db_connection import DEFAULT_PRAGMAS, apply_pragmas, ensure_columns, execute_script
+    from .single_flight import LEASE_SCHEMA_SQL
+    from .blob_store import init_blob_schema
+    from .audit_rollup import init_rollup_schema
+except ImportError:                     # importado via sys.path / executado direto
+    from db_connection import DEFAULT_PRAGMAS, apply_pragmas, ensure_columns, execute_script
+    from single_flight import LEASE_SCHEMA_SQL
+    from blob_store import init_blob_schema
+    from audit_rollup import init_rollup_schema
+
+BASE_DIR = Path(__file__).resolve().parent.parent.parent
+DB_PATH = BASE_DIR / "database" / "harikatha.db"
+
+logger = logging.getLogger("DatabaseSetup")
+
+# Versão do schema deste módulo (PRAGMA user_version). Bancos novos nascem
+# nela; bancos existentes sobem pelos passos de database_migrator.py.
+SCHEMA_VERSION = 2
+
+# Perfil de desempenho: PRAGMAs padrão + mmap (leituras sem cópia para o
+# cache do processo) e cache de páginas maior (valor negativo = KiB)
+PERFORMANCE_PRAGMAS: Tuple[Tuple[str, Union[str, int]], ...] = DEFAULT_PRAGMAS + (
+    ("mmap_size", 256 * 1024 * 1024),
+    ("cache_size", -32 * 1024),
+)
+
+# ----------------------------------------------------------------------
+# Acervo
+# ----------------------------------------------------------------------
+LIBRARY_SCHEMA_SQL = """
+CREATE TABLE IF NOT EXISTS library_books (
+    id                INTEGER PRIMARY KEY,
+    acronym           TEXT    NOT NULL UNIQUE,
+    book_title        TEXT,
+    author            TEXT,
+    label_l1          TEXT,       -- rótulo de cada nível da referência (ex.: Canto)
+    label_l2          TEXT,
+    label_l3          TEXT,
+    language_default  TEXT
+);
+
+CREATE TABLE IF NOT EXISTS library_index (
+    id            INTEGER PRIMARY KEY AUTOINCREMENT,
+    book_id       INTEGER NOT NULL REFERENCES library_books(id),
+    canonical_id  TEXT    NOT NULL UNIQUE,      -- ex.: SLK_8.39
+    num_1         INTEGER,
+    num_2         INTEGER,
+    num_3         INTEGER,
+    page_number   INTEGER
+);
+
+CREATE TABLE IF NOT EXISTS library_root_text (
+    index_id         INTEGER PRIMARY KEY REFERENCES library_index(id),
+    primary_script   TEXT,        -- devanágari / bengali
+    transliteration  TEXT
+);
+
+CREATE TABLE IF NOT EXISTS library_translations (
+    id             INTEGER PRIMARY KEY,
+    index_id       INTEGER NOT NULL REFERENCES library_index(id),
+    language_code  TEXT    NOT NULL,
+    translator     TEXT,
+    text_body      TEXT,
+    word_for_word  TEXT,
+    source_ref     TEXT,
+    commentary     TEXT,
+    UNIQUE (index_id, language_code, translator)
+);
+
+CREATE TABLE IF NOT EXISTS library_commentaries (
+    id             INTEGER PRIMARY KEY,
+    index_id       INTEGER NOT NULL REFERENCES library_index(id),
+    language_code  TEXT    NOT NULL,
+    commentator    TEXT,
+    text_body      TEXT,
+    UNIQUE (index_id, language_code, commentator)
+);
+
+CREATE TABLE IF NOT EXISTS theological_concepts (
+    id        INTEGER PRIMARY KEY,
+    term      TEXT NOT NULL UNIQUE,
+    category  TEXT
+);
+
+CREATE TABLE IF NOT EXISTS content_tags (
+    concept_id        INTEGER NOT NULL REFERENCES theological_concepts(id),
+    library_index_id  INTEGER NOT NULL REFERENCES library_index(id),
+    relevance_score   REAL,
+    PRIMARY KEY (concept_id, library_index_id)
+);
+
+-- Modelo antigo (v6.5): um bloco de texto por tipo; ainda lido por check_db e ingestores legados
+CREATE TABLE IF NOT EXISTS library_content (
+    id             INTEGER PRIMARY KEY AUTOINCREMENT,
+    index_id       INTEGER NOT NULL REFERENCES library_index(id),
+    content_type   TEXT    NOT NULL,
+    language_code  TEXT,
+    author_source  TEXT,
+    text_body      TEXT,
+    version        INTEGER NOT NULL DEFAULT 1
+);
+
+CREATE TABLE IF NOT EXISTS pipeline_jobs (
+    job_id         INTEGER PRIMARY KEY AUTOINCREMENT,
+    job_type       TEXT NOT NULL,
+    status         TEXT NOT NULL,
+    started_at     DATETIME,
+    finished_at    DATETIME,
+    error_message  TEXT,
+    model_version  TEXT
+);
+"""
+
+# Índices comuns dos caminhos quentes (os únicos ficam em UNIQUE_INDEXES)
+LIBRARY_INDEXES_SQL = """
+CREATE INDEX IF NOT EXISTS idx_library_index_book ON library_index (book_id, num_1, num_2, num_3);
+CREATE INDEX IF NOT EXISTS idx_content_tags_verse ON content_tags (library_index_id);
+CREATE INDEX IF NOT EXISTS idx_library_content_verse ON library_content (index_id, content_type);
+"""
+
+# (nome, tabela, colunas): bancos criados antes deste módulo não têm as
+# constraints UNIQUE das tabelas acima, então elas viram índices únicos
+UNIQUE_INDEXES: Tuple[Tuple[str, str, Tuple[str, ...]], ...] = (
+    ("ux_library_books_acronym", "library_books", ("acronym",)),
+    ("ux_library_index_canonical", "library_index", ("canonical_id",)),
+    ("ux_translations_key", "library_translations", ("index_id", "language_code", "translator")),
+    ("ux_commentaries_key", "library_commentaries", ("index_id", "language_code", "commentator")),
+    ("ux_concepts_term", "theological_concepts", ("term",)),
+)
+
+# Colunas que bancos antigos podem não ter
+LIBRARY_EXTRA_COLUMNS: Dict[str, Dict[str, str]] = {
+    "library_books": {"author": "TEXT", "label_l1": "TEXT", "label_l2": "TEXT",
+                      "label_l3": "TEXT", "language_default": "TEXT"},
+    "library_index": {"num_1": "INTEGER", "num_2": "INTEGER", "num_3": "INTEGER",
+                      "page_number": "INTEGER"},
+    "library_translations": {"translator": "TEXT", "word_for_word": "TEXT",
+                             "source_ref": "TEXT", "commentary": "TEXT"},
+    "pipeline_jobs": {"model_version": "TEXT"},
+}
+
+# ----------------------------------------------------------------------
+# Auditoria de IA (SmartAIWrapper)
+# ----------------------------------------------------------------------
+AUDIT_SCHEMA_SQL = """
+CREATE TABLE IF NOT EXISTS ai_audit_logs (
+    audit_id            INTEGER PRIMARY KEY AUTOINCREMENT,
+    lecture_id          INTEGER,
+    book_id             INTEGER,
+    job_id              INTEGER,
+    model_name          TEXT    NOT NULL,
+    request_hash        TEXT    NOT NULL,
+    prompt_raw          TEXT    NOT NULL,
+    response_raw        TEXT,
+    input_tokens        INTEGER NOT NULL,
+    output_tokens       INTEGER,
+    estimated_cost_usd  REAL    NOT NULL,
+    cost_usd            REAL,
+    latency_ms          REAL,       -- tempo total da chamada
+    ttft_ms             REAL,       -- time-to-first-token (só providers em streaming)
+    status_code         TEXT    NOT NULL
+                               CHECK (status_code IN ('SUCCESS','ERROR','RATE_LIMIT','COST_BLOCKED')),
+    payload_json        TEXT,
+    created_at          DATETIME DEFAULT CURRENT_TIMESTAMP,
+    updated_at          DATETIME DEFAULT CURRENT_TIMESTAMP,
+    prompt_ref          TEXT,       -- ai_blobs.blob_hash (texto do prompt)
+    response_ref        TEXT,       -- ai_blobs.blob_hash (texto da resposta)
+    UNIQUE(request_hash, model_name)
+);
+CREATE INDEX IF NOT EXISTS idx_audit_cache_lookup
+    ON ai_audit_logs(request_hash, model_name, status_code, created_at DESC);
+CREATE INDEX IF NOT EXISTS idx_audit_status  ON ai_audit_logs(status_code);
+CREATE INDEX IF NOT EXISTS idx_audit_created ON ai_audit_logs(created_at DESC);
+"""
+
+# Colunas acrescentadas depois do schema original (bancos antigos ganham via ALTER)
+AUDIT_EXTRA_COLUMNS = {"ttft_ms": "REAL"}
 
-    ensure_slk_8_39_exists(cursor, book_id)
-    fix_slk_0_1(cursor)
-    fix_slk_13_47(cursor)
-    fix_slk_13_87(cursor)
-    
+
+def init_audit_schema(conn: sqlite3.Connection) -> None:
+    """Garante auditoria, leases, blob store e totais (roda uma vez por conexão nova)."""
+    execute_script(conn, AUDIT_SCHEMA_SQL + LEASE_SCHEMA_SQL)
+    ensure_columns(conn, "ai_audit_logs", AUDIT_EXTRA_COLUMNS)
+    init_blob_schema(conn)
+    init_rollup_schema(conn)
+
+
+# ----------------------------------------------------------------------
+# Acervo: índices e colunas em bancos antigos
+# ----------------------------------------------------------------------
+def has_unique_index(conn: sqlite3.Connection, table: str, columns: Sequence[str]) -> bool:
+    """Já existe índice único (constraint ou CREATE UNIQUE INDEX) exatamente nessas colunas?"""
+    for _, name, unique, *_ in conn.execute(f"PRAGMA index_list({table})"):
+        if unique:
+            indexed = tuple(row[2] for row in conn.execute(f"PRAGMA index_info({name})"))
+            if indexed == tuple(columns):
+                return True
+    return False
+
+
+def ensure_unique_indexes(conn: sqlite3.Connection) -> List[str]:
+    """
+    Cria os índices únicos que faltarem. Se a tabela tiver duplicatas, cria
+    um índice comum com o mesmo nome (a consulta continua indexada) e avisa.
+
+    Retorna os nomes dos índices criados.
+    """
+    created = []
+    existing = {name for (name,) in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+    for name, table, columns in UNIQUE_INDEXES:
+        if name in existing or has_unique_index(conn, table, columns):
+            continue
+        cols = ", ".join(columns)
+        try:
+            conn.execute(f"CREATE UNIQUE INDEX IF NOT EXISTS {name} ON {table} ({cols})")
+        except sqlite3.IntegrityError:
+            logger.warning(f"⚠️ {table} tem duplicatas em ({cols}); criando {name} sem UNIQUE.")
+            conn.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({cols})")
+        created.append(name)
+    return created
+
+
+def init_library_schema(conn: sqlite3.Connection) -> None:
+    """Tabelas, colunas e índices do acervo."""
+    execute_script(conn, LIBRARY_SCHEMA_SQL)
+    for table, columns in LIBRARY_EXTRA_COLUMNS.items():
+        ensure_columns(conn, table, columns)
+    execute_script(conn, LIBRARY_INDEXES_SQL)
+    ensure_unique_indexes(conn)
+
+
+# ----------------------------------------------------------------------
+def schema_version(conn: sqlite3.Connection) -> int:
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def _is_empty(conn: sqlite3.Connection) -> bool:
+    return conn.execute(
+        "SELECT COUNT(*) FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%'"
+    ).fetchone()[0] == 0
+
+
+def init_schema(conn: sqlite3.Connection) -> int:
+    """
+    Garante tabelas, colunas e índices (idempotente) e retorna a versão do banco.
+
+    Banco vazio recebe ``SCHEMA_VERSION`` direto. Banco existente mais
+    antigo só ganha o que é aditivo; a versão continua a dele até o
+    ``database_migrator.py`` aplicar os passos que faltam (reconstruções).
+    """
+    current = schema_version(conn)
+    if current > SCHEMA_VERSION:
+        logger.warning(f"⚠️ Banco na versão {current}, código na {SCHEMA_VERSION}; schema não alterado.")
+        return current
+    fresh = _is_empty(conn)
+    init_library_schema(conn)
+    init_audit_schema(conn)
     conn.commit()
+    if fresh:
+        conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        current = SCHEMA_VERSION
+    elif current < SCHEMA_VERSION:
+        logger.warning(f"⚠️ Banco na versão {current}, código na {SCHEMA_VERSION}: rode database_migrator.py.")
+    conn.execute("PRAGMA optimize")              # estatísticas para o planner
+    return current
+
+
+def connect(db_path: Union[str, Path] = DB_PATH,
+            pragmas: Sequence[Tuple[str, Union[str, int]]] = PERFORMANCE_PRAGMAS,
+            ensure_schema: bool = True) -> sqlite3.Connection:
+    """
+    Conexão com o perfil de desempenho aplicado e (por padrão) o schema
+    garantido – ponto de entrada dos mineradores e scripts de carga.
+    """
+    Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(str(db_path))
+    apply_pragmas(conn, pragmas)
+    if ensure_schema:
+        init_schema(conn)
+    return conn
+
+
+# ----------------------------------------------------------------------
+def check_schema(conn: sqlite3.Connection) -> Dict[str, object]:
+    """Relatório sem alterações: versão, tabelas/índices que faltam e PRAGMAs do arquivo."""
+    scratch = sqlite3.connect(":memory:")
+    init_library_schema(scratch)
+    scratch.executescript(AUDIT_SCHEMA_SQL + LEASE_SCHEMA_SQL)
+    expected = {
+        kind: {name for (name,) in scratch.execute(
+            "SELECT name FROM sqlite_master WHERE type = ? AND name NOT LIKE 'sqlite_%'", (kind,)
+        )}
+        for kind in ("table", "index")
+    }
+    scratch.close()
+    existing = {
+        kind: {name for (name,) in conn.execute("SELECT name FROM sqlite_master WHERE type = ?", (kind,))}
+        for kind in ("table", "index")
+    }
+    missing_indexes = sorted(expected["index"] - existing["index"])
+    # Únicos: no banco novo vêm das constraints; em bancos antigos, dos ux_*
+    missing_indexes += [
+        name for name, table, columns in UNIQUE_INDEXES
+        if table in existing["table"] and name not in existing["index"]
+        and not has_unique_index(conn, table, columns)
+    ]
+    return {
+        "user_version": schema_version(conn),
+        "schema_version": SCHEMA_VERSION,
+        "missing_tables": sorted(expected["table"] - existing["table"]),
+        "missing_indexes": missing_indexes,
+        # Só os PRAGMAs gravados no arquivo; os demais valem por conexão
+        "pragmas": {name: conn.execute(f"PRAGMA {name}").fetchone()[0]
+                    for name in ("journal_mode", "auto_vacuum", "page_size")},
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Cria/atualiza o schema do banco HariKathaAI.")
+    parser.add_argument("--db", type=Path, default=DB_PATH, help="Caminho do banco SQLite.")
+    parser.add_argument("--check", action="store_true", help="Só relata o estado, sem alterar.")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+
+    if args.check:
+        if not args.db.exists():
+            print(f"❌ Banco não encontrado: {args.db}")
+            sys.exit(1)
+        conn = sqlite3.connect(str(args.db))
+        report = check_schema(conn)
+        conn.close()
+        print(f"🗄️ user_version={report['user_version']} (código: {report['schema_version']})")
+        if report["user_version"] < report["schema_version"]:
+            print("⬆️ Banco desatualizado: python database_migrator.py --plan")
+        print(f"📋 Tabelas faltando: {', '.join(report['missing_tables']) or 'nenhuma'}")
+        print(f"📇 Índices faltando: {', '.join(report['missing_indexes']) or 'nenhum'}")
+        print("⚙️ PRAGMAs: " + ", ".join(f"{k}={v}" for k, v in report["pragmas"].items()))
+        return
+
+    conn = connect(args.db)
+    version = schema_version(conn)
     conn.close()
-    print("\n✨ Limpeza final concluída!")
+    print(f"✅ Schema pronto em {args.db} (versão {version}).")
+
 
 if __name__ == "__main__":
-    run_cleanup()
\ No newline at end of file
+    main()
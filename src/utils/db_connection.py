@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+db_connection.py – Camada de conexão SQLite compartilhada do HariKathaAI
+
+Recursos principais:
+- Uma conexão por thread (thread-local), reaproveitada entre chamadas.
+- Journal em WAL + synchronous=NORMAL (leitores nunca bloqueiam o escritor).
+- auto_vacuum=INCREMENTAL em bancos novos (o expurgo devolve espaço sem VACUUM completo).
+- Cache de prepared statements do sqlite3 (mesma string SQL = mesmo plano).
+- Script de inicialização (schema) executado só na primeira conexão.
+- Ciclo de vida explícito: ``close()`` ou uso como context manager;
+  ``release()`` (ou o fim da thread) devolve a conexão de uma thread só.
+"""
+
+import sqlite3
+import threading
+import itertools
+import weakref
+import logging
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple, Union
+
+logger = logging.getLogger("DBConnection")
+
+# PRAGMAs aplicados em toda conexão nova (ordem importa: auto_vacuum só vale
+# num banco ainda sem tabelas, por isso vem antes de tudo; depois journal_mode)
+DEFAULT_PRAGMAS: Tuple[Tuple[str, Union[str, int]], ...] = (
+    ("auto_vacuum", "INCREMENTAL"),
+    ("journal_mode", "WAL"),
+    ("synchronous", "NORMAL"),
+    ("busy_timeout", 5000),
+    ("temp_store", "MEMORY"),
+)
+
+_memory_ids = itertools.count(1)
+
+
+class _ThreadConnection:
+    """Conexão guardada no thread-local; o finalizador a fecha com a thread."""
+
+    __slots__ = ("conn", "finalizer", "__weakref__")
+
+    def __init__(self, conn: sqlite3.Connection) -> None:
+        self.conn = conn
+        self.finalizer = None
+
+
+def _discard(manager_ref, conn: sqlite3.Connection) -> None:
+    """Fecha a conexão de uma thread e a tira do gerenciador (se ainda existir)."""
+    manager = manager_ref()
+    if manager is not None:
+        with manager._lock:
+            if conn is manager._anchor:
+                return          # mantém o banco em memória vivo até close()
+            try:
+                manager._connections.remove(conn)
+            except ValueError:
+                return          # já fechada por close()
+    try:
+        conn.close()
+    except sqlite3.Error:
+        pass
+
+
+InitScript = Union[str, Callable[[sqlite3.Connection], None]]
+
+
+# ----------------------------------------------------------------------
+def apply_pragmas(conn: sqlite3.Connection, pragmas: Sequence[Tuple[str, Union[str, int]]]) -> None:
+    """Aplica ``pragmas`` em ordem; um PRAGMA recusado só gera aviso."""
+    for name, value in pragmas:
+        try:
+            conn.execute(f"PRAGMA {name}={value}")
+        except sqlite3.DatabaseError as exc:
+            logger.warning(f"⚠️ PRAGMA {name} ignorado: {exc}")
+
+
+def execute_script(conn: sqlite3.Connection, script: str) -> None:
+    """
+    Roda um script SQL statement a statement. Ao contrário de
+    ``executescript`` não faz COMMIT implícito, então pode ser usado dentro
+    de uma transação aberta (migrações).
+    """
+    statement = ""
+    for line in script.splitlines(keepends=True):
+        statement += line
+        if sqlite3.complete_statement(statement):
+            conn.execute(statement)
+            statement = ""
+    leftover = "\n".join(l for l in statement.splitlines() if not l.strip().startswith("--"))
+    if leftover.strip():
+        conn.execute(statement)                 # incompleto: deixa o sqlite3 apontar o erro
+
+
+# ----------------------------------------------------------------------
+def ensure_columns(conn: sqlite3.Connection, table: str, columns: Dict[str, str]) -> List[str]:
+    """
+    Adiciona à ``table`` as colunas de ``columns`` (nome -> tipo) que faltarem.
+
+    Retorna os nomes das colunas criadas.
+    """
+    existing = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+    added = []
+    for name, col_type in columns.items():
+        if name not in existing:
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN {name} {col_type}")
+            added.append(name)
+    return added
+
+
+# ----------------------------------------------------------------------
+class SQLiteConnectionManager:
+    """
+    Gerenciador de conexões SQLite por processo.
+
+    Cada thread recebe sua própria conexão (o sqlite3 não permite compartilhar
+    uma conexão entre threads sem lock externo); todas são fechadas juntas em
+    ``close()``. Para ``":memory:"`` é usado um banco compartilhado via URI,
+    assim todas as threads enxergam os mesmos dados.
+    """
+
+    # ------------------------------------------------------------------
+    def __init__(self,
+                 db_path: Union[str, Path],
+                 init_script: Optional[InitScript] = None,
+                 pragmas: Sequence[Tuple[str, Union[str, int]]] = DEFAULT_PRAGMAS,
+                 cached_statements: int = 256) -> None:
+        """
+        Parameters
+        ----------
+        db_path : str | Path
+            Caminho do arquivo SQLite ou ``":memory:"``.
+        init_script : str | callable | None
+            SQL (``executescript``) ou função ``f(conn)`` rodada uma vez,
+            na primeira conexão.
+        pragmas : sequência de (nome, valor)
+            PRAGMAs aplicados a cada conexão aberta.
+        cached_statements : int
+            Tamanho do cache de prepared statements por conexão.
+        """
+        self.db_path = db_path
+        self.init_script = init_script
+        self.pragmas = tuple(pragmas)
+        self.cached_statements = cached_statements
+
+        if str(db_path) == ":memory:":
+            self._target = f"file:harikatha_mem_{next(_memory_ids)}?mode=memory&cache=shared"
+            self._uri = True
+        else:
+            self._target = str(db_path)
+            self._uri = False
+
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connections: List[sqlite3.Connection] = []
+        self._initialized = False
+        # Mantém o banco em memória vivo enquanto o gerenciador existir
+        self._anchor: Optional[sqlite3.Connection] = None
+
+    # ------------------------------------------------------------------
+    def _open(self) -> sqlite3.Connection:
+        """Abre uma conexão nova, aplica PRAGMAs e (uma vez) o schema."""
+        conn = sqlite3.connect(
+            self._target,
+            uri=self._uri,
+            check_same_thread=False,
+            cached_statements=self.cached_statements,
+        )
+        apply_pragmas(conn, self.pragmas)
+
+        with self._lock:
+            if self._uri and self._anchor is None:
+                self._anchor = conn
+            if not self._initialized and self.init_script:
+                try:
+                    if callable(self.init_script):
+                        with conn:
+                            self.init_script(conn)
+                    else:
+                        conn.executescript(self.init_script)
+                except sqlite3.DatabaseError as exc:
+                    logger.warning(f"⚠️ Script de inicialização falhou: {exc}")
+            self._initialized = True
+            self._connections.append(conn)
+        return conn
+
+    # ------------------------------------------------------------------
+    def connection(self) -> sqlite3.Connection:
+        """Retorna a conexão da thread atual (abre na primeira chamada)."""
+        holder = getattr(self._local, "holder", None)
+        if holder is None:
+            holder = _ThreadConnection(self._open())
+            # Quando a thread termina o thread-local é descartado e o
+            # finalizador devolve a conexão (threads de pool/stream curtas)
+            # (referência fraca ao gerenciador: o finalizador não o mantém vivo)
+            holder.finalizer = weakref.finalize(holder, _discard, weakref.ref(self), holder.conn)
+            self._local.holder = holder
+        return holder.conn
+
+    # ------------------------------------------------------------------
+    def release(self) -> None:
+        """
+        Fecha e esquece a conexão da thread atual.
+
+        Para workers de vida curta: a próxima chamada a ``connection()``
+        nesta thread abre uma conexão nova. Sem efeito se a thread não
+        tiver conexão.
+        """
+        holder = getattr(self._local, "holder", None)
+        if holder is not None:
+            self._local.holder = None
+            holder.finalizer()
+
+    # ------------------------------------------------------------------
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        """Bloco transacional na conexão da thread (commit/rollback automático)."""
+        conn = self.connection()
+        with conn:
+            yield conn
+
+    # ------------------------------------------------------------------
+    def close(self) -> None:
+        """
+        Fecha todas as conexões abertas pelo gerenciador.
+
+        O gerenciador pode ser reutilizado depois: a próxima chamada a
+        ``connection()`` reabre (e reinicializa) a conexão da thread.
+        """
+        with self._lock:
+            self._initialized = False
+            conns, self._connections = self._connections, []
+            self._anchor = None
+        for conn in conns:
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
+        self._local = threading.local()
+
+    # ------------------------------------------------------------------
+    def __enter__(self) -> "SQLiteConnectionManager":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
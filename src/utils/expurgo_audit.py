@@ -0,0 +1,390 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+expurgo_audit.py – Política de expurgo da tabela ai_audit_logs
+
+Etapas (ver README, "Política de expurgo"):
+1. Seleção   – linhas com ``created_at`` anterior ao corte (``--days``),
+               opcionalmente preservando as SUCCESS (``--keep-success``).
+2. Backup    – exporta as linhas para ``backup/ai_audit_logs_<timestamp>.csv``
+               em streaming (cursor + ``fetchmany``), já com prompt/resposta
+               reidratados do blob store.
+3. Exclusão  – DELETE em blocos de ``--chunk`` ids, uma transação curta por
+               bloco, para nunca travar os escritores da ingestão por muito tempo.
+4. Blobs     – remove de ``ai_blobs`` o que ficou sem referência.
+5. Espaço    – ``PRAGMA incremental_vacuum`` em passos (exige
+               ``auto_vacuum=INCREMENTAL``; ``--convert`` faz a conversão
+               única de bancos antigos, que custa um VACUUM completo).
+
+Uso:
+    python src/utils/expurgo_audit.py [--days 90] [--keep-success] [--dry-run]
+"""
+
+import sys
+import csv
+import time
+import logging
+import argparse
+import sqlite3
+from pathlib import Path
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+try:                                    # importado como pacote (src.utils.expurgo_audit)
+    from .db_connection import SQLiteConnectionManager
+    from .blob_store import decompress
+except ImportError:                     # importado via sys.path / executado direto
+    from db_connection import SQLiteConnectionManager
+    from blob_store import decompress
+
+BASE_DIR = Path(__file__).resolve().parent.parent.parent
+DB_PATH = BASE_DIR / "database" / "harikatha.db"
+BACKUP_DIR = BASE_DIR / "backup"
+LOG_DIR = BASE_DIR / "logs"
+
+DEFAULT_DAYS = 90
+DEFAULT_CHUNK = 1000
+DEFAULT_PAUSE = 0.05            # respiro (s) entre blocos para os escritores
+DEFAULT_VACUUM_STEP = 2000      # páginas devolvidas por incremental_vacuum
+
+AUTO_VACUUM_MODES = {0: "NONE", 1: "FULL", 2: "INCREMENTAL"}
+
+CSV_COLUMNS = [
+    "audit_id", "lecture_id", "book_id", "job_id", "model_name", "request_hash",
+    "prompt_raw", "response_raw", "input_tokens", "output_tokens",
+    "estimated_cost_usd", "cost_usd", "latency_ms", "status_code",
+    "payload_json", "created_at", "updated_at",
+]
+
+logger = logging.getLogger("Expurgo")
+
+
+# ----------------------------------------------------------------------
+# Critério de corte
+# ----------------------------------------------------------------------
+def cutoff_for(days: int, now: Optional[datetime] = None) -> str:
+    """Data de corte no formato de ``CURRENT_TIMESTAMP`` (UTC)."""
+    now = now or datetime.now(timezone.utc)
+    return (now - timedelta(days=days)).strftime("%Y-%m-%d %H:%M:%S")
+
+
+def _where(keep_success: bool, alias: str = "") -> str:
+    p = f"{alias}." if alias else ""
+    clause = f"{p}created_at < :cutoff"
+    if keep_success:
+        clause += f" AND {p}status_code <> 'SUCCESS'"
+    return clause
+
+
+def _has_table(conn: sqlite3.Connection, name: str) -> bool:
+    row = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (name,)
+    ).fetchone()
+    return row is not None
+
+
+def _has_column(conn: sqlite3.Connection, table: str, column: str) -> bool:
+    return any(r[1] == column for r in conn.execute(f"PRAGMA table_info({table})"))
+
+
+# ----------------------------------------------------------------------
+# 1. Seleção
+# ----------------------------------------------------------------------
+def count_candidates(conn: sqlite3.Connection, cutoff: str, keep_success: bool) -> Dict[str, int]:
+    """Quantidade de linhas a expurgar, por status."""
+    rows = conn.execute(
+        f"SELECT status_code, COUNT(*) FROM ai_audit_logs "
+        f"WHERE {_where(keep_success)} GROUP BY status_code",
+        {"cutoff": cutoff},
+    ).fetchall()
+    return {status: n for status, n in rows}
+
+
+# ----------------------------------------------------------------------
+# 2. Backup CSV (streaming)
+# ----------------------------------------------------------------------
+def export_csv(conn: sqlite3.Connection,
+               cutoff: str,
+               keep_success: bool,
+               target: Path,
+               fetch_size: int = DEFAULT_CHUNK) -> Tuple[int, int]:
+    """
+    Exporta as linhas candidatas para ``target`` sem carregá-las na memória.
+
+    Retorna ``(linhas_exportadas, maior_audit_id)``; a exclusão depois fica
+    limitada a esse id, então nada que não está no CSV é apagado.
+    """
+    with_blobs = _has_table(conn, "ai_blobs") and _has_column(conn, "ai_audit_logs", "prompt_ref")
+    base_cols = ", ".join(f"l.{c}" for c in CSV_COLUMNS)
+    if with_blobs:
+        sql = (
+            f"SELECT {base_cols}, pb.codec, pb.data, rb.codec, rb.data "
+            f"FROM ai_audit_logs l "
+            f"LEFT JOIN ai_blobs pb ON pb.blob_hash = l.prompt_ref "
+            f"LEFT JOIN ai_blobs rb ON rb.blob_hash = l.response_ref "
+            f"WHERE {_where(keep_success, 'l')} ORDER BY l.audit_id"
+        )
+    else:
+        sql = f"SELECT {base_cols} FROM ai_audit_logs l WHERE {_where(keep_success, 'l')} ORDER BY l.audit_id"
+
+    prompt_idx = CSV_COLUMNS.index("prompt_raw")
+    response_idx = CSV_COLUMNS.index("response_raw")
+    n_cols = len(CSV_COLUMNS)
+
+    target.parent.mkdir(parents=True, exist_ok=True)
+    exported, max_id = 0, 0
+    cur = conn.execute(sql, {"cutoff": cutoff})
+    with open(target, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(CSV_COLUMNS)
+        while True:
+            batch = cur.fetchmany(fetch_size)
+            if not batch:
+                break
+            for row in batch:
+                out = list(row[:n_cols])
+                if with_blobs:
+                    p_codec, p_data, r_codec, r_data = row[n_cols:]
+                    if p_data is not None:
+                        out[prompt_idx] = decompress(p_codec, p_data)
+                    if r_data is not None:
+                        out[response_idx] = decompress(r_codec, r_data)
+                writer.writerow(out)
+            exported += len(batch)
+            max_id = batch[-1][0]
+    return exported, max_id
+
+
+# ----------------------------------------------------------------------
+# 3. Exclusão em blocos
+# ----------------------------------------------------------------------
+def delete_in_chunks(db: SQLiteConnectionManager,
+                     cutoff: str,
+                     keep_success: bool,
+                     max_id: int,
+                     chunk_size: int = DEFAULT_CHUNK,
+                     pause: float = DEFAULT_PAUSE) -> int:
+    """
+    Apaga as linhas candidatas com ``audit_id <= max_id`` em blocos.
+
+    Cada bloco é uma transação curta (SELECT dos ids + DELETE por chave
+    primária); entre blocos o lock de escrita fica livre por ``pause`` s.
+    """
+    select_ids = (
+        f"SELECT audit_id FROM ai_audit_logs "
+        f"WHERE audit_id > :last AND audit_id <= :max_id AND {_where(keep_success)} "
+        f"ORDER BY audit_id LIMIT :limit"
+    )
+    last_id, deleted = 0, 0
+    while True:
+        with db.transaction() as conn:
+            ids = [r[0] for r in conn.execute(
+                select_ids,
+                {"last": last_id, "max_id": max_id, "cutoff": cutoff, "limit": chunk_size},
+            )]
+            if not ids:
+                break
+            conn.execute(
+                f"DELETE FROM ai_audit_logs WHERE audit_id IN ({','.join('?' * len(ids))})",
+                ids,
+            )
+        last_id = ids[-1]
+        deleted += len(ids)
+        logger.info(f"🗑️ [EXPURGO] {deleted} linhas removidas (até audit_id={last_id})")
+        if pause:
+            time.sleep(pause)
+    return deleted
+
+
+# ----------------------------------------------------------------------
+# 4. Blobs órfãos
+# ----------------------------------------------------------------------
+def collect_orphan_blobs(db: SQLiteConnectionManager,
+                         chunk_size: int = DEFAULT_CHUNK,
+                         pause: float = DEFAULT_PAUSE) -> int:
+    """
+    Remove blobs sem nenhuma linha de auditoria apontando para eles.
+
+    A checagem de referência roda dentro da transação do DELETE, então um
+    blob regravado por um flush concorrente nunca é apagado por engano.
+    """
+    conn = db.connection()
+    if not _has_table(conn, "ai_blobs") or not _has_column(conn, "ai_audit_logs", "prompt_ref"):
+        return 0
+
+    last_hash, removed = "", 0
+    while True:
+        with db.transaction() as conn:
+            hashes = [r[0] for r in conn.execute(
+                "SELECT blob_hash FROM ai_blobs WHERE blob_hash > ? ORDER BY blob_hash LIMIT ?",
+                (last_hash, chunk_size),
+            )]
+            if not hashes:
+                break
+            cur = conn.execute(
+                f"""
+                DELETE FROM ai_blobs
+                WHERE blob_hash IN ({','.join('?' * len(hashes))})
+                  AND NOT EXISTS (SELECT 1 FROM ai_audit_logs WHERE prompt_ref = ai_blobs.blob_hash)
+                  AND NOT EXISTS (SELECT 1 FROM ai_audit_logs WHERE response_ref = ai_blobs.blob_hash)
+                """,
+                hashes,
+            )
+            removed += cur.rowcount
+        last_hash = hashes[-1]
+        if pause:
+            time.sleep(pause)
+    if removed:
+        logger.info(f"🧺 [BLOBS] {removed} blobs órfãos removidos.")
+    return removed
+
+
+# ----------------------------------------------------------------------
+# 5. Recuperação de espaço
+# ----------------------------------------------------------------------
+def reclaim_space(conn: sqlite3.Connection,
+                  step: int = DEFAULT_VACUUM_STEP,
+                  convert: bool = False) -> int:
+    """
+    Devolve páginas livres ao sistema com ``incremental_vacuum``.
+
+    Em bancos criados sem ``auto_vacuum=INCREMENTAL`` nada é feito, a menos
+    que ``convert`` seja True (conversão única: VACUUM completo).
+    Retorna o número de páginas liberadas.
+    """
+    mode = conn.execute("PRAGMA auto_vacuum").fetchone()[0]
+    if mode != 2:
+        if not convert:
+            logger.warning(
+                f"⚠️ auto_vacuum={AUTO_VACUUM_MODES.get(mode, mode)}: espaço não devolvido. "
+                "Rode uma vez com --convert para ativar o modo INCREMENTAL."
+            )
+            return 0
+        logger.info("🧹 Convertendo para auto_vacuum=INCREMENTAL (VACUUM completo, uma única vez)...")
+        before = conn.execute("PRAGMA page_count").fetchone()[0]
+        conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        conn.execute("VACUUM")
+        return max(0, before - conn.execute("PRAGMA page_count").fetchone()[0])
+
+    freed = 0
+    while True:
+        free = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        if free == 0:
+            break
+        n = min(step, free)
+        conn.execute(f"PRAGMA incremental_vacuum({int(n)})").fetchall()
+        freed += n
+    try:
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchall()
+    except sqlite3.DatabaseError as exc:
+        logger.warning(f"⚠️ Checkpoint do WAL adiado: {exc}")
+    if freed:
+        logger.info(f"🧹 [VACUUM] {freed} páginas devolvidas ao disco.")
+    return freed
+
+
+# ----------------------------------------------------------------------
+# Orquestração
+# ----------------------------------------------------------------------
+def run_expurgo(db_path: Union[str, Path] = DB_PATH,
+                days: int = DEFAULT_DAYS,
+                keep_success: bool = False,
+                dry_run: bool = False,
+                backup_dir: Union[str, Path] = BACKUP_DIR,
+                chunk_size: int = DEFAULT_CHUNK,
+                pause: float = DEFAULT_PAUSE,
+                vacuum_step: int = DEFAULT_VACUUM_STEP,
+                convert: bool = False) -> Dict[str, Any]:
+    """Executa o expurgo completo. Retorna um resumo com os contadores."""
+    cutoff = cutoff_for(days)
+    summary: Dict[str, Any] = {
+        "cutoff": cutoff, "candidates": 0, "exported": 0, "deleted": 0,
+        "blobs_removed": 0, "pages_freed": 0, "backup": None,
+    }
+
+    with SQLiteConnectionManager(db_path) as db:
+        conn = db.connection()
+        if not _has_table(conn, "ai_audit_logs"):
+            logger.warning("⚠️ Tabela ai_audit_logs não existe; nada a fazer.")
+            return summary
+
+        by_status = count_candidates(conn, cutoff, keep_success)
+        summary["candidates"] = sum(by_status.values())
+        summary["by_status"] = by_status
+        logger.info(
+            f"🔎 [EXPURGO] {summary['candidates']} linhas anteriores a {cutoff} UTC "
+            f"{'(SUCCESS preservadas) ' if keep_success else ''}{by_status}"
+        )
+        if dry_run:
+            logger.info("🧪 --dry-run: nada foi exportado nem apagado.")
+            return summary
+
+        if summary["candidates"]:
+            stamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            target = Path(backup_dir) / f"ai_audit_logs_{stamp}.csv"
+            exported, max_id = export_csv(conn, cutoff, keep_success, target, chunk_size)
+            summary["exported"], summary["backup"] = exported, str(target)
+            logger.info(f"💾 [BACKUP] {exported} linhas exportadas para {target}")
+
+            summary["deleted"] = delete_in_chunks(db, cutoff, keep_success, max_id, chunk_size, pause)
+
+        with db.transaction() as conn:
+            if _has_table(conn, "ai_inflight_leases"):
+                conn.execute("DELETE FROM ai_inflight_leases WHERE expires_at < ?", (time.time(),))
+
+        summary["blobs_removed"] = collect_orphan_blobs(db, chunk_size, pause)
+        summary["pages_freed"] = reclaim_space(db.connection(), vacuum_step, convert)
+
+    logger.info(
+        f"✅ Expurgo concluído: {summary['deleted']} linhas, "
+        f"{summary['blobs_removed']} blobs, {summary['pages_freed']} páginas liberadas."
+    )
+    return summary
+
+
+# ----------------------------------------------------------------------
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Expurgo da auditoria de IA (ai_audit_logs)")
+    parser.add_argument("--db", default=str(DB_PATH))
+    parser.add_argument("--days", type=int, default=DEFAULT_DAYS,
+                        help="Remove registros mais antigos que N dias (padrão 90)")
+    parser.add_argument("--keep-success", action="store_true",
+                        help="Preserva registros SUCCESS independentemente da idade")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="Mostra o que seria excluído sem apagar nada")
+    parser.add_argument("--backup-dir", default=str(BACKUP_DIR))
+    parser.add_argument("--chunk", type=int, default=DEFAULT_CHUNK,
+                        help="Linhas por transação de DELETE")
+    parser.add_argument("--pause", type=float, default=DEFAULT_PAUSE,
+                        help="Pausa (s) entre blocos, para os escritores")
+    parser.add_argument("--vacuum-step", type=int, default=DEFAULT_VACUUM_STEP,
+                        help="Páginas por passo de incremental_vacuum")
+    parser.add_argument("--convert", action="store_true",
+                        help="Converte o banco para auto_vacuum=INCREMENTAL (VACUUM completo único)")
+    args = parser.parse_args(argv)
+
+    LOG_DIR.mkdir(parents=True, exist_ok=True)
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s [%(levelname)s] %(message)s",
+        handlers=[
+            logging.FileHandler(LOG_DIR / "expurgo.log", encoding="utf-8"),
+            logging.StreamHandler(sys.stdout),
+        ],
+    )
+    run_expurgo(
+        db_path=args.db,
+        days=args.days,
+        keep_success=args.keep_success,
+        dry_run=args.dry_run,
+        backup_dir=args.backup_dir,
+        chunk_size=args.chunk,
+        pause=args.pause,
+        vacuum_step=args.vacuum_step,
+        convert=args.convert,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -3,48 +3,32 @@ import sqlite3
 import json
 import os
 import time
-import google.generativeai as genai
 from dotenv import load_dotenv
+from provider_registry import get_provider
+from rate_controller import AdaptiveRateController, CircuitOpenError
+from prompt_registry import get_prompt
 
 load_dotenv()
-genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
 
 # CONFIGURAÇÕES
 DB_PATH = "database/harikatha.db"
 PDF_PATH = "Gaudiya-Giti-guccha-7th-ed-2016.pdf"
 BOOK_ID = 10  # Verifique se este ID está livre ou crie um novo para o Giti Guccha
+MODEL = 'gemini-2.0-flash'
+
+# Adapter único (SDK configurado e modelo criado uma vez, não a cada página)
+gemini_json = get_provider("gemini", json_mode=True)
+SONG_PAGE_PROMPT = get_prompt("ingest.giti_guccha_page")   # config/prompts.yaml
 
 def parse_song_page(text, page_num):
-    model = genai.GenerativeModel(
-        model_name='gemini-2.0-flash',
-        generation_config={"response_mime_type": "application/json"}
-    )
-    
-    prompt = f"""
-    Analyze this page from 'Gaudiya Giti-guccha'. Extract songs into JSON.
-    Songs often have a title, an author, and numbered stanzas.
-    
-    STRUCTURE:
-    [{{
-      "title": "string",
-      "author": "string",
-      "section": "string",
-      "content": [
-        {{
-          "stanza_number": int,
-          "original_text": "string",
-          "translation": "string"
-        }}
-      ]
-    }}]
-    TEXT: {text}
-    """
-    
+    prompt = SONG_PAGE_PROMPT.bind(text=text).text
+
+    # Erros da API sobem para o controlador de ritmo (429 → backoff)
+    response_text = gemini_json(prompt, MODEL)
     try:
-        response = model.generate_content(prompt)
-        return json.loads(response.text)
-    except Exception as e:
-        print(f"⚠️ Erro na página {page_num}: {e}")
+        return json.loads(response_text)
+    except json.JSONDecodeError as e:
+        print(f"⚠️ JSON inválido na página {page_num}: {e}")
         return None
 
 def save_song_to_db(conn, song, page_num):
@@ -93,6 +77,9 @@ def main():
     doc = fitz.open(PDF_PATH)
     
     print(f"🚀 Iniciando ingestão do Giti-guccha ({len(doc)} páginas)...")
+
+    # Sem pausa fixa: o ritmo só diminui quando a cota reclama (429)
+    controller = AdaptiveRateController(name=f"gemini:{MODEL}")
     
     # Sugestão: Começar após o índice (ex: página 20)
     for i in range(20, len(doc)):
@@ -101,15 +88,26 @@ def main():
         
         if len(text) < 100: continue
         
-        songs = parse_song_page(text, i+1)
+        songs = None
+        while True:
+            try:
+                songs = controller.call(parse_song_page, text, i+1)
+            except CircuitOpenError as e:
+                # Provider fora do ar: espera o circuito e repete a mesma página
+                print(f"🛑 {e} – aguardando antes de retomar.")
+                time.sleep(e.retry_in)
+                continue
+            except Exception as e:
+                print(f"⚠️ Erro na página {i+1}: {e}")
+            break
+
         if songs:
             if isinstance(songs, list):
                 for s in songs: save_song_to_db(conn, s, i+1)
             else:
                 save_song_to_db(conn, songs, i+1)
-        
-        # Como você é Tier 1, um delay de 2s é seguro e rápido
-        time.sleep(2)
+
+    print(f"📊 Ritmo final: {controller.stats()}")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -1,20 +1,24 @@
 import fitz
 import sqlite3
 import json
-import os
-import time
 import logging
-import google.generativeai as genai
 from dotenv import load_dotenv
+from provider_registry import get_provider
+from rate_controller import AdaptiveRateController, CircuitOpenError
+from prompt_registry import get_prompt
 
 load_dotenv()
-genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(message)s')
 logger = logging.getLogger("Ingest_Checkpointed")
 
 DB_PATH = "database/harikatha.db"
 PDF_PATH = "downloads/Sri_Slokamritam.pdf"
 
+# Usando o Flash 2.0 que é o mais rápido e estável para você agora
+MODEL = 'gemini-2.0-flash'
+gemini = get_provider("gemini")   # construído uma vez por processo
+PAGE_PROMPT = get_prompt("ingest.slokamrtam_page")   # config/prompts.yaml
+
 def verse_exists(conn, page_num):
     """Verifica se já processamos esta página (evita gasto de cota)."""
     cursor = conn.cursor()
@@ -23,17 +27,16 @@ def verse_exists(conn, page_num):
     return cursor.fetchone() is not None
 
 def parse_page(text, page_num):
-    # Usando o Flash 2.0 que é o mais rápido e estável para você agora
-    model = genai.GenerativeModel('gemini-2.0-flash')
-    prompt = f"Extract verses from page {page_num} into JSON: [{{'chapter_number': int, 'verse_number': int, 'topic_name': str, 'internal_ref': str, 'sanskrit_roman': str, 'synonyms': str, 'translation': str}}]. TEXT: {text}"
+    prompt = PAGE_PROMPT.bind(page_num=page_num, text=text).text
     
+    # Erros da API sobem para o controlador de ritmo (429 → backoff)
+    response_text = gemini(prompt, MODEL)
+    # Limpeza básica de Markdown se houver
+    json_text = response_text.replace("```json", "").replace("```", "").strip()
     try:
-        response = model.generate_content(prompt)
-        # Limpeza básica de Markdown se houver
-        json_text = response.text.replace("```json", "").replace("```", "").strip()
         return json.loads(json_text)
-    except Exception as e:
-        logger.error(f"❌ Erro na página {page_num}: {e}")
+    except json.JSONDecodeError as e:
+        logger.error(f"❌ JSON inválido na página {page_num}: {e}")
         return None
 
 def save_verse(conn, v, page_num):
@@ -57,7 +60,10 @@ def save_verse(conn, v, page_num):
 def main():
     conn = sqlite3.connect(DB_PATH)
     doc = fitz.open(PDF_PATH)
-    
+
+    # Ritmo adaptativo no lugar das pausas fixas de 3s/10s
+    controller = AdaptiveRateController(name=f"gemini:{MODEL}")
+
     for i in range(30, len(doc)):
         page_num = i + 1
         
@@ -66,18 +72,24 @@ def main():
             continue
             
         logger.info(f"📄 Processando página {page_num}...")
-        data = parse_page(doc[i].get_text(), page_num)
-        
+        try:
+            data = controller.call(parse_page, doc[i].get_text(), page_num)
+        except CircuitOpenError as e:
+            # Checkpoint por página: basta rodar de novo mais tarde
+            logger.error(f"🛑 {e}. Interrompendo; rode novamente para retomar.")
+            break
+        except Exception as e:
+            logger.error(f"❌ Erro na página {page_num}: {e}")
+            continue
+
+
         if data:
             verses = data if isinstance(data, list) else [data]
             for v in verses:
                 save_verse(conn, v, page_num)
             logger.info(f"✅ Página {page_num} salva.")
-            # Espera 3 segundos entre páginas para manter o Tier 1 estável
-            time.sleep(3)
-        else:
-            # Se falhar, esperamos mais tempo para o cooldown
-            time.sleep(10)
+
+    logger.info(f"📊 Ritmo final: {controller.stats()}")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+job_planner.py – Plano de custo/tempo de um job inteiro (dry-run do gatekeeper)
+
+O gatekeeper do SmartAIWrapper avalia um prompt por vez, na hora da
+chamada. O ``JobPlan`` avalia a fila inteira de uma vez (ver
+``SmartAIWrapper.plan_job``): tokens, hits de cache previstos, custo
+estimado e tempo de parede numa dada concorrência. Aprovado uma vez,
+o plano roda com ``SmartAIWrapper.run_plan`` sem confirmação por chamada.
+"""
+
+import math
+from typing import Any, Dict, List, Optional, Sequence
+
+# Latência assumida quando ainda não há histórico do modelo na auditoria
+DEFAULT_LATENCY_MS = 2000.0
+
+
+# ----------------------------------------------------------------------
+class JobPlan:
+    """
+    Resultado do planejamento de uma fila de prompts.
+
+    ``items`` traz uma entrada por prompt (na ordem da fila) com
+    ``request_hash``, ``cached``, ``duplicate``, ``input_tokens``,
+    ``est_output_tokens`` e ``est_cost``. Prompts em cache ou repetidos
+    na própria fila têm custo zero (single-flight / cache).
+    """
+
+    # ------------------------------------------------------------------
+    def __init__(self,
+                 model: str,
+                 prompts: Sequence[Any],
+                 items: List[Dict[str, Any]],
+                 concurrency: int,
+                 avg_latency_ms: float,
+                 cost_limit: float,
+                 rate_limit: Optional[float] = None) -> None:
+        self.model = model
+        self.prompts = list(prompts)
+        self.items = items
+        self.concurrency = max(1, int(concurrency))
+        self.avg_latency_ms = avg_latency_ms
+        self.cost_limit = cost_limit
+        self.rate_limit = rate_limit
+        self.approved = False
+
+        calls = [it for it in items if not it["cached"] and not it["duplicate"]]
+        self.n_prompts = len(items)
+        self.n_cached = sum(1 for it in items if it["cached"])
+        self.n_duplicates = sum(1 for it in items if it["duplicate"])
+        self.n_calls = len(calls)
+        self.input_tokens = sum(it["input_tokens"] for it in calls)
+        self.est_output_tokens = sum(it["est_output_tokens"] for it in calls)
+        self.est_cost = sum(it["est_cost"] for it in calls)
+        # Prompts que o gatekeeper barraria um a um
+        self.over_limit = [it["index"] for it in calls if it["est_cost"] > cost_limit]
+
+        waves = math.ceil(self.n_calls / self.concurrency)
+        seconds = waves * avg_latency_ms / 1000.0
+        if rate_limit:
+            seconds = max(seconds, self.n_calls / rate_limit)
+        self.est_wall_seconds = seconds
+
+    # ------------------------------------------------------------------
+    def approve(self) -> "JobPlan":
+        """Marca o plano como aprovado (libera ``run_plan``)."""
+        self.approved = True
+        return self
+
+    # ------------------------------------------------------------------
+    def to_dict(self) -> Dict[str, Any]:
+        """Totais do plano (sem os prompts), prontos para JSON/log."""
+        return {
+            "model": self.model,
+            "prompts": self.n_prompts,
+            "cached": self.n_cached,
+            "duplicates": self.n_duplicates,
+            "calls": self.n_calls,
+            "input_tokens": self.input_tokens,
+            "est_output_tokens": self.est_output_tokens,
+            "est_cost_usd": round(self.est_cost, 6),
+            "over_limit": len(self.over_limit),
+            "concurrency": self.concurrency,
+            "avg_latency_ms": round(self.avg_latency_ms, 1),
+            "est_wall_seconds": round(self.est_wall_seconds, 1),
+            "approved": self.approved,
+        }
+
+    # ------------------------------------------------------------------
+    def summary(self) -> str:
+        """Resumo legível para o terminal (usado antes da aprovação)."""
+        lines = [
+            f"📋 Plano do job – modelo {self.model}",
+            f"   Prompts: {self.n_prompts} | em cache: {self.n_cached} | "
+            f"repetidos: {self.n_duplicates} | chamadas pagas: {self.n_calls}",
+            f"   Tokens: entrada {self.input_tokens} | saída≈{self.est_output_tokens}",
+            f"   Custo estimado: ${self.est_cost:.4f}",
+            f"   Tempo estimado: {self.est_wall_seconds:.0f}s com {self.concurrency} workers "
+            f"(latência média {self.avg_latency_ms:.0f}ms)",
+        ]
+        if self.over_limit:
+            lines.append(
+                f"   ⚠️ {len(self.over_limit)} prompts acima do limite por chamada "
+                f"(${self.cost_limit:.2f}) – liberados se o plano for aprovado."
+            )
+        return "\n".join(lines)
+
+    def __repr__(self) -> str:
+        return f"JobPlan({self.to_dict()})"
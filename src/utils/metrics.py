@@ -0,0 +1,326 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+metrics.py – Métricas em processo (contadores, gauges, histogramas)
+
+Registro leve, sem dependências, para enxergar cauda de latência e
+eficiência de cache durante ingestões longas:
+- ``Counter`` / ``Gauge`` / ``Histogram`` com labels (thread-safe).
+- Histogramas com baldes fixos; p50/p95/p99 por interpolação linear
+  dentro do balde (mesma estimativa do ``histogram_quantile`` do Prometheus).
+- Exportação em texto do Prometheus ou JSON (``dump`` para ``logs/``) e
+  endpoint HTTP local opcional (``serve``: ``/metrics`` e ``/metrics.json``).
+"""
+
+import json
+import math
+import logging
+import threading
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple, Union
+
+BASE_DIR = Path(__file__).resolve().parent.parent.parent
+LOG_DIR = BASE_DIR / "logs"
+
+# Baldes padrão (ms) – de respostas em cache até chamadas longas de LLM
+LATENCY_BUCKETS_MS: Tuple[float, ...] = (
+    5, 10, 25, 50, 100, 250, 500, 1000, 2000, 5000, 10000, 30000, 60000,
+)
+TOKENS_PER_SECOND_BUCKETS: Tuple[float, ...] = (1, 5, 10, 25, 50, 100, 200, 500, 1000, 2000)
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+logger = logging.getLogger("Metrics")
+
+LabelValues = Tuple[str, ...]
+
+
+# ----------------------------------------------------------------------
+class _Family:
+    """Uma métrica com nome/ajuda/labels; cada combinação de labels é uma série."""
+
+    kind = "untyped"
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = ()) -> None:
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._series: Dict[LabelValues, Any] = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, Any]) -> LabelValues:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name}: labels esperados {self.labelnames}, recebidos {tuple(labels)}")
+        return tuple(str(labels[n]) for n in self.labelnames)
+
+    def _new_series(self) -> Any:
+        raise NotImplementedError
+
+    def labels(self, **labels: Any) -> Any:
+        key = self._key(labels)
+        series = self._series.get(key)
+        if series is None:
+            with self._lock:
+                series = self._series.setdefault(key, self._new_series())
+        return series
+
+    def series(self) -> Iterator[Tuple[Dict[str, str], Any]]:
+        with self._lock:
+            items = list(self._series.items())
+        for key, series in items:
+            yield dict(zip(self.labelnames, key)), series
+
+
+# ----------------------------------------------------------------------
+class _Value:
+    __slots__ = ("value", "_lock")
+
+    def __init__(self) -> None:
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self.value -= amount
+
+    def set(self, value: float) -> None:
+        with self._lock:
+            self.value = value
+
+
+class Counter(_Family):
+    kind = "counter"
+
+    def _new_series(self) -> _Value:
+        return _Value()
+
+
+class Gauge(_Family):
+    kind = "gauge"
+
+    def _new_series(self) -> _Value:
+        return _Value()
+
+
+# ----------------------------------------------------------------------
+class _HistogramSeries:
+    __slots__ = ("bounds", "counts", "sum", "count", "_lock")
+
+    def __init__(self, bounds: Tuple[float, ...]) -> None:
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)        # último = +Inf
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        index = bisect_left(self.bounds, value)     # balde "le": valor <= limite
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    def snapshot(self) -> Tuple[List[int], float, int]:
+        with self._lock:
+            return list(self.counts), self.sum, self.count
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Estimativa do quantil ``q`` (interpolação linear no balde)."""
+        counts, _, total = self.snapshot()
+        if not total:
+            return None
+        rank = q * total
+        seen = 0
+        for i, count in enumerate(counts):
+            if count and seen + count >= rank:
+                if i == len(self.bounds):           # balde +Inf: só o limite conhecido
+                    return float(self.bounds[-1])
+                lower = self.bounds[i - 1] if i else 0.0
+                return lower + (self.bounds[i] - lower) * (rank - seen) / count
+            seen += count
+        return float(self.bounds[-1])
+
+
+class Histogram(_Family):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS_MS) -> None:
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_series(self) -> _HistogramSeries:
+        return _HistogramSeries(self.buckets)
+
+
+# ----------------------------------------------------------------------
+def _fmt(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels_text(labels: Dict[str, str], extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(labels.items()) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(str(v))}"' for k, v in pairs) + "}"
+
+
+class MetricsRegistry:
+    """
+    Conjunto de métricas do processo/wrapper.
+
+    ``counter`` / ``gauge`` / ``histogram`` devolvem a família existente se
+    o nome já foi registrado (o tipo precisa bater).
+    """
+
+    def __init__(self) -> None:
+        self._families: Dict[str, _Family] = {}
+        self._lock = threading.Lock()
+        self._server: Optional[ThreadingHTTPServer] = None
+
+    # ------------------------------------------------------------------
+    def _register(self, cls: type, name: str, help_text: str,
+                  labelnames: Sequence[str], **kwargs: Any) -> Any:
+        with self._lock:
+            family = self._families.get(name)
+            if family is None:
+                family = cls(name, help_text, labelnames, **kwargs)
+                self._families[name] = family
+            elif not isinstance(family, cls):
+                raise ValueError(f"Métrica '{name}' já registrada como {family.kind}")
+            return family
+
+    def counter(self, name: str, help_text: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter, name, help_text, labelnames)
+
+    def gauge(self, name: str, help_text: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge, name, help_text, labelnames)
+
+    def histogram(self, name: str, help_text: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS_MS) -> Histogram:
+        return self._register(Histogram, name, help_text, labelnames, buckets=buckets)
+
+    def families(self) -> List[_Family]:
+        with self._lock:
+            return list(self._families.values())
+
+    # ------------------------------------------------------------------
+    def to_prometheus(self) -> str:
+        """Formato de texto de exposição do Prometheus (0.0.4)."""
+        lines: List[str] = []
+        for family in self.families():
+            lines.append(f"# HELP {family.name} {family.help}")
+            lines.append(f"# TYPE {family.name} {family.kind}")
+            for labels, series in family.series():
+                if isinstance(series, _HistogramSeries):
+                    counts, total_sum, total = series.snapshot()
+                    cumulative = 0
+                    for bound, count in zip(series.bounds + (math.inf,), counts):
+                        cumulative += count
+                        lines.append(
+                            f"{family.name}_bucket{_labels_text(labels, ('le', _fmt(bound)))} {cumulative}"
+                        )
+                    lines.append(f"{family.name}_sum{_labels_text(labels)} {_fmt(total_sum)}")
+                    lines.append(f"{family.name}_count{_labels_text(labels)} {total}")
+                else:
+                    lines.append(f"{family.name}{_labels_text(labels)} {_fmt(series.value)}")
+        return "\n".join(lines) + "\n"
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Instantâneo em dicionário (histogramas já com p50/p95/p99)."""
+        result: Dict[str, Any] = {}
+        for family in self.families():
+            entries = []
+            for labels, series in family.series():
+                if isinstance(series, _HistogramSeries):
+                    counts, total_sum, total = series.snapshot()
+                    entry = {
+                        "labels": labels,
+                        "count": total,
+                        "sum": round(total_sum, 3),
+                        "mean": round(total_sum / total, 3) if total else None,
+                    }
+                    for q in QUANTILES:
+                        value = series.quantile(q)
+                        entry[f"p{int(q * 100)}"] = round(value, 3) if value is not None else None
+                    entries.append(entry)
+                else:
+                    entries.append({"labels": labels, "value": series.value})
+            result[family.name] = {"type": family.kind, "help": family.help, "series": entries}
+        return result
+
+    def to_json(self) -> str:
+        return json.dumps(self.to_dict(), ensure_ascii=False, indent=2)
+
+    # ------------------------------------------------------------------
+    def dump(self, path: Union[str, Path, None] = None, fmt: str = "prom") -> Path:
+        """
+        Grava o instantâneo em disco (padrão ``logs/metrics.prom`` ou
+        ``logs/metrics.json``). O formato vem de ``fmt`` ou da extensão.
+        """
+        if path is None:
+            path = LOG_DIR / f"metrics.{'json' if fmt == 'json' else 'prom'}"
+        path = Path(path)
+        if path.suffix == ".json":
+            fmt = "json"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(path.suffix + ".tmp")
+        tmp.write_text(self.to_json() if fmt == "json" else self.to_prometheus(), encoding="utf-8")
+        tmp.replace(path)                       # leitores nunca veem arquivo pela metade
+        return path
+
+    # ------------------------------------------------------------------
+    def serve(self, port: int, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+        """
+        Sobe o endpoint HTTP local numa thread daemon: ``/metrics``
+        (Prometheus) e ``/metrics.json``. ``port=0`` escolhe uma porta livre.
+        """
+        if self._server is not None:
+            return self._server
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self) -> None:               # noqa: N802 (API do http.server)
+                path = self.path.split("?", 1)[0]
+                if path in ("/metrics", "/"):
+                    body, ctype = registry.to_prometheus(), "text/plain; version=0.0.4; charset=utf-8"
+                elif path == "/metrics.json":
+                    body, ctype = registry.to_json(), "application/json; charset=utf-8"
+                else:
+                    self.send_error(404)
+                    return
+                data = body.encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", ctype)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format: str, *args: Any) -> None:
+                pass                                # sem uma linha de log por scrape
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+        self._server = server
+        logger.info(f"📈 [METRICS] Endpoint em http://{host}:{server.server_address[1]}/metrics")
+        return server
+
+    def stop(self) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+prompt_packing.py – Vários itens por requisição (instruções pagas uma vez)
+
+Prompts longos de instrução (ex.: diretrizes de siddhanta do Scholar)
+repetidos a cada verso custam mais que o próprio verso. Aqui os itens
+são agrupados em pacotes que cabem nos orçamentos de tokens de entrada e
+de saída, e a resposta (um array JSON, um objeto por item) é separada de
+volta por item.
+"""
+
+import json
+import re
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple, TypeVar
+
+T = TypeVar("T")
+
+_FENCE = re.compile(r"^```(?:json)?\s*|\s*```$", re.IGNORECASE)
+
+
+# ----------------------------------------------------------------------
+def pack_by_budget(items: Sequence[T],
+                   cost: Callable[[T], Tuple[int, int]],
+                   header_tokens: int,
+                   max_input_tokens: int,
+                   max_output_tokens: int,
+                   max_items: int = 25) -> List[List[T]]:
+    """
+    Agrupa ``items`` em pacotes, na ordem, sem estourar os orçamentos.
+
+    Parameters
+    ----------
+    cost : callable
+        ``item -> (tokens_de_entrada, tokens_de_saída_estimados)``.
+    header_tokens : int
+        Tokens fixos do prompt (instruções), pagos uma vez por pacote.
+    max_input_tokens, max_output_tokens : int
+        Orçamentos por requisição. Um item que sozinho passa do orçamento
+        vai num pacote próprio.
+    max_items : int
+        Teto de itens por pacote (limita o estrago de uma resposta ruim).
+    """
+    packs: List[List[T]] = []
+    current: List[T] = []
+    used_in, used_out = header_tokens, 0
+    for item in items:
+        item_in, item_out = cost(item)
+        if current and (
+            used_in + item_in > max_input_tokens
+            or used_out + item_out > max_output_tokens
+            or len(current) >= max_items
+        ):
+            packs.append(current)
+            current, used_in, used_out = [], header_tokens, 0
+        current.append(item)
+        used_in += item_in
+        used_out += item_out
+    if current:
+        packs.append(current)
+    return packs
+
+
+# ----------------------------------------------------------------------
+def parse_json_array(text: Optional[str]) -> List[Any]:
+    """
+    Array JSON de uma resposta de modelo (aceita cercas ```json e um
+    objeto com uma única lista dentro). Retorna ``[]`` se não der.
+    """
+    if not text:
+        return []
+    try:
+        data = json.loads(_FENCE.sub("", text.strip()))
+    except json.JSONDecodeError:
+        return []
+    if isinstance(data, dict):
+        lists = [v for v in data.values() if isinstance(v, list)]
+        data = lists[0] if len(lists) == 1 else [data]
+    return data if isinstance(data, list) else []
+
+
+# ----------------------------------------------------------------------
+def split_packed(ids: Sequence[str],
+                 text: Optional[str],
+                 id_key: str = "id",
+                 value_key: str = "translation") -> Dict[str, str]:
+    """
+    Separa a resposta de um pacote por item: ``{id: valor}``.
+
+    Casa pelo campo ``id_key``; se a resposta vier sem ids mas com o
+    mesmo número de objetos, casa pela posição. Itens ausentes ou vazios
+    ficam de fora (quem chama refaz só esses).
+    """
+    entries = [e for e in parse_json_array(text) if isinstance(e, dict)]
+    wanted = set(ids)
+    result: Dict[str, str] = {}
+    for entry in entries:
+        key = str(entry.get(id_key, "")).strip()
+        value = entry.get(value_key)
+        if key in wanted and isinstance(value, str) and value.strip():
+            result[key] = value.strip()
+
+    if not result and len(entries) == len(ids):
+        for key, entry in zip(ids, entries):
+            value = entry.get(value_key)
+            if isinstance(value, str) and value.strip():
+                result[key] = value.strip()
+    return result
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+prompt_registry.py – Prompts versionados de ``config/prompts.yaml``
+
+O arquivo é lido uma vez por processo. Cada entrada vira um
+``PromptTemplate``; o prefixo estático (instruções antes da primeira
+variável) é canonicalizado e tem os tokens contados já no carregamento,
+então em cada chamada só as variáveis são tokenizadas e o início do
+prompt é sempre o mesmo, byte a byte (cache de prefixo do provider).
+
+Uso::
+
+    from prompt_registry import get_prompt
+    prompt = get_prompt("scholar.gaudiya_pt").bind(sanskrit=..., ...)
+"""
+
+import logging
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Union
+
+try:                                    # importado como pacote (src.utils.prompt_registry)
+    from .prompt_template import PromptTemplate, StructuredPrompt
+    from .token_counter import TokenCounter, default_counter
+except ImportError:                     # importado via sys.path (src/utils)
+    from prompt_template import PromptTemplate, StructuredPrompt
+    from token_counter import TokenCounter, default_counter
+
+try:
+    import yaml
+except ImportError:                     # dependência opcional (requirements.txt)
+    yaml = None
+
+BASE_DIR = Path(__file__).resolve().parent.parent.parent
+DEFAULT_PROMPTS = BASE_DIR / "config" / "prompts.yaml"
+
+logger = logging.getLogger("PromptRegistry")
+
+
+# ----------------------------------------------------------------------
+class PromptRegistry:
+    """
+    Templates carregados de um YAML (``templates: [{id, version, text}]``).
+
+    Parameters
+    ----------
+    path : Path | str
+        Arquivo de prompts (padrão = ``config/prompts.yaml``).
+    token_counter : TokenCounter | None
+        Contador usado para pré-contar os prefixos.
+    models : lista de str
+        Modelos cujos prefixos são contados já no carregamento (os demais
+        são contados no primeiro uso e guardados no template).
+    """
+
+    # ------------------------------------------------------------------
+    def __init__(self,
+                 path: Union[str, Path] = DEFAULT_PROMPTS,
+                 token_counter: Optional[TokenCounter] = None,
+                 models: Optional[List[str]] = None) -> None:
+        self.path = Path(path)
+        self.tokens = token_counter or default_counter
+        self._templates: Dict[str, Dict[int, PromptTemplate]] = {}
+        self._load()
+        for template in self.latest():
+            for model in models or ["default"]:
+                template.prefix_tokens(self.tokens, model)
+
+    # ------------------------------------------------------------------
+    def _load(self) -> None:
+        if yaml is None:
+            raise ImportError("PyYAML é necessário para ler config/prompts.yaml (pip install PyYAML)")
+        with open(self.path, encoding="utf-8") as f:
+            data = yaml.safe_load(f) or {}
+        for entry in data.get("templates", []):
+            template = PromptTemplate(entry["id"], entry["version"], entry["text"])
+            versions = self._templates.setdefault(template.template_id, {})
+            if template.version in versions:
+                raise ValueError(f"Prompt duplicado em {self.path.name}: {template!r}")
+            versions[template.version] = template
+        logger.info(f"📚 [PROMPTS] {len(self._templates)} templates carregados de {self.path}")
+
+    # ------------------------------------------------------------------
+    def get(self, template_id: str, version: Optional[int] = None) -> PromptTemplate:
+        """Template pelo id (maior versão, ou a ``version`` pedida)."""
+        versions = self._templates.get(template_id)
+        if not versions:
+            raise KeyError(f"Prompt '{template_id}' não existe em {self.path.name}")
+        if version is None:
+            return versions[max(versions)]
+        try:
+            return versions[int(version)]
+        except KeyError:
+            raise KeyError(f"Prompt '{template_id}' v{version} não existe em {self.path.name}") from None
+
+    def bind(self, template_id: str, **variables: Any) -> StructuredPrompt:
+        """Atalho: ``get(template_id).bind(**variables)``."""
+        return self.get(template_id).bind(**variables)
+
+    # ------------------------------------------------------------------
+    def latest(self) -> List[PromptTemplate]:
+        return [versions[max(versions)] for versions in self._templates.values()]
+
+    def describe(self, model: str = "default") -> List[Dict[str, Any]]:
+        """Resumo por template: versão, hash e tokens do prefixo estático."""
+        return [
+            {
+                "id": t.template_id,
+                "version": t.version,
+                "prefix_sha": t.prefix_sha,
+                "prefix_tokens": t.prefix_tokens(self.tokens, model),
+            }
+            for t in self.latest()
+        ]
+
+
+# ----------------------------------------------------------------------
+_default_registry: Optional[PromptRegistry] = None
+_default_lock = threading.Lock()
+
+
+def default_registry() -> PromptRegistry:
+    """Registro compartilhado do processo (``config/prompts.yaml``, lido uma vez)."""
+    global _default_registry
+    if _default_registry is None:
+        with _default_lock:
+            if _default_registry is None:
+                _default_registry = PromptRegistry()
+    return _default_registry
+
+
+def get_prompt(template_id: str, version: Optional[int] = None) -> PromptTemplate:
+    return default_registry().get(template_id, version)
+
+
+if __name__ == "__main__":
+    for info in default_registry().describe():
+        print(f"{info['id']:<28} v{info['version']}  prefixo={info['prefix_tokens']:>4} tokens  sha={info['prefix_sha']}")
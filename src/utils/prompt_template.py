@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+prompt_template.py – Prompts estruturados com chave de cache canônica
+
+Um prompt estruturado = template (id + versão + texto) + variáveis.
+A chave de cache vem só de ``id``, ``versão`` e das variáveis
+canonicalizadas (Unicode NFC + espaços normalizados); a redação do
+template não entra na chave. Assim, reindentar o f-string ou ajustar
+espaços não gera nova chamada paga: só mudam a chave uma variável
+(conteúdo do verso) ou a versão do template.
+"""
+
+import re
+import json
+import string
+import hashlib
+import textwrap
+import threading
+import unicodedata
+from typing import Any, Dict, Mapping
+
+_SPACES = re.compile(r"[ \t\u00a0\u2000-\u200a\u202f\u3000]+")
+_BLANK_LINES = re.compile(r"\n{3,}")
+
+
+# ----------------------------------------------------------------------
+def canonicalize(text: str) -> str:
+    """
+    Forma canônica de um texto: NFC, quebras de linha ``\\n``, espaços
+    repetidos colapsados, linhas sem espaços nas pontas, no máximo uma
+    linha em branco seguida e sem espaços no início/fim.
+    """
+    text = unicodedata.normalize("NFC", text)
+    text = text.replace("\r\n", "\n").replace("\r", "\n")
+    lines = (_SPACES.sub(" ", line).strip() for line in text.split("\n"))
+    return _BLANK_LINES.sub("\n\n", "\n".join(lines)).strip()
+
+
+# ----------------------------------------------------------------------
+class PromptTemplate:
+    """
+    Template de prompt versionado (sintaxe ``str.format``).
+
+    Aumente ``version`` sempre que a mudança no texto deva invalidar as
+    respostas já em cache; ajustes só de formatação não precisam.
+
+    ``prefix`` é a parte estática do início (as linhas antes da primeira
+    variável), já canonicalizada: todo ``render`` começa exatamente com
+    esses bytes, o que permite cache de prefixo no provider. Por isso as
+    instruções devem vir antes dos dados.
+    """
+
+    __slots__ = ("template_id", "version", "text", "prefix", "prefix_sha", "_prefix_tokens", "_lock")
+
+    def __init__(self, template_id: str, version: int, text: str) -> None:
+        self.template_id = template_id
+        self.version = int(version)
+        self.text = textwrap.dedent(text)
+        self.prefix = canonicalize(self._static_head(self.text))
+        self.prefix_sha = hashlib.sha256(self.prefix.encode("utf-8")).hexdigest()[:16]
+        self._prefix_tokens: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    # ------------------------------------------------------------------
+    @staticmethod
+    def _static_head(text: str) -> str:
+        """Linhas inteiras antes do primeiro campo ``{...}``."""
+        head = []
+        for literal, field, _, _ in string.Formatter().parse(text):
+            head.append(literal)
+            if field is not None:
+                break
+        else:
+            return text
+        static = "".join(head)
+        return static[:static.rfind("\n") + 1]
+
+    # ------------------------------------------------------------------
+    def prefix_tokens(self, counter: Any, model: str = "default") -> int:
+        """Tokens do prefixo estático (contados uma vez por modelo)."""
+        tokens = self._prefix_tokens.get(model)
+        if tokens is None:
+            tokens = counter.count(self.prefix, model) if self.prefix else 0
+            with self._lock:
+                self._prefix_tokens[model] = tokens
+        return tokens
+
+    # ------------------------------------------------------------------
+    def render(self, **variables: Any) -> str:
+        """Texto final enviado ao modelo (já canonicalizado)."""
+        return canonicalize(self.text.format(**variables))
+
+    # ------------------------------------------------------------------
+    def cache_key(self, variables: Mapping[str, Any]) -> str:
+        """SHA‑256 de ``id``, ``versão`` e variáveis canonicalizadas."""
+        canonical = {
+            "template": self.template_id,
+            "version": self.version,
+            "vars": {k: canonicalize("" if v is None else str(v)) for k, v in variables.items()},
+        }
+        blob = json.dumps(canonical, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+        return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+    # ------------------------------------------------------------------
+    def bind(self, **variables: Any) -> "StructuredPrompt":
+        """Associa as variáveis ao template (aceito por ``call_ai``)."""
+        return StructuredPrompt(self, variables)
+
+    def __repr__(self) -> str:
+        return f"PromptTemplate({self.template_id!r}, v{self.version})"
+
+
+# ----------------------------------------------------------------------
+class StructuredPrompt:
+    """Template + variáveis: texto renderizado e chave de cache prontos."""
+
+    __slots__ = ("template", "variables", "text", "cache_key")
+
+    def __init__(self, template: PromptTemplate, variables: Dict[str, Any]) -> None:
+        self.template = template
+        self.variables = dict(variables)
+        self.text = template.render(**self.variables)
+        self.cache_key = template.cache_key(self.variables)
+
+    # ------------------------------------------------------------------
+    def describe(self) -> Dict[str, Any]:
+        """Identificação do template para o payload da auditoria."""
+        return {
+            "template_id": self.template.template_id,
+            "template_version": self.template.version,
+            "prefix_sha": self.template.prefix_sha,
+        }
+
+    # ------------------------------------------------------------------
+    def count_tokens(self, counter: Any, model: str = "default") -> int:
+        """Prefixo (pré-contado) + só a parte variável do texto."""
+        prefix = self.template.prefix
+        if not prefix or not self.text.startswith(prefix):
+            return counter.count(self.text, model)
+        return self.template.prefix_tokens(counter, model) + counter.count(self.text[len(prefix):], model)
+
+    def __str__(self) -> str:
+        return self.text
+
+    def __repr__(self) -> str:
+        return f"StructuredPrompt({self.template!r}, key={self.cache_key[:12]})"
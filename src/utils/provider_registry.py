@@ -0,0 +1,506 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+provider_registry.py – Registro de providers de IA (adapters reutilizáveis)
+
+Cada adapter é construído uma vez por processo e reaproveitado em todas as
+chamadas: SDK configurado uma vez, modelos em cache, conexões HTTP em pool
+(keep-alive). Todo adapter é um ``provider_func`` válido para o
+SmartAIWrapper: ``adapter(prompt, model) -> str``; ``adapter.stream(...)``
+devolve os chunks (ver ``call_ai_stream``).
+
+Adapters registrados:
+- ``gemini``  – google-generativeai (``GEMINI_API_KEY``).
+- ``groq``    – API OpenAI-compatível da Groq (``GROQ_API_KEY``).
+- ``openai``  – qualquer endpoint OpenAI-compatível (``OPENAI_BASE_URL``,
+                ``OPENAI_API_KEY``).
+- ``fake``    – servidor HTTP local (OpenAI-compatível) para testes e
+                benchmarks, sem custo nem rede.
+
+Uso:
+    from provider_registry import get_provider
+    gemini = get_provider("gemini", json_mode=True)
+    wrapper.call_ai(prompt, model="gemini-2.0-flash", provider_func=gemini)
+"""
+
+import os
+import json
+import time
+import logging
+import weakref
+import threading
+import http.client
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+from typing import Any, Callable, Dict, Iterator, Optional, Tuple
+
+try:
+    import httpx                         # pool HTTP/1.1 keep-alive (opcional)
+except ImportError:
+    httpx = None
+
+logger = logging.getLogger("ProviderRegistry")
+
+DEFAULT_TIMEOUT = 120.0
+
+
+# ----------------------------------------------------------------------
+class ProviderError(RuntimeError):
+    """Erro HTTP/SDK de um provider (``status`` 429 = limite de taxa)."""
+
+    def __init__(self, message: str, status: Optional[int] = None,
+                 retry_after: Optional[float] = None) -> None:
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+
+def _retry_after(value: Optional[str]) -> Optional[float]:
+    try:
+        return float(value) if value else None
+    except ValueError:
+        return None
+
+
+# ----------------------------------------------------------------------
+# Sessão HTTP com pool de conexões
+# ----------------------------------------------------------------------
+class _ThreadHTTPConnection:
+    """Conexão guardada no thread-local; o finalizador a fecha com a thread."""
+
+    __slots__ = ("conn", "finalizer", "__weakref__")
+
+    def __init__(self, conn: http.client.HTTPConnection) -> None:
+        self.conn = conn
+        self.finalizer = None
+
+
+def _close_http(session_ref, conn: http.client.HTTPConnection) -> None:
+    """Fecha a conexão de uma thread e a tira da sessão (se ainda existir)."""
+    session = session_ref()
+    if session is not None:
+        with session._lock:
+            try:
+                session._conns.remove(conn)
+            except ValueError:
+                pass            # já fechada por close()
+    conn.close()
+
+
+class HTTPSession:
+    """
+    Conexões HTTP persistentes (keep-alive) para um host.
+
+    Usa ``httpx.Client`` quando instalado; senão, uma ``http.client``
+    por thread, reaberta só se o servidor fechar a conexão.
+    """
+
+    def __init__(self, base_url: str, headers: Optional[Dict[str, str]] = None,
+                 timeout: float = DEFAULT_TIMEOUT) -> None:
+        self.base_url = base_url.rstrip("/")
+        self.headers = dict(headers or {})
+        self.timeout = timeout
+        parts = urlsplit(self.base_url)
+        self._scheme, self._host, self._port = parts.scheme, parts.hostname, parts.port
+        self._prefix = parts.path.rstrip("/")
+        self._client = (
+            httpx.Client(base_url=self.base_url, headers=self.headers, timeout=timeout)
+            if httpx is not None else None
+        )
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._conns = []
+
+    # ------------------------------------------------------------------
+    def _connection(self, fresh: bool = False) -> http.client.HTTPConnection:
+        if fresh:
+            self._drop_connection()
+        holder = getattr(self._local, "holder", None)
+        if holder is None:
+            cls = http.client.HTTPSConnection if self._scheme == "https" else http.client.HTTPConnection
+            holder = _ThreadHTTPConnection(cls(self._host, self._port, timeout=self.timeout))
+            # Thread que termina descarta o thread-local: o finalizador fecha o
+            # socket e o tira de _conns (referência fraca à sessão)
+            holder.finalizer = weakref.finalize(holder, _close_http, weakref.ref(self), holder.conn)
+            self._local.holder = holder
+            with self._lock:
+                self._conns.append(holder.conn)
+        return holder.conn
+
+    def _drop_connection(self) -> None:
+        """Fecha e esquece a conexão da thread atual."""
+        holder = getattr(self._local, "holder", None)
+        if holder is not None:
+            self._local.holder = None
+            holder.finalizer()
+
+    # ------------------------------------------------------------------
+    def _send(self, path: str, body: bytes) -> http.client.HTTPResponse:
+        headers = {**self.headers, "Content-Type": "application/json"}
+        for attempt in (0, 1):
+            conn = self._connection(fresh=attempt == 1)
+            try:
+                conn.request("POST", self._prefix + path, body=body, headers=headers)
+                return conn.getresponse()
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError,
+                    http.client.CannotSendRequest, http.client.ResponseNotReady):
+                if attempt == 1:    # keep-alive derrubado pelo servidor: reconecta uma vez
+                    raise
+        raise AssertionError("inalcançável")
+
+    # ------------------------------------------------------------------
+    @staticmethod
+    def _raise_for(status: int, body: bytes, retry_after: Optional[str]) -> None:
+        if status >= 400:
+            raise ProviderError(
+                f"HTTP {status}: {body[:300].decode('utf-8', 'replace')}",
+                status=status,
+                retry_after=_retry_after(retry_after),
+            )
+
+    # ------------------------------------------------------------------
+    def post_json(self, path: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """POST com corpo JSON; retorna o JSON da resposta."""
+        body = json.dumps(payload).encode("utf-8")
+        if self._client is not None:
+            resp = self._client.post(path, content=body, headers={"Content-Type": "application/json"})
+            self._raise_for(resp.status_code, resp.content, resp.headers.get("retry-after"))
+            return resp.json()
+        resp = self._send(path, body)
+        data = resp.read()                  # lê tudo: a conexão volta limpa para o pool
+        self._raise_for(resp.status, data, resp.getheader("Retry-After"))
+        return json.loads(data)
+
+    # ------------------------------------------------------------------
+    def stream_lines(self, path: str, payload: Dict[str, Any]) -> Iterator[str]:
+        """POST com resposta em streaming (SSE); devolve linha a linha."""
+        body = json.dumps(payload).encode("utf-8")
+        if self._client is not None:
+            with self._client.stream("POST", path, content=body,
+                                     headers={"Content-Type": "application/json"}) as resp:
+                if resp.status_code >= 400:
+                    resp.read()
+                    self._raise_for(resp.status_code, resp.content, resp.headers.get("retry-after"))
+                yield from resp.iter_lines()
+            return
+        resp = self._send(path, body)
+        try:
+            if resp.status >= 400:
+                self._raise_for(resp.status, resp.read(), resp.getheader("Retry-After"))
+            while True:
+                line = resp.readline()
+                if not line:
+                    break
+                yield line.decode("utf-8").rstrip("\r\n")
+        finally:
+            # Stream pode ter sido abandonado no meio: a conexão não volta ao pool
+            resp.close()
+            self._drop_connection()
+
+    # ------------------------------------------------------------------
+    def close(self) -> None:
+        if self._client is not None:
+            self._client.close()
+        with self._lock:
+            conns, self._conns = self._conns, []
+        for conn in conns:
+            conn.close()
+        self._local = threading.local()
+
+
+# ----------------------------------------------------------------------
+# Adapters
+# ----------------------------------------------------------------------
+class ProviderAdapter:
+    """Base dos adapters: ``adapter(prompt, model) -> str``."""
+
+    name = "provider"
+
+    @property
+    def __name__(self) -> str:              # chave do rate limiter no wrapper
+        return self.name
+
+    def __call__(self, prompt: str, model: str) -> str:
+        raise NotImplementedError
+
+    def stream(self, prompt: str, model: str) -> Iterator[str]:
+        """Padrão: a resposta inteira como um único chunk."""
+        yield self(prompt, model)
+
+    def streaming(self) -> Callable[[str, str], Iterator[str]]:
+        """``provider_func`` que devolve chunks (para ``call_ai_stream``)."""
+        def stream_provider(prompt: str, model: str) -> Iterator[str]:
+            return self.stream(prompt, model)
+        stream_provider.__name__ = self.name
+        return stream_provider
+
+    def close(self) -> None:
+        pass
+
+    def __repr__(self) -> str:
+        return f"<{type(self).__name__} {self.name}>"
+
+
+# ----------------------------------------------------------------------
+class GeminiAdapter(ProviderAdapter):
+    """
+    google-generativeai com ``configure`` único e ``GenerativeModel`` em
+    cache por modelo (antes: um objeto novo por verso/página).
+    """
+
+    name = "gemini"
+
+    def __init__(self, api_key: Optional[str] = None, json_mode: bool = False,
+                 generation_config: Optional[Dict[str, Any]] = None) -> None:
+        self.api_key = api_key
+        self.generation_config = dict(generation_config or {})
+        if json_mode:
+            self.generation_config["response_mime_type"] = "application/json"
+        self._genai = None
+        self._models: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+    # ------------------------------------------------------------------
+    def _model(self, model: str):
+        with self._lock:
+            if self._genai is None:
+                import google.generativeai as genai     # só quando usado
+                genai.configure(api_key=self.api_key or os.getenv("GEMINI_API_KEY"))
+                self._genai = genai
+            cached = self._models.get(model)
+            if cached is None:
+                cached = self._genai.GenerativeModel(
+                    model_name=model,
+                    generation_config=self.generation_config or None,
+                )
+                self._models[model] = cached
+            return cached
+
+    # ------------------------------------------------------------------
+    def __call__(self, prompt: str, model: str) -> str:
+        return self._model(model).generate_content(prompt).text
+
+    def stream(self, prompt: str, model: str) -> Iterator[str]:
+        for chunk in self._model(model).generate_content(prompt, stream=True):
+            text = getattr(chunk, "text", "")
+            if text:
+                yield text
+
+
+# ----------------------------------------------------------------------
+class OpenAICompatibleAdapter(ProviderAdapter):
+    """``/chat/completions`` de qualquer API OpenAI-compatível, via ``HTTPSession``."""
+
+    name = "openai"
+    default_base_url = "https://api.openai.com/v1"
+    api_key_env = "OPENAI_API_KEY"
+    base_url_env = "OPENAI_BASE_URL"
+
+    def __init__(self, base_url: Optional[str] = None, api_key: Optional[str] = None,
+                 json_mode: bool = False, timeout: float = DEFAULT_TIMEOUT,
+                 extra_body: Optional[Dict[str, Any]] = None) -> None:
+        self.base_url = base_url or os.getenv(self.base_url_env) or self.default_base_url
+        self.api_key = api_key if api_key is not None else os.getenv(self.api_key_env, "")
+        self.json_mode = json_mode
+        self.extra_body = dict(extra_body or {})
+        headers = {"Authorization": f"Bearer {self.api_key}"} if self.api_key else {}
+        self.session = HTTPSession(self.base_url, headers=headers, timeout=timeout)
+
+    # ------------------------------------------------------------------
+    def _payload(self, prompt: str, model: str, stream: bool) -> Dict[str, Any]:
+        payload: Dict[str, Any] = {
+            "model": model,
+            "messages": [{"role": "user", "content": prompt}],
+            **self.extra_body,
+        }
+        if self.json_mode:
+            payload["response_format"] = {"type": "json_object"}
+        if stream:
+            payload["stream"] = True
+        return payload
+
+    # ------------------------------------------------------------------
+    def __call__(self, prompt: str, model: str) -> str:
+        data = self.session.post_json("/chat/completions", self._payload(prompt, model, False))
+        try:
+            return data["choices"][0]["message"]["content"]
+        except (KeyError, IndexError, TypeError):
+            raise ProviderError(f"Resposta inesperada de {self.name}: {str(data)[:300]}")
+
+    def stream(self, prompt: str, model: str) -> Iterator[str]:
+        for line in self.session.stream_lines("/chat/completions", self._payload(prompt, model, True)):
+            if not line.startswith("data:"):
+                continue
+            data = line[5:].strip()
+            if data == "[DONE]":
+                break
+            delta = json.loads(data)["choices"][0].get("delta", {})
+            if delta.get("content"):
+                yield delta["content"]
+
+    def close(self) -> None:
+        self.session.close()
+
+
+# ----------------------------------------------------------------------
+class GroqAdapter(OpenAICompatibleAdapter):
+    name = "groq"
+    default_base_url = "https://api.groq.com/openai/v1"
+    api_key_env = "GROQ_API_KEY"
+    base_url_env = "GROQ_BASE_URL"
+
+
+# ----------------------------------------------------------------------
+# Servidor HTTP falso (OpenAI-compatível) para testes/benchmarks
+# ----------------------------------------------------------------------
+class _FakeHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"           # keep-alive
+
+    def setup(self) -> None:
+        super().setup()
+        with self.server.stats_lock:
+            self.server.connections += 1
+
+    def log_message(self, *args) -> None:   # silencioso
+        pass
+
+    def do_POST(self) -> None:
+        length = int(self.headers.get("Content-Length", 0))
+        payload = json.loads(self.rfile.read(length) or b"{}")
+        with self.server.stats_lock:
+            self.server.requests += 1
+        prompt = payload.get("messages", [{}])[-1].get("content", "")
+        reply = self.server.reply(prompt, payload.get("model", ""))
+        if self.server.latency:
+            time.sleep(self.server.latency)
+
+        if payload.get("stream"):
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Connection", "close")
+            self.end_headers()
+            for word in reply.split(" "):
+                chunk = {"choices": [{"delta": {"content": word + " "}}]}
+                self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+                self.wfile.flush()
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.close_connection = True
+            return
+
+        body = json.dumps({"choices": [{"message": {"role": "assistant", "content": reply}}]}).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class FakeHTTPServer:
+    """
+    Servidor local (thread própria) que imita ``/v1/chat/completions``.
+
+    ``reply(prompt, model)`` define a resposta (padrão: eco do prompt);
+    ``latency`` simula o tempo do modelo. ``connections`` / ``requests``
+    permitem verificar o reaproveitamento de conexões.
+    """
+
+    def __init__(self, reply: Optional[Callable[[str, str], str]] = None,
+                 latency: float = 0.0) -> None:
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), _FakeHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.reply = reply or (lambda prompt, model: f"[fake:{model}] {prompt[:60]}")
+        self.httpd.latency = latency
+        self.httpd.connections = 0
+        self.httpd.requests = 0
+        self.httpd.stats_lock = threading.Lock()
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name="FakeHTTPServer", daemon=True)
+        self._thread.start()
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    @property
+    def connections(self) -> int:
+        return self.httpd.connections
+
+    @property
+    def requests(self) -> int:
+        return self.httpd.requests
+
+    def close(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class FakeHTTPAdapter(OpenAICompatibleAdapter):
+    """Adapter OpenAI-compatível apontado para um ``FakeHTTPServer`` próprio."""
+
+    name = "fake"
+
+    def __init__(self, reply: Optional[Callable[[str, str], str]] = None,
+                 latency: float = 0.0, json_mode: bool = False) -> None:
+        self.server = FakeHTTPServer(reply, latency)
+        super().__init__(base_url=self.server.base_url, api_key="fake", json_mode=json_mode)
+
+    def close(self) -> None:
+        super().close()
+        self.server.close()
+
+
+# ----------------------------------------------------------------------
+# Registro
+# ----------------------------------------------------------------------
+class ProviderRegistry:
+    """
+    Fábricas de adapters por nome; cada combinação ``(nome, opções)`` é
+    construída uma única vez e reaproveitada (thread-safe).
+    """
+
+    def __init__(self) -> None:
+        self._factories: Dict[str, Callable[..., ProviderAdapter]] = {}
+        self._instances: Dict[Tuple[str, str], ProviderAdapter] = {}
+        self._lock = threading.Lock()
+
+    # ------------------------------------------------------------------
+    def register(self, name: str, factory: Callable[..., ProviderAdapter]) -> None:
+        self._factories[name] = factory
+
+    # ------------------------------------------------------------------
+    def get(self, name: str, **options: Any) -> ProviderAdapter:
+        """Adapter ``name`` com ``options`` (construído na primeira chamada)."""
+        key = (name, json.dumps(options, sort_keys=True, default=repr))
+        with self._lock:
+            adapter = self._instances.get(key)
+            if adapter is None:
+                if name not in self._factories:
+                    raise KeyError(f"Provider desconhecido: {name} (registrados: {sorted(self._factories)})")
+                adapter = self._factories[name](**options)
+                self._instances[key] = adapter
+                logger.info(f"🔌 [PROVIDER] {name} inicializado {options or ''}")
+            return adapter
+
+    # ------------------------------------------------------------------
+    def close(self) -> None:
+        """Fecha sessões HTTP / servidores de todos os adapters construídos."""
+        with self._lock:
+            adapters, self._instances = list(self._instances.values()), {}
+        for adapter in adapters:
+            try:
+                adapter.close()
+            except OSError as exc:
+                logger.warning(f"⚠️ Falha ao fechar {adapter!r}: {exc}")
+
+
+default_registry = ProviderRegistry()
+default_registry.register("gemini", GeminiAdapter)
+default_registry.register("groq", GroqAdapter)
+default_registry.register("openai", OpenAICompatibleAdapter)
+default_registry.register("fake", FakeHTTPAdapter)
+
+
+def get_provider(name: str, **options: Any) -> ProviderAdapter:
+    """Atalho para ``default_registry.get``."""
+    return default_registry.get(name, **options)
@@ -0,0 +1,356 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+rate_controller.py – Controle adaptativo de taxa + circuit breaker
+
+Substitui os ``time.sleep`` fixos entre páginas/versos:
+- ``AdaptiveRateController``: sem ritmo imposto enquanto o provider está
+  saudável; no primeiro sinal de limite (HTTP 429, gRPC
+  ``RESOURCE_EXHAUSTED`` ou exceção de cota do SDK) passa a espaçar as chamadas (AIMD: corta a taxa
+  pela metade e volta a subir aos poucos a cada sucesso) e aplica backoff
+  exponencial com jitter (ou o ``Retry-After`` do servidor).
+- ``CircuitBreaker``: após N falhas seguidas para de chamar o provider por
+  um tempo; depois deixa passar uma chamada de teste (half-open).
+- ``RateControllerRegistry``: um controlador por ``provider:modelo``.
+"""
+
+import time
+import random
+import logging
+import threading
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Optional
+
+logger = logging.getLogger("RateController")
+
+# Classes de exceção dos SDKs que significam limite de cota (comparadas pelo
+# nome na hierarquia, sem importar os SDKs): google.api_core, openai,
+# anthropic, httpx/requests adaptados.
+RATE_LIMIT_EXCEPTIONS = ("ResourceExhausted", "RateLimitError", "TooManyRequests")
+
+# Status que indicam limite: HTTP 429 e o código gRPC/JSON equivalente
+RATE_LIMIT_STATUSES = (429, "429", "RESOURCE_EXHAUSTED")
+
+
+# ----------------------------------------------------------------------
+def _status_of(exc: BaseException) -> Any:
+    for attr in ("status", "status_code", "code"):
+        value = getattr(exc, attr, None)
+        if callable(value):             # grpc.RpcError.code()
+            try:
+                value = value()
+            except Exception:
+                value = None
+        if value is not None:
+            return getattr(value, "name", value)        # enum StatusCode → nome
+    response = getattr(exc, "response", None)
+    return getattr(response, "status_code", None) if response is not None else None
+
+
+def is_rate_limit_error(exc: BaseException) -> bool:
+    """
+    True se a exceção é um sinal de limite de taxa/cota do provider.
+
+    Decide pelo status (HTTP 429 / ``RESOURCE_EXHAUSTED``) ou pelo tipo da
+    exceção, nunca pelo texto da mensagem: um "429" ou "quota" qualquer
+    numa mensagem de erro não desacelera o provider.
+    """
+    if _status_of(exc) in RATE_LIMIT_STATUSES:
+        return True
+    return any(cls.__name__ in RATE_LIMIT_EXCEPTIONS for cls in type(exc).__mro__)
+
+
+def retry_after_of(exc: BaseException) -> Optional[float]:
+    """``Retry-After`` (s) informado pelo provider, se houver."""
+    value = getattr(exc, "retry_after", None)
+    if value is None:
+        headers = getattr(getattr(exc, "response", None), "headers", None)
+        value = headers.get("retry-after") if headers else None
+    try:
+        return float(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+# ----------------------------------------------------------------------
+class CircuitOpenError(RuntimeError):
+    """Provider em pausa pelo circuit breaker."""
+
+    def __init__(self, message: str, retry_in: float) -> None:
+        super().__init__(message)
+        self.retry_in = retry_in
+
+
+# ----------------------------------------------------------------------
+class CircuitBreaker:
+    """
+    CLOSED → (``failure_threshold`` falhas seguidas) → OPEN →
+    (``reset_timeout`` s) → HALF_OPEN (uma chamada de teste) →
+    CLOSED se der certo, OPEN de novo (com timeout dobrado) se falhar.
+    """
+
+    CLOSED, OPEN, HALF_OPEN = "CLOSED", "OPEN", "HALF_OPEN"
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0,
+                 max_reset_timeout: float = 600.0) -> None:
+        self.failure_threshold = max(1, int(failure_threshold))
+        self.base_reset_timeout = reset_timeout
+        self.reset_timeout = reset_timeout
+        self.max_reset_timeout = max_reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probe_out = False
+
+    # ------------------------------------------------------------------
+    def check(self, now: float) -> Optional[float]:
+        """None se a chamada pode seguir; senão, segundos até a próxima tentativa."""
+        if self.state == self.OPEN:
+            remaining = self.opened_at + self.reset_timeout - now
+            if remaining > 0:
+                return remaining
+            self.state = self.HALF_OPEN
+            self._probe_out = False
+        if self.state == self.HALF_OPEN:
+            if self._probe_out:
+                return self.reset_timeout
+            self._probe_out = True
+        return None
+
+    # ------------------------------------------------------------------
+    def record_success(self) -> None:
+        if self.state != self.CLOSED:
+            logger.info("✅ [CIRCUIT] Provider respondeu – circuito fechado.")
+        self.state = self.CLOSED
+        self.failures = 0
+        self.reset_timeout = self.base_reset_timeout
+
+    def record_failure(self, now: float) -> None:
+        self.failures += 1
+        if self.state == self.HALF_OPEN:
+            self.reset_timeout = min(self.max_reset_timeout, self.reset_timeout * 2)
+            self._open(now)
+        elif self.state == self.CLOSED and self.failures >= self.failure_threshold:
+            self._open(now)
+
+    def _open(self, now: float) -> None:
+        self.state = self.OPEN
+        self.opened_at = now
+        logger.error(
+            f"🛑 [CIRCUIT] {self.failures} falhas seguidas – pausando o provider por "
+            f"{self.reset_timeout:.0f}s."
+        )
+
+
+# ----------------------------------------------------------------------
+class AdaptiveRateController:
+    """
+    Ritmo adaptativo (AIMD) com backoff exponencial e circuit breaker.
+
+    Parameters
+    ----------
+    initial_rate : float | None
+        Req/s inicial. ``None`` = sem ritmo até o primeiro sinal de limite.
+    min_rate, max_rate : float
+        Faixa da taxa. Sem ``initial_rate``, passar de ``max_rate`` volta
+        ao modo sem ritmo.
+    increase : float
+        Aumento aditivo (req/s) a cada sucesso.
+    decrease : float
+        Fator multiplicativo aplicado num sinal de limite.
+    backoff_base, backoff_max : float
+        Backoff exponencial com jitter "full": ``uniform(0, min(max, base·2ⁿ))``.
+    latency_ceiling_ms : float | None
+        Latência (média móvel) acima da qual a taxa é reduzida de leve.
+    failure_threshold, reset_timeout : circuit breaker.
+    """
+
+    def __init__(self,
+                 initial_rate: Optional[float] = None,
+                 min_rate: float = 0.05,
+                 max_rate: float = 50.0,
+                 increase: float = 0.1,
+                 decrease: float = 0.5,
+                 backoff_base: float = 1.0,
+                 backoff_max: float = 60.0,
+                 latency_ceiling_ms: Optional[float] = None,
+                 failure_threshold: int = 5,
+                 reset_timeout: float = 30.0,
+                 name: str = "provider") -> None:
+        self.name = name
+        self.rate = initial_rate
+        self.paced_always = initial_rate is not None
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.increase = increase
+        self.decrease = decrease
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.latency_ceiling_ms = latency_ceiling_ms
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+
+        self._lock = threading.Lock()
+        self._next_slot = 0.0
+        self._backoff_until = 0.0
+        self._streak = 0                        # sinais ruins seguidos
+        self._recent: Deque[float] = deque(maxlen=64)
+        self.latency_ewma: Optional[float] = None
+
+        self.successes = 0
+        self.rate_limited = 0
+        self.failures = 0
+
+    # ------------------------------------------------------------------
+    def _observed_rate(self, now: float) -> Optional[float]:
+        """Req/s efetivos nas últimas chamadas (base do primeiro corte)."""
+        if len(self._recent) < 2:
+            return None
+        span = now - self._recent[0]
+        return len(self._recent) / span if span > 0 else None
+
+    def _backoff(self, now: float, retry_after: Optional[float]) -> float:
+        if retry_after is not None:
+            delay = retry_after
+        else:
+            cap = min(self.backoff_max, self.backoff_base * (2 ** (self._streak - 1)))
+            delay = random.uniform(0, cap)
+        self._backoff_until = max(self._backoff_until, now + delay)
+        return delay
+
+    # ------------------------------------------------------------------
+    def acquire(self) -> float:
+        """
+        Espera a vez da próxima chamada. Retorna o tempo esperado.
+
+        Levanta ``CircuitOpenError`` se o circuito estiver aberto.
+        """
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                blocked = self.breaker.check(now)
+                if blocked is not None:
+                    raise CircuitOpenError(
+                        f"Circuito aberto para {self.name}; nova tentativa em {blocked:.0f}s", blocked
+                    )
+                start = max(now, self._backoff_until, self._next_slot if self.rate else 0.0)
+                wait = start - now
+                if wait <= 0:
+                    if self.rate:
+                        self._next_slot = now + 1.0 / self.rate
+                    self._recent.append(now)
+                    return waited
+                if self.breaker.state == CircuitBreaker.HALF_OPEN:
+                    self.breaker._probe_out = False     # a sonda ainda não saiu
+            time.sleep(wait)
+            waited += wait
+
+    # ------------------------------------------------------------------
+    def record_success(self, latency_ms: Optional[float] = None) -> None:
+        with self._lock:
+            self.successes += 1
+            self._streak = 0
+            self.breaker.record_success()
+            if latency_ms is not None:
+                self.latency_ewma = (
+                    latency_ms if self.latency_ewma is None
+                    else 0.8 * self.latency_ewma + 0.2 * latency_ms
+                )
+            if self.latency_ceiling_ms and self.latency_ewma and self.latency_ewma > self.latency_ceiling_ms:
+                base = self.rate or self._observed_rate(time.monotonic()) or self.max_rate
+                self.rate = max(self.min_rate, base * 0.9)
+                return
+            if self.rate is not None:
+                self.rate += self.increase
+                if self.rate > self.max_rate:
+                    self.rate = self.max_rate if self.paced_always else None
+
+    # ------------------------------------------------------------------
+    def record_rate_limited(self, retry_after: Optional[float] = None) -> float:
+        """Sinal de limite: corta a taxa e agenda o backoff. Retorna o atraso."""
+        with self._lock:
+            now = time.monotonic()
+            self.rate_limited += 1
+            self._streak += 1
+            base = self.rate or self._observed_rate(now) or self.max_rate
+            self.rate = max(self.min_rate, base * self.decrease)
+            self.breaker.record_failure(now)
+            delay = self._backoff(now, retry_after)
+        logger.warning(
+            f"⏳ [RATE] {self.name}: limite atingido – taxa {self.rate:.2f} req/s, "
+            f"backoff {delay:.1f}s"
+        )
+        return delay
+
+    # ------------------------------------------------------------------
+    def record_failure(self) -> float:
+        """Erro não relacionado a cota (timeout, 5xx...): backoff + breaker."""
+        with self._lock:
+            now = time.monotonic()
+            self.failures += 1
+            self._streak += 1
+            self.breaker.record_failure(now)
+            return self._backoff(now, None)
+
+    # ------------------------------------------------------------------
+    def call(self, fn: Callable[..., Any], *args: Any, retries: int = 3, **kwargs: Any) -> Any:
+        """
+        Executa ``fn`` no ritmo do controlador, registrando o resultado.
+
+        Sinais de limite são repetidos até ``retries`` vezes (após o
+        backoff); demais exceções são registradas e repassadas.
+        """
+        attempt = 0
+        while True:
+            self.acquire()
+            start = time.perf_counter()
+            try:
+                result = fn(*args, **kwargs)
+            except Exception as exc:
+                if is_rate_limit_error(exc):
+                    self.record_rate_limited(retry_after_of(exc))
+                    if attempt < retries:
+                        attempt += 1
+                        continue
+                else:
+                    self.record_failure()
+                raise
+            self.record_success((time.perf_counter() - start) * 1000)
+            return result
+
+    # ------------------------------------------------------------------
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "rate": self.rate,
+                "successes": self.successes,
+                "rate_limited": self.rate_limited,
+                "failures": self.failures,
+                "circuit": self.breaker.state,
+                "latency_ewma_ms": self.latency_ewma,
+            }
+
+
+# ----------------------------------------------------------------------
+class RateControllerRegistry:
+    """Um ``AdaptiveRateController`` por ``provider:modelo`` (compartilhado entre threads)."""
+
+    def __init__(self, **defaults: Any) -> None:
+        self.defaults = defaults
+        self._controllers: Dict[str, AdaptiveRateController] = {}
+        self._lock = threading.Lock()
+
+    def get(self, provider: str, model: str) -> AdaptiveRateController:
+        key = f"{provider}:{model}"
+        with self._lock:
+            controller = self._controllers.get(key)
+            if controller is None:
+                controller = AdaptiveRateController(name=key, **self.defaults)
+                self._controllers[key] = controller
+            return controller
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            controllers = dict(self._controllers)
+        return {key: c.stats() for key, c in controllers.items()}
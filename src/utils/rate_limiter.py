@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+rate_limiter.py – Limitadores de taxa (token bucket) do HariKathaAI
+
+Recursos principais:
+- ``TokenBucket``: taxa sustentada (req/s) + rajada máxima, thread-safe.
+- ``RateLimiterRegistry``: um bucket por chave ``provider:modelo``,
+  compartilhado por todos os workers do processo.
+"""
+
+import threading
+import time
+from typing import Dict, Optional
+
+
+# ----------------------------------------------------------------------
+class TokenBucket:
+    """
+    Bucket clássico: enche ``rate`` fichas por segundo até ``capacity``.
+    Cada chamada consome uma ficha; sem ficha, ``acquire`` dorme o
+    tempo exato até a próxima ficha ficar disponível.
+    """
+
+    # ------------------------------------------------------------------
+    def __init__(self, rate: float, capacity: Optional[float] = None) -> None:
+        """
+        Parameters
+        ----------
+        rate : float
+            Fichas por segundo (requisições sustentadas por segundo).
+        capacity : float | None
+            Rajada máxima (padrão = max(1, rate)).
+        """
+        if rate <= 0:
+            raise ValueError("rate deve ser > 0")
+        self.rate = float(rate)
+        self.capacity = float(capacity) if capacity else max(1.0, self.rate)
+        self._tokens = self.capacity
+        self._stamp = time.monotonic()
+        self._lock = threading.Lock()
+
+    # ------------------------------------------------------------------
+    def _refill(self, now: float) -> None:
+        elapsed = now - self._stamp
+        self._stamp = now
+        self._tokens = min(self.capacity, self._tokens + elapsed * self.rate)
+
+    # ------------------------------------------------------------------
+    def try_acquire(self, tokens: float = 1.0) -> float:
+        """
+        Tenta consumir ``tokens`` fichas.
+
+        Retorna 0.0 quando conseguiu, ou quantos segundos faltam para
+        haver fichas suficientes.
+        """
+        with self._lock:
+            self._refill(time.monotonic())
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return 0.0
+            return (tokens - self._tokens) / self.rate
+
+    # ------------------------------------------------------------------
+    def acquire(self, tokens: float = 1.0) -> float:
+        """Bloqueia até consumir as fichas. Retorna o tempo total esperado."""
+        waited = 0.0
+        while True:
+            wait = self.try_acquire(tokens)
+            if wait <= 0:
+                return waited
+            time.sleep(wait)
+            waited += wait
+
+
+# ----------------------------------------------------------------------
+class RateLimiterRegistry:
+    """Registro de buckets por chave (ex.: ``"gemini_provider:gemini-1.5-flash"``)."""
+
+    # ------------------------------------------------------------------
+    def __init__(self, limits: Optional[Dict[str, float]] = None) -> None:
+        """
+        Parameters
+        ----------
+        limits : dict | None
+            Mapa ``chave -> req/s``. A chave pode ser ``provider:modelo``
+            ou apenas ``modelo`` (vale para qualquer provider).
+        """
+        self.limits = dict(limits or {})
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._lock = threading.Lock()
+
+    # ------------------------------------------------------------------
+    def get(self,
+            provider: str,
+            model: str,
+            rate: Optional[float] = None,
+            burst: Optional[float] = None) -> Optional[TokenBucket]:
+        """Retorna o bucket de ``provider:modelo`` (ou None se sem limite)."""
+        key = f"{provider}:{model}"
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is not None:
+                return bucket
+            if rate is None:
+                rate = self.limits.get(key, self.limits.get(model))
+            if not rate:
+                return None
+            bucket = TokenBucket(rate, burst)
+            self._buckets[key] = bucket
+            return bucket
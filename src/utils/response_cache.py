@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+response_cache.py – Cache LRU em memória para respostas de IA
+
+Primeira camada do cache do SmartAIWrapper (a segunda é o SQLite):
+- Chave ``(request_hash, model)``; valor = texto da resposta.
+- Limite por bytes (UTF-8) com despejo do item menos usado.
+- Contadores de hit / miss / eviction para observabilidade.
+"""
+
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+CacheKey = Tuple[str, str]
+
+# Sobrecarga aproximada por entrada (chave + estruturas do OrderedDict)
+ENTRY_OVERHEAD_BYTES = 160
+
+
+# ----------------------------------------------------------------------
+class LRUResponseCache:
+    """LRU thread-safe limitado em bytes."""
+
+    # ------------------------------------------------------------------
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024) -> None:
+        """
+        Parameters
+        ----------
+        max_bytes : int
+            Orçamento total de memória. ``0`` desativa a camada.
+        """
+        self.max_bytes = max(0, int(max_bytes))
+        self._data: "OrderedDict[CacheKey, Tuple[str, int]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    # ------------------------------------------------------------------
+    @staticmethod
+    def _sizeof(value: str) -> int:
+        return len(value.encode("utf-8")) + ENTRY_OVERHEAD_BYTES
+
+    # ------------------------------------------------------------------
+    def get(self, key: CacheKey) -> Optional[str]:
+        """Retorna a resposta (e a marca como recente) ou None."""
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return item[0]
+
+    # ------------------------------------------------------------------
+    def peek(self, key: CacheKey) -> Optional[str]:
+        """Como ``get``, mas sem mexer na ordem LRU nem nos contadores."""
+        with self._lock:
+            item = self._data.get(key)
+            return item[0] if item is not None else None
+
+    # ------------------------------------------------------------------
+    def put(self, key: CacheKey, value: str) -> None:
+        """Guarda a resposta; despeja as menos usadas até caber no orçamento."""
+        size = self._sizeof(value)
+        if size > self.max_bytes:
+            return                      # maior que o cache inteiro: não guarda
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self.current_bytes -= old[1]
+            self._data[key] = (value, size)
+            self.current_bytes += size
+            while self.current_bytes > self.max_bytes and self._data:
+                _, (_, evicted) = self._data.popitem(last=False)
+                self.current_bytes -= evicted
+                self.evictions += 1
+
+    # ------------------------------------------------------------------
+    def invalidate(self, key: CacheKey) -> None:
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self.current_bytes -= old[1]
+
+    # ------------------------------------------------------------------
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self.current_bytes = 0
+
+    # ------------------------------------------------------------------
+    def __len__(self) -> int:
+        return len(self._data)
+
+    # ------------------------------------------------------------------
+    def stats(self) -> Dict[str, int]:
+        """Contadores atuais da camada."""
+        with self._lock:
+            return {
+                "entries": len(self._data),
+                "bytes": self.current_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
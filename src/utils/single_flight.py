@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+single_flight.py – Coalescência de chamadas idênticas em andamento
+
+Quando vários workers pedem o mesmo prompt ao mesmo tempo, só o primeiro
+(o "líder") chama o provider; os demais esperam e reutilizam a resposta.
+
+- Dentro do processo: um ``threading.Event`` por chave ``(request_hash, model)``.
+- Entre processos (opcional): uma linha de "lease" em ``ai_inflight_leases``.
+  O líder grava a resposta na própria linha ao terminar, então os
+  seguidores de outros processos não dependem do momento em que a
+  auditoria é gravada.
+"""
+
+import os
+import time
+import uuid
+import socket
+import logging
+import sqlite3
+import threading
+from typing import Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger("SingleFlight")
+
+FlightKey = Tuple[str, str]
+
+LEASE_SCHEMA_SQL = """
+CREATE TABLE IF NOT EXISTS ai_inflight_leases (
+    request_hash  TEXT NOT NULL,
+    model_name    TEXT NOT NULL,
+    owner         TEXT NOT NULL,
+    state         TEXT NOT NULL DEFAULT 'RUNNING' CHECK (state IN ('RUNNING','DONE')),
+    response_raw  TEXT,
+    expires_at    REAL NOT NULL,
+    PRIMARY KEY (request_hash, model_name)
+) WITHOUT ROWID;
+"""
+
+
+# ----------------------------------------------------------------------
+class _Flight:
+    """Chamada em andamento dentro do processo."""
+
+    __slots__ = ("event", "response")
+
+    def __init__(self) -> None:
+        self.event = threading.Event()
+        self.response: Optional[str] = None
+
+
+# ----------------------------------------------------------------------
+class SingleFlight:
+    """
+    Executa ``fn`` uma única vez por chave entre chamadas concorrentes.
+
+    Parameters
+    ----------
+    db : SQLiteConnectionManager | None
+        Quando informado, ativa o lease entre processos (tabela
+        ``ai_inflight_leases``, criada pelo schema do wrapper).
+    lease_seconds : float
+        Validade do lease; um líder que morre libera a chave ao expirar.
+    wait_timeout : float
+        Tempo máximo que um seguidor de outro processo espera antes de
+        desistir e chamar o provider por conta própria.
+    poll_interval : float
+        Intervalo entre consultas ao lease de outro processo.
+    """
+
+    # ------------------------------------------------------------------
+    def __init__(self,
+                 db=None,
+                 lease_seconds: float = 300.0,
+                 wait_timeout: float = 600.0,
+                 poll_interval: float = 0.25) -> None:
+        self.db = db
+        self.lease_seconds = lease_seconds
+        self.wait_timeout = wait_timeout
+        self.poll_interval = poll_interval
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._flights: Dict[FlightKey, _Flight] = {}
+        self._lock = threading.Lock()
+        self.coalesced = 0
+
+    # ------------------------------------------------------------------
+    def do(self, key: FlightKey, fn: Callable[[], Optional[str]]) -> Tuple[Optional[str], bool]:
+        """
+        Executa ``fn`` (ou espera quem já está executando).
+
+        Retorna ``(resposta, executou_aqui)``. ``executou_aqui`` é False
+        quando a resposta veio de outro thread ou de outro processo.
+        """
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = _Flight()
+                self._flights[key] = flight
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            flight.event.wait()
+            return flight.response, False
+
+        response: Optional[str] = None
+        try:
+            if self.db is not None:
+                shared = self._lease_or_wait(key)
+                if shared is not None:
+                    logger.info("🔗 [SINGLE-FLIGHT] Resposta reaproveitada de outro processo.")
+                    response = shared
+                    return response, False
+            try:
+                response = fn()
+            finally:
+                if self.db is not None:
+                    self._finish_lease(key, response)
+            return response, True
+        finally:
+            flight.response = response
+            with self._lock:
+                self._flights.pop(key, None)
+            flight.event.set()
+
+    # ------------------------------------------------------------------
+    def _try_lease(self, key: FlightKey) -> Tuple[str, Optional[str]]:
+        """
+        Tenta assumir o lease da chave.
+
+        Retorna ``("ACQUIRED", None)``, ``("DONE", resposta)`` ou
+        ``("RUNNING", None)`` quando outro processo ainda está executando.
+        """
+        now = time.time()
+        with self.db.transaction() as conn:
+            conn.execute("DELETE FROM ai_inflight_leases WHERE expires_at < ?", (now,))
+            cur = conn.execute(
+                """
+                INSERT OR IGNORE INTO ai_inflight_leases
+                    (request_hash, model_name, owner, state, expires_at)
+                VALUES (?, ?, ?, 'RUNNING', ?)
+                """,
+                (key[0], key[1], self.owner, now + self.lease_seconds),
+            )
+            if cur.rowcount == 1:
+                return "ACQUIRED", None
+            row = conn.execute(
+                "SELECT state, response_raw FROM ai_inflight_leases "
+                "WHERE request_hash = ? AND model_name = ?",
+                key,
+            ).fetchone()
+        if row and row[0] == "DONE" and row[1]:
+            return "DONE", row[1]
+        return "RUNNING", None
+
+    # ------------------------------------------------------------------
+    def _lease_or_wait(self, key: FlightKey) -> Optional[str]:
+        """
+        Assume o lease (retorna None) ou espera o processo líder e
+        retorna a resposta dele.
+        """
+        deadline = time.monotonic() + self.wait_timeout
+        waited = False
+        while True:
+            try:
+                state, response = self._try_lease(key)
+            except sqlite3.Error as exc:
+                logger.warning(f"⚠️ Lease indisponível, seguindo sem coalescer: {exc}")
+                return None
+            if state == "ACQUIRED":
+                return None
+            if state == "DONE":
+                self.coalesced += 1
+                return response
+            if not waited:
+                logger.info("⏳ [SINGLE-FLIGHT] Prompt em execução em outro processo, aguardando...")
+                waited = True
+            if time.monotonic() > deadline:
+                logger.warning("⚠️ Lease de outro processo não terminou a tempo; executando localmente.")
+                return None
+            time.sleep(self.poll_interval)
+
+    # ------------------------------------------------------------------
+    def _finish_lease(self, key: FlightKey, response: Optional[str]) -> None:
+        """Publica a resposta no lease (sucesso) ou o libera (falha)."""
+        try:
+            with self.db.transaction() as conn:
+                if response is None:
+                    conn.execute(
+                        "DELETE FROM ai_inflight_leases "
+                        "WHERE request_hash = ? AND model_name = ? AND owner = ?",
+                        (key[0], key[1], self.owner),
+                    )
+                else:
+                    conn.execute(
+                        """
+                        UPDATE ai_inflight_leases
+                        SET state = 'DONE', response_raw = ?, expires_at = ?
+                        WHERE request_hash = ? AND model_name = ? AND owner = ?
+                        """,
+                        (response, time.time() + self.lease_seconds, key[0], key[1], self.owner),
+                    )
+        except sqlite3.Error as exc:
+            logger.warning(f"⚠️ Falha ao finalizar lease: {exc}")
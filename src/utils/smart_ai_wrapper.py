@@ -5,12 +5,30 @@
 SmartAIWrapper v6.7 – Guardião Devocional do HariKathaAI
 
 Recursos principais:
-- Cache inteligente (SHA‑256) com recuperação rápida.
+- Cache inteligente (SHA‑256) em duas camadas: LRU em memória + SQLite.
 - Estimativa e cálculo preciso de custo (input + output tokens).
 - Gatekeeper configurável via variáveis de ambiente.
-- Auditoria completa (prompt, resposta, tokens, latência, custo estimado, custo real, payload JSON).
-- Suporte opcional a tiktoken para contagem exata de tokens.
+- Auditoria completa (prompt, resposta, tokens, latência, custo estimado, custo real, payload JSON),
+  gravada em lote (write-behind) com spool local à prova de crash.
+- Prompts e respostas deduplicados e comprimidos em ai_blobs (blob_store).
+- Suporte opcional a tiktoken para contagem exata de tokens (encoders em cache,
+  contagem de prompts memorizada por request_hash).
 - Injeção de dependências (db_path, pricing_path, provider_func) para testes.
+- Conexão SQLite compartilhada (thread-local, WAL) com ciclo de vida explícito.
+- Lote concorrente (call_ai_many) com token bucket por provider/modelo.
+- Single-flight: prompts idênticos simultâneos viram uma única chamada
+  (no processo e, opcionalmente, entre processos via lease no SQLite).
+- Providers em streaming (geradores de chunks): saída parcial via
+  ``on_chunk`` / ``call_ai_stream`` e time-to-first-token (ttft_ms) na auditoria.
+- Prompts estruturados (template id/versão + variáveis): chave de cache
+  canônica (NFC + espaços normalizados), imune a reformatação do template.
+- Planejamento de job inteiro (plan_job / run_plan): custo, cache e tempo
+  estimados em lote, aprovados uma vez, sem confirmação por chamada.
+- Totais diários (ai_audit_rollup_daily) mantidos por trigger a cada linha
+  de auditoria, mais cache hits; relatórios em audit_report.py.
+- Métricas em processo (histogramas de latência p50/p95/p99, hit ratio por
+  camada de cache, bloqueios do gatekeeper, tokens/s, chamadas em voo):
+  Prometheus/JSON em logs/ e endpoint HTTP local opcional.
 - Rotina de expurgo (arquivo separado) para limpeza automática do SQLite.
 """
 
@@ -18,10 +36,49 @@ import os
 import json
 import hashlib
 import logging
+import queue
 import sqlite3
+import threading
 import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
-from typing import Callable, Optional, Dict, Any
+from typing import Callable, Optional, Dict, Any, Iterable, Iterator, List, Sequence, Tuple, Union
+
+try:                                    # importado como pacote (src.utils.smart_ai_wrapper)
+    from .db_connection import SQLiteConnectionManager
+    from .token_counter import TokenCounter, default_counter
+    from .rate_limiter import RateLimiterRegistry, TokenBucket
+    from .response_cache import LRUResponseCache
+    from .single_flight import SingleFlight
+    from .audit_sink import AuditSink
+    from .database_setup import AUDIT_EXTRA_COLUMNS, PERFORMANCE_PRAGMAS, init_audit_schema
+    from .blob_store import externalize_rows, decompress
+    from .audit_rollup import record_cache_hits, record_skipped_calls, hit_key
+    from .metrics import MetricsRegistry, TOKENS_PER_SECOND_BUCKETS
+    from .prompt_template import StructuredPrompt
+    from .job_planner import JobPlan, DEFAULT_LATENCY_MS
+    from .rate_controller import (
+        RateControllerRegistry, AdaptiveRateController, CircuitOpenError,
+        is_rate_limit_error, retry_after_of,
+    )
+except ImportError:                     # importado via sys.path (src/utils)
+    from db_connection import SQLiteConnectionManager
+    from token_counter import TokenCounter, default_counter
+    from rate_limiter import RateLimiterRegistry, TokenBucket
+    from response_cache import LRUResponseCache
+    from single_flight import SingleFlight
+    from audit_sink import AuditSink
+    from database_setup import AUDIT_EXTRA_COLUMNS, PERFORMANCE_PRAGMAS, init_audit_schema
+    from blob_store import externalize_rows, decompress
+    from audit_rollup import record_cache_hits, record_skipped_calls, hit_key
+    from metrics import MetricsRegistry, TOKENS_PER_SECOND_BUCKETS
+    from prompt_template import StructuredPrompt
+    from job_planner import JobPlan, DEFAULT_LATENCY_MS
+    from rate_controller import (
+        RateControllerRegistry, AdaptiveRateController, CircuitOpenError,
+        is_rate_limit_error, retry_after_of,
+    )
 
 # ----------------------------------------------------------------------
 # Configurações globais
@@ -33,6 +90,94 @@ DEFAULT_PRICING = BASE_DIR / "pricing.json"
 logger = logging.getLogger("SmartAIWrapper")
 logger.setLevel(logging.INFO)
 
+# Texto livre (hash do texto cru) ou prompt estruturado (chave canônica)
+PromptInput = Union[str, StructuredPrompt]
+
+# Provider bloqueante (retorna str) ou em streaming (retorna um iterável de chunks)
+ProviderFunc = Callable[[str, str], Union[str, Iterable[str]]]
+
+# ----------------------------------------------------------------------
+# Schema e comandos SQL (strings fixas = prepared statements reaproveitados)
+# ----------------------------------------------------------------------
+# Média de latência das últimas chamadas bem-sucedidas (estimativa do planner)
+SQL_RECENT_LATENCY = """
+    SELECT AVG(latency_ms) FROM (
+        SELECT latency_ms FROM ai_audit_logs
+        WHERE model_name = ? AND status_code = 'SUCCESS' AND latency_ms IS NOT NULL
+        ORDER BY audit_id DESC
+        LIMIT 200
+    )
+"""
+
+# Lote de chaves consultadas por vez no planner (limite de parâmetros do SQLite)
+PLAN_LOOKUP_CHUNK = 500
+
+SQL_CACHE_LOOKUP = """
+    SELECT l.response_raw, b.codec, b.data
+    FROM ai_audit_logs l
+    LEFT JOIN ai_blobs b ON b.blob_hash = l.response_ref
+    WHERE l.request_hash = ? AND l.model_name = ?
+      AND l.status_code = 'SUCCESS'
+    ORDER BY l.created_at DESC
+    LIMIT 1
+"""
+
+# Upsert: a chave (request_hash, model_name) é única. Uma nova chamada
+# substitui a linha anterior, exceto uma falha sobre um SUCCESS já gravado
+# (o cache continua valendo). Também torna a regravação do spool idempotente.
+SQL_AUDIT_INSERT = """
+    INSERT INTO ai_audit_logs (
+        lecture_id, book_id, job_id, model_name, request_hash,
+        prompt_raw, response_raw,
+        input_tokens, output_tokens,
+        estimated_cost_usd, cost_usd,
+        latency_ms, ttft_ms, status_code, payload_json,
+        prompt_ref, response_ref,
+        created_at, updated_at
+    ) VALUES (
+        :lecture_id, :book_id, :job_id, :model_name, :request_hash,
+        :prompt_raw, :response_raw,
+        :input_tokens, :output_tokens,
+        :estimated_cost_usd, :cost_usd,
+        :latency_ms, :ttft_ms, :status_code, :payload_json,
+        :prompt_ref, :response_ref,
+        CURRENT_TIMESTAMP, CURRENT_TIMESTAMP
+    )
+    ON CONFLICT(request_hash, model_name) DO UPDATE SET
+        lecture_id         = excluded.lecture_id,
+        book_id            = excluded.book_id,
+        job_id             = excluded.job_id,
+        prompt_raw         = excluded.prompt_raw,
+        response_raw       = excluded.response_raw,
+        input_tokens       = excluded.input_tokens,
+        output_tokens      = excluded.output_tokens,
+        estimated_cost_usd = excluded.estimated_cost_usd,
+        cost_usd           = excluded.cost_usd,
+        latency_ms         = excluded.latency_ms,
+        ttft_ms            = excluded.ttft_ms,
+        status_code        = excluded.status_code,
+        payload_json       = excluded.payload_json,
+        prompt_ref         = excluded.prompt_ref,
+        response_ref       = excluded.response_ref,
+        created_at         = excluded.created_at,
+        updated_at         = CURRENT_TIMESTAMP
+    WHERE excluded.status_code = 'SUCCESS'
+       OR ai_audit_logs.status_code <> 'SUCCESS'
+"""
+
+def prepare_audit_rows(conn: sqlite3.Connection, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Hook do ``AuditSink``: completa colunas novas em linhas antigas do
+    spool, soma nos totais as falhas que o upsert vai ignorar e move
+    prompt/resposta para ``ai_blobs``.
+    """
+    for row in rows:
+        for column in AUDIT_EXTRA_COLUMNS:
+            row.setdefault(column, None)
+    record_skipped_calls(conn, rows)
+    return externalize_rows(conn, rows)
+
+
 # ----------------------------------------------------------------------
 class SmartAIWrapper:
     """
@@ -41,12 +186,24 @@ class SmartAIWrapper:
     - Gatekeeper de custo
     - Auditoria detalhada
     - Possibilidade de injetar função real de chamada (provider_func)
+
+    Mantém uma conexão SQLite por thread durante toda a vida do objeto;
+    use ``close()`` (ou ``with SmartAIWrapper() as wrapper:``) ao terminar.
     """
 
     # ------------------------------------------------------------------
     def __init__(self,
                  db_path: Optional[Path] = None,
-                 pricing_path: Optional[Path] = None) -> None:
+                 pricing_path: Optional[Path] = None,
+                 token_counter: Optional[TokenCounter] = None,
+                 rate_limits: Optional[Dict[str, float]] = None,
+                 memory_cache_bytes: Optional[int] = None,
+                 cross_process_coalescing: Optional[bool] = None,
+                 audit_batch_size: Optional[int] = None,
+                 audit_flush_interval: Optional[float] = None,
+                 adaptive_rate: Optional[bool] = None,
+                 simulated_latency: Optional[float] = None,
+                 metrics: Optional[MetricsRegistry] = None) -> None:
         """
         Parameters
         ----------
@@ -54,15 +211,187 @@ class SmartAIWrapper:
             Caminho opcional para o SQLite (padrão = DEFAULT_DB). Útil em testes.
         pricing_path : Path | None
             Caminho opcional para o arquivo pricing.json (padrão = DEFAULT_PRICING).
+        token_counter : TokenCounter | None
+            Contador de tokens (padrão = instância compartilhada do processo).
+        rate_limits : dict | None
+            Requisições/s por ``"provider:modelo"`` ou ``"modelo"``
+            (ex.: ``{"gemini-2.0-flash": 4}``). Vale para ``call_ai`` e
+            ``call_ai_many``.
+        memory_cache_bytes : int | None
+            Orçamento do cache LRU em memória (padrão = ``HARI_CACHE_MAX_BYTES``
+            ou 64 MiB; ``0`` desativa).
+        cross_process_coalescing : bool | None
+            Coalesce prompts idênticos também entre processos, via lease em
+            ``ai_inflight_leases`` (padrão = ``HARI_CROSS_PROCESS_LEASES=1``).
+            Dentro do processo a coalescência está sempre ativa.
+        audit_batch_size : int | None
+            Linhas de auditoria por lote write-behind (padrão =
+            ``HARI_AUDIT_BATCH`` ou 50; ``1`` grava cada linha na hora).
+        audit_flush_interval : float | None
+            Segundos máximos até o flush do lote (padrão =
+            ``HARI_AUDIT_FLUSH_SECONDS`` ou 2.0).
+        adaptive_rate : bool | None
+            Ritmo adaptativo + circuit breaker por provider/modelo, guiado
+            por 429/``RATE_LIMIT`` e latência (padrão = ``HARI_ADAPTIVE_RATE=1``).
+            Chamadas com limite de cota são repetidas até
+            ``HARI_RATE_LIMIT_RETRIES`` (3) vezes após o backoff.
+        simulated_latency : float | None
+            Segundos de espera do provider simulado (sem ``provider_func``)
+            (padrão = ``HARI_SIMULATED_LATENCY`` ou 0.5).
+        metrics : MetricsRegistry | None
+            Registro de métricas (padrão = um novo por wrapper). Com
+            ``HARI_METRICS_PORT`` sobe o endpoint HTTP local; com
+            ``HARI_METRICS_DUMP=prom|json`` grava ``logs/metrics.*`` no ``close()``.
         """
         self.db_path = Path(db_path) if db_path else DEFAULT_DB
         self.pricing_path = Path(pricing_path) if pricing_path else DEFAULT_PRICING
 
         self._load_pricing()
+        self.tokens = token_counter or default_counter
+
+        # Conexão compartilhada (WAL, schema de auditoria garantido uma vez)
+        self._db = SQLiteConnectionManager(
+            self.db_path, init_script=init_audit_schema, pragmas=PERFORMANCE_PRAGMAS,
+        )
 
         # Configurações de ambiente
         self.cost_limit = float(os.getenv("HARI_COST_LIMIT", "0.10"))   # USD
         self.env = os.getenv("HARI_ENV", "development")               # development | production
+        self.max_concurrency = int(os.getenv("HARI_MAX_CONCURRENCY", "4"))
+
+        # Token bucket por provider/modelo (compartilhado entre threads)
+        self.rate_limiters = RateLimiterRegistry(rate_limits)
+
+        # Ritmo adaptativo (AIMD + backoff + circuit breaker) por provider/modelo
+        if adaptive_rate is None:
+            adaptive_rate = os.getenv("HARI_ADAPTIVE_RATE", "1") == "1"
+        self.rate_controllers = RateControllerRegistry() if adaptive_rate else None
+        self.rate_limit_retries = int(os.getenv("HARI_RATE_LIMIT_RETRIES", "3"))
+        if simulated_latency is None:
+            simulated_latency = float(os.getenv("HARI_SIMULATED_LATENCY", "0.5"))
+        self.simulated_latency = simulated_latency
+
+        # Cache em duas camadas: LRU (memória) na frente do ai_audit_logs
+        if memory_cache_bytes is None:
+            memory_cache_bytes = int(os.getenv("HARI_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+        self.memory_cache = LRUResponseCache(memory_cache_bytes)
+        self.sqlite_hits = 0
+        self.sqlite_misses = 0
+
+        # Cache hits ainda não somados em ai_audit_rollup_daily
+        self._pending_hits: Dict[Tuple[str, int, int], int] = {}
+        self._hits_lock = threading.Lock()
+
+        # Single-flight: prompts idênticos em andamento viram uma só chamada
+        if cross_process_coalescing is None:
+            cross_process_coalescing = os.getenv("HARI_CROSS_PROCESS_LEASES", "0") == "1"
+        self.single_flight = SingleFlight(self._db if cross_process_coalescing else None)
+
+        # Métricas (latência, cache por camada, gatekeeper, tokens/s, em voo)
+        self.metrics = metrics or MetricsRegistry()
+        self._init_metrics()
+        self.metrics_dump = os.getenv("HARI_METRICS_DUMP", "")
+        metrics_port = os.getenv("HARI_METRICS_PORT")
+        if metrics_port:
+            try:
+                self.metrics.serve(int(metrics_port))
+            except OSError as exc:
+                logger.warning(f"⚠️ Endpoint de métricas não iniciado (porta {metrics_port}): {exc}")
+
+        # Auditoria write-behind (lote + spool local à prova de crash)
+        if audit_batch_size is None:
+            audit_batch_size = int(os.getenv("HARI_AUDIT_BATCH", "50"))
+        if audit_flush_interval is None:
+            audit_flush_interval = float(os.getenv("HARI_AUDIT_FLUSH_SECONDS", "2.0"))
+        spool_dir = None if str(self.db_path) == ":memory:" else self.db_path.parent / "audit_spool"
+        self.audit_sink = AuditSink(
+            self._db,
+            SQL_AUDIT_INSERT,
+            batch_size=audit_batch_size,
+            flush_interval=audit_flush_interval,
+            spool_dir=spool_dir,
+            prepare=self._prepare_audit_batch,  # textos → ai_blobs, cache hits → totais
+        )
+
+    # ------------------------------------------------------------------
+    def _init_metrics(self) -> None:
+        m = self.metrics
+        self._m_latency = m.histogram(
+            "hari_call_latency_ms", "Latência das chamadas ao provider (ms)", ("provider", "model"))
+        self._m_ttft = m.histogram(
+            "hari_ttft_ms", "Tempo até o primeiro chunk em streaming (ms)", ("provider", "model"))
+        self._m_calls = m.counter(
+            "hari_calls_total", "Chamadas ao provider por status", ("provider", "model", "status"))
+        self._m_tokens = m.counter(
+            "hari_tokens_total", "Tokens de chamadas SUCCESS", ("provider", "model", "direction"))
+        self._m_tps = m.histogram(
+            "hari_output_tokens_per_second", "Tokens de saída por segundo, por chamada",
+            ("provider", "model"), buckets=TOKENS_PER_SECOND_BUCKETS)
+        self._m_inflight = m.gauge(
+            "hari_inflight_requests", "Chamadas ao provider em andamento", ("provider", "model"))
+        self._m_cache = m.counter(
+            "hari_cache_lookups_total", "Consultas ao cache por camada", ("tier", "result"))
+        self._m_hit_ratio = m.gauge(
+            "hari_cache_hit_ratio", "Hits / consultas por camada de cache", ("tier",))
+        self._m_gatekeeper = m.counter(
+            "hari_gatekeeper_total", "Chamadas barradas pelo gatekeeper", ("model", "outcome"))
+
+    def _count_cache(self, tier: str, hit: bool) -> None:
+        hits = self._m_cache.labels(tier=tier, result="hit")
+        misses = self._m_cache.labels(tier=tier, result="miss")
+        (hits if hit else misses).inc()
+        total = hits.value + misses.value
+        self._m_hit_ratio.labels(tier=tier).set(hits.value / total if total else 0.0)
+
+    def dump_metrics(self, path: Optional[Union[str, Path]] = None, fmt: str = "prom") -> Path:
+        """Grava as métricas (Prometheus ou JSON; padrão ``logs/metrics.prom``)."""
+        return self.metrics.dump(path, fmt)
+
+    # ------------------------------------------------------------------
+    def _prepare_audit_batch(self, conn: sqlite3.Connection,
+                             rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Hook do ``AuditSink``: ``prepare_audit_rows`` + cache hits no mesmo commit."""
+        self._flush_cache_hits(conn)
+        return prepare_audit_rows(conn, rows)
+
+    def _note_cache_hit(self, model: str, book_id: Optional[int], job_id: Optional[int]) -> None:
+        key = hit_key(model, book_id, job_id)
+        with self._hits_lock:
+            self._pending_hits[key] = self._pending_hits.get(key, 0) + 1
+
+    def _flush_cache_hits(self, conn: Optional[sqlite3.Connection] = None) -> None:
+        with self._hits_lock:
+            hits, self._pending_hits = self._pending_hits, {}
+        if not hits:
+            return
+        if conn is not None:
+            record_cache_hits(conn, hits)
+            return
+        with self._db.transaction() as own:
+            record_cache_hits(own, hits)
+
+    # ------------------------------------------------------------------
+    def flush_audit(self) -> int:
+        """Grava imediatamente as linhas de auditoria pendentes (e os cache hits)."""
+        written = self.audit_sink.flush()
+        self._flush_cache_hits()
+        return written
+
+    # ------------------------------------------------------------------
+    def close(self) -> None:
+        """Grava a auditoria pendente e fecha as conexões SQLite do wrapper."""
+        self.audit_sink.close()
+        self._flush_cache_hits()
+        if self.metrics_dump:
+            logger.info(f"📈 [METRICS] {self.dump_metrics(fmt=self.metrics_dump)}")
+        self.metrics.stop()
+        self._db.close()
+
+    def __enter__(self) -> "SmartAIWrapper":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
 
     # ------------------------------------------------------------------
     def _load_pricing(self) -> None:
@@ -85,20 +414,27 @@ class SmartAIWrapper:
         """Retorna hash SHA‑256 do prompt (identificador único)."""
         return hashlib.sha256(prompt.encode("utf-8")).hexdigest()
 
+    # ------------------------------------------------------------------
+    def _prompt_key(self, prompt: PromptInput) -> Tuple[str, str, Optional[Dict[str, Any]]]:
+        """Retorna ``(texto, request_hash, template)`` de um prompt."""
+        if isinstance(prompt, StructuredPrompt):
+            return prompt.text, prompt.cache_key, prompt.describe()
+        return prompt, self._hash_prompt(prompt), None
+
+    # ------------------------------------------------------------------
+    @staticmethod
+    def _estimate_output_tokens(input_tokens: int) -> int:
+        """Chute conservador para a saída: max(1000, input/2)."""
+        return max(1000, input_tokens // 2)
+
     # ------------------------------------------------------------------
     @staticmethod
     def _count_tokens(text: str, model: str = "default") -> int:
         """
-        Conta tokens usando tiktoken quando disponível.
+        Conta tokens usando tiktoken quando disponível (encoder em cache).
         Fallback: 1 token ≈ 3 caracteres (conservador).
         """
-        try:
-            import tiktoken
-            enc = tiktoken.get_encoding("cl100k_base")   # funciona para GPT‑4/Gemini‑Flash etc.
-            return len(enc.encode(text))
-        except Exception:
-            # Heurística segura
-            return max(1, len(text) // 3)
+        return default_counter.count(text, model)
 
     # ------------------------------------------------------------------
     def _calculate_cost(self,
@@ -114,99 +450,168 @@ class SmartAIWrapper:
 
     # ------------------------------------------------------------------
     def _check_cache(self, request_hash: str, model: str) -> Optional[str]:
-        """Retorna resposta cacheada (mais recente) ou None."""
+        """
+        Retorna resposta cacheada (mais recente) ou None.
+
+        Camada 1: LRU em memória. Camada 2: ai_audit_logs (SQLite);
+        um hit na camada 2 promove a resposta para a camada 1.
+        """
+        key = (request_hash, model)
+        cached = self.memory_cache.get(key)
+        self._count_cache("memory", cached is not None)
+        if cached is not None:
+            return cached
+
+        # Linha SUCCESS ainda no buffer write-behind
+        cached = self.audit_sink.pending_response(request_hash, model)
+        self._count_cache("write_behind", bool(cached))
+        if cached:
+            return cached
+
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                cur = conn.execute(
-                    """
-                    SELECT response_raw FROM ai_audit_logs
-                    WHERE request_hash = ? AND model_name = ?
-                      AND status_code = 'SUCCESS'
-                    ORDER BY created_at DESC
-                    LIMIT 1
-                    """,
-                    (request_hash, model),
-                )
-                row = cur.fetchone()
-                return row[0] if row else None
+            row = self._db.connection().execute(
+                SQL_CACHE_LOOKUP, (request_hash, model)
+            ).fetchone()
         except sqlite3.OperationalError:
             # Tabela pode ainda não existir – ignora cache
             return None
 
+        response = None
+        if row:
+            # Linhas novas guardam a resposta em ai_blobs; antigas, inline
+            response = decompress(row[1], row[2]) if row[2] is not None else row[0]
+        self._count_cache("sqlite", bool(response))
+        if response:
+            self.sqlite_hits += 1
+            self.memory_cache.put(key, response)
+            return response
+        self.sqlite_misses += 1
+        return None
+
+    # ------------------------------------------------------------------
+    def cache_stats(self) -> Dict[str, Dict[str, int]]:
+        """Contadores das duas camadas de cache (memória e SQLite)."""
+        return {
+            "memory": self.memory_cache.stats(),
+            "sqlite": {"hits": self.sqlite_hits, "misses": self.sqlite_misses},
+        }
+
     # ------------------------------------------------------------------
     def _register_audit(self, data: Dict[str, Any]) -> None:
         """
-        Insere registro completo na tabela ai_audit_logs.
+        Registra a chamada na tabela ai_audit_logs (via ``audit_sink``).
+
+        A gravação é write-behind: a linha entra no buffer/spool e vai para
+        o SQLite no próximo lote. Use ``flush_audit()`` para forçar.
 
         Campos esperados em ``data``:
         lecture_id, book_id, job_id, model_name, request_hash,
         prompt_raw, response_raw, input_tokens, output_tokens,
-        estimated_cost_usd, cost_usd, latency_ms, status_code,
+        estimated_cost_usd, cost_usd, latency_ms, ttft_ms, status_code,
         payload_json
+
+        Respostas ``SUCCESS`` também entram no cache em memória.
         """
+        if data["status_code"] == "SUCCESS" and data["response_raw"]:
+            self.memory_cache.put((data["request_hash"], data["model_name"]), data["response_raw"])
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                conn.execute(
-                    """
-                    INSERT INTO ai_audit_logs (
-                        lecture_id, book_id, job_id, model_name, request_hash,
-                        prompt_raw, response_raw,
-                        input_tokens, output_tokens,
-                        estimated_cost_usd, cost_usd,
-                        latency_ms, status_code, payload_json,
-                        created_at, updated_at
-                    ) VALUES (
-                        :lecture_id, :book_id, :job_id, :model_name, :request_hash,
-                        :prompt_raw, :response_raw,
-                        :input_tokens, :output_tokens,
-                        :estimated_cost_usd, :cost_usd,
-                        :latency_ms, :status_code, :payload_json,
-                        CURRENT_TIMESTAMP, CURRENT_TIMESTAMP
-                    )
-                    """,
-                    data,
-                )
+            self.audit_sink.write(data)
             logger.info(
                 f"✅ [AUDIT] modelo={data['model_name']} "
                 f"status={data['status_code']} custo=${data['cost_usd']:.5f} "
                 f"lat={data['latency_ms']}ms"
+                + (f" ttft={data['ttft_ms']}ms" if data.get("ttft_ms") is not None else "")
             )
         except Exception as exc:
             logger.error(f"❌ Falha ao gravar auditoria: {exc}")
 
     # ------------------------------------------------------------------
-    def call_ai(self,
-                prompt: str,
-                model: str = "gemini-1.5-flash",
-                lecture_id: Optional[int] = None,
-                book_id: Optional[int] = None,
-                job_id: Optional[int] = None,
-                force: bool = False,
-                provider_func: Optional[Callable[[str, str], str]] = None) -> Optional[str]:
+    @staticmethod
+    def _audit_row(ctx: Dict[str, Any],
+                   response: str,
+                   output_tokens: int,
+                   cost: float,
+                   latency_ms: int,
+                   status: str,
+                   ttft_ms: Optional[int] = None) -> Dict[str, Any]:
+        """Monta o dicionário de auditoria a partir do contexto da chamada."""
+        # call_id distingue uma nova chamada da regravação do spool (totais diários)
+        payload = {"prompt": ctx["prompt"], "model": ctx["model"], "call_id": uuid.uuid4().hex}
+        if ctx.get("template"):
+            payload.update(ctx["template"])
+        return {
+            "lecture_id": ctx["lecture_id"],
+            "book_id": ctx["book_id"],
+            "job_id": ctx["job_id"],
+            "model_name": ctx["model"],
+            "request_hash": ctx["request_hash"],
+            "prompt_raw": ctx["prompt"],           # texto integral
+            "response_raw": response,              # texto integral
+            "input_tokens": ctx["input_tokens"],
+            "output_tokens": output_tokens,
+            "estimated_cost_usd": ctx["est_cost"],
+            "cost_usd": cost,
+            "latency_ms": latency_ms,
+            "ttft_ms": ttft_ms,
+            "status_code": status,
+            "payload_json": json.dumps(payload),
+        }
+
+    # ------------------------------------------------------------------
+    def _prepare_call(self,
+                      prompt: PromptInput,
+                      model: str,
+                      lecture_id: Optional[int],
+                      book_id: Optional[int],
+                      job_id: Optional[int],
+                      force: bool,
+                      gatekeeper: bool = True) -> Dict[str, Any]:
         """
-        Executa a chamada ao modelo de IA com:
-        1️⃣ Verificação de cache (se ``force`` = False).
-        2️⃣ Estimativa de custo e gatekeeper.
-        3️⃣ Execução real (via ``provider_func`` ou simulação).
-        4️⃣ Registro de auditoria completo.
+        Etapas que antecedem o provider: cache e gatekeeper.
 
-        Retorna a resposta da IA quando ``status_code == 'SUCCESS'``,
-        ou ``None`` em caso de bloqueio ou erro.
+        Retorna o contexto da chamada com ``state`` em
+        ``CACHED`` | ``BLOCKED`` | ``ABORTED`` | ``READY``.
+        Chamadas bloqueadas trazem a linha de auditoria em ``ctx["audit"]``
+        (quem chama decide quando gravá-la).
+
+        Um ``StructuredPrompt`` usa a própria chave canônica como
+        ``request_hash``; texto livre usa o SHA‑256 do texto cru.
+        ``gatekeeper=False`` (plano já aprovado) pula o limite por chamada.
         """
-        request_hash = self._hash_prompt(prompt)
+        source = prompt
+        prompt, request_hash, template = self._prompt_key(prompt)
+        ctx: Dict[str, Any] = {
+            "state": "READY",
+            "prompt": prompt,
+            "template": template,
+            "model": model,
+            "lecture_id": lecture_id,
+            "book_id": book_id,
+            "job_id": job_id,
+            "force": force,
+            "request_hash": request_hash,
+            "response": None,
+            "audit": None,
+        }
 
         # -------------------- 1️⃣ CACHE --------------------
         if not force:
             cached = self._check_cache(request_hash, model)
             if cached:
                 logger.info("⚡ [CACHE HIT] Resposta recuperada – custo $0.00")
-                return cached
+                self._note_cache_hit(model, book_id, job_id)
+                ctx.update(state="CACHED", response=cached)
+                return ctx
 
         # -------------------- 2️⃣ GATEKEEPER --------------------
-        input_tokens = self._count_tokens(prompt, model)
-        # Chute conservador para saída: max(1000, input/2)
-        est_output_tokens = max(1000, input_tokens // 2)
+        if isinstance(source, StructuredPrompt):
+            # Prefixo estático já contado no template: só as variáveis são tokenizadas
+            input_tokens = source.count_tokens(self.tokens, model)
+        else:
+            input_tokens = self.tokens.count_prompt(request_hash, prompt, model)
+        est_output_tokens = self._estimate_output_tokens(input_tokens)
         est_cost = self._calculate_cost(model, input_tokens, est_output_tokens)
+        ctx.update(input_tokens=input_tokens, est_cost=est_cost)
 
         logger.info(
             f"[GATEKEEPER] modelo={model} "
@@ -214,82 +619,604 @@ class SmartAIWrapper:
             f"custo_estimado=${est_cost:.5f}"
         )
 
-        if est_cost > self.cost_limit:
+        if gatekeeper and est_cost > self.cost_limit:
             msg = f"Custo estimado ${est_cost:.5f} > limite ${self.cost_limit:.2f}"
             if self.env == "production":
                 logger.error(f"🛑 [BLOCKED] {msg}")
-                self._register_audit({
-                    "lecture_id": lecture_id,
-                    "book_id": book_id,
-                    "job_id": job_id,
-                    "model_name": model,
-                    "request_hash": request_hash,
-                    "prompt_raw": prompt,
-                    "response_raw": "",
-                    "input_tokens": input_tokens,
-                    "output_tokens": 0,
-                    "estimated_cost_usd": est_cost,
-                    "cost_usd": 0.0,
-                    "latency_ms": 0,
-                    "status_code": "COST_BLOCKED",
-                    "payload_json": json.dumps({"prompt": prompt, "model": model}),
-                })
-                return None
+                self._m_gatekeeper.labels(model=model, outcome="blocked").inc()
+                ctx.update(
+                    state="BLOCKED",
+                    audit=self._audit_row(ctx, "", 0, 0.0, 0, "COST_BLOCKED"),
+                )
             else:
                 confirm = input(f"⚠️ {msg}. Prosseguir? (y/n): ")
                 if confirm.lower() not in {"y", "yes", "s", "sim"}:
                     logger.info("❌ Chamada abortada pelo usuário.")
-                    return None
+                    self._m_gatekeeper.labels(model=model, outcome="aborted").inc()
+                    ctx["state"] = "ABORTED"
 
-        # -------------------- 3️⃣ EXECUÇÃO --------------------
-        start = time.perf_counter()
-        status = "SUCCESS"
-        response = ""
-        error_msg = ""
+        return ctx
 
-        try:
-            if provider_func:
-                response = provider_func(prompt, model)   # chamada real
+    # ------------------------------------------------------------------
+    def _execute_call(self,
+                      ctx: Dict[str, Any],
+                      provider_func: Optional[ProviderFunc],
+                      limiter: Optional[TokenBucket] = None,
+                      on_chunk: Optional[Callable[[str], None]] = None) -> Tuple[Optional[str], Dict[str, Any]]:
+        """
+        Executa o provider para um contexto ``READY``.
+
+        Se o provider devolver um iterável de chunks (streaming), cada chunk
+        vai para ``on_chunk`` assim que chega e o tempo até o primeiro
+        chunk é registrado em ``ttft_ms``.
+
+        Retorna ``(resposta | None, linha_de_auditoria)``; não grava nada.
+        """
+        prompt, model = ctx["prompt"], ctx["model"]
+        provider = self._provider_name(provider_func)
+        controller: Optional[AdaptiveRateController] = None
+        if self.rate_controllers is not None and provider_func is not None:
+            controller = self.rate_controllers.get(provider, model)
+        inflight = self._m_inflight.labels(provider=provider, model=model)
+
+        attempt = 0
+        while True:
+            status = "SUCCESS"
+            response = ""
+            ttft_ms: Optional[int] = None
+            parts: List[str] = []
+            start = time.perf_counter()
+            running = False
+
+            try:
+                if controller is not None:
+                    controller.acquire()
+                if limiter is not None:
+                    limiter.acquire()
+
+                # -------------------- 3️⃣ EXECUÇÃO --------------------
+                start = time.perf_counter()
+                inflight.inc()
+                running = True
+                if provider_func:
+                    result = provider_func(prompt, model)     # chamada real
+                    if isinstance(result, str):
+                        response = result
+                    else:
+                        for chunk in result:                  # streaming
+                            if not chunk:
+                                continue
+                            if ttft_ms is None:
+                                ttft_ms = int((time.perf_counter() - start) * 1000)
+                            parts.append(chunk)
+                            if on_chunk is not None:
+                                on_chunk(chunk)
+                        response = "".join(parts)
+                else:
+                    # Simulação para desenvolvimento / teste
+                    if self.simulated_latency > 0:
+                        time.sleep(self.simulated_latency)
+                    response = f"[SIMULAÇÃO] Resposta para: {prompt[:30]}..."
+            except CircuitOpenError as exc:
+                status = "ERROR"
+                response = str(exc)
+                logger.error(f"🛑 {exc}")
+            except Exception as exc:
+                response = str(exc)
+                if is_rate_limit_error(exc):
+                    status = "RATE_LIMIT"
+                    if controller is not None:
+                        controller.record_rate_limited(retry_after_of(exc))
+                        # Só repete se nenhum chunk já foi entregue ao chamador
+                        if attempt < self.rate_limit_retries and not parts:
+                            attempt += 1
+                            continue
+                    logger.error(f"⏳ Limite de cota ao chamar IA: {exc}")
+                else:
+                    status = "ERROR"
+                    if controller is not None:
+                        controller.record_failure()
+                    logger.error(f"❌ Erro ao chamar IA: {exc}")
             else:
-                # Simulação para desenvolvimento / teste
-                time.sleep(0.5)
-                response = f"[SIMULAÇÃO] Resposta para: {prompt[:30]}..."
-        except Exception as exc:
-            status = "ERROR"
-            error_msg = str(exc)
-            response = error_msg
-            logger.error(f"❌ Erro ao chamar IA: {exc}")
+                if controller is not None:
+                    controller.record_success((time.perf_counter() - start) * 1000)
+            finally:
+                if running:
+                    inflight.dec()
+            break
 
-        latency_ms = int((time.perf_counter() - start) * 1000)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        latency_ms = int(elapsed_ms)
 
         # -------------------- 4️⃣ CÁLCULO FINAL --------------------
-        output_tokens = self._count_tokens(response, model) if status == "SUCCESS" else 0
+        output_tokens = self.tokens.count(response, model) if status == "SUCCESS" else 0
         real_cost = (
-            self._calculate_cost(model, input_tokens, output_tokens)
+            self._calculate_cost(model, ctx["input_tokens"], output_tokens)
             if status == "SUCCESS"
             else 0.0
         )
 
+        labels = {"provider": provider, "model": model}
+        self._m_calls.labels(status=status, **labels).inc()
+        if running:                             # o provider chegou a ser chamado
+            self._m_latency.labels(**labels).observe(elapsed_ms)
+            if ttft_ms is not None:
+                self._m_ttft.labels(**labels).observe(ttft_ms)
+        if status == "SUCCESS":
+            self._m_tokens.labels(direction="input", **labels).inc(ctx["input_tokens"])
+            self._m_tokens.labels(direction="output", **labels).inc(output_tokens)
+            if elapsed_ms > 0:
+                self._m_tps.labels(**labels).observe(output_tokens / (elapsed_ms / 1000))
+
+        audit = self._audit_row(ctx, response, output_tokens, real_cost, latency_ms, status, ttft_ms)
+        return (response if status == "SUCCESS" else None), audit
+
+    # ------------------------------------------------------------------
+    def _run_coalesced(self,
+                       ctx: Dict[str, Any],
+                       provider_func: Optional[ProviderFunc],
+                       limiter: Optional[TokenBucket] = None,
+                       on_chunk: Optional[Callable[[str], None]] = None) -> Tuple[Optional[str], Optional[Dict[str, Any]]]:
+        """
+        ``_execute_call`` com single-flight por ``(request_hash, model)``.
+
+        Só o líder chama o provider e devolve a linha de auditoria; os
+        seguidores recebem a mesma resposta e ``None`` no lugar da auditoria
+        (para eles a chamada equivale a um cache hit). ``force`` ignora a
+        coalescência. Só o líder recebe os chunks em ``on_chunk``.
+        """
+        if ctx["force"]:
+            return self._execute_call(ctx, provider_func, limiter, on_chunk)
+
+        holder: Dict[str, Any] = {}
+
+        def run() -> Optional[str]:
+            response, holder["audit"] = self._execute_call(ctx, provider_func, limiter, on_chunk)
+            return response
+
+        key = (ctx["request_hash"], ctx["model"])
+        response, leader = self.single_flight.do(key, run)
+        if not leader:
+            logger.info("🔗 [SINGLE-FLIGHT] Prompt idêntico em andamento – resposta compartilhada")
+            self._count_cache("single_flight", bool(response))
+            if response:
+                self.memory_cache.put(key, response)
+        return response, holder.get("audit")
+
+    # ------------------------------------------------------------------
+    @staticmethod
+    def _provider_name(provider_func: Optional[Callable[..., Any]]) -> str:
+        """Nome estável do provider (chave dos limitadores de taxa)."""
+        if provider_func is None:
+            return "simulation"
+        return getattr(provider_func, "__name__", type(provider_func).__name__)
+
+    # ------------------------------------------------------------------
+    def call_ai(self,
+                prompt: PromptInput,
+                model: str = "gemini-1.5-flash",
+                lecture_id: Optional[int] = None,
+                book_id: Optional[int] = None,
+                job_id: Optional[int] = None,
+                force: bool = False,
+                provider_func: Optional[ProviderFunc] = None,
+                on_chunk: Optional[Callable[[str], None]] = None,
+                gatekeeper: bool = True) -> Optional[str]:
+        """
+        Executa a chamada ao modelo de IA com:
+        1️⃣ Verificação de cache (se ``force`` = False).
+        2️⃣ Estimativa de custo e gatekeeper.
+        3️⃣ Execução real (via ``provider_func`` ou simulação).
+        4️⃣ Registro de auditoria completo.
+
+        ``prompt`` pode ser texto livre ou um ``StructuredPrompt``
+        (``PromptTemplate.bind(...)``), cuja chave de cache ignora a
+        formatação do template.
+
+        ``provider_func`` pode devolver a resposta inteira (str) ou um
+        iterável de chunks; neste caso ``on_chunk`` recebe cada chunk assim
+        que chega. Respostas de cache (ou de uma chamada idêntica em
+        andamento) chegam a ``on_chunk`` como um único chunk.
+
+        ``gatekeeper=False`` dispensa o limite por chamada (já aprovada por
+        ``gate_call`` ou por um plano) – é o que workers em threads usam,
+        para a confirmação interativa nunca sair de várias threads.
+
+        Retorna a resposta da IA quando ``status_code == 'SUCCESS'``,
+        ou ``None`` em caso de bloqueio ou erro.
+        """
+        delivered = False
+
+        def forward(chunk: str) -> None:
+            nonlocal delivered
+            delivered = True
+            on_chunk(chunk)
+
+        ctx = self._prepare_call(prompt, model, lecture_id, book_id, job_id, force, gatekeeper)
+        if ctx["state"] == "CACHED":
+            if on_chunk is not None:
+                on_chunk(ctx["response"])
+            return ctx["response"]
+        if ctx["state"] == "BLOCKED":
+            self._register_audit(ctx["audit"])
+            return None
+        if ctx["state"] == "ABORTED":
+            return None
+
+        limiter = self.rate_limiters.get(self._provider_name(provider_func), model)
+        response, audit = self._run_coalesced(
+            ctx, provider_func, limiter, forward if on_chunk is not None else None
+        )
+        if on_chunk is not None and response and not delivered:
+            on_chunk(response)          # seguidor do single-flight / provider bloqueante
+
         # -------------------- 5️⃣ AUDITORIA --------------------
-        self._register_audit({
+        if audit is not None:
+            self._register_audit(audit)
+        return response
+
+    # ------------------------------------------------------------------
+    def gate_call(self,
+                  prompt: PromptInput,
+                  model: str = "gemini-1.5-flash",
+                  lecture_id: Optional[int] = None,
+                  book_id: Optional[int] = None,
+                  job_id: Optional[int] = None,
+                  force: bool = False) -> bool:
+        """
+        Só o cache e o gatekeeper de ``call_ai``, na thread que chama.
+
+        Para quem despacha chamadas a um pool: aprova (ou bloqueia) cada
+        prompt em série na thread principal e manda ao worker só o que
+        passou, com ``call_ai(..., gatekeeper=False)``. Bloqueios são
+        auditados aqui. Retorna ``True`` se a chamada pode seguir.
+        """
+        ctx = self._prepare_call(prompt, model, lecture_id, book_id, job_id, force)
+        if ctx["state"] == "BLOCKED":
+            self._register_audit(ctx["audit"])
+        return ctx["state"] in ("CACHED", "READY")
+
+    # ------------------------------------------------------------------
+    def call_ai_stream(self,
+                       prompt: PromptInput,
+                       model: str = "gemini-1.5-flash",
+                       lecture_id: Optional[int] = None,
+                       book_id: Optional[int] = None,
+                       job_id: Optional[int] = None,
+                       force: bool = False,
+                       provider_func: Optional[ProviderFunc] = None) -> Iterator[str]:
+        """
+        ``call_ai`` como gerador: devolve os chunks à medida que chegam.
+
+        A chamada (cache, gatekeeper, provider e auditoria) roda numa thread
+        própria, então quem consome pode processar o início da resposta
+        enquanto o modelo ainda gera o resto. Bloqueio ou erro antes do
+        primeiro chunk resultam num gerador vazio (detalhes na auditoria).
+        """
+        chunks: "queue.Queue[Any]" = queue.Queue()
+        done = object()
+        failure: List[BaseException] = []
+
+        def worker() -> None:
+            try:
+                self.call_ai(prompt, model, lecture_id, book_id, job_id, force,
+                             provider_func, on_chunk=chunks.put)
+            except BaseException as exc:        # repassado a quem consome
+                failure.append(exc)
+            finally:
+                self._db.release()              # thread de vida curta: devolve a conexão
+                chunks.put(done)
+
+        thread = threading.Thread(target=worker, name="AIStream", daemon=True)
+        thread.start()
+        while True:
+            chunk = chunks.get()
+            if chunk is done:
+                break
+            yield chunk
+        thread.join()
+        if failure:
+            raise failure[0]
+
+    # ------------------------------------------------------------------
+    def call_ai_many(self,
+                     prompts: Sequence[PromptInput],
+                     model: str = "gemini-1.5-flash",
+                     lecture_id: Optional[int] = None,
+                     book_id: Optional[int] = None,
+                     job_id: Optional[int] = None,
+                     force: bool = False,
+                     provider_func: Optional[ProviderFunc] = None,
+                     max_workers: Optional[int] = None,
+                     rate_limit: Optional[float] = None,
+                     burst: Optional[float] = None,
+                     gatekeeper: bool = True) -> List[Optional[str]]:
+        """
+        Versão em lote de ``call_ai`` com concorrência limitada.
+
+        - Cache e gatekeeper rodam antes, em série e na ordem de entrada
+          (confirmações interativas continuam uma por vez).
+        - Os prompts restantes vão para um pool de ``max_workers`` threads;
+          cada chamada consome uma ficha do bucket ``provider:modelo``.
+        - Resultados e linhas de auditoria saem na ordem de ``prompts``:
+          uma linha só é gravada depois que todas as anteriores foram.
+        - Prompts repetidos no próprio lote (mesma chave) viram uma única
+          chamada, exceto com ``force``.
+
+        Parameters
+        ----------
+        max_workers : int | None
+            Chamadas simultâneas (padrão = ``HARI_MAX_CONCURRENCY`` ou 4).
+        rate_limit : float | None
+            Requisições por segundo para este provider/modelo. Sem valor,
+            usa o limite configurado em ``rate_limits`` (se houver).
+        burst : float | None
+            Rajada máxima do bucket (padrão = max(1, rate_limit)).
+        gatekeeper : bool
+            ``False`` dispensa o limite por chamada (uso interno de
+            ``run_plan``, depois da aprovação do plano inteiro).
+
+        Retorna uma lista alinhada com ``prompts`` (``None`` = bloqueio/erro).
+        """
+        workers = max(1, int(max_workers or self.max_concurrency))
+        limiter = self.rate_limiters.get(
+            self._provider_name(provider_func), model, rate=rate_limit, burst=burst
+        )
+
+        results: List[Optional[str]] = [None] * len(prompts)
+        audits: List[Optional[Dict[str, Any]]] = [None] * len(prompts)
+        finished = [True] * len(prompts)
+        pending: Dict[int, Dict[str, Any]] = {}
+        first_by_key: Dict[str, int] = {}
+        aliases: Dict[int, List[int]] = {}      # prompts repetidos no lote -> primeiro
+
+        for i, prompt in enumerate(prompts):
+            if not force:
+                first = first_by_key.setdefault(self._prompt_key(prompt)[1], i)
+                if first != i:
+                    if first in pending:
+                        aliases.setdefault(first, []).append(i)
+                        finished[i] = False
+                    else:
+                        results[i] = results[first]
+                    continue
+            ctx = self._prepare_call(prompt, model, lecture_id, book_id, job_id, force, gatekeeper)
+            if ctx["state"] == "CACHED":
+                results[i] = ctx["response"]
+            elif ctx["state"] == "BLOCKED":
+                audits[i] = ctx["audit"]
+            elif ctx["state"] == "READY":
+                pending[i] = ctx
+                finished[i] = False
+
+        written = 0
+
+        def flush_in_order() -> None:
+            nonlocal written
+            while written < len(prompts):
+                if not finished[written]:
+                    return          # ainda em execução
+                if audits[written] is not None:
+                    self._register_audit(audits[written])
+                written += 1
+
+        flush_in_order()
+        if pending:
+            # As threads do pool morrem com o lote; a conexão de cada uma é
+            # devolvida ao gerenciador quando ela termina
+            with ThreadPoolExecutor(max_workers=min(workers, len(pending))) as pool:
+                futures = {
+                    pool.submit(self._run_coalesced, ctx, provider_func, limiter): i
+                    for i, ctx in pending.items()
+                }
+                for fut in as_completed(futures):
+                    i = futures[fut]
+                    results[i], audits[i] = fut.result()
+                    finished[i] = True
+                    for j in aliases.get(i, ()):
+                        results[j] = results[i]
+                        finished[j] = True
+                    flush_in_order()
+
+        # Fim do lote: um único commit para as linhas que ainda estão no buffer
+        self.audit_sink.flush()
+        logger.info(
+            f"📦 [BATCH] {len(prompts)} prompts – "
+            f"{len(pending)} executados, {sum(r is not None for r in results)} com resposta"
+        )
+        return results
+
+
+    # ------------------------------------------------------------------
+    def _cached_keys(self, request_hashes: Sequence[str], model: str) -> set:
+        """Quais chaves já têm resposta SUCCESS (memória, buffer ou SQLite)."""
+        hits = set()
+        unknown = []
+        for h in dict.fromkeys(request_hashes):
+            if (self.memory_cache.peek((h, model)) is not None
+                    or self.audit_sink.pending_response(h, model)):
+                hits.add(h)
+            else:
+                unknown.append(h)
+
+        conn = self._db.connection()
+        for start in range(0, len(unknown), PLAN_LOOKUP_CHUNK):
+            chunk = unknown[start:start + PLAN_LOOKUP_CHUNK]
+            try:
+                rows = conn.execute(
+                    f"SELECT DISTINCT request_hash FROM ai_audit_logs "
+                    f"WHERE model_name = ? AND status_code = 'SUCCESS' "
+                    f"AND request_hash IN ({','.join('?' * len(chunk))})",
+                    [model, *chunk],
+                ).fetchall()
+            except sqlite3.OperationalError:
+                break
+            hits.update(r[0] for r in rows)
+        return hits
+
+    # ------------------------------------------------------------------
+    def cached_flags(self, prompts: Sequence[PromptInput], model: str) -> List[bool]:
+        """Para cada prompt, se já existe resposta ``SUCCESS`` em cache (sem chamar nada)."""
+        hashes = [self._prompt_key(p)[1] for p in prompts]
+        cached = self._cached_keys(hashes, model)
+        return [h in cached for h in hashes]
+
+    # ------------------------------------------------------------------
+    def prime_cache(self,
+                    prompt: PromptInput,
+                    model: str,
+                    response: str,
+                    source_hash: Optional[str] = None,
+                    lecture_id: Optional[int] = None,
+                    book_id: Optional[int] = None,
+                    job_id: Optional[int] = None) -> None:
+        """
+        Grava ``response`` como resposta ``SUCCESS`` de ``prompt`` sem chamar
+        o provider (ex.: um verso extraído de uma resposta em lote).
+
+        A linha entra com custo e tokens zerados – o gasto real já está na
+        linha da chamada de origem, indicada em ``derived_from`` no payload.
+        Depois disso, ``call_ai(prompt)`` é cache hit.
+        """
+        text, request_hash, template = self._prompt_key(prompt)
+        ctx = {
+            "prompt": text,
+            "template": template,
+            "model": model,
             "lecture_id": lecture_id,
             "book_id": book_id,
             "job_id": job_id,
-            "model_name": model,
             "request_hash": request_hash,
-            "prompt_raw": prompt,                 # texto integral
-            "response_raw": response,              # texto integral
-            "input_tokens": input_tokens,
-            "output_tokens": output_tokens,
-            "estimated_cost_usd": est_cost,
-            "cost_usd": real_cost,
-            "latency_ms": latency_ms,
-            "status_code": status,
-            "payload_json": json.dumps({"prompt": prompt, "model": model}),
-        })
+            "input_tokens": 0,
+            "est_cost": 0.0,
+        }
+        row = self._audit_row(ctx, response, 0, 0.0, 0, "SUCCESS")
+        if source_hash:
+            payload = json.loads(row["payload_json"])
+            payload["derived_from"] = source_hash
+            row["payload_json"] = json.dumps(payload)
+        self._register_audit(row)
+
+    # ------------------------------------------------------------------
+    def plan_job(self,
+                 prompts: Sequence[PromptInput],
+                 model: str = "gemini-1.5-flash",
+                 concurrency: Optional[int] = None,
+                 rate_limit: Optional[float] = None,
+                 avg_latency_ms: Optional[float] = None,
+                 force: bool = False) -> JobPlan:
+        """
+        Dry-run do gatekeeper para a fila inteira, sem chamar o provider.
+
+        Numa passada só: chaves de cache, previsão de hits (consulta em
+        lote), contagem de tokens (``count_many``), custo estimado e tempo
+        de parede com ``concurrency`` workers. A latência vem da média
+        recente do modelo na auditoria (ou ``DEFAULT_LATENCY_MS``).
+
+        Parameters
+        ----------
+        concurrency : int | None
+            Workers previstos (padrão = ``HARI_MAX_CONCURRENCY`` ou 4).
+        rate_limit : float | None
+            Req/s do provider; limita o tempo estimado por baixo.
+        avg_latency_ms : float | None
+            Sobrescreve a latência histórica.
+        force : bool
+            Planeja como se nada estivesse em cache.
+        """
+        keyed = [self._prompt_key(p) for p in prompts]
+        hashes = [h for _, h, _ in keyed]
+        cached = set() if force else self._cached_keys(hashes, model)
+
+        # Tokens só dos prompts que vão de fato ao provider (um por chave)
+        # (prompts estruturados: prefixo pré-contado + só a parte variável)
+        seen = set()
+        to_count: Dict[str, str] = {}
+        counts: Dict[str, int] = {}
+        for prompt, (text, h, _) in zip(prompts, keyed):
+            if h in cached or h in to_count or h in counts:
+                continue
+            if isinstance(prompt, StructuredPrompt):
+                counts[h] = prompt.count_tokens(self.tokens, model)
+            else:
+                to_count[h] = text
+        counts.update(zip(
+            to_count,
+            self.tokens.count_many(list(to_count.values()), model, list(to_count)),
+        ))
+
+        items: List[Dict[str, Any]] = []
+        for i, (_, h, _) in enumerate(keyed):
+            is_cached = h in cached
+            duplicate = not is_cached and h in seen
+            seen.add(h)
+            input_tokens = counts.get(h, 0)
+            est_output = self._estimate_output_tokens(input_tokens) if h in counts else 0
+            items.append({
+                "index": i,
+                "request_hash": h,
+                "cached": is_cached,
+                "duplicate": duplicate,
+                "input_tokens": input_tokens,
+                "est_output_tokens": est_output,
+                "est_cost": self._calculate_cost(model, input_tokens, est_output) if h in counts else 0.0,
+            })
 
-        return response if status == "SUCCESS" else None
+        if avg_latency_ms is None:
+            try:
+                row = self._db.connection().execute(SQL_RECENT_LATENCY, (model,)).fetchone()
+                avg_latency_ms = row[0] if row and row[0] else DEFAULT_LATENCY_MS
+            except sqlite3.OperationalError:
+                avg_latency_ms = DEFAULT_LATENCY_MS
 
+        if rate_limit is None:
+            rate_limit = self.rate_limiters.limits.get(model)
+
+        plan = JobPlan(
+            model=model,
+            prompts=prompts,
+            items=items,
+            concurrency=concurrency or self.max_concurrency,
+            avg_latency_ms=avg_latency_ms,
+            cost_limit=self.cost_limit,
+            rate_limit=rate_limit,
+        )
+        logger.info(f"📋 [PLAN] {plan.to_dict()}")
+        return plan
+
+    # ------------------------------------------------------------------
+    def run_plan(self,
+                 plan: JobPlan,
+                 provider_func: Optional[ProviderFunc] = None,
+                 lecture_id: Optional[int] = None,
+                 book_id: Optional[int] = None,
+                 job_id: Optional[int] = None,
+                 rate_limit: Optional[float] = None,
+                 burst: Optional[float] = None) -> List[Optional[str]]:
+        """
+        Executa um plano aprovado via ``call_ai_many``.
+
+        A aprovação vale para o job inteiro: não há confirmação nem
+        bloqueio de custo por chamada. Cache e auditoria seguem normais.
+        """
+        if not plan.approved:
+            raise RuntimeError("Plano não aprovado: chame plan.approve() antes de run_plan().")
+        logger.info(
+            f"🚀 [PLAN] Executando plano aprovado: {plan.n_calls} chamadas, "
+            f"custo estimado ${plan.est_cost:.4f}"
+        )
+        return self.call_ai_many(
+            plan.prompts,
+            model=plan.model,
+            lecture_id=lecture_id,
+            book_id=book_id,
+            job_id=job_id,
+            provider_func=provider_func,
+            max_workers=plan.concurrency,
+            rate_limit=rate_limit,
+            burst=burst,
+            gatekeeper=False,
+        )
 
 # ----------------------------------------------------------------------
 # Exemplo de uso (executável direto)
@@ -306,14 +1233,13 @@ if __name__ == "__main__":
         """
         return "Tradução Sânscrita: Bhakti significa amor puro."
 
-    wrapper = SmartAIWrapper()   # usa DB e pricing padrão
-
-    print("\n--- Teste de chamada ---")
-    resposta = wrapper.call_ai(
-        prompt="Traduza o verso 1.1.1 do Srimad Bhagavatam para o português.",
-        model="gemini-1.5-flash",
-        lecture_id=1,
-        book_id=1,
-        provider_func=gemini_provider,
-    )
-    print(f"Resultado: {resposta}")
+    with SmartAIWrapper() as wrapper:   # usa DB e pricing padrão
+        print("\n--- Teste de chamada ---")
+        resposta = wrapper.call_ai(
+            prompt="Traduza o verso 1.1.1 do Srimad Bhagavatam para o português.",
+            model="gemini-1.5-flash",
+            lecture_id=1,
+            book_id=1,
+            provider_func=gemini_provider,
+        )
+        print(f"Resultado: {resposta}")
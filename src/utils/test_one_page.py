@@ -2,12 +2,12 @@ import fitz
 import sqlite3
 import json
 import os
-import google.generativeai as genai
 from dotenv import load_dotenv
+from provider_registry import get_provider
+from prompt_registry import get_prompt
 
-# Configuração inicial
+# Configuração inicial (o SDK é configurado pelo adapter, no primeiro uso)
 load_dotenv()
-genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
 
 DB_PATH = "database/harikatha.db"
 PDF_PATH = "downloads/Sri_Slokamritam.pdf"
@@ -23,30 +23,15 @@ def test_extraction():
     doc = fitz.open(PDF_PATH)
     page_text = doc[34].get_text()
     
-    # 2. Configurar Modelo 2.0 Flash Lite (Resiliente)
-    model = genai.GenerativeModel(
-        model_name='gemini-2.0-flash-lite',
-        generation_config={"response_mime_type": "application/json"}
-    )
+    # 2. Modelo 2.0 Flash Lite (Resiliente), em modo JSON
+    gemini_json = get_provider("gemini", json_mode=True)
     
-    prompt = f"""
-    Extract verses from this text into a JSON list.
-    Structure: [{{
-      "chapter_number": int,
-      "verse_number": int,
-      "topic_name": "string",
-      "internal_ref": "string",
-      "sanskrit_roman": "string",
-      "synonyms": "string",
-      "translation": "string"
-    }}]
-    TEXT: {page_text}
-    """
+    # Mesmo prompt da ingestão (config/prompts.yaml): o teste valida o de produção
+    prompt = get_prompt("ingest.slokamrtam_page").bind(page_num=35, text=page_text).text
     
     try:
         print("📡 Enviando para Gemini...")
-        response = model.generate_content(prompt)
-        verses = json.loads(response.text)
+        verses = json.loads(gemini_json(prompt, 'gemini-2.0-flash-lite'))
         
         print(f"✅ Gemini retornou {len(verses)} versos.")
         
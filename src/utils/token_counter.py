@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+token_counter.py – Contabilidade de tokens do HariKathaAI
+
+Recursos principais:
+- Encoders do tiktoken construídos uma única vez por modelo e reaproveitados.
+- Memoização da contagem de prompts por ``request_hash`` (LRU limitado).
+- API em lote (``count_many``) que conta uma lista inteira de prompts de uma vez.
+- Fallback conservador (1 token ≈ 3 caracteres) quando o tiktoken não existe.
+"""
+
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+try:
+    import tiktoken
+except ImportError:                     # dependência opcional
+    tiktoken = None
+
+# Encoding usado quando o tiktoken não conhece o modelo (Gemini, Groq, ...)
+DEFAULT_ENCODING = "cl100k_base"
+
+
+# ----------------------------------------------------------------------
+class TokenCounter:
+    """
+    Contador de tokens com cache de encoders e memo de prompts.
+
+    Thread-safe: pode ser compartilhado entre os workers do wrapper.
+    """
+
+    # ------------------------------------------------------------------
+    def __init__(self,
+                 memo_size: int = 8192,
+                 encodings: Optional[Dict[str, str]] = None) -> None:
+        """
+        Parameters
+        ----------
+        memo_size : int
+            Quantidade máxima de contagens de prompt memorizadas.
+        encodings : dict | None
+            Mapa opcional ``modelo -> nome do encoding`` (sobrepõe o tiktoken).
+        """
+        self.memo_size = memo_size
+        self.encodings = dict(encodings or {})
+        self._encoders: Dict[str, Any] = {}
+        self._memo: "OrderedDict[Tuple[str, str], int]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.memo_hits = 0
+        self.memo_misses = 0
+
+    # ------------------------------------------------------------------
+    def encoder_for(self, model: str = "default") -> Optional[Any]:
+        """Retorna (e guarda) o encoder do modelo, ou None sem tiktoken."""
+        if tiktoken is None:
+            return None
+        if model in self._encoders:
+            return self._encoders[model]
+
+        name = self.encodings.get(model)
+        try:
+            if name:
+                enc = tiktoken.get_encoding(name)
+            else:
+                enc = tiktoken.encoding_for_model(model)
+        except Exception:
+            try:
+                enc = tiktoken.get_encoding(DEFAULT_ENCODING)
+            except Exception:
+                enc = None                  # lembra a falha: não tenta de novo
+
+        with self._lock:
+            return self._encoders.setdefault(model, enc)
+
+    # ------------------------------------------------------------------
+    @staticmethod
+    def _heuristic(text: str) -> int:
+        """Heurística segura: 1 token ≈ 3 caracteres."""
+        return max(1, len(text) // 3)
+
+    # ------------------------------------------------------------------
+    def count(self, text: str, model: str = "default") -> int:
+        """Conta tokens de um texto (sem memo)."""
+        enc = self.encoder_for(model)
+        if enc is None:
+            return self._heuristic(text)
+        try:
+            return len(enc.encode(text, disallowed_special=()))
+        except Exception:
+            return self._heuristic(text)
+
+    # ------------------------------------------------------------------
+    def count_prompt(self, request_hash: str, prompt: str, model: str = "default") -> int:
+        """Conta tokens do prompt memorizando por ``(request_hash, model)``."""
+        key = (request_hash, model)
+        with self._lock:
+            cached = self._memo.get(key)
+            if cached is not None:
+                self._memo.move_to_end(key)
+                self.memo_hits += 1
+                return cached
+            self.memo_misses += 1
+
+        tokens = self.count(prompt, model)
+        self._remember(key, tokens)
+        return tokens
+
+    # ------------------------------------------------------------------
+    def count_many(self,
+                   prompts: Sequence[str],
+                   model: str = "default",
+                   request_hashes: Optional[Sequence[str]] = None) -> List[int]:
+        """
+        Conta uma lista inteira de prompts numa única passada.
+
+        Quando ``request_hashes`` é informado, reaproveita o memo e guarda
+        as contagens novas; os prompts restantes vão juntos para
+        ``encode_batch`` do tiktoken.
+        """
+        results: List[Optional[int]] = [None] * len(prompts)
+        pending: List[int] = []
+
+        with self._lock:
+            for i in range(len(prompts)):
+                if request_hashes is not None:
+                    key = (request_hashes[i], model)
+                    cached = self._memo.get(key)
+                    if cached is not None:
+                        self._memo.move_to_end(key)
+                        self.memo_hits += 1
+                        results[i] = cached
+                        continue
+                    self.memo_misses += 1
+                pending.append(i)
+
+        if pending:
+            texts = [prompts[i] for i in pending]
+            enc = self.encoder_for(model)
+            counts: Optional[List[int]] = None
+            if enc is not None:
+                try:
+                    counts = [len(t) for t in enc.encode_batch(texts, disallowed_special=())]
+                except Exception:
+                    counts = None
+            if counts is None:
+                counts = [self._heuristic(t) for t in texts]
+
+            for i, tokens in zip(pending, counts):
+                results[i] = tokens
+                if request_hashes is not None:
+                    self._remember((request_hashes[i], model), tokens)
+
+        return [int(r) for r in results]
+
+    # ------------------------------------------------------------------
+    def _remember(self, key: Tuple[str, str], tokens: int) -> None:
+        with self._lock:
+            self._memo[key] = tokens
+            self._memo.move_to_end(key)
+            while len(self._memo) > self.memo_size:
+                self._memo.popitem(last=False)
+
+
+# Instância compartilhada pelo processo (encoders construídos uma vez só)
+default_counter = TokenCounter()
@@ -0,0 +1,76 @@
+import sys
+import sqlite3
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.append(str(ROOT))
+sys.path.append(str(ROOT / "src" / "intelligence"))
+
+from database_migrator import MIGRATIONS, Migration, migrate, plan
+from database_setup import SCHEMA_VERSION, connect, has_unique_index, schema_version
+from translation_queue import init_queue_schema
+
+LEGACY_SQL = """
+CREATE TABLE library_books (id INTEGER PRIMARY KEY, acronym TEXT, book_title TEXT);
+CREATE TABLE library_index (id INTEGER PRIMARY KEY, book_id INTEGER, canonical_id TEXT);
+CREATE TABLE library_root_text (index_id INTEGER PRIMARY KEY, primary_script TEXT, transliteration TEXT);
+CREATE TABLE library_translations (
+    id INTEGER PRIMARY KEY, index_id INTEGER, language_code TEXT, translator TEXT, text_body TEXT
+);
+INSERT INTO library_books (acronym) VALUES ('SLK');
+INSERT INTO library_index (book_id, canonical_id) VALUES (1, 'SLK_1.1'), (1, 'SLK_1.2');
+"""
+
+
+@pytest.fixture
+def legacy(tmp_path):
+    conn = sqlite3.connect(tmp_path / "legacy.db")
+    conn.executescript(LEGACY_SQL)
+    conn.executemany(
+        "INSERT INTO library_translations (index_id, language_code, translator, text_body) VALUES (?, ?, ?, ?)",
+        [(1 + n % 2, "en", "WisdomLib", f"v{n}") for n in range(10)],
+    )
+    conn.commit()
+    init_queue_schema(conn)                             # triggers em library_translations
+    yield conn
+    conn.close()
+
+
+def test_plan_then_migrate_rebuilds_translations(legacy):
+    steps = plan(legacy)
+    assert [s["version"] for s in steps] == [1, 2]
+    assert "8 duplicatas" in steps[1]["actions"][0]
+    assert schema_version(legacy) == 0                  # --plan não altera nada
+
+    seen = []
+    assert migrate(legacy, chunk_rows=3, progress=lambda t, done, total: seen.append(done)) == SCHEMA_VERSION
+    assert seen == [3, 6, 9, 10]
+    assert has_unique_index(legacy, "library_translations", ("index_id", "language_code", "translator"))
+    rows = legacy.execute("SELECT index_id, text_body FROM library_translations ORDER BY index_id").fetchall()
+    assert rows == [(1, "v8"), (2, "v9")]               # a mais nova de cada chave
+    triggers = {r[0] for r in legacy.execute("SELECT name FROM sqlite_master WHERE type = 'trigger'")}
+    assert {"trg_tq_done", "trg_tq_enqueue_on_translation"} <= triggers
+    assert plan(legacy) == [] and migrate(legacy) == SCHEMA_VERSION
+
+
+def test_failing_step_rolls_back_everything(legacy):
+    def boom(conn, chunk_rows, progress):
+        raise RuntimeError("falha no meio")
+
+    steps = list(MIGRATIONS) + [Migration(SCHEMA_VERSION + 1, "quebra", boom)]
+    with pytest.raises(RuntimeError):
+        migrate(legacy, steps, chunk_rows=3)
+    assert schema_version(legacy) == 0
+    assert legacy.execute("SELECT COUNT(*) FROM library_translations").fetchone()[0] == 10
+    assert not has_unique_index(legacy, "library_translations", ("index_id", "language_code", "translator"))
+    tables = {r[0] for r in legacy.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    assert "ai_audit_logs" not in tables and "library_translations__rebuild" not in tables
+
+
+def test_fresh_database_needs_no_migration(tmp_path):
+    conn = connect(tmp_path / "new.db")
+    assert schema_version(conn) == SCHEMA_VERSION
+    assert plan(conn) == []
+    conn.close()
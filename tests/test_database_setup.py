@@ -0,0 +1,43 @@
+import sys
+import sqlite3
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent / "src" / "utils"))
+
+from database_setup import SCHEMA_VERSION, check_schema, connect, init_schema
+
+
+def test_fresh_database_gets_schema_indexes_and_version(tmp_path):
+    conn = connect(tmp_path / "new" / "harikatha.db")
+    report = check_schema(conn)
+    assert report["user_version"] == SCHEMA_VERSION
+    assert report["missing_tables"] == report["missing_indexes"] == []
+    assert report["pragmas"]["journal_mode"] == "wal"
+    assert conn.execute("PRAGMA mmap_size").fetchone()[0] > 0
+
+    plan = " ".join(str(row) for row in conn.execute(
+        "EXPLAIN QUERY PLAN SELECT id FROM library_translations "
+        "WHERE index_id = 1 AND language_code = 'pt' AND translator = 'x'"
+    ))
+    assert "USING" in plan and "INDEX" in plan
+    assert init_schema(conn) == SCHEMA_VERSION                  # idempotente
+    conn.close()
+
+
+def test_old_database_is_upgraded_without_losing_rows(tmp_path):
+    conn = sqlite3.connect(tmp_path / "old.db")
+    conn.executescript("""
+        CREATE TABLE library_books (id INTEGER PRIMARY KEY, acronym TEXT, book_title TEXT);
+        CREATE TABLE library_index (id INTEGER PRIMARY KEY, book_id INTEGER, canonical_id TEXT);
+        INSERT INTO library_index (book_id, canonical_id) VALUES (1, 'SLK_1.1'), (1, 'SLK_1.1');
+    """)
+    assert check_schema(conn)["missing_indexes"]
+    assert init_schema(conn) == 0                       # reconstruções ficam com o migrator
+
+    report = check_schema(conn)
+    assert report["user_version"] == 0
+    assert report["missing_tables"] == report["missing_indexes"] == []
+    assert conn.execute("SELECT COUNT(*) FROM library_index").fetchone()[0] == 2
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(library_index)")}
+    assert {"num_1", "num_2", "num_3", "page_number"} <= columns
+    conn.close()
@@ -0,0 +1,45 @@
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent / "src" / "utils"))
+
+from db_connection import SQLiteConnectionManager
+
+
+def test_release_and_thread_exit_return_connections(tmp_path):
+    db = SQLiteConnectionManager(tmp_path / "t.db", init_script="CREATE TABLE t (x INTEGER);")
+
+    def work(_):
+        with db.transaction() as conn:
+            conn.execute("INSERT INTO t VALUES (1)")
+
+    for _ in range(20):                                 # um pool novo por lote
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            list(pool.map(work, range(8)))
+    assert len(db._connections) <= 1
+
+    conn = db.connection()
+    db.release()
+    assert db._connections == []
+    assert db.connection() is not conn
+    assert db.connection().execute("SELECT COUNT(*) FROM t").fetchone()[0] == 160
+    db.close()
+
+
+def test_memory_database_survives_released_threads():
+    db = SQLiteConnectionManager(":memory:", init_script="CREATE TABLE t (x INTEGER);")
+
+    def work():
+        with db.transaction() as conn:
+            conn.execute("INSERT INTO t VALUES (1)")
+        db.release()
+
+    threads = [threading.Thread(target=work) for _ in range(5)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert db.connection().execute("SELECT COUNT(*) FROM t").fetchone()[0] == 5
+    db.close()
@@ -0,0 +1,65 @@
+import csv
+import sys
+import sqlite3
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent / "src" / "utils"))
+
+from smart_ai_wrapper import SmartAIWrapper
+from expurgo_audit import run_expurgo
+
+
+def _seed(tmp_path, monkeypatch):
+    monkeypatch.setenv("HARI_ENV", "production")
+    db = tmp_path / "harikatha.db"
+    with SmartAIWrapper(db_path=db, pricing_path=tmp_path / "p.json") as w:
+        for i in range(30):
+            w.call_ai(f"prompt antigo {i} " * 10, provider_func=lambda p, m: "resposta " * 50)
+        w.call_ai("prompt com erro", provider_func=lambda p, m: 1 / 0)
+        w.call_ai("prompt recente", provider_func=lambda p, m: "ok")
+        w.flush_audit()
+        w._db.connection().execute(
+            "UPDATE ai_audit_logs SET created_at = '2000-01-01 00:00:00' WHERE prompt_ref <> ?",
+            (w._db.connection().execute(
+                "SELECT prompt_ref FROM ai_audit_logs ORDER BY audit_id DESC LIMIT 1"
+            ).fetchone()[0],),
+        )
+        w._db.connection().commit()
+    return db
+
+
+def test_dry_run_deletes_nothing(tmp_path, monkeypatch):
+    db = _seed(tmp_path, monkeypatch)
+    summary = run_expurgo(db, days=90, dry_run=True, backup_dir=tmp_path / "backup")
+
+    assert summary["candidates"] == 31
+    assert summary["by_status"] == {"SUCCESS": 30, "ERROR": 1}
+    assert not (tmp_path / "backup").exists()
+    assert sqlite3.connect(db).execute("SELECT COUNT(*) FROM ai_audit_logs").fetchone()[0] == 32
+
+
+def test_purge_exports_deletes_and_reclaims(tmp_path, monkeypatch):
+    db = _seed(tmp_path, monkeypatch)
+    summary = run_expurgo(db, days=90, backup_dir=tmp_path / "backup", chunk_size=7, pause=0)
+
+    assert summary["exported"] == summary["deleted"] == 31
+    with open(summary["backup"], encoding="utf-8") as f:
+        rows = list(csv.DictReader(f))
+    assert rows[0]["prompt_raw"] == "prompt antigo 0 " * 10       # reidratado do blob
+    assert rows[0]["response_raw"] == "resposta " * 50
+
+    conn = sqlite3.connect(db)
+    assert conn.execute("SELECT COUNT(*) FROM ai_audit_logs").fetchone()[0] == 1
+    assert conn.execute("SELECT COUNT(*) FROM ai_blobs").fetchone()[0] == 2   # só o prompt/resposta recentes
+    assert conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2
+    assert conn.execute("PRAGMA freelist_count").fetchone()[0] == 0
+    assert summary["pages_freed"] > 0
+
+
+def test_keep_success_preserves_success_rows(tmp_path, monkeypatch):
+    db = _seed(tmp_path, monkeypatch)
+    summary = run_expurgo(db, days=90, keep_success=True, backup_dir=tmp_path / "backup", pause=0)
+
+    assert summary["deleted"] == 1
+    statuses = sqlite3.connect(db).execute("SELECT DISTINCT status_code FROM ai_audit_logs").fetchall()
+    assert statuses == [("SUCCESS",)]
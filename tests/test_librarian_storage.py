@@ -0,0 +1,158 @@
+import sys
+import time
+import sqlite3
+from pathlib import Path
+
+import pytest
+
+sys.path.append(str(Path(__file__).resolve().parent.parent / "src" / "intelligence"))
+
+from librarian_storage import (
+    VerseBatchWriter, _ensure_index_id, identity_cache, invalidate_identity_cache,
+    save_scraped_verse, scraped_verse_record,
+)
+
+LIBRARY_SQL = """
+CREATE TABLE library_books (id INTEGER PRIMARY KEY, acronym TEXT UNIQUE, book_title TEXT);
+CREATE TABLE library_index (
+    id INTEGER PRIMARY KEY, book_id INTEGER, canonical_id TEXT UNIQUE,
+    num_1 INTEGER, num_2 INTEGER, num_3 INTEGER
+);
+CREATE TABLE library_root_text (index_id INTEGER PRIMARY KEY, primary_script TEXT, transliteration TEXT);
+CREATE TABLE library_translations (
+    id INTEGER PRIMARY KEY, index_id INTEGER, language_code TEXT, translator TEXT, text_body TEXT,
+    word_for_word TEXT, source_ref TEXT, commentary TEXT,
+    UNIQUE (index_id, language_code, translator)
+);
+CREATE TABLE library_commentaries (
+    id INTEGER PRIMARY KEY, index_id INTEGER, language_code TEXT, commentator TEXT, text_body TEXT,
+    UNIQUE (index_id, language_code, commentator)
+);
+CREATE TABLE theological_concepts (id INTEGER PRIMARY KEY, term TEXT UNIQUE, category TEXT);
+CREATE TABLE content_tags (
+    concept_id INTEGER, library_index_id INTEGER NOT NULL, relevance_score REAL,
+    PRIMARY KEY (concept_id, library_index_id)
+);
+INSERT INTO library_books (acronym, book_title) VALUES ('SLK', 'Śrī Ślokāmṛtam');
+"""
+
+
+@pytest.fixture
+def conn(tmp_path):
+    conn = sqlite3.connect(tmp_path / "library.db")
+    conn.executescript(LIBRARY_SQL)
+    yield conn
+    conn.close()
+
+
+def verse(n):
+    return {
+        "ref": f"{n // 100}.{n % 100}",
+        "transliteration": f"śloka {n}",
+        "translations": [{"lang": "en", "translator": "Slokamrtam Book", "body": f" body {n} ",
+                          "w2w": "a — b", "ref": "(SGG p. 1)"}],
+        "commentaries": [{"lang": "en", "commentator": "Editorial", "text": f"nota {n}"}],
+        "tags": [{"term": f"tattva {n % 3}", "category": "Tattva", "score": 2.0}],
+    }
+
+
+def test_batch_writer_loads_book_in_few_transactions(conn):
+    start = time.perf_counter()
+    with VerseBatchWriter("SLK", conn=conn, batch_size=250) as writer:
+        writer.add_many(verse(n) for n in range(1000))
+        writer.add(verse(5))                                # regravação do mesmo verso
+    assert time.perf_counter() - start < 5
+    assert (writer.written, writer.batches, writer.failed) == (1001, 5, 0)
+
+    count = lambda table: conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+    assert count("library_index") == count("library_translations") == count("content_tags") == 1000
+    assert count("theological_concepts") == 3
+    row = conn.execute(
+        "SELECT i.num_1, i.num_2, t.text_body, t.word_for_word FROM library_index i "
+        "JOIN library_translations t ON t.index_id = i.id WHERE i.canonical_id = 'SLK_2.5'"
+    ).fetchone()
+    assert row == (2, 5, "body 205", "a — b")
+
+
+def test_failed_batch_is_retried_per_verse(conn):
+    conn.execute("CREATE TRIGGER no_bad BEFORE INSERT ON library_root_text "
+                 "WHEN NEW.transliteration = 'ruim' BEGIN SELECT RAISE(ABORT, 'verso ruim'); END")
+    bad = dict(verse(2), transliteration="ruim")
+    with VerseBatchWriter("SLK", conn=conn, batch_size=10) as writer:
+        writer.add_many([verse(1), bad, verse(3)])
+    assert (writer.written, writer.failed) == (2, 1)
+    ids = [r[0] for r in conn.execute("SELECT canonical_id FROM library_index ORDER BY id")]
+    assert ids == ["SLK_0.1", "SLK_0.3"]
+
+
+def test_malformed_record_does_not_sink_the_batch(conn):
+    with VerseBatchWriter("SLK", conn=conn, batch_size=10) as writer:
+        with pytest.raises(ValueError):
+            writer.add(dict(verse(1), translations=[{"lang": "en", "body": "sem tradutor"}]))
+        changed = verse(2)
+        writer.add_many([verse(3), changed, verse(4)])
+        changed["translations"].append({"lang": "pt", "body": "x"})    # depois do add: KeyError
+    assert (writer.written, writer.failed) == (2, 1)
+    ids = [r[0] for r in conn.execute("SELECT canonical_id FROM library_index ORDER BY id")]
+    assert ids == ["SLK_0.3", "SLK_0.4"]
+
+
+def test_interrupted_batch_leaves_no_stale_ids(conn):
+    with VerseBatchWriter("SLK", conn=conn) as writer:
+        original = writer._write
+
+        def interrupted(records):
+            original(records)
+            raise KeyboardInterrupt             # escapa do flush, mas desfaz a transação
+
+        writer._write = interrupted
+        writer.add(verse(1))
+        with pytest.raises(KeyboardInterrupt):
+            writer.flush()
+        writer._write = original
+        writer.add(verse(1))
+    orphans = conn.execute(
+        "SELECT COUNT(*) FROM library_root_text r "
+        "LEFT JOIN library_index i ON i.id = r.index_id WHERE i.id IS NULL"
+    ).fetchone()[0]
+    assert orphans == 0 and writer.written == 1
+
+
+def test_save_scraped_verse_uses_writer(conn):
+    data = {"reference": "1.1.1", "sanskrit": "अखिल", "transliteration": "akhila",
+            "english_translations": ["first", "second"], "source": "https://example.org/1"}
+    with VerseBatchWriter("SLK", conn=conn) as writer:
+        save_scraped_verse(data, "SLK", writer=writer)
+    rows = conn.execute("SELECT translator, source_ref FROM library_translations ORDER BY id").fetchall()
+    assert rows == [("WisdomLib", "https://example.org/1"), ("WisdomLib_2", "https://example.org/1")]
+    with pytest.raises(ValueError):
+        scraped_verse_record({"error": "timeout"})
+
+
+def test_identity_cache_skips_lookups_and_follows_invalidation(conn, tmp_path):
+    with VerseBatchWriter("SLK", conn=conn, batch_size=50) as writer:
+        writer.add_many(verse(n) for n in range(100))
+
+    statements = []
+    conn.set_trace_callback(statements.append)
+    with VerseBatchWriter("SLK", conn=conn, batch_size=50) as writer:
+        writer.add_many(verse(n) for n in range(100))       # regravação: ids todos conhecidos
+    conn.set_trace_callback(None)
+    lookups = [s for s in statements if "FROM library_index" in s or "FROM theological_concepts" in s
+               or "FROM library_books" in s]
+    assert lookups == []
+    assert not any("INSERT OR IGNORE INTO library_index" in s for s in statements)
+
+    cache = identity_cache(conn)
+    stale = cache.index["SLK_0.1"]
+    conn.execute("DELETE FROM library_index WHERE canonical_id = 'SLK_0.1'")
+    invalidate_identity_cache(conn, "index")
+    assert _ensure_index_id(conn, cache.book_id("SLK"), "SLK_0.1", "0.1") != stale
+    conn.commit()
+
+    other = sqlite3.connect(tmp_path / "library.db")            # escrita de outra conexão
+    other.execute("INSERT INTO library_books (acronym, book_title) VALUES ('BG', 'Gita')")
+    other.commit()
+    other.close()
+    assert "BG" not in cache.books
+    assert cache.refresh_if_changed() and "BG" in cache.books
@@ -0,0 +1,60 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.append(str(Path(__file__).resolve().parent.parent / "src" / "utils"))
+
+from smart_ai_wrapper import SmartAIWrapper
+from provider_registry import FakeHTTPAdapter, ProviderRegistry
+
+
+@pytest.fixture
+def registry():
+    reg = ProviderRegistry()
+    reg.register("fake", FakeHTTPAdapter)
+    yield reg
+    reg.close()
+
+
+def test_adapter_built_once_per_options(registry):
+    first = registry.get("fake")
+    assert registry.get("fake") is first
+    assert registry.get("fake", json_mode=True) is not first
+    with pytest.raises(KeyError):
+        registry.get("inexistente")
+
+
+def test_fake_adapter_reuses_connections_through_wrapper(registry, tmp_path, monkeypatch):
+    monkeypatch.setenv("HARI_ENV", "production")
+    fake = registry.get("fake", reply=lambda prompt, model: f"tradução de {prompt}")
+    prompts = [f"verso {i}" for i in range(20)]
+
+    with SmartAIWrapper(db_path=tmp_path / "h.db", pricing_path=tmp_path / "p.json") as w:
+        results = w.call_ai_many(prompts, model="fake-model", provider_func=fake, max_workers=4)
+        assert results == [f"tradução de {p}" for p in prompts]
+        assert fake.server.requests == 20
+        assert fake.server.connections <= 4       # keep-alive: uma conexão por worker
+
+        chunks = list(w.call_ai_stream("verso longo", model="fake-model", provider_func=fake.streaming()))
+        assert "".join(chunks).strip() == "tradução de verso longo"
+        assert len(chunks) > 1
+
+
+def test_http_session_forgets_dead_threads_and_reconnects(registry):
+    import threading
+
+    fake = registry.get("fake", reply=lambda prompt, model: "ok")
+    session = fake.session
+    session._client = None                      # força o pool próprio (http.client)
+    threads = [threading.Thread(target=session.post_json, args=("/chat/completions",
+               {"model": "m", "messages": [{"role": "user", "content": "x"}]})) for _ in range(10)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert session._conns == []                 # threads mortas não seguram sockets
+
+    first = session._connection()
+    second = session._connection(fresh=True)
+    assert session._conns == [second] and first is not second
@@ -0,0 +1,78 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.append(str(Path(__file__).resolve().parent.parent / "src" / "utils"))
+
+from smart_ai_wrapper import SmartAIWrapper
+from provider_registry import ProviderError
+from rate_controller import AdaptiveRateController, CircuitBreaker, CircuitOpenError, is_rate_limit_error
+
+
+def test_aimd_backs_off_on_429_and_recovers():
+    ctl = AdaptiveRateController(max_rate=2.0, increase=1.0, backoff_base=0.01)
+    assert ctl.rate is None                       # sem ritmo enquanto saudável
+
+    delay = ctl.record_rate_limited(retry_after=0.02)
+    assert delay == pytest.approx(0.02)
+    assert ctl.rate == pytest.approx(1.0)         # max_rate * 0.5
+    assert ctl.acquire() >= 0.01                  # respeita o Retry-After
+
+    ctl.record_success(10)
+    assert ctl.rate == pytest.approx(2.0)
+    ctl.record_success(10)
+    assert ctl.rate is None                       # passou do teto → sem ritmo de novo
+
+
+def test_rate_limit_detection_uses_status_and_type_not_message():
+    class ResourceExhausted(Exception):
+        pass
+
+    class Code:
+        name = "RESOURCE_EXHAUSTED"
+
+    class RpcError(Exception):
+        def code(self):
+            return Code()
+
+    assert is_rate_limit_error(ProviderError("HTTP 429", status=429))
+    assert is_rate_limit_error(ResourceExhausted("cota"))
+    assert is_rate_limit_error(RpcError())
+    assert not is_rate_limit_error(ValueError("verso 1.429 sem quota de tradução"))
+    assert not is_rate_limit_error(ProviderError("HTTP 500: quota service down", status=500))
+
+
+def test_circuit_breaker_opens_and_probes():
+    ctl = AdaptiveRateController(failure_threshold=2, reset_timeout=0.05, backoff_base=0.001)
+    ctl.record_failure()
+    ctl.record_failure()
+    assert ctl.breaker.state == CircuitBreaker.OPEN
+    with pytest.raises(CircuitOpenError):
+        ctl.acquire()
+
+    import time
+    time.sleep(0.06)
+    ctl.acquire()                                 # sonda half-open liberada
+    assert ctl.breaker.state == CircuitBreaker.HALF_OPEN
+    ctl.record_success()
+    assert ctl.breaker.state == CircuitBreaker.CLOSED
+
+
+def test_wrapper_retries_rate_limited_calls(tmp_path, monkeypatch):
+    monkeypatch.setenv("HARI_ENV", "production")
+    calls = []
+
+    def flaky(prompt, model):
+        calls.append(prompt)
+        if len(calls) == 1:
+            raise ProviderError("HTTP 429: quota", status=429, retry_after=0.01)
+        return "ok"
+
+    with SmartAIWrapper(db_path=tmp_path / "h.db", pricing_path=tmp_path / "p.json",
+                        simulated_latency=0) as w:
+        assert w.call_ai("verso", model="m", provider_func=flaky) == "ok"
+        assert len(calls) == 2
+        stats = w.rate_controllers.stats()["flaky:m"]
+        assert stats["rate_limited"] == 1 and stats["successes"] == 1
+        assert w.call_ai("simulado", model="m").startswith("[SIMULAÇÃO]")
@@ -0,0 +1,541 @@
+import sys
+import time
+import sqlite3
+from pathlib import Path
+
+import pytest
+
+# Mesmo truque dos scripts: src/utils no path para importar o wrapper
+sys.path.append(str(Path(__file__).resolve().parent.parent / "src" / "utils"))
+
+import audit_sink
+from smart_ai_wrapper import SmartAIWrapper
+
+
+@pytest.fixture
+def wrapper(tmp_path, monkeypatch):
+    monkeypatch.setenv("HARI_ENV", "production")
+    w = SmartAIWrapper(db_path=tmp_path / "harikatha.db", pricing_path=tmp_path / "pricing.json")
+    yield w
+    w.close()
+
+
+def make_stub(reply="Resposta fixa"):
+    calls = []
+
+    def stub(prompt, model):
+        calls.append(prompt)
+        return reply
+
+    stub.calls = calls
+    return stub
+
+
+def test_cache_hit_reuses_connection(wrapper):
+    stub = make_stub()
+    first = wrapper.call_ai("prompt teste", provider_func=stub)
+    conn = wrapper._db.connection()
+    second = wrapper.call_ai("prompt teste", provider_func=stub)
+
+    assert first == second == "Resposta fixa"
+    assert len(stub.calls) == 1
+    assert wrapper._db.connection() is conn
+
+    wrapper.flush_audit()
+    count = conn.execute("SELECT COUNT(*) FROM ai_audit_logs").fetchone()[0]
+    assert count == 1
+
+
+def test_wal_mode_and_close(tmp_path, monkeypatch):
+    monkeypatch.setenv("HARI_ENV", "production")
+    db = tmp_path / "harikatha.db"
+    with SmartAIWrapper(db_path=db, pricing_path=tmp_path / "pricing.json") as w:
+        w.call_ai("verso 1.1.1", provider_func=make_stub())
+        mode = w._db.connection().execute("PRAGMA journal_mode").fetchone()[0]
+        assert mode == "wal"
+
+    with sqlite3.connect(db) as conn:
+        rows = conn.execute("SELECT status_code FROM ai_audit_logs").fetchall()
+    assert rows == [("SUCCESS",)]
+
+
+def test_token_counter_memo_and_batch():
+    from token_counter import TokenCounter
+
+    counter = TokenCounter(memo_size=2)
+    prompts = ["Traduza o verso 1.1.1", "Analise o verso 1.2", "bhakti"]
+    hashes = [SmartAIWrapper._hash_prompt(p) for p in prompts]
+
+    batch = counter.count_many(prompts, request_hashes=hashes)
+    assert batch == [counter.count(p) for p in prompts]
+
+    counter.count_prompt(hashes[2], prompts[2])
+    assert counter.memo_hits == 1
+    assert len(counter._memo) == 2
+
+
+def test_call_ai_many_keeps_input_order(wrapper):
+    def slow_echo(prompt, model):
+        # Os primeiros prompts demoram mais: terminam fora de ordem
+        time.sleep(0.05 if prompt.endswith(("0", "1")) else 0.0)
+        return f"eco {prompt}"
+
+    wrapper.call_ai("verso 3", provider_func=slow_echo)       # já em cache
+    prompts = [f"verso {i}" for i in range(6)]
+    results = wrapper.call_ai_many(prompts, provider_func=slow_echo, max_workers=6)
+
+    assert results == [f"eco {p}" for p in prompts]
+    wrapper.flush_audit()
+    rows = wrapper._db.connection().execute(
+        "SELECT b.data FROM ai_audit_logs l JOIN ai_blobs b ON b.blob_hash = l.prompt_ref "
+        "ORDER BY l.audit_id"
+    ).fetchall()
+    assert [bytes(r[0]).decode() for r in rows] == ["verso 3", "verso 0", "verso 1", "verso 2", "verso 4", "verso 5"]
+
+
+def test_token_bucket_limits_rate():
+    from rate_limiter import TokenBucket
+
+    bucket = TokenBucket(rate=50, capacity=1)
+    start = time.monotonic()
+    for _ in range(6):
+        bucket.acquire()
+    assert time.monotonic() - start >= 0.09
+
+
+def test_memory_cache_tier(wrapper, tmp_path):
+    stub = make_stub("Resposta em memória")
+    wrapper.call_ai("verso 2.12", provider_func=stub)
+    assert wrapper.call_ai("verso 2.12", provider_func=stub) == "Resposta em memória"
+    stats = wrapper.cache_stats()
+    assert stats["memory"]["hits"] == 1
+    assert stats["sqlite"]["hits"] == 0
+
+    # Outro processo (wrapper novo) promove o hit do SQLite para a memória
+    wrapper.flush_audit()
+    other = SmartAIWrapper(db_path=wrapper.db_path, pricing_path=tmp_path / "pricing.json")
+    assert other.call_ai("verso 2.12", provider_func=stub) == "Resposta em memória"
+    assert other.call_ai("verso 2.12", provider_func=stub) == "Resposta em memória"
+    assert other.cache_stats()["sqlite"]["hits"] == 1
+    assert other.cache_stats()["memory"]["hits"] == 1
+    assert len(stub.calls) == 1
+    other.close()
+
+
+def test_lru_evicts_by_bytes():
+    from response_cache import LRUResponseCache, ENTRY_OVERHEAD_BYTES
+
+    cache = LRUResponseCache(max_bytes=2 * (ENTRY_OVERHEAD_BYTES + 10))
+    cache.put(("a", "m"), "x" * 10)
+    cache.put(("b", "m"), "y" * 10)
+    cache.get(("a", "m"))
+    cache.put(("c", "m"), "z" * 10)
+
+    assert cache.get(("b", "m")) is None
+    assert cache.get(("a", "m")) == "x" * 10
+    assert cache.stats()["evictions"] == 1
+
+
+def _slow_stub(delay=0.2):
+    stub = make_stub("Resposta única")
+    inner = stub
+
+    def slow(prompt, model):
+        time.sleep(delay)
+        return inner(prompt, model)
+
+    slow.calls = stub.calls
+    return slow
+
+
+def test_single_flight_in_process(wrapper):
+    from concurrent.futures import ThreadPoolExecutor
+
+    stub = _slow_stub()
+    with ThreadPoolExecutor(4) as pool:
+        results = list(pool.map(lambda _: wrapper.call_ai("verso 10.9", provider_func=stub), range(4)))
+
+    assert results == ["Resposta única"] * 4
+    assert len(stub.calls) == 1
+    wrapper.flush_audit()
+    count = wrapper._db.connection().execute("SELECT COUNT(*) FROM ai_audit_logs").fetchone()[0]
+    assert count == 1
+
+
+def test_single_flight_across_processes(tmp_path, monkeypatch):
+    from concurrent.futures import ThreadPoolExecutor
+
+    monkeypatch.setenv("HARI_ENV", "production")
+    # Dois wrappers = dois "processos" (SingleFlight e conexões independentes)
+    a, b = (
+        SmartAIWrapper(db_path=tmp_path / "h.db", pricing_path=tmp_path / "p.json",
+                       cross_process_coalescing=True)
+        for _ in range(2)
+    )
+    b.single_flight.poll_interval = 0.02
+    stub = _slow_stub(0.3)
+    with ThreadPoolExecutor(2) as pool:
+        fa = pool.submit(a.call_ai, "verso 7.7", provider_func=stub)
+        time.sleep(0.1)
+        fb = pool.submit(b.call_ai, "verso 7.7", provider_func=stub)
+        assert fa.result() == fb.result() == "Resposta única"
+
+    assert len(stub.calls) == 1
+    a.close()
+    b.close()
+
+
+def test_audit_write_behind_and_spool_recovery(tmp_path, monkeypatch):
+    import os
+    monkeypatch.setenv("HARI_ENV", "production")
+    db = tmp_path / "harikatha.db"
+    w = SmartAIWrapper(db_path=db, pricing_path=tmp_path / "p.json",
+                       audit_batch_size=100, audit_flush_interval=60)
+    for i in range(3):
+        w.call_ai(f"verso 4.{i}", provider_func=make_stub())
+    count = lambda: sqlite3.connect(db).execute("SELECT COUNT(*) FROM ai_audit_logs").fetchone()[0]
+    assert count() == 0                      # ainda no buffer
+    assert w.call_ai("verso 4.0", provider_func=make_stub("outra")) == "Resposta fixa"
+
+    # Simula um crash: o spool fica órfão e o próximo processo o reaplica
+    w.audit_sink._spool_file.close()
+    spool = w.audit_sink._spool_path
+    old = spool.stat().st_mtime - 3600
+    os.utime(spool, (old, old))
+    w.audit_sink._buffer.clear()
+    audit_sink._LIVE_TAGS.discard(w.audit_sink._tag)    # o "processo" morreu
+
+    w2 = SmartAIWrapper(db_path=db, pricing_path=tmp_path / "p.json")
+    assert count() == 3
+    assert not spool.exists()
+    w2.close()
+
+
+def test_spool_of_live_sink_is_kept_and_bad_batch_is_quarantined(tmp_path):
+    from db_connection import SQLiteConnectionManager
+
+    db = SQLiteConnectionManager(tmp_path / "a.db", init_script="CREATE TABLE t (x INTEGER NOT NULL);")
+    spool = tmp_path / "spool"
+    idle = audit_sink.AuditSink(db, "INSERT INTO t VALUES (:x)", spool_dir=spool)
+    other = audit_sink.AuditSink(db, "INSERT INTO t VALUES (:x)", spool_dir=spool,
+                                 stale_after=0, max_failures=2)
+    other.recover()
+    assert idle._spool_path.exists()                    # segmento vazio de um sink vivo
+
+    for x in (1, None, 2):                              # None viola o NOT NULL
+        other.write({"x": x, "request_hash": "h", "model_name": "m"})
+    assert other.flush() == 0 and len(other._buffer) == 3
+    assert other.flush() == 2 and other._buffer == []
+    assert other.rows_quarantined == 1
+    assert list(spool.glob(f"*{audit_sink.QUARANTINE_SUFFIX}"))
+    assert db.connection().execute("SELECT COUNT(*) FROM t").fetchone()[0] == 2
+    other.close()
+    idle.close()
+    db.close()
+
+
+def test_repeat_call_refreshes_audit_created_at(wrapper):
+    wrapper.call_ai("verso antigo", provider_func=make_stub())
+    wrapper.flush_audit()
+    conn = wrapper._db.connection()
+    with conn:
+        conn.execute("UPDATE ai_audit_logs SET created_at = datetime('now', '-100 days'), "
+                     "status_code = 'ERROR'")
+    wrapper.call_ai("verso antigo", provider_func=make_stub(), force=True)
+    wrapper.flush_audit()
+    age = conn.execute("SELECT julianday('now') - julianday(created_at) FROM ai_audit_logs").fetchone()[0]
+    assert age < 1
+
+
+def test_blob_store_dedup_and_migration(tmp_path, monkeypatch):
+    from blob_store import get_blob, migrate_audit_rows
+
+    monkeypatch.setenv("HARI_ENV", "production")
+    db = tmp_path / "harikatha.db"
+    template = "Explique o verso a seguir segundo a tradição Gaudiya. " * 20
+    with SmartAIWrapper(db_path=db, pricing_path=tmp_path / "p.json") as w:
+        w.call_ai(template, provider_func=make_stub("resposta"), model="modelo-a")
+        w.call_ai(template, provider_func=make_stub("resposta"), model="modelo-b")
+        w.flush_audit()
+        conn = w._db.connection()
+        assert conn.execute("SELECT COUNT(*) FROM ai_blobs").fetchone()[0] == 2
+        codec, raw_size = conn.execute(
+            "SELECT b.codec, b.raw_size FROM ai_audit_logs l "
+            "JOIN ai_blobs b ON b.blob_hash = l.prompt_ref LIMIT 1"
+        ).fetchone()
+        assert codec in ("zlib", "zstd") and raw_size == len(template.encode("utf-8"))
+        # Linha "antiga", com o texto inline
+        conn.execute(
+            "INSERT INTO ai_audit_logs (model_name, request_hash, prompt_raw, response_raw, "
+            "input_tokens, output_tokens, estimated_cost_usd, latency_ms, status_code) "
+            "VALUES ('legado', 'h-legado', 'prompt antigo', 'resposta antiga', 1, 1, 0, 1, 'SUCCESS')"
+        )
+        conn.commit()
+
+    # Cache persistido via blob (wrapper novo, LRU vazio)
+    with SmartAIWrapper(db_path=db, pricing_path=tmp_path / "p.json") as w:
+        stub = make_stub("outra")
+        assert w.call_ai(template, provider_func=stub, model="modelo-a") == "resposta"
+        assert stub.calls == []
+
+    conn = sqlite3.connect(db)
+    assert migrate_audit_rows(conn, chunk_size=1) == 1
+    prompt_raw, ref = conn.execute(
+        "SELECT prompt_raw, response_ref FROM ai_audit_logs WHERE request_hash = 'h-legado'"
+    ).fetchone()
+    assert prompt_raw == "" and get_blob(conn, ref) == "resposta antiga"
+    conn.close()
+
+
+def test_structured_prompt_key_ignores_formatting(wrapper):
+    import unicodedata
+    from prompt_template import PromptTemplate
+
+    v1 = PromptTemplate("teste.verso", 1, """
+        Traduza:
+        {verso}
+    """)
+    reformatted = PromptTemplate("teste.verso", 1, "Traduza:\n\n    {verso}   ")
+    bumped = PromptTemplate("teste.verso", 2, "Traduza:\n{verso}")
+
+    stub = make_stub("tradução")
+    # Diacríticos decompostos (NFD) + espaços extras = mesmo verso
+    decomposed = unicodedata.normalize("NFD", "kṛṣṇa nāma")
+    assert wrapper.call_ai(v1.bind(verso="kṛṣṇa  nāma"), provider_func=stub) == "tradução"
+    assert wrapper.call_ai(reformatted.bind(verso=decomposed + "\n"), provider_func=stub) == "tradução"
+    assert len(stub.calls) == 1
+    assert stub.calls[0] == "Traduza:\nkṛṣṇa nāma"
+
+    wrapper.call_ai(v1.bind(verso="rādhā"), provider_func=stub)       # verso novo
+    wrapper.call_ai(bumped.bind(verso="kṛṣṇa nāma"), provider_func=stub)  # versão nova
+    assert len(stub.calls) == 3
+
+
+def _fake_stream(chunks, first_delay=0.05, gap=0.05):
+    def stream_provider(prompt, model):
+        time.sleep(first_delay)
+        for i, chunk in enumerate(chunks):
+            if i:
+                time.sleep(gap)
+            yield chunk
+
+    return stream_provider
+
+
+def test_streaming_provider_records_ttft(wrapper):
+    received = []
+    provider = _fake_stream(["Bhakti ", "é ", "amor ", "puro."], first_delay=0.05, gap=0.05)
+
+    response = wrapper.call_ai("comente o verso", provider_func=provider, on_chunk=received.append)
+
+    assert response == "Bhakti é amor puro."
+    assert received == ["Bhakti ", "é ", "amor ", "puro."]
+    wrapper.flush_audit()
+    ttft, latency = wrapper._db.connection().execute(
+        "SELECT ttft_ms, latency_ms FROM ai_audit_logs"
+    ).fetchone()
+    assert 40 <= ttft < latency
+    assert latency >= 190
+
+
+def test_gate_call_confirms_once_on_caller_thread(tmp_path, monkeypatch):
+    import builtins
+    import threading
+    from concurrent.futures import ThreadPoolExecutor
+
+    monkeypatch.setenv("HARI_ENV", "development")
+    monkeypatch.setenv("HARI_COST_LIMIT", "0")
+    asked = []
+    monkeypatch.setattr(builtins, "input", lambda msg: asked.append(threading.current_thread()) or "s")
+    stub = make_stub()
+    with SmartAIWrapper(db_path=tmp_path / "h.db", pricing_path=tmp_path / "p.json") as w:
+        prompts = [f"verso {i}" for i in range(4)]
+        approved = [p for p in prompts if w.gate_call(p)]
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            replies = list(pool.map(lambda p: w.call_ai(p, provider_func=stub, gatekeeper=False), approved))
+    assert replies == ["Resposta fixa"] * 4
+    assert asked == [threading.main_thread()] * 4
+
+
+def test_call_ai_stream_yields_before_completion(wrapper):
+    provider = _fake_stream(["a", "b", "c"], first_delay=0.0, gap=0.1)
+    start = time.perf_counter()
+    arrivals = [(chunk, time.perf_counter() - start) for chunk in
+                wrapper.call_ai_stream("comentário longo", provider_func=provider)]
+
+    assert [c for c, _ in arrivals] == ["a", "b", "c"]
+    assert arrivals[0][1] < 0.1 <= arrivals[-1][1]
+
+    # Cache hit: a resposta inteira chega como um único chunk
+    assert list(wrapper.call_ai_stream("comentário longo", provider_func=provider)) == ["abc"]
+
+
+def test_stream_and_batch_threads_do_not_leak_connections(wrapper):
+    stub = make_stub()
+    for i in range(30):
+        assert list(wrapper.call_ai_stream(f"prompt {i}", provider_func=stub)) == ["Resposta fixa"]
+    for i in range(10):
+        wrapper.call_ai_many([f"lote {i} {j}" for j in range(6)], provider_func=stub, max_workers=3)
+    wrapper.flush_audit()
+    assert len(wrapper._db._connections) <= 2
+
+
+def test_plan_job_predicts_and_runs_without_prompts(wrapper, monkeypatch):
+    stub = make_stub("ok")
+    wrapper.call_ai("já traduzido", provider_func=stub)
+    wrapper.flush_audit()
+    wrapper.memory_cache.clear()            # força a previsão pelo SQLite
+
+    wrapper.cost_limit = 0.0                # o gatekeeper barraria qualquer chamada
+    queue = ["já traduzido", "verso novo 1", "verso novo 2", "verso novo 1"]
+    plan = wrapper.plan_job(queue, concurrency=2, avg_latency_ms=1000)
+
+    assert (plan.n_cached, plan.n_duplicates, plan.n_calls) == (1, 1, 2)
+    assert plan.est_cost > 0 and plan.over_limit == [1, 2]
+    assert plan.est_wall_seconds == 1.0
+    assert len(stub.calls) == 1                        # planejar não chama o provider
+
+    with pytest.raises(RuntimeError):
+        wrapper.run_plan(plan, provider_func=stub)
+
+    monkeypatch.setattr("builtins.input", lambda *_: pytest.fail("confirmação por chamada"))
+    wrapper.env = "development"
+    results = wrapper.run_plan(plan.approve(), provider_func=stub)
+    assert results == ["ok"] * 4
+    assert len(stub.calls) == 3
+
+
+def test_packed_response_primes_per_item_cache(wrapper):
+    from prompt_packing import pack_by_budget, split_packed
+
+    items = [f"verso {i}" for i in range(10)]
+    packs = pack_by_budget(items, lambda it: (100, 50), header_tokens=500,
+                           max_input_tokens=1000, max_output_tokens=1000, max_items=25)
+    assert [len(p) for p in packs] == [5, 5]          # 500 + 5×100 = orçamento de entrada
+
+    reply = '```json\n[{"id": "a", "translation": "A"}, {"id": "c", "translation": " "}]\n```'
+    assert split_packed(["a", "b", "c"], reply) == {"a": "A"}
+    assert split_packed(["a", "b"], '{"items": [{"translation": "1"}, {"translation": "2"}]}') == {"a": "1", "b": "2"}
+
+    stub = make_stub()
+    assert wrapper.cached_flags(["verso 0", "verso 1"], "m") == [False, False]
+    wrapper.prime_cache("verso 0", "m", "tradução 0", source_hash="pacote")
+    assert wrapper.cached_flags(["verso 0", "verso 1"], "m") == [True, False]
+    assert wrapper.call_ai("verso 0", model="m", provider_func=stub) == "tradução 0"
+    assert stub.calls == []
+
+    wrapper.flush_audit()
+    row = wrapper._db.connection().execute(
+        "SELECT cost_usd, input_tokens, payload_json FROM ai_audit_logs"
+    ).fetchone()
+    assert row[0] == 0 and row[1] == 0 and '"derived_from": "pacote"' in row[2]
+
+
+def test_prompt_registry_static_prefix(tmp_path):
+    from prompt_registry import PromptRegistry, DEFAULT_PROMPTS
+    from token_counter import TokenCounter
+
+    registry = PromptRegistry(DEFAULT_PROMPTS)              # o YAML real do projeto
+    scholar = registry.get("scholar.gaudiya_pt")
+    assert scholar.prefix.startswith("Atue como um Pandita") and "{" not in scholar.prefix
+
+    a = scholar.bind(sanskrit="A", translit="a", english_ref="x")
+    b = scholar.bind(sanskrit="B " * 50, translit="b", english_ref="y")
+    assert a.text.encode()[:len(scholar.prefix.encode())] == b.text.encode()[:len(scholar.prefix.encode())]
+    assert a.text.startswith(scholar.prefix)
+
+    counter = TokenCounter()
+    assert abs(b.count_tokens(counter) - counter.count(b.text)) <= 2
+
+    # Versões: get() devolve a maior; a antiga continua acessível
+    path = tmp_path / "prompts.yaml"
+    path.write_text(
+        "templates:\n"
+        "  - {id: t, version: 1, text: \"Instrução.\\nDado: {x}\"}\n"
+        "  - {id: t, version: 2, text: \"Instrução nova.\\nDado: {x}\"}\n",
+        encoding="utf-8",
+    )
+    local = PromptRegistry(path)
+    assert local.get("t").version == 2 and local.get("t", 1).prefix == "Instrução."
+    assert local.bind("t", x="1").text == "Instrução nova.\nDado: 1"
+    with pytest.raises(KeyError):
+        local.get("inexistente")
+
+
+def test_audit_rollups_follow_inserts_and_cache_hits(wrapper):
+    from audit_report import build_report
+    from audit_rollup import rebuild_rollups
+
+    stub = make_stub()
+    wrapper.call_ai("verso 1", provider_func=stub, book_id=7)
+    wrapper.call_ai("verso 2", provider_func=stub, book_id=7)
+    wrapper.call_ai("verso 1", provider_func=stub, book_id=7)                 # cache hit
+    wrapper.call_ai("verso 2", provider_func=stub, book_id=7, force=True)     # upsert = nova chamada
+    wrapper.flush_audit()
+
+    conn = wrapper._db.connection()
+    [row] = build_report(conn, by=("book", "status"))
+    assert (row["book"], row["status"], row["calls"], row["cache_hits"]) == (7, "SUCCESS", 3, 1)
+    assert sum(row["latency_buckets"].values()) == 3
+    assert row["input_tokens"] > 0
+
+    # Expurgo apaga o log, não os totais
+    with wrapper._db.transaction() as tx:
+        tx.execute("DELETE FROM ai_audit_logs")
+    assert build_report(conn, by=("model",))[0]["calls"] == 3
+
+    with wrapper._db.transaction() as tx:
+        assert rebuild_rollups(tx) == 0
+
+
+def test_rollup_day_follows_retry_and_counts_skipped_failures(wrapper):
+    from audit_report import build_report
+
+    def broken(prompt, model):
+        raise ValueError("provider fora do ar")
+
+    wrapper.call_ai("verso 3", provider_func=broken)
+    wrapper.flush_audit()
+    conn = wrapper._db.connection()
+    with conn:                                          # a falha foi há 10 dias
+        conn.execute("UPDATE ai_audit_logs SET created_at = datetime('now', '-10 days'), "
+                     "updated_at = datetime('now', '-10 days')")
+        conn.execute("DELETE FROM ai_audit_rollup_daily")
+    wrapper.call_ai("verso 3", provider_func=make_stub())              # retry hoje
+    wrapper.call_ai("verso 3", provider_func=broken, force=True)       # upsert ignora
+    wrapper.flush_audit()
+
+    today = conn.execute("SELECT date('now')").fetchone()[0]
+    days = {r[0] for r in conn.execute("SELECT day FROM ai_audit_rollup_daily")}
+    assert days == {today}
+    by_status = {r["status"]: r["calls"] for r in build_report(conn, by=("status",))}
+    assert by_status["SUCCESS"] == 1 and sum(by_status.values()) == 2
+    assert conn.execute("SELECT status_code FROM ai_audit_logs").fetchone()[0] == "SUCCESS"
+
+
+def test_metrics_histograms_cache_tiers_and_endpoint(wrapper, tmp_path):
+    import json
+    import urllib.request
+
+    stub = make_stub("uma resposta com alguns tokens")
+    wrapper.call_ai("verso 1", provider_func=stub)
+    wrapper.call_ai("verso 1", provider_func=stub)          # hit na memória
+    wrapper.call_ai("verso 2", provider_func=stub)
+
+    snap = wrapper.metrics.to_dict()
+    [latency] = snap["hari_call_latency_ms"]["series"]
+    assert latency["labels"] == {"provider": "stub", "model": "gemini-1.5-flash"}
+    assert latency["count"] == 2 and latency["p99"] is not None
+    ratios = {s["labels"]["tier"]: s["value"] for s in snap["hari_cache_hit_ratio"]["series"]}
+    assert ratios["memory"] == pytest.approx(1 / 3)
+    inflight = snap["hari_inflight_requests"]["series"][0]["value"]
+    assert inflight == 0
+
+    text = wrapper.metrics.to_prometheus()
+    assert 'hari_call_latency_ms_bucket{provider="stub",model="gemini-1.5-flash",le="+Inf"} 2' in text
+    assert wrapper.dump_metrics(tmp_path / "m.json").read_text(encoding="utf-8").startswith("{")
+
+    server = wrapper.metrics.serve(0)
+    port = server.server_address[1]
+    with urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics.json") as resp:
+        assert "hari_calls_total" in json.load(resp)
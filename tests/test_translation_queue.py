@@ -0,0 +1,112 @@
+import sys
+import sqlite3
+from pathlib import Path
+
+import pytest
+
+sys.path.append(str(Path(__file__).resolve().parent.parent / "src" / "intelligence"))
+
+from translation_queue import TranslationQueue, TranslationWriter, SQL_LEASE
+
+LIBRARY_SQL = """
+CREATE TABLE library_index (id INTEGER PRIMARY KEY, book_id INTEGER, canonical_id TEXT UNIQUE);
+CREATE TABLE library_root_text (index_id INTEGER PRIMARY KEY, primary_script TEXT, transliteration TEXT);
+CREATE TABLE library_translations (
+    id INTEGER PRIMARY KEY, index_id INTEGER, language_code TEXT, translator TEXT, text_body TEXT,
+    UNIQUE (index_id, language_code, translator)
+);
+"""
+
+
+def add_verse(conn, n, english=True):
+    conn.execute("INSERT INTO library_index (id, book_id, canonical_id) VALUES (?, 1, ?)", (n, f"BRS {n}"))
+    conn.execute("INSERT INTO library_root_text VALUES (?, ?, ?)", (n, f"sa {n}", f"tr {n}"))
+    if english:
+        conn.execute(
+            "INSERT INTO library_translations (index_id, language_code, translator, text_body) "
+            "VALUES (?, 'en', 'WisdomLib', ?)", (n, f"en {n}"),
+        )
+
+
+@pytest.fixture
+def db(tmp_path):
+    path = tmp_path / "library.db"
+    conn = sqlite3.connect(path)
+    conn.executescript(LIBRARY_SQL)
+    for n in range(1, 101):
+        add_verse(conn, n, english=(n % 10 != 0))       # 90 versos elegíveis
+    conn.commit()
+    conn.close()
+    return path
+
+
+def test_backfill_triggers_and_leases(db):
+    with TranslationQueue(db) as q, TranslationQueue(db) as other:
+        assert q.stats() == {"PENDING": 90}              # backfill no registro do alvo
+
+        first = q.lease(5)
+        second = other.lease(5)
+        assert [v[1] for v in first] == [f"BRS {n}" for n in (1, 2, 3, 4, 5)]
+        assert first[0] == (1, "BRS 1", "sa 1", "tr 1", "en 1")
+        assert not {v[0] for v in first} & {v[0] for v in second}
+
+        conn = sqlite3.connect(db)
+        with conn:
+            # Verso novo entra pela trigger; tradução alvo gravada conclui o item
+            add_verse(conn, 101)
+            conn.execute(
+                "INSERT OR REPLACE INTO library_translations (index_id, language_code, translator, text_body) "
+                "VALUES (1, 'pt', 'AI_Gaudiya_PT', 'tradução')"
+            )
+        conn.close()
+
+        q.release([2])
+        assert q.stats() == {"PENDING": 82, "LEASED": 8, "DONE": 1}
+        assert len(q.pending()) == 82 and q.pending()[-1][0] == 101
+
+
+def test_lease_uses_partial_covering_index(db):
+    with TranslationQueue(db) as q:
+        conn = q._db.connection()
+        select = SQL_LEASE.split("id IN (")[1].rsplit(")", 1)[0]
+        plan = " ".join(
+            row[-1] for row in conn.execute(
+                "EXPLAIN QUERY PLAN " + select, ("pt", "AI_Gaudiya_PT", 0, 5)
+            )
+        )
+        assert "COVERING INDEX idx_tq_pending" in plan
+
+
+def test_single_writer_batches_and_release_owned(db):
+    with TranslationQueue(db) as q:
+        leased = q.lease(30)
+        with TranslationWriter(db, batch_size=10, flush_interval=60) as writer:
+            for verse in leased[:25]:
+                writer.put(verse[0], f"tradução {verse[0]}")
+        assert (writer.written, writer.batches) == (25, 3)      # 10 + 10 + resto no close
+
+        assert q.release_owned() == 5                            # não concluídos voltam à fila
+        assert q.stats() == {"DONE": 25, "PENDING": 65}
+
+
+def test_release_fails_item_after_max_attempts(db):
+    with TranslationQueue(db, max_attempts=2) as q:
+        for _ in range(2):
+            (verse,) = q.lease(1)
+            assert verse[0] == 1
+            q.release([verse[0]])                        # o modelo falhou de novo
+        assert q.stats() == {"PENDING": 89, "FAILED": 1}
+        assert q.lease(1)[0][0] == 2                     # a fila segue adiante
+
+
+def test_release_only_touches_own_leases(db):
+    with TranslationQueue(db) as q, TranslationQueue(db) as other:
+        (verse,) = q.lease(1)
+        other.release([verse[0]])                        # não é dele: nada muda
+        assert q.stats() == {"PENDING": 89, "LEASED": 1}
+
+        assert len(other.lease_all(page_size=20)) == 89
+        assert other.release_owned() == 89
+        attempts = sqlite3.connect(db).execute(
+            "SELECT MAX(attempts) FROM translation_queue WHERE state = 'PENDING'").fetchone()[0]
+        assert attempts == 0                             # reserva devolvida não conta tentativa
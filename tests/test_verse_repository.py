@@ -0,0 +1,82 @@
+import sys
+import sqlite3
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.append(str(ROOT / "src" / "utils"))
+sys.path.append(str(ROOT / "src" / "intelligence"))
+
+from database_setup import connect
+from librarian_storage import VerseBatchWriter
+from verse_repository import Verse, VerseRepository
+
+
+def verse(n):
+    return {
+        "ref": f"{n // 100}.{n % 100}",
+        "sanskrit": f"श्लोक {n}",
+        "transliteration": f"śloka {n}",
+        "translations": [
+            {"lang": "en", "translator": "Book", "body": f"body {n}", "w2w": "a — b", "ref": "(p. 1)"},
+            {"lang": "pt", "translator": "AI_Gaudiya_PT", "body": f"corpo {n}"},
+        ],
+        "commentaries": [{"lang": "en", "commentator": "Editorial", "text": f"nota {n}"}],
+        "tags": [{"term": "rasa", "category": "Rasa", "score": 1.0},
+                 {"term": "bhakti", "category": "Tattva", "score": 5.0}],
+    }
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = tmp_path / "library.db"
+    conn = connect(path)
+    conn.execute("INSERT INTO library_books (acronym, book_title) VALUES ('SLK', 'Śrī Ślokāmṛtam')")
+    conn.commit()
+    with VerseBatchWriter("SLK", conn=conn) as writer:
+        writer.add_many(verse(n) for n in range(300))
+    conn.close()
+    return path
+
+
+def test_verses_are_hydrated_in_one_query(db_path):
+    conn = sqlite3.connect(db_path)
+    statements = []
+    conn.set_trace_callback(statements.append)
+    repo = VerseRepository(conn=conn)
+
+    ids = [f"SLK_{n // 100}.{n % 100}" for n in range(0, 300, 3)] + ["SLK_99.99"]
+    verses = repo.get_many(ids)
+    assert len(statements) == 1 and len(verses) == 100
+    assert list(verses) == ids[:-1]                         # ordem pedida, inexistente fora
+
+    v = verses["SLK_2.4"]
+    assert isinstance(v, Verse) and not hasattr(v, "__dict__")
+    assert (v.ref, v.num_1, v.num_2, v.primary_script, v.transliteration) == ("2.4", 2, 4, "श्लोक 204", "śloka 204")
+    assert v.translation("en").word_for_word == "a — b"
+    assert v.translation(translator="AI_Gaudiya_PT").text_body == "corpo 204"
+    assert [c.text_body for c in v.commentaries] == ["nota 204"]
+    assert [t.term for t in v.tags] == ["bhakti", "rasa"]
+
+    statements.clear()
+    chapter = repo.chapter("SLK", 1, start=10, end=19)
+    assert len(statements) == 1
+    assert [c.ref for c in chapter] == [f"1.{n}" for n in range(10, 20)]
+    assert repo.get("SLK_99.99") is None
+    conn.close()
+
+
+def test_lru_serves_repeats_and_drops_stale_verses(db_path):
+    with VerseRepository(db_path, cache_size=2) as repo:
+        assert repo.get("SLK_0.1").translation("pt").text_body == "corpo 1"
+        repo.get("SLK_0.1")
+        repo.get_many(["SLK_0.2", "SLK_0.3"])                # expulsa SLK_0.1
+        assert (repo.hits, repo.misses) == (1, 3)
+        assert repo.get("SLK_0.3") is not None and repo.hits == 2
+
+        writer = sqlite3.connect(db_path)                   # outra conexão grava
+        writer.execute("UPDATE library_translations SET text_body = 'novo' WHERE text_body = 'corpo 3'")
+        writer.commit()
+        writer.close()
+        assert repo.get("SLK_0.3").translation("pt").text_body == "novo"